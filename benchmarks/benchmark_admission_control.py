@@ -0,0 +1,361 @@
+"""Benchmark the goodput of an overloaded server with admission control.
+
+Sends `--num-prompts` random completion requests at `--request-rate`
+requests per second, paced and measured like `benchmark_serving.py`, to
+`OpenAIServingCompletion` in front of a simulated engine, with and without
+an admission controller. The engine schedules requests like the scheduler
+with chunked prefill: each step prefills up to `--max-num-batched-tokens`
+prompt tokens of the waiting requests at `--prefill-tokens-per-s` and
+decodes a token of each of the `--max-num-seqs` running requests in
+`--decode-step-ms`, so a request rate above what it sustains makes its queue
+grow for as long as requests arrive. A `--low-priority-fraction` of the
+requests have priority 1. A byte-level BPE tokenizer is trained and saved to
+a temporary directory, so no model is downloaded. Reports the throughput,
+the goodput under the TTFT SLO `--ttft-slo-ms` overall and for each
+priority, and the time to first token of the requests served.
+"""
+import asyncio
+import json
+import random
+import tempfile
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+from backend_request_func import RequestFuncOutput
+from benchmark_serving import (calculate_metrics, get_request,
+                               sample_random_requests)
+from benchmark_tokenizer_cache import Vocabulary, save_tokenizer
+
+from vllm.entrypoints.openai.admission import AdmissionController
+from vllm.entrypoints.openai.protocol import CompletionRequest, ErrorResponse
+from vllm.entrypoints.openai.serving_completion import OpenAIServingCompletion
+from vllm.entrypoints.openai.serving_engine import BaseModelPath
+from vllm.outputs import CompletionOutput, RequestOutput
+from vllm.transformers_utils.tokenizer import AnyTokenizer, get_tokenizer
+from vllm.utils import FlexibleArgumentParser
+
+MODEL_NAME = "meta-llama/Llama-3.1-8B-Instruct"
+
+
+@dataclass
+class FakeModelConfig:
+    task = "generate"
+    max_model_len = 8192
+    logits_processor_pattern = None
+
+
+@dataclass
+class SimulatedRequest:
+    request_id: str
+    prompt_token_ids: List[int]
+    max_tokens: int
+    priority: int
+    arrival: int
+    queue: asyncio.Queue = field(default_factory=asyncio.Queue)
+    num_computed_tokens: int = 0
+    num_output_tokens: int = 0
+
+
+class SimulatedEngine:
+    """Prefills and decodes requests in steps whose duration depends on the
+    number of tokens prefilled."""
+
+    def __init__(self, args, tokenizer: AnyTokenizer):
+        self.args = args
+        self.tokenizer = tokenizer
+        self.token_id = 100
+        self.token_text = tokenizer.decode([self.token_id])
+        self.waiting: Deque[SimulatedRequest] = deque()
+        self.running: List[SimulatedRequest] = []
+        self.num_arrivals = 0
+        self.errored = False
+        self.new_request = asyncio.Event()
+
+    @property
+    def kv_cache_usage(self) -> float:
+        num_tokens = sum(request.num_computed_tokens +
+                         request.num_output_tokens for request in self.running)
+        return num_tokens / self.args.num_kv_cache_tokens
+
+    async def get_tokenizer(self, lora_request=None) -> AnyTokenizer:
+        return self.tokenizer
+
+    async def is_tracing_enabled(self) -> bool:
+        return False
+
+    async def abort(self, request_id: str) -> None:
+        pass
+
+    def generate(self,
+                 prompt,
+                 sampling_params,
+                 request_id,
+                 lora_request=None,
+                 trace_headers=None,
+                 prompt_adapter_request=None,
+                 priority=0):
+        request = SimulatedRequest(request_id, prompt["prompt_token_ids"],
+                                   sampling_params.max_tokens, priority,
+                                   self.num_arrivals)
+        self.num_arrivals += 1
+        return self._generate(request)
+
+    async def _generate(self, request: SimulatedRequest):
+        self.waiting.append(request)
+        self.new_request.set()
+        while True:
+            res = await request.queue.get()
+            yield res
+            if res.finished:
+                return
+
+    def _schedule(self) -> List[Tuple[SimulatedRequest, int]]:
+        if self.args.scheduling_policy == "priority":
+            self.waiting = deque(
+                sorted(self.waiting,
+                       key=lambda request:
+                       (request.priority, request.arrival)))
+        budget = self.args.max_num_batched_tokens
+        scheduled = []
+        for request in self.running:
+            num_tokens = min(
+                len(request.prompt_token_ids) - request.num_computed_tokens,
+                budget) or 1
+            scheduled.append((request, num_tokens))
+            budget -= num_tokens
+        while (self.waiting and budget > 0
+               and len(self.running) < self.args.max_num_seqs):
+            request = self.waiting.popleft()
+            num_tokens = min(len(request.prompt_token_ids), budget)
+            self.running.append(request)
+            scheduled.append((request, num_tokens))
+            budget -= num_tokens
+        return scheduled
+
+    def _make_output(self, request: SimulatedRequest) -> RequestOutput:
+        request.num_output_tokens += 1
+        finished = request.num_output_tokens == request.max_tokens
+        return RequestOutput(
+            request.request_id,
+            prompt=None,
+            prompt_token_ids=request.prompt_token_ids,
+            prompt_logprobs=None,
+            outputs=[
+                CompletionOutput(index=0,
+                                 text=self.token_text,
+                                 token_ids=[self.token_id],
+                                 cumulative_logprob=None,
+                                 logprobs=None,
+                                 finish_reason="length" if finished else None)
+            ],
+            finished=finished)
+
+    async def run(self) -> None:
+        while True:
+            scheduled = self._schedule()
+            if not scheduled:
+                self.new_request.clear()
+                await self.new_request.wait()
+                continue
+            num_prefill_tokens = sum(
+                num_tokens for request, num_tokens in scheduled
+                if request.num_computed_tokens < len(request.prompt_token_ids))
+            await asyncio.sleep(self.args.decode_step_ms / 1000 +
+                                num_prefill_tokens /
+                                self.args.prefill_tokens_per_s)
+            for request, num_tokens in scheduled:
+                if request.num_computed_tokens < len(request.prompt_token_ids):
+                    request.num_computed_tokens += num_tokens
+                    if request.num_computed_tokens < len(
+                            request.prompt_token_ids):
+                        continue
+                res = self._make_output(request)
+                request.queue.put_nowait(res)
+                if res.finished:
+                    self.running.remove(request)
+
+
+async def is_disconnected() -> bool:
+    return False
+
+
+async def send_request(serving_completion: OpenAIServingCompletion,
+                       prompt: str, prompt_len: int, output_len: int,
+                       priority: int) -> RequestFuncOutput:
+    request = CompletionRequest(model=MODEL_NAME,
+                                prompt=prompt,
+                                max_tokens=output_len,
+                                ignore_eos=True,
+                                stream=True,
+                                priority=priority)
+    raw_request = SimpleNamespace(headers={},
+                                  state=SimpleNamespace(),
+                                  is_disconnected=is_disconnected)
+    output = RequestFuncOutput(prompt_len=prompt_len)
+    start = time.perf_counter()
+    response = await serving_completion.create_completion(
+        request,
+        raw_request,  # type: ignore[arg-type]
+    )
+    if isinstance(response, ErrorResponse):
+        output.error = response.message
+        return output
+    most_recent_timestamp = start
+    async for event in response:  # type: ignore[union-attr]
+        data = event[len("data: "):].strip()
+        if data == "[DONE]":
+            continue
+        timestamp = time.perf_counter()
+        if not output.ttft:
+            output.ttft = timestamp - start
+        else:
+            output.itl.append(timestamp - most_recent_timestamp)
+        most_recent_timestamp = timestamp
+        output.generated_text += json.loads(data)["choices"][0]["text"]
+    output.latency = most_recent_timestamp - start
+    output.success = True
+    return output
+
+
+async def run(args, tokenizer: AnyTokenizer,
+              input_requests: List[Tuple[str, int, int,
+                                         None]], priorities: List[int],
+              admission_control: bool) -> Dict[str, float]:
+    engine = SimulatedEngine(args, tokenizer)
+    admission_controller: Optional[AdmissionController] = None
+    if admission_control:
+        admission_controller = AdmissionController(
+            args.ttft_slo_ms,
+            priority_scheduling=args.scheduling_policy == "priority")
+    serving_completion = OpenAIServingCompletion(
+        engine,  # type: ignore[arg-type]
+        FakeModelConfig(),  # type: ignore[arg-type]
+        [BaseModelPath(MODEL_NAME, MODEL_NAME)],
+        lora_modules=None,
+        prompt_adapters=None,
+        request_logger=None,
+        admission_controller=admission_controller)
+
+    async def report_kv_cache_usage() -> None:
+        # As `AdmissionStatLogger` does after every step of the engine.
+        while admission_controller is not None:
+            admission_controller.kv_cache_usage = engine.kv_cache_usage
+            await asyncio.sleep(args.decode_step_ms / 1000)
+
+    engine_task = asyncio.create_task(engine.run())
+    stats_task = asyncio.create_task(report_kv_cache_usage())
+    tasks = []
+    start = time.perf_counter()
+    i = 0
+    async for prompt, prompt_len, output_len, _ in get_request(
+            input_requests, args.request_rate, args.burstiness):
+        tasks.append(
+            asyncio.create_task(
+                send_request(serving_completion, prompt, prompt_len,
+                             output_len, priorities[i])))
+        i += 1
+    outputs: List[RequestFuncOutput] = await asyncio.gather(*tasks)
+    duration = time.perf_counter() - start
+    engine_task.cancel()
+    stats_task.cancel()
+
+    goodput_config = {"ttft": args.ttft_slo_ms}
+    metrics, _ = calculate_metrics(input_requests, outputs, duration,
+                                   tokenizer, ["ttft"], [99], goodput_config)
+    results = {
+        "duration_s": duration,
+        "completed": metrics.completed,
+        "rejected": len(outputs) - metrics.completed,
+        "request_throughput": metrics.request_throughput,
+        "request_goodput": metrics.request_goodput,
+        "mean_ttft_ms": metrics.mean_ttft_ms,
+        "p99_ttft_ms": metrics.percentiles_ttft_ms[0][1],
+    }
+    for priority in sorted(set(priorities)):
+        indices = [i for i, p in enumerate(priorities) if p == priority]
+        priority_metrics, _ = calculate_metrics(
+            [input_requests[i]
+             for i in indices], [outputs[i] for i in indices], duration,
+            tokenizer, ["ttft"], [99], goodput_config)
+        results[f"priority_{priority}_goodput"] = (
+            priority_metrics.request_goodput)
+    return results
+
+
+def main(args):
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+    results = {}
+    with tempfile.TemporaryDirectory() as tokenizer_path:
+        save_tokenizer(Vocabulary(args.seed), tokenizer_path)
+        tokenizer = get_tokenizer(tokenizer_path)
+        input_requests = sample_random_requests(prefix_len=0,
+                                                input_len=args.input_len,
+                                                output_len=args.output_len,
+                                                num_prompts=args.num_prompts,
+                                                range_ratio=args.range_ratio,
+                                                tokenizer=tokenizer)
+        priorities = [
+            int(random.random() < args.low_priority_fraction)
+            for _ in input_requests
+        ]
+        for name, admission_control in [("no admission control", False),
+                                        ("admission control", True)]:
+            np.random.seed(args.seed)
+            results[name] = asyncio.run(
+                run(args, tokenizer, input_requests, priorities,
+                    admission_control))
+            print(f"{name}: " +
+                  ", ".join(f"{key}={value:.2f}"
+                            for key, value in results[name].items()))
+    if args.output_json:
+        with open(args.output_json, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    parser = FlexibleArgumentParser(
+        description="Benchmark the goodput of a simulated engine under "
+        "overload with and without admission control.")
+    parser.add_argument("--num-prompts", type=int, default=600)
+    parser.add_argument("--request-rate",
+                        type=float,
+                        default=20,
+                        help="Number of requests per second.")
+    parser.add_argument("--burstiness",
+                        type=float,
+                        default=1.0,
+                        help="Burstiness factor of the request generation, "
+                        "as in benchmark_serving.py.")
+    parser.add_argument("--input-len", type=int, default=512)
+    parser.add_argument("--output-len", type=int, default=64)
+    parser.add_argument("--range-ratio", type=float, default=0.5)
+    parser.add_argument("--low-priority-fraction",
+                        type=float,
+                        default=0.5,
+                        help="Fraction of the requests with priority 1.")
+    parser.add_argument("--ttft-slo-ms",
+                        type=float,
+                        default=1000,
+                        help="TTFT SLO of the requests, used for admission "
+                        "control and to compute the goodput.")
+    parser.add_argument("--scheduling-policy",
+                        choices=["fcfs", "priority"],
+                        default="priority")
+    parser.add_argument("--prefill-tokens-per-s", type=float, default=10000)
+    parser.add_argument("--decode-step-ms", type=float, default=20)
+    parser.add_argument("--max-num-seqs", type=int, default=64)
+    parser.add_argument("--max-num-batched-tokens", type=int, default=2048)
+    parser.add_argument("--num-kv-cache-tokens",
+                        type=int,
+                        default=65536,
+                        help="Number of tokens the KV cache holds, to report "
+                        "its usage to the admission controller.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output-json", type=str, default=None)
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,177 @@
+"""Benchmark the memory and throughput of the OpenAI batch runner.
+
+Writes a chat completion batch input file and runs it through the streaming
+batch runner of `vllm.entrypoints.openai.run_batch` and through the previous
+implementation, which read the whole file, submitted every request at once
+and wrote all the outputs at the end. The engine is replaced by a handler
+that runs at most `--max-num-seqs` requests at once, each for
+`--request-latency` seconds, and returns `--output-len` characters, so that
+the overhead of the batch runner itself is measured. Each implementation
+runs in its own process, whose peak RSS is reported.
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+from io import StringIO
+from typing import Dict
+
+from vllm.entrypoints.openai.protocol import (BatchRequestInput,
+                                              ChatCompletionRequest,
+                                              ChatCompletionResponse,
+                                              ChatCompletionResponseChoice,
+                                              ChatMessage, UsageInfo)
+from vllm.entrypoints.openai.run_batch import (BatchProgressTracker,
+                                               run_batch_file, run_request)
+from vllm.utils import FlexibleArgumentParser
+
+
+def write_input_file(args, path: str) -> None:
+    content = "x" * args.prompt_len
+    with open(path, "w") as f:
+        for i in range(args.num_requests):
+            print(json.dumps({
+                "custom_id": f"request-{i}",
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": "model",
+                    "messages": [{
+                        "role": "user",
+                        "content": f"{i} {content}"
+                    }],
+                    "max_tokens": 16,
+                },
+            }),
+                  file=f)
+
+
+class FakeChatHandler:
+    """Runs at most `max_num_seqs` requests at once, like an engine."""
+
+    def __init__(self, args):
+        self.engine_slots = asyncio.Semaphore(args.max_num_seqs)
+        self.latency = args.request_latency
+        self.output = "y" * args.output_len
+
+    async def __call__(
+            self, request: ChatCompletionRequest) -> ChatCompletionResponse:
+        async with self.engine_slots:
+            await asyncio.sleep(self.latency)
+        return ChatCompletionResponse(model=request.model,
+                                      choices=[
+                                          ChatCompletionResponseChoice(
+                                              index=0,
+                                              message=ChatMessage(
+                                                  role="assistant",
+                                                  content=self.output))
+                                      ],
+                                      usage=UsageInfo())
+
+
+async def run_previous(input_file: str, output_file: str,
+                       handler: FakeChatHandler) -> None:
+    """The batch runner before it streamed its input and output."""
+    tracker = BatchProgressTracker()
+    with open(input_file, encoding="utf-8") as f:
+        data = f.read()
+    response_futures = []
+    for request_json in data.strip().split("\n"):
+        request_json = request_json.strip()
+        if not request_json:
+            continue
+        request = BatchRequestInput.model_validate_json(request_json)
+        response_futures.append(run_request(handler, request, tracker))
+        tracker.submitted()
+    with tracker.pbar():
+        responses = await asyncio.gather(*response_futures)
+    output_buffer = StringIO()
+    for response in responses:
+        print(response.model_dump_json(), file=output_buffer)
+    output_buffer.seek(0)
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write(output_buffer.read().strip())
+
+
+def run(args, implementation: str, input_file: str, output_file: str,
+        results: multiprocessing.Queue) -> None:
+
+    async def run_batch() -> None:
+        handler = FakeChatHandler(args)
+        if implementation == "previous":
+            await run_previous(input_file, output_file, handler)
+        else:
+            await run_batch_file(
+                input_file,
+                output_file, {"/v1/chat/completions": (handler, "")},
+                max_concurrent_requests=2 * args.max_num_seqs,
+                ordered=implementation == "streaming (input order)")
+
+    start = time.perf_counter()
+    asyncio.run(run_batch())
+    elapsed = time.perf_counter() - start
+    results.put({
+        "requests_per_s":
+        args.num_requests / elapsed,
+        # ru_maxrss is in KiB on Linux.
+        "peak_rss_gib":
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**20,
+    })
+
+
+def main(args):
+    ctx = multiprocessing.get_context("spawn")
+    all_results: Dict[str, Dict[str, float]] = {}
+    with tempfile.TemporaryDirectory(dir=args.tmp_dir) as tmp_dir:
+        input_file = os.path.join(tmp_dir, "input.jsonl")
+        write_input_file(args, input_file)
+        for implementation in [
+                "previous", "streaming (input order)",
+                "streaming (completion order)"
+        ]:
+            results = ctx.Queue()
+            proc = ctx.Process(target=run,
+                               args=(args, implementation, input_file,
+                                     os.path.join(tmp_dir,
+                                                  "output.jsonl"), results))
+            proc.start()
+            all_results[implementation] = results.get()
+            proc.join()
+            print(f"{implementation}: " + ", ".join(
+                f"{key}={value:.2f}"
+                for key, value in all_results[implementation].items()))
+    if args.output_json:
+        with open(args.output_json, "w") as f:
+            json.dump(all_results, f, indent=4)
+
+
+if __name__ == "__main__":
+    parser = FlexibleArgumentParser(
+        description="Benchmark the memory and throughput of the OpenAI batch "
+        "runner with a simulated engine.")
+    parser.add_argument("--num-requests", type=int, default=200000)
+    parser.add_argument("--prompt-len",
+                        type=int,
+                        default=1000,
+                        help="Number of characters of each prompt.")
+    parser.add_argument("--output-len",
+                        type=int,
+                        default=1000,
+                        help="Number of characters of each output.")
+    parser.add_argument("--max-num-seqs", type=int, default=256)
+    parser.add_argument("--request-latency",
+                        type=float,
+                        default=0.01,
+                        help="Time in seconds the simulated engine spends "
+                        "on a request.")
+    parser.add_argument("--tmp-dir",
+                        type=str,
+                        default=None,
+                        help="Directory in which the input and output files "
+                        "are written. Defaults to the system temp directory.")
+    parser.add_argument("--output-json", type=str, default=None)
+    args = parser.parse_args()
+    main(args)
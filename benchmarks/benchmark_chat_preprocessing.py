@@ -0,0 +1,198 @@
+"""Benchmark the preprocessing of multi-turn chat completion requests.
+
+Sends the turns of `--num-conversations` agent conversations, each with a
+system prompt and `--num-tools` tool schemas, to the preprocessing of
+`OpenAIServingChat` (parsing the messages, rendering the chat template and
+tokenizing the prompt) with and without the chat prompt cache, and reports
+the latency of each request against the number of turns of its
+conversation. A byte-level BPE tokenizer is trained on the vocabulary of the
+conversations, so no model is downloaded, and the prompts are rendered with
+the Hermes tool chat template.
+"""
+import asyncio
+import json
+import random
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+from transformers import PreTrainedTokenizerFast
+
+from vllm.entrypoints.chat_utils import load_chat_template
+from vllm.entrypoints.openai.protocol import ChatCompletionRequest
+from vllm.entrypoints.openai.serving_chat import OpenAIServingChat
+from vllm.entrypoints.openai.serving_engine import BaseModelPath
+from vllm.utils import FlexibleArgumentParser, GiB_bytes
+
+MODEL_NAME = "agent-model"
+CHAT_TEMPLATE = (Path(__file__).parent.parent / "examples" /
+                 "tool_chat_template_hermes.jinja")
+
+
+@dataclass
+class FakeModelConfig:
+    task = "generate"
+    max_model_len = 1 << 20
+    logits_processor_pattern = None
+    multimodal_config = None
+    hf_config = None
+
+
+class Vocabulary:
+
+    def __init__(self, seed: int):
+        self.rng = random.Random(seed)
+        self.words = [
+            "".join(
+                self.rng.choice("abcdefghijklmnopqrstuvwxyz")
+                for _ in range(self.rng.randint(2, 9))) for _ in range(3000)
+        ]
+
+    def text(self, num_words: int) -> str:
+        return " ".join(self.rng.choice(self.words) for _ in range(num_words))
+
+
+def make_tokenizer(vocabulary: Vocabulary) -> PreTrainedTokenizerFast:
+    tokenizer = Tokenizer(models.BPE())
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    tokenizer.train_from_iterator(
+        [vocabulary.text(50) for _ in range(2000)],
+        trainers.BpeTrainer(
+            vocab_size=8000,
+            special_tokens=["<|im_start|>", "<|im_end|>", "<|endoftext|>"],
+            initial_alphabet=pre_tokenizers.ByteLevel.alphabet()))
+    hf_tokenizer = PreTrainedTokenizerFast(tokenizer_object=tokenizer,
+                                           eos_token="<|im_end|>",
+                                           pad_token="<|endoftext|>")
+    hf_tokenizer.chat_template = load_chat_template(CHAT_TEMPLATE)
+    return hf_tokenizer
+
+
+def make_tools(args, vocabulary: Vocabulary) -> List[Dict[str, Any]]:
+    return [{
+        "type": "function",
+        "function": {
+            "name": f"tool_{i}",
+            "description": vocabulary.text(40),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    f"arg_{j}": {
+                        "type": "string",
+                        "description": vocabulary.text(10)
+                    }
+                    for j in range(8)
+                },
+                "required": ["arg_0"],
+            },
+        },
+    } for i in range(args.num_tools)]
+
+
+async def run(args, vocabulary: Vocabulary, tokenizer: PreTrainedTokenizerFast,
+              cache_bytes: int) -> Dict[int, List[float]]:
+    serving_chat = OpenAIServingChat(
+        None,  # type: ignore[arg-type]
+        FakeModelConfig(),  # type: ignore[arg-type]
+        [BaseModelPath(MODEL_NAME, MODEL_NAME)],
+        "assistant",
+        lora_modules=None,
+        prompt_adapters=None,
+        request_logger=None,
+        chat_template=None,
+        chat_template_content_format="auto",
+        chat_prompt_cache_bytes=cache_bytes)
+    tools = make_tools(args, vocabulary)
+    latencies: Dict[int, List[float]] = {
+        num_turns: []
+        for num_turns in range(1, args.num_turns + 1)
+    }
+    conversations: List[List[Dict[str, str]]] = []
+    for _ in range(args.num_conversations):
+        system_prompt = vocabulary.text(args.system_prompt_len)
+        conversations.append([{"role": "system", "content": system_prompt}])
+    # The conversations are interleaved, as on a server.
+    for num_turns in range(1, args.num_turns + 1):
+        for messages in conversations:
+            messages.append({
+                "role": "user",
+                "content": vocabulary.text(args.message_len)
+            })
+            request = ChatCompletionRequest(model=MODEL_NAME,
+                                            messages=messages,
+                                            tools=tools)
+            start = time.perf_counter()
+            await serving_chat._preprocess_chat(
+                request,
+                tokenizer,
+                request.messages,
+                chat_template=None,
+                chat_template_content_format="auto",
+                add_generation_prompt=True,
+                tool_dicts=[tool.model_dump() for tool in request.tools])
+            latencies[num_turns].append(time.perf_counter() - start)
+            messages.append({
+                "role": "assistant",
+                "content": vocabulary.text(args.message_len)
+            })
+    return latencies
+
+
+def main(args):
+    vocabulary = Vocabulary(args.seed)
+    tokenizer = make_tokenizer(vocabulary)
+    reported_turns = [
+        num_turns for num_turns in [1, 2, 5, 10, 20, 30, 40, 50]
+        if num_turns <= args.num_turns
+    ]
+    results: Dict[str, Dict[int, float]] = {}
+    for name, cache_bytes in [
+        ("no cache", 0),
+        ("cache", int(args.chat_prompt_cache_size * GiB_bytes)),
+    ]:
+        # Generate the same conversations for both runs.
+        vocabulary.rng.seed(args.seed)
+        latencies = asyncio.run(run(args, vocabulary, tokenizer, cache_bytes))
+        results[name] = {
+            num_turns: float(np.mean(latencies[num_turns])) * 1000
+            for num_turns in reported_turns
+        }
+    print(f"{'turns':>5} " + " ".join(f"{name + ' (ms)':>14}"
+                                      for name in results))
+    for num_turns in reported_turns:
+        print(f"{num_turns:>5} " +
+              " ".join(f"{results[name][num_turns]:>14.2f}"
+                       for name in results))
+    if args.output_json:
+        with open(args.output_json, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    parser = FlexibleArgumentParser(
+        description="Benchmark the latency of the preprocessing of "
+        "multi-turn chat completion requests with and without the chat "
+        "prompt cache.")
+    parser.add_argument("--num-conversations", type=int, default=8)
+    parser.add_argument("--num-turns", type=int, default=50)
+    parser.add_argument("--num-tools", type=int, default=20)
+    parser.add_argument("--system-prompt-len",
+                        type=int,
+                        default=500,
+                        help="Number of words of the system prompt.")
+    parser.add_argument("--message-len",
+                        type=int,
+                        default=100,
+                        help="Number of words of each message.")
+    parser.add_argument("--chat-prompt-cache-size",
+                        type=float,
+                        default=1.0,
+                        help="Size of the chat prompt cache in GiB.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output-json", type=str, default=None)
+    args = parser.parse_args()
+    main(args)
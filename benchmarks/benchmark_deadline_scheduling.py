@@ -0,0 +1,223 @@
+"""Benchmark the SLO attainment of the deadline scheduling policy.
+
+Runs the scheduler of the engine under bursty load with a simulated model:
+each step takes `--step-ms` milliseconds plus the time to prefill its prompt
+tokens at `--prefill-tokens-per-s`, and samples a token for each sequence
+group done with its prompt. `--num-prompts` requests arrive at
+`--request-rate` requests per second with the `--burstiness` of
+`benchmark_serving.py`. An `--interactive-fraction` of the requests have
+the tight TTFT and TPOT SLOs `--interactive-ttft-slo-ms` and
+`--interactive-tpot-slo-ms`, and the others the loose SLOs
+`--batch-ttft-slo-ms` and `--batch-tpot-slo-ms`. The requests carry their
+SLOs in their sampling parameters, which only the "deadline" policy uses.
+Reports for each policy the fraction of the requests of each class that
+meet both SLOs, the goodput, the requests aborted past their deadline, and
+the fraction of the generated tokens spent on requests that missed their
+SLOs.
+"""
+import json
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from vllm.config import CacheConfig, SchedulerConfig
+from vllm.core.scheduler import Scheduler
+from vllm.inputs import token_inputs
+from vllm.sampling_params import SamplingParams
+from vllm.sequence import Logprob, Sequence, SequenceGroup, SequenceStatus
+from vllm.utils import FlexibleArgumentParser
+
+BLOCK_SIZE = 16
+
+
+@dataclass
+class SimulatedRequest:
+    seq_group: SequenceGroup
+    interactive: bool
+    arrival_time: float = 0.0
+    token_times: List[float] = field(default_factory=list)
+    aborted: bool = False
+
+    def meets_slo(self) -> bool:
+        params = self.seq_group.sampling_params
+        assert params is not None
+        if self.aborted or not self.token_times:
+            return False
+        assert params.ttft_slo_ms is not None
+        assert params.tpot_slo_ms is not None
+        ttft = self.token_times[0] - self.arrival_time
+        if ttft > params.ttft_slo_ms / 1000:
+            return False
+        if len(self.token_times) == 1:
+            return True
+        tpot = ((self.token_times[-1] - self.token_times[0]) /
+                (len(self.token_times) - 1))
+        return tpot <= params.tpot_slo_ms / 1000
+
+
+def make_requests(args) -> List[SimulatedRequest]:
+    rng = random.Random(args.seed)
+    requests = []
+    for i in range(args.num_prompts):
+        interactive = rng.random() < args.interactive_fraction
+        prompt_len = rng.randint(args.input_len // 2, args.input_len)
+        output_len = rng.randint(args.output_len // 2, args.output_len)
+        if interactive:
+            ttft_slo_ms = args.interactive_ttft_slo_ms
+            tpot_slo_ms = args.interactive_tpot_slo_ms
+        else:
+            ttft_slo_ms = args.batch_ttft_slo_ms
+            tpot_slo_ms = args.batch_tpot_slo_ms
+        sampling_params = SamplingParams(max_tokens=output_len,
+                                         ignore_eos=True,
+                                         ttft_slo_ms=ttft_slo_ms,
+                                         tpot_slo_ms=tpot_slo_ms)
+        seq = Sequence(i,
+                       inputs=token_inputs([0] * prompt_len),
+                       block_size=BLOCK_SIZE)
+        # The arrival time is set when the request is added.
+        seq_group = SequenceGroup(request_id=str(i),
+                                  seqs=[seq],
+                                  arrival_time=0.0,
+                                  sampling_params=sampling_params)
+        requests.append(SimulatedRequest(seq_group, interactive))
+    return requests
+
+
+def get_arrival_offsets(args) -> List[float]:
+    # The intervals between requests follow the gamma distribution of
+    # benchmark_serving.py.
+    np.random.seed(args.seed)
+    theta = 1.0 / (args.request_rate * args.burstiness)
+    intervals = np.random.gamma(shape=args.burstiness,
+                                scale=theta,
+                                size=args.num_prompts)
+    return np.cumsum(intervals).tolist()
+
+
+def run(args, policy: str) -> Dict[str, float]:
+    scheduler_config = SchedulerConfig(
+        "generate",
+        max_num_batched_tokens=args.max_num_batched_tokens,
+        max_num_seqs=args.max_num_seqs,
+        max_model_len=args.input_len + args.output_len,
+        enable_chunked_prefill=True,
+        policy=policy)
+    cache_config = CacheConfig(BLOCK_SIZE, 1.0, 1, "auto")
+    cache_config.num_gpu_blocks = args.num_gpu_blocks
+    cache_config.num_cpu_blocks = 0
+    scheduler = Scheduler(scheduler_config, cache_config, None)
+
+    requests = make_requests(args)
+    by_id = {request.seq_group.request_id: request for request in requests}
+    offsets = get_arrival_offsets(args)
+    num_added = 0
+    num_tokens = 0
+    start = time.time()
+    while num_added < len(requests) or scheduler.has_unfinished_seqs():
+        now = time.time()
+        while num_added < len(requests) and start + offsets[num_added] <= now:
+            request = requests[num_added]
+            request.arrival_time = start + offsets[num_added]
+            request.seq_group.arrival_time = request.arrival_time
+            request.seq_group.metrics.arrival_time = request.arrival_time
+            scheduler.add_seq_group(request.seq_group)
+            num_added += 1
+        if not scheduler.has_unfinished_seqs():
+            time.sleep(start + offsets[num_added] - now)
+            continue
+
+        _, out, _ = scheduler.schedule()
+        for seq_group in out.ignored_seq_groups:
+            by_id[seq_group.request_id].aborted = True
+        num_prefill_tokens = sum(scheduled.token_chunk_size
+                                 for scheduled in out.scheduled_seq_groups
+                                 if scheduled.seq_group.is_prefill())
+        time.sleep(args.step_ms / 1000 +
+                   num_prefill_tokens / args.prefill_tokens_per_s)
+        now = time.time()
+        for scheduled in out.scheduled_seq_groups:
+            seq_group = scheduled.seq_group
+            seq_group.update_num_computed_tokens(scheduled.token_chunk_size)
+            if seq_group.is_prefill():
+                # The prompt is not done yet.
+                continue
+            seq = seq_group.first_seq
+            seq.append_token_id(0, {0: Logprob(0.0)})
+            seq_group.maybe_set_first_token_time(now)
+            by_id[seq_group.request_id].token_times.append(now)
+            num_tokens += 1
+            assert seq_group.sampling_params is not None
+            if seq.get_output_len() == seq_group.sampling_params.max_tokens:
+                seq.status = SequenceStatus.FINISHED_LENGTH_CAPPED
+        scheduler.free_finished_seq_groups()
+    duration = time.time() - start
+
+    def attainment(interactive: Optional[bool]) -> float:
+        selected = [
+            request for request in requests
+            if interactive is None or request.interactive == interactive
+        ]
+        return (sum(request.meets_slo()
+                    for request in selected) / max(len(selected), 1))
+
+    num_wasted_tokens = sum(
+        len(request.token_times) for request in requests
+        if not request.meets_slo())
+    return {
+        "duration_s": duration,
+        "slo_attainment": attainment(None),
+        "interactive_slo_attainment": attainment(True),
+        "batch_slo_attainment": attainment(False),
+        "goodput_req_s":
+        sum(request.meets_slo() for request in requests) / duration,
+        "aborted": sum(request.aborted for request in requests),
+        "wasted_token_fraction": num_wasted_tokens / max(num_tokens, 1),
+    }
+
+
+def main(args):
+    results = {}
+    for policy in ["fcfs", "deadline"]:
+        results[policy] = run(args, policy)
+        print(f"{policy}: " +
+              ", ".join(f"{key}={value:.3f}"
+                        for key, value in results[policy].items()))
+    if args.output_json:
+        with open(args.output_json, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    parser = FlexibleArgumentParser(
+        description="Benchmark the SLO attainment of the fcfs and deadline "
+        "scheduling policies under bursty load with a simulated model.")
+    parser.add_argument("--num-prompts", type=int, default=400)
+    parser.add_argument("--request-rate",
+                        type=float,
+                        default=24,
+                        help="Number of requests per second.")
+    parser.add_argument("--burstiness",
+                        type=float,
+                        default=0.1,
+                        help="Burstiness factor of the request generation, "
+                        "as in benchmark_serving.py. Lower is burstier.")
+    parser.add_argument("--input-len", type=int, default=512)
+    parser.add_argument("--output-len", type=int, default=128)
+    parser.add_argument("--interactive-fraction", type=float, default=0.5)
+    parser.add_argument("--interactive-ttft-slo-ms", type=float, default=500)
+    parser.add_argument("--interactive-tpot-slo-ms", type=float, default=50)
+    parser.add_argument("--batch-ttft-slo-ms", type=float, default=5000)
+    parser.add_argument("--batch-tpot-slo-ms", type=float, default=100)
+    parser.add_argument("--step-ms", type=float, default=15)
+    parser.add_argument("--prefill-tokens-per-s", type=float, default=20000)
+    parser.add_argument("--max-num-seqs", type=int, default=64)
+    parser.add_argument("--max-num-batched-tokens", type=int, default=2048)
+    parser.add_argument("--num-gpu-blocks", type=int, default=1024)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output-json", type=str, default=None)
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,190 @@
+"""Benchmark the embedding cache and the base64 encoding of the
+Embeddings API.
+
+Sends batches of chunks drawn from a corpus with many duplicates, as when
+documents are ingested again for retrieval, to `OpenAIServingEmbedding`
+with and without the embedding cache. The engine is simulated: it embeds
+`--engine-tokens-per-s` tokens per second, one prompt at a time. Reports
+the throughput of each configuration and the fraction of the inputs found
+in the cache, then the time spent encoding an embedding to base64 from the
+list of its values, as before, and from the buffer of its tensor.
+"""
+import asyncio
+import base64
+import json
+import time
+from dataclasses import dataclass
+from typing import Dict, List
+
+import numpy as np
+import torch
+
+from vllm.config import PoolerConfig
+from vllm.entrypoints.openai.protocol import (EmbeddingCompletionRequest,
+                                              EmbeddingResponse)
+from vllm.entrypoints.openai.serving_embedding import (OpenAIServingEmbedding,
+                                                       _get_embedding)
+from vllm.entrypoints.openai.serving_engine import BaseModelPath
+from vllm.outputs import PoolingOutput, PoolingRequestOutput
+from vllm.utils import FlexibleArgumentParser, GiB_bytes
+
+MODEL_NAME = "embedding-model"
+
+
+@dataclass
+class SimulatedModelConfig:
+    model = MODEL_NAME
+    task = "embed"
+    max_model_len = 8192
+    pooler_config = PoolerConfig(pooling_type="MEAN", normalize=True)
+
+
+class SimulatedTokenizer:
+    """Decodes the token ids of the inputs for logging."""
+
+    def decode(self, token_ids: List[int], **kwargs) -> str:
+        return " ".join(map(str, token_ids))
+
+
+class SimulatedEngine:
+    """Embeds the prompts one at a time at a fixed token throughput."""
+
+    def __init__(self, args):
+        self.tokens_per_s = args.engine_tokens_per_s
+        self.hidden_size = args.hidden_size
+        self.lock = asyncio.Lock()
+        self.errored = False
+
+    async def get_tokenizer(self, lora_request=None):
+        return SimulatedTokenizer()
+
+    async def encode(self, prompt, pooling_params, request_id, **kwargs):
+        token_ids = prompt["prompt_token_ids"]
+        async with self.lock:
+            await asyncio.sleep(len(token_ids) / self.tokens_per_s)
+        yield PoolingRequestOutput(request_id,
+                                   PoolingOutput(torch.randn(
+                                       self.hidden_size)),
+                                   token_ids,
+                                   finished=True)
+
+
+def make_requests(args) -> List[List[List[int]]]:
+    rng = np.random.default_rng(args.seed)
+    corpus = rng.integers(0,
+                          32000,
+                          size=(args.num_unique_chunks, args.chunk_len))
+    chunks = rng.integers(args.num_unique_chunks,
+                          size=(args.num_requests, args.batch_size))
+    return [[corpus[i].tolist() for i in batch] for batch in chunks]
+
+
+async def run_requests(args, serving: OpenAIServingEmbedding,
+                       requests: List[List[List[int]]]) -> float:
+    queue = list(reversed(requests))
+
+    async def client() -> None:
+        while queue:
+            request = EmbeddingCompletionRequest(
+                model=MODEL_NAME,
+                input=queue.pop(),
+                encoding_format=args.encoding_format)
+            response = await serving.create_embedding(request)
+            assert isinstance(response, EmbeddingResponse), response
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(args.num_clients)))
+    return time.perf_counter() - start
+
+
+def run(args, requests: List[List[List[int]]],
+        cache_bytes: int) -> Dict[str, float]:
+    serving = OpenAIServingEmbedding(SimulatedEngine(args),
+                                     SimulatedModelConfig(),
+                                     [BaseModelPath(MODEL_NAME, MODEL_NAME)],
+                                     request_logger=None,
+                                     chat_template=None,
+                                     chat_template_content_format="auto",
+                                     embedding_cache_bytes=cache_bytes)
+    elapsed = asyncio.run(run_requests(args, serving, requests))
+    num_inputs = sum(len(batch) for batch in requests)
+    cache = serving.embedding_cache
+    return {
+        "requests_per_s": len(requests) / elapsed,
+        "inputs_per_s": num_inputs / elapsed,
+        "cache_hit_rate": cache.hit_rate if cache is not None else 0.0,
+    }
+
+
+def benchmark_base64(args) -> Dict[str, float]:
+    pooled_data = torch.randn(args.hidden_size)
+    num_iters = 1000
+
+    start = time.perf_counter()
+    for _ in range(num_iters):
+        embedding = np.array(pooled_data.tolist(), dtype="float32").tobytes()
+        base64.b64encode(embedding).decode("utf-8")
+    from_list = (time.perf_counter() - start) / num_iters
+
+    start = time.perf_counter()
+    for _ in range(num_iters):
+        _get_embedding(pooled_data, "base64")
+    from_tensor = (time.perf_counter() - start) / num_iters
+    return {
+        "from_list_us": from_list * 1e6,
+        "from_tensor_us": from_tensor * 1e6
+    }
+
+
+def main(args):
+    requests = make_requests(args)
+    results = {}
+    for name, cache_bytes in [
+        ("no cache", 0),
+        ("cache", int(args.embedding_cache_size * GiB_bytes)),
+    ]:
+        results[name] = run(args, requests, cache_bytes)
+        print(f"{name}: " + ", ".join(f"{key}={value:.3f}"
+                                      for key, value in results[name].items()))
+    results["base64"] = benchmark_base64(args)
+    print("base64 encoding: " +
+          ", ".join(f"{key}={value:.1f}"
+                    for key, value in results["base64"].items()))
+    if args.output_json:
+        with open(args.output_json, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    parser = FlexibleArgumentParser(
+        description="Benchmark the Embeddings API with and without the "
+        "embedding cache on a corpus with many duplicate chunks.")
+    parser.add_argument("--num-requests", type=int, default=500)
+    parser.add_argument("--batch-size",
+                        type=int,
+                        default=16,
+                        help="Number of chunks embedded by each request.")
+    parser.add_argument("--num-unique-chunks",
+                        type=int,
+                        default=1000,
+                        help="Number of distinct chunks the requests are "
+                        "drawn from.")
+    parser.add_argument("--chunk-len", type=int, default=256)
+    parser.add_argument("--hidden-size", type=int, default=4096)
+    parser.add_argument("--engine-tokens-per-s",
+                        type=float,
+                        default=1e6,
+                        help="Throughput of the simulated engine.")
+    parser.add_argument("--num-clients", type=int, default=16)
+    parser.add_argument("--encoding-format",
+                        type=str,
+                        choices=["float", "base64"],
+                        default="base64")
+    parser.add_argument("--embedding-cache-size",
+                        type=float,
+                        default=1.0,
+                        help="Size of the embedding cache in GiB.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output-json", type=str, default=None)
+    args = parser.parse_args()
+    main(args)
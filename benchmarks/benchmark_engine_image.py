@@ -0,0 +1,94 @@
+"""Benchmark engine startup from a checkpoint and from an engine image.
+
+Converts the model into a vLLM engine image with the given engine
+arguments (unless an existing image is passed) and then measures, in a
+fresh process per run, the time to create an `LLM` from the original
+checkpoint with the default loader and from the engine image.
+"""
+import argparse
+import dataclasses
+import glob
+import os
+import tempfile
+import time
+
+import torch.multiprocessing as mp
+from benchmark_weight_loading import drop_page_cache
+
+from vllm import LLM, EngineArgs
+from vllm.scripts import convert_checkpoint
+from vllm.utils import FlexibleArgumentParser
+
+
+def create_llm(engine_args: EngineArgs, results) -> None:
+    start = time.perf_counter()
+    llm = LLM(**dataclasses.asdict(engine_args))
+    results.put(time.perf_counter() - start)
+    del llm
+
+
+def convert(args, image_dir: str, snapshot: bool = False) -> None:
+    # Converts with the same engine arguments as the benchmarked engines.
+    convert_args = argparse.Namespace(**vars(args))
+    convert_args.model_tag = args.model
+    convert_args.output = image_dir
+    convert_args.snapshot = snapshot
+    ctx = mp.get_context("spawn")
+    process = ctx.Process(target=convert_checkpoint, args=(convert_args, ))
+    process.start()
+    process.join()
+    assert process.exitcode == 0
+
+
+def time_startup(engine_args: EngineArgs, drop_cache: bool) -> float:
+    if drop_cache and os.path.isdir(engine_args.model):
+        drop_page_cache([
+            path for path in glob.glob(os.path.join(engine_args.model, "*"))
+            if os.path.isfile(path)
+        ])
+    ctx = mp.get_context("spawn")
+    results = ctx.Queue()
+    process = ctx.Process(target=create_llm, args=(engine_args, results))
+    process.start()
+    startup_time = results.get()
+    process.join()
+    assert process.exitcode == 0
+    return startup_time
+
+
+def main(args):
+    engine_args = EngineArgs.from_cli_args(args)
+    with tempfile.TemporaryDirectory(dir=args.image_dir) as tmp_dir:
+        image_dir = os.path.join(tmp_dir, "image")
+        convert(args, image_dir)
+        image_args = dataclasses.replace(engine_args,
+                                         model=image_dir,
+                                         tokenizer=engine_args.tokenizer
+                                         or engine_args.model,
+                                         load_format="engine_image")
+
+        drop_cache = not args.keep_page_cache
+        print(f"{'run':>4} {'checkpoint (s)':>15} {'engine image (s)':>17}")
+        for run in range(args.num_runs):
+            checkpoint = time_startup(engine_args, drop_cache)
+            image = time_startup(image_args, drop_cache)
+            print(f"{run:>4} {checkpoint:>15.2f} {image:>17.2f}")
+
+
+if __name__ == "__main__":
+    parser = FlexibleArgumentParser(
+        description="Benchmark engine startup time from a checkpoint and "
+        "from an engine image.")
+    parser.add_argument("--image-dir",
+                        type=str,
+                        default=None,
+                        help="Directory in which the engine image is "
+                        "written. Defaults to the system temp directory.")
+    parser.add_argument("--num-runs", type=int, default=3)
+    parser.add_argument("--keep-page-cache",
+                        action="store_true",
+                        help="Do not evict the model files from the page "
+                        "cache before each run.")
+    parser = EngineArgs.add_cli_args(parser)
+    args = parser.parse_args()
+    main(args)
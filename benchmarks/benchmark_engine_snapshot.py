@@ -0,0 +1,75 @@
+"""Benchmark the time to first request of an engine started from an engine
+snapshot.
+
+Takes a snapshot of an engine created with the given engine arguments (see
+`vllm convert-checkpoint --snapshot`) and then measures, in a fresh process
+per run, the time from starting the process to the completion of a first
+one-token request, for an engine created from the original checkpoint and
+for one restored from the snapshot. Defaults to the CPU backend.
+"""
+import dataclasses
+import os
+import tempfile
+import time
+
+import torch.multiprocessing as mp
+from benchmark_engine_image import convert
+
+from vllm import LLM, EngineArgs, SamplingParams
+from vllm.utils import FlexibleArgumentParser
+
+
+def first_request(engine_args: EngineArgs, results) -> None:
+    llm = LLM(**dataclasses.asdict(engine_args))
+    ready = time.time()
+    llm.generate("Hello, my name is",
+                 SamplingParams(max_tokens=1),
+                 use_tqdm=False)
+    results.put((ready, time.time()))
+
+
+def time_first_request(engine_args: EngineArgs):
+    ctx = mp.get_context("spawn")
+    results = ctx.Queue()
+    process = ctx.Process(target=first_request, args=(engine_args, results))
+    start = time.time()
+    process.start()
+    ready, done = results.get()
+    process.join()
+    assert process.exitcode == 0
+    return ready - start, done - start
+
+
+def main(args):
+    engine_args = EngineArgs.from_cli_args(args)
+    with tempfile.TemporaryDirectory(dir=args.snapshot_dir) as tmp_dir:
+        snapshot_dir = os.path.join(tmp_dir, "snapshot")
+        convert(args, snapshot_dir, snapshot=True)
+        snapshot_args = dataclasses.replace(engine_args,
+                                            model=snapshot_dir,
+                                            tokenizer=None,
+                                            load_format="engine_image")
+
+        print(f"{'run':>4} {'engine':>10} {'startup (s)':>12} "
+              f"{'first request (s)':>18}")
+        for run in range(args.num_runs):
+            for name, run_args in (("checkpoint", engine_args),
+                                   ("snapshot", snapshot_args)):
+                startup, ttfr = time_first_request(run_args)
+                print(f"{run:>4} {name:>10} {startup:>12.2f} {ttfr:>18.2f}")
+
+
+if __name__ == "__main__":
+    parser = FlexibleArgumentParser(
+        description="Benchmark the time to first request of an engine "
+        "started from a checkpoint and from an engine snapshot.")
+    parser.add_argument("--snapshot-dir",
+                        type=str,
+                        default=None,
+                        help="Directory in which the snapshot is written. "
+                        "Defaults to the system temp directory.")
+    parser.add_argument("--num-runs", type=int, default=3)
+    parser = EngineArgs.add_cli_args(parser)
+    parser.set_defaults(device="cpu")
+    args = parser.parse_args()
+    main(args)
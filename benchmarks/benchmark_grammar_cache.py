@@ -0,0 +1,156 @@
+"""Benchmark the compiled-grammar cache used by guided decoding.
+
+Builds a corpus of distinct JSON schemas from benchmarks/structured_schemas
+and measures the time to construct guided decoding logits processors when
+the grammars are compiled from scratch (cold), served from the in-memory
+cache (warm) and loaded from the disk cache after a simulated restart.
+"""
+import copy
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Callable, List
+
+from transformers import AutoTokenizer
+
+from vllm.model_executor.guided_decoding import grammar_cache
+from vllm.model_executor.guided_decoding.grammar_cache import (
+    CompiledGrammarCache, GrammarCacheStats)
+from vllm.utils import FlexibleArgumentParser
+
+# Schema keywords that xgrammar cannot compile, see
+# has_xgrammar_unsupported_json_features.
+_XGRAMMAR_UNSUPPORTED_KEYS = ("pattern", "minimum", "maximum",
+                              "exclusiveMinimum", "exclusiveMaximum",
+                              "multipleOf")
+
+
+def _strip_keys(obj, keys):
+    if isinstance(obj, dict):
+        return {
+            k: _strip_keys(v, keys)
+            for k, v in obj.items() if k not in keys
+        }
+    if isinstance(obj, list):
+        return [_strip_keys(item, keys) for item in obj]
+    return obj
+
+
+def load_schemas(schema_dir: str, num_schemas: int, seed: int,
+                 backend: str) -> List[str]:
+    """Returns `num_schemas` distinct schemas derived from the corpus."""
+    base_schemas = []
+    for name in sorted(os.listdir(schema_dir)):
+        if name.endswith(".json"):
+            with open(os.path.join(schema_dir, name)) as f:
+                schema = json.load(f)
+            if backend == "xgrammar":
+                schema = _strip_keys(schema, _XGRAMMAR_UNSUPPORTED_KEYS)
+            base_schemas.append(schema)
+    assert base_schemas, f"No JSON schemas found in {schema_dir}"
+
+    rng = random.Random(seed)
+    schemas = []
+    for i in range(num_schemas):
+        schema = copy.deepcopy(base_schemas[i % len(base_schemas)])
+        # Make every schema distinct while keeping its structure, as in a
+        # workload where each client sends a slightly different schema.
+        properties = schema.setdefault("properties", {})
+        properties[f"field_{i}"] = {
+            "type": rng.choice(["string", "integer", "boolean"])
+        }
+        schemas.append(json.dumps(schema))
+    return schemas
+
+
+def make_processor_fn(backend: str, tokenizer) -> Callable[[str], object]:
+    if backend == "outlines":
+        from vllm.model_executor.guided_decoding.outlines_logits_processors import (  # noqa: E501
+            JSONLogitsProcessor)
+        return lambda schema: JSONLogitsProcessor(
+            schema, tokenizer, whitespace_pattern=None)
+
+    from vllm.model_executor.guided_decoding.xgrammar_decoding import (
+        GrammarConfig, TokenizerDataCache, XGrammarLogitsProcessor)
+    tokenizer_data = TokenizerDataCache.get_tokenizer_data(tokenizer)
+
+    def make_xgrammar_processor(schema: str):
+        processor = XGrammarLogitsProcessor(
+            GrammarConfig(tokenizer_hash=hash(tokenizer),
+                          vocab_size=len(tokenizer),
+                          json_str=schema,
+                          encoded_vocab=tokenizer_data.encoded_vocab,
+                          stop_token_ids=tokenizer_data.stop_token_ids,
+                          backend_str=tokenizer_data.backend_str,
+                          tokenizer_fingerprint=tokenizer_data.fingerprint))
+        processor._ensure_ctx()
+        return processor
+
+    return make_xgrammar_processor
+
+
+def run_pass(name: str, schemas: List[str],
+             make_processor: Callable[[str], object]) -> None:
+    cache = grammar_cache.get_compiled_grammar_cache()
+    cache.stats = GrammarCacheStats()
+    start = time.perf_counter()
+    for schema in schemas:
+        make_processor(schema)
+    elapsed = time.perf_counter() - start
+    stats = cache.stats
+    print(f"{name:>12}: {elapsed:8.3f} s total, "
+          f"{elapsed / len(schemas) * 1000:8.3f} ms/schema | "
+          f"hits={stats.hits} disk_hits={stats.disk_hits} "
+          f"misses={stats.misses} compile_time={stats.compile_time:.3f} s "
+          f"disk_load_time={stats.disk_load_time:.3f} s")
+
+
+def main(args):
+    tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+    schemas = load_schemas(args.schema_dir, args.num_schemas, args.seed,
+                           args.backend)
+    make_processor = make_processor_fn(args.backend, tokenizer)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache_dir = args.cache_dir or tmp_dir
+        cache_dir = None if args.disable_disk_cache else cache_dir
+
+        grammar_cache._grammar_cache = CompiledGrammarCache(
+            max_size=args.cache_size, cache_dir=cache_dir)
+        run_pass("cold", schemas, make_processor)
+        run_pass("warm", schemas, make_processor)
+
+        if cache_dir is not None:
+            # Simulate a restart: empty memory, populated disk cache.
+            grammar_cache._grammar_cache = CompiledGrammarCache(
+                max_size=args.cache_size, cache_dir=cache_dir)
+            run_pass("restart", schemas, make_processor)
+
+
+if __name__ == "__main__":
+    parser = FlexibleArgumentParser(
+        description="Benchmark the guided decoding compiled-grammar cache.")
+    parser.add_argument("--tokenizer",
+                        type=str,
+                        default="meta-llama/Llama-3.2-1B-Instruct")
+    parser.add_argument("--backend",
+                        type=str,
+                        choices=["outlines", "xgrammar"],
+                        default="xgrammar")
+    parser.add_argument("--schema-dir",
+                        type=str,
+                        default=os.path.join(os.path.dirname(__file__),
+                                             "structured_schemas"))
+    parser.add_argument("--num-schemas", type=int, default=64)
+    parser.add_argument("--cache-size", type=int, default=1024)
+    parser.add_argument("--cache-dir",
+                        type=str,
+                        default=None,
+                        help="Directory for the disk cache. Defaults to a "
+                        "temporary directory.")
+    parser.add_argument("--disable-disk-cache", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    main(args)
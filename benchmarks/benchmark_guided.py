@@ -1,5 +1,6 @@
 """Benchmark guided decoding throughput."""
 import argparse
+import copy
 import dataclasses
 import json
 import os
@@ -185,7 +186,12 @@ async def run_vllm_async(
         first_latency = pd.Series([lat[0] * 1000 for lat in latencies])
         next_latency = pd.Series([(lat[-1] - lat[0]) / len(lat[1:]) * 1000
                                   for lat in latencies])
-        return end - start, ret, (first_latency, next_latency)
+        # Split the first token latency by request kind to show the impact
+        # of grammar compilation on unrelated (unguided) requests.
+        guided = first_latency.index.isin(guided_decoding_req_idx)
+        first_latency_by_kind = (first_latency[guided], first_latency[~guided])
+        return (end - start, ret, (first_latency, next_latency),
+                first_latency_by_kind)
 
 
 def sample_requests(tokenizer: PreTrainedTokenizerBase,
@@ -210,6 +216,15 @@ def sample_requests(tokenizer: PreTrainedTokenizerBase,
             for _ in range(args.num_prompts)
         ]
 
+        if args.unique_schemas:
+            # Give every request its own schema so that each guided request
+            # has to compile a new grammar, as with many distinct clients.
+            for i, request in enumerate(requests):
+                request.schema = copy.deepcopy(schema)
+                request.schema.setdefault("properties", {})[f"field_{i}"] = {
+                    "type": "string"
+                }
+
     elif args.dataset == "grammar":
         schema = """
             ?start: select_statement
@@ -380,15 +395,17 @@ def main(args: argparse.Namespace):
 
     if args.async_engine:
         engine_args = AsyncEngineArgs.from_cli_args(args)
-        elapsed_time, ret, (first_latency, next_latency) = uvloop.run(
-            run_vllm_async(requests, engine_args, args.n,
-                           args.guided_decoding_ratio, args.warmup,
-                           args.disable_frontend_multiprocessing))
+        (elapsed_time, ret, (first_latency, next_latency),
+         (guided_first_latency, unguided_first_latency)) = uvloop.run(
+             run_vllm_async(requests, engine_args, args.n,
+                            args.guided_decoding_ratio, args.warmup,
+                            args.disable_frontend_multiprocessing))
     else:
         engine_args = EngineArgs.from_cli_args(args)
         elapsed_time, ret = run_vllm(requests, engine_args, args.n,
                                      args.guided_decoding_ratio, args.warmup)
         first_latency, next_latency = None, None
+        guided_first_latency, unguided_first_latency = None, None
 
     score = evaluate(ret, args)
     total_num_tokens = sum(request.prompt_len + request.expected_output_len
@@ -400,6 +417,12 @@ def main(args: argparse.Namespace):
         latency_breakdown += f"{first_latency.describe()}"
         latency_breakdown += "\nNext token latency(msecs):\n"
         latency_breakdown += f"{next_latency.describe()}"
+        latency_breakdown += "\nFirst token latency of guided requests"
+        latency_breakdown += "(msecs):\n"
+        latency_breakdown += f"{guided_first_latency.describe()}"
+        latency_breakdown += "\nFirst token latency of unguided requests"
+        latency_breakdown += "(msecs):\n"
+        latency_breakdown += f"{unguided_first_latency.describe()}"
     print(
         f"Throughput: {len(requests) / elapsed_time:.2f} requests/s, "
         f"{total_num_tokens / elapsed_time:.2f} total tokens/s, "
@@ -426,6 +449,10 @@ def main(args: argparse.Namespace):
             ).to_dict()
             results["next_token_latency(msecs)"] = next_latency.describe(
             ).to_dict()
+            results["guided_first_token_latency(msecs)"] = (
+                guided_first_latency.describe().to_dict())
+            results["unguided_first_token_latency(msecs)"] = (
+                unguided_first_latency.describe().to_dict())
         if args.output_json:
             with open(args.output_json, "w") as f:
                 json.dump(results, f, indent=4)
@@ -480,6 +507,12 @@ if __name__ == "__main__":
                         action='store_true',
                         default=False,
                         help="Disable decoupled async engine frontend.")
+    parser.add_argument("--unique-schemas",
+                        action="store_true",
+                        default=False,
+                        help="Give every request of the json dataset a "
+                        "distinct schema, so that each guided request "
+                        "compiles a new grammar.")
     parser.add_argument("--warmup",
                         action="store_true",
                         default=False,
@@ -0,0 +1,177 @@
+"""Benchmark LoRA adapter loading with and without the shared adapter store.
+
+Writes random Llama-shaped LoRA adapters to disk and loads each of them in
+every tensor parallel worker, one CPU process per worker, like
+`WorkerLoRAManager` does when an adapter is first used. Without the store
+every worker reads and processes the adapter; with the store
+(VLLM_LORA_ADAPTER_STORE_GB) the first worker does and the others map it,
+and later loads of the adapter (e.g. after it was evicted from the
+worker's LoRA cache) are warm. Reports the load latency of the slowest
+worker, averaged over the adapters.
+"""
+import json
+import os
+import tempfile
+import time
+from functools import partial
+from typing import List
+
+import torch
+import torch.multiprocessing as mp
+from benchmark_weight_loading import drop_page_cache
+from safetensors.torch import save_file
+
+from vllm.lora.adapter_store import LoRAAdapterStore
+from vllm.lora.models import LoRAModel
+from vllm.utils import FlexibleArgumentParser
+
+MODULES = {
+    # module: (input dim, output dim) in units of hidden size
+    "self_attn.q_proj": (1, 1),
+    "self_attn.k_proj": (1, 1),
+    "self_attn.v_proj": (1, 1),
+    "self_attn.o_proj": (1, 1),
+    "mlp.gate_proj": (1, 4),
+    "mlp.up_proj": (1, 4),
+    "mlp.down_proj": (4, 1),
+}
+EXPECTED_LORA_MODULES = [name.split(".")[-1] for name in MODULES]
+
+
+def write_adapter(args, lora_dir: str) -> List[str]:
+    os.makedirs(lora_dir)
+    dtype = getattr(torch, args.dtype)
+    tensors = {}
+    for layer in range(args.num_layers):
+        for module, (in_dim, out_dim) in MODULES.items():
+            prefix = f"base_model.model.model.layers.{layer}.{module}"
+            tensors[f"{prefix}.lora_A.weight"] = torch.randn(args.rank,
+                                                             in_dim *
+                                                             args.hidden_size,
+                                                             dtype=dtype)
+            tensors[f"{prefix}.lora_B.weight"] = torch.randn(out_dim *
+                                                             args.hidden_size,
+                                                             args.rank,
+                                                             dtype=dtype)
+    save_file(tensors, os.path.join(lora_dir, "adapter_model.safetensors"))
+    with open(os.path.join(lora_dir, "adapter_config.json"), "w") as f:
+        json.dump(
+            {
+                "r": args.rank,
+                "lora_alpha": 2 * args.rank,
+                "target_modules": EXPECTED_LORA_MODULES,
+            }, f)
+    return [os.path.join(lora_dir, name) for name in os.listdir(lora_dir)]
+
+
+def load(lora_dir: str, lora_id: int, dtype: torch.dtype) -> LoRAModel:
+    return LoRAModel.from_local_checkpoint(lora_dir,
+                                           EXPECTED_LORA_MODULES,
+                                           lora_model_id=lora_id,
+                                           device="cpu",
+                                           dtype=dtype,
+                                           embedding_modules={},
+                                           embedding_padding_modules=[])
+
+
+def run_worker(lora_dirs: List[str], store_dir: str, dtype: torch.dtype,
+               barrier, results) -> None:
+    store = (LoRAAdapterStore(store_dir, max_bytes=1 << 40)
+             if store_dir else None)
+    for lora_id, lora_dir in enumerate(lora_dirs, start=1):
+        barrier.wait()
+        start = time.perf_counter()
+        if store is None:
+            load(lora_dir, lora_id, dtype)
+        else:
+            store.get_or_load(lora_dir,
+                              lora_id,
+                              partial(load, lora_dir, lora_id, dtype),
+                              dtype=dtype)
+        results.put(time.perf_counter() - start)
+
+
+def time_loads(lora_dirs: List[str], tp_size: int, store_dir: str,
+               dtype: torch.dtype) -> float:
+    """Mean over the adapters of the load latency of the slowest worker."""
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(tp_size)
+    results = ctx.Queue()
+    processes = [
+        ctx.Process(target=run_worker,
+                    args=(lora_dirs, store_dir, dtype, barrier, results))
+        for _ in range(tp_size)
+    ]
+    for process in processes:
+        process.start()
+    latencies = [results.get() for _ in range(tp_size * len(lora_dirs))]
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+    # Workers load the adapters in the same order, in lockstep.
+    return sum(sorted(latencies)[-len(lora_dirs):]) / len(lora_dirs)
+
+
+def main(args):
+    dtype = getattr(torch, args.dtype)
+    with tempfile.TemporaryDirectory(dir=args.adapter_dir) as tmp_dir:
+        lora_dirs = []
+        files = []
+        for i in range(args.num_adapters):
+            lora_dir = os.path.join(tmp_dir, f"lora_{i}")
+            files.extend(write_adapter(args, lora_dir))
+            lora_dirs.append(lora_dir)
+        adapter_bytes = sum(os.path.getsize(path)
+                            for path in files) / args.num_adapters
+        print(f"{args.num_adapters} adapters of {adapter_bytes / 1e6:.1f} MB")
+        print(f"{'TP':>4} {'no store (ms)':>14} {'cold (ms)':>10} "
+              f"{'warm (ms)':>10}")
+
+        for tp_size in args.tp_sizes:
+            latencies = []
+            for use_store in (False, True):
+                with tempfile.TemporaryDirectory(
+                        dir=args.store_dir) as store_dir:
+                    if not args.keep_page_cache:
+                        drop_page_cache(files)
+                    latencies.append(
+                        time_loads(lora_dirs, tp_size,
+                                   store_dir if use_store else "", dtype))
+                    if use_store:
+                        latencies.append(
+                            time_loads(lora_dirs, tp_size, store_dir, dtype))
+            no_store, cold, warm = (latency * 1000 for latency in latencies)
+            print(f"{tp_size:>4} {no_store:>14.1f} {cold:>10.1f} "
+                  f"{warm:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = FlexibleArgumentParser(
+        description="Benchmark LoRA adapter loading with the shared adapter "
+        "store.")
+    parser.add_argument("--adapter-dir",
+                        type=str,
+                        default=None,
+                        help="Directory in which the random adapters are "
+                        "written. Defaults to the system temp directory.")
+    parser.add_argument(
+        "--store-dir",
+        type=str,
+        default="/dev/shm" if os.path.isdir("/dev/shm") else None,
+        help="Directory in which the adapter store is "
+        "created.")
+    parser.add_argument("--num-adapters", type=int, default=4)
+    parser.add_argument("--num-layers", type=int, default=32)
+    parser.add_argument("--hidden-size", type=int, default=4096)
+    parser.add_argument("--rank", type=int, default=16)
+    parser.add_argument("--dtype",
+                        type=str,
+                        default="bfloat16",
+                        choices=["float16", "bfloat16", "float32"])
+    parser.add_argument("--tp-sizes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--keep-page-cache",
+                        action="store_true",
+                        help="Do not evict the adapters from the page cache "
+                        "before the cold loads.")
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,174 @@
+"""Benchmark the prefix cache hit rate of a multi-adapter workload.
+
+Replays requests that share a few base prompts (e.g. system prompts) across
+many LoRA adapters through the V0 block manager with prefix caching, on CPU.
+The adapter ids are served from `--num-distinct-adapters` distinct sets of
+weights, as when the same adapter is registered under several names or
+reloaded with new ids, each id with its own copy of the adapter files.
+
+The blocks of the requests are salted with the adapter id, as they were
+before adapters were identified by the fingerprint of their weights, and
+with the fingerprint. Reports the fraction of prompt tokens found in the
+cache and the time spent computing the extra hash of a request, which
+includes fingerprinting its adapter the first time the adapter is used.
+"""
+import json
+import os
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import torch
+from safetensors.torch import save_file
+
+from vllm import SamplingParams
+from vllm.core.block_manager import SelfAttnBlockSpaceManager
+from vllm.inputs import SingletonInputs, token_inputs
+from vllm.lora.request import LoRARequest
+from vllm.sequence import Sequence, SequenceGroup, compute_extra_hash
+from vllm.utils import Device, FlexibleArgumentParser
+
+ExtraHashFn = Callable[[SingletonInputs, Optional[LoRARequest]], Optional[int]]
+
+
+def adapter_id_extra_hash(
+        inputs: SingletonInputs,
+        lora_request: Optional[LoRARequest]) -> Optional[int]:
+    """Salt the blocks of a request with the id of its adapter."""
+    if lora_request is None:
+        return None
+    return hash((0, lora_request.lora_int_id))
+
+
+def write_adapters(args, adapter_dir: str) -> List[str]:
+    """Write `--num-adapters` adapter directories holding copies of
+    `--num-distinct-adapters` distinct weights."""
+    distinct_weights = [{
+        "lora_a":
+        torch.randn(args.lora_rank, args.hidden_size),
+        "lora_b":
+        torch.randn(args.hidden_size, args.lora_rank),
+    } for _ in range(args.num_distinct_adapters)]
+    paths = []
+    for i in range(args.num_adapters):
+        path = os.path.join(adapter_dir, f"adapter_{i}")
+        os.makedirs(path)
+        save_file(distinct_weights[i % args.num_distinct_adapters],
+                  os.path.join(path, "adapter_model.safetensors"))
+        with open(os.path.join(path, "adapter_config.json"), "w") as f:
+            json.dump({"r": args.lora_rank, "lora_alpha": 16}, f)
+        paths.append(path)
+    return paths
+
+
+def make_workload(args, adapter_paths: List[str]):
+    """Return the prompts and adapters of the requests."""
+    rng = np.random.default_rng(args.seed)
+    base_prompts = rng.integers(0,
+                                32000,
+                                size=(args.num_base_prompts, args.prefix_len))
+    prompts = [
+        base_prompts[rng.integers(args.num_base_prompts)].tolist() +
+        rng.integers(0, 32000, size=args.suffix_len).tolist()
+        for _ in range(args.num_requests)
+    ]
+    adapters = rng.integers(args.num_adapters, size=args.num_requests)
+    lora_requests = [
+        LoRARequest(f"adapter_{i}", int(i) + 1, lora_path=adapter_paths[i])
+        for i in adapters
+    ]
+    return prompts, lora_requests
+
+
+def run(args, adapter_paths: List[str],
+        extra_hash_fn: ExtraHashFn) -> Dict[str, float]:
+    block_manager = SelfAttnBlockSpaceManager(
+        block_size=args.block_size,
+        num_gpu_blocks=args.num_gpu_blocks,
+        num_cpu_blocks=0,
+        enable_caching=True,
+    )
+    prompts, lora_requests = make_workload(args, adapter_paths)
+
+    num_prompt_tokens = 0
+    num_cached_tokens = 0
+    hash_times: List[float] = []
+    start = time.perf_counter()
+    for i, (prompt, lora_request) in enumerate(zip(prompts, lora_requests)):
+        inputs = token_inputs(prompt)
+        hash_start = time.perf_counter()
+        extra_hash = extra_hash_fn(inputs, lora_request)
+        hash_times.append(time.perf_counter() - hash_start)
+        seq = Sequence(i,
+                       inputs=inputs,
+                       block_size=args.block_size,
+                       lora_request=lora_request,
+                       extra_hash=extra_hash)
+        seq_group = SequenceGroup(request_id=str(i),
+                                  seqs=[seq],
+                                  arrival_time=time.time(),
+                                  sampling_params=SamplingParams(),
+                                  lora_request=lora_request)
+        num_prompt_tokens += len(prompt)
+        num_cached_tokens += block_manager.get_num_cached_tokens(seq)
+        block_manager.allocate(seq_group)
+        block_manager.access_all_blocks_in_seq(seq, time.time())
+        block_manager.mark_blocks_as_computed(seq_group, len(prompt))
+        block_manager.free(seq)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "cached_token_fraction": num_cached_tokens / num_prompt_tokens,
+        "block_hit_rate": block_manager.get_prefix_cache_hit_rate(Device.GPU),
+        "elapsed_s": elapsed,
+        "median_extra_hash_us": float(np.median(hash_times)) * 1e6,
+        "max_extra_hash_us": float(np.max(hash_times)) * 1e6,
+    }
+
+
+def main(args):
+    with tempfile.TemporaryDirectory(dir=args.adapter_dir) as tmp_dir:
+        adapter_paths = write_adapters(args, tmp_dir)
+        results = {}
+        for name, extra_hash_fn in [("adapter-id", adapter_id_extra_hash),
+                                    ("fingerprint", compute_extra_hash)]:
+            results[name] = run(args, adapter_paths, extra_hash_fn)
+            print(f"{name}: " +
+                  ", ".join(f"{key}={value:.3f}"
+                            for key, value in results[name].items()))
+    if args.output_json:
+        with open(args.output_json, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    parser = FlexibleArgumentParser(
+        description="Benchmark the prefix cache hit rate of requests sharing "
+        "base prompts across many LoRA adapters.")
+    parser.add_argument("--num-adapters",
+                        type=int,
+                        default=64,
+                        help="Number of adapter ids.")
+    parser.add_argument("--num-distinct-adapters",
+                        type=int,
+                        default=8,
+                        help="Number of distinct adapter weights the adapter "
+                        "ids are served from.")
+    parser.add_argument("--num-requests", type=int, default=2000)
+    parser.add_argument("--num-base-prompts", type=int, default=4)
+    parser.add_argument("--prefix-len", type=int, default=512)
+    parser.add_argument("--suffix-len", type=int, default=64)
+    parser.add_argument("--block-size", type=int, default=16)
+    parser.add_argument("--num-gpu-blocks", type=int, default=2048)
+    parser.add_argument("--lora-rank", type=int, default=16)
+    parser.add_argument("--hidden-size", type=int, default=1024)
+    parser.add_argument("--adapter-dir",
+                        type=str,
+                        default=None,
+                        help="Directory in which the random adapters are "
+                        "written. Defaults to the system temp directory.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output-json", type=str, default=None)
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,289 @@
+"""Benchmark LoRA-aware batch formation on a multi-adapter workload.
+
+Replays requests whose adapters follow a Zipf distribution through the V0
+scheduler, with FCFS admission and with LoRA-aware admission
+(`--max-lora-loads-per-step`), on CPU. The scheduled batches run on a
+small dummy model whose LoRA computation, like the punica kernels, is done
+per distinct adapter of the batch; the dummy worker keeps adapters in a
+CPU LRU cache of `--max-cpu-loras` adapters read from disk and in
+`--max-loras` slots. Reports throughput, latencies, the number of distinct
+adapters per step and the number of adapter loads.
+"""
+import json
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import torch
+from safetensors.torch import load_file, save_file
+
+from vllm import SamplingParams
+from vllm.config import CacheConfig, LoRAConfig, SchedulerConfig
+from vllm.core.scheduler import Scheduler
+from vllm.inputs import token_inputs
+from vllm.lora.request import LoRARequest
+from vllm.sequence import Logprob, Sequence, SequenceGroup, SequenceStatus
+from vllm.utils import FlexibleArgumentParser
+
+BLOCK_SIZE = 16
+
+
+def write_adapters(args, adapter_dir: str) -> List[str]:
+    paths = []
+    for i in range(args.num_adapters):
+        path = os.path.join(adapter_dir, f"adapter_{i}.safetensors")
+        save_file(
+            {
+                "lora_a":
+                torch.randn(args.num_layers, args.hidden_size, args.lora_rank),
+                "lora_b":
+                torch.randn(args.num_layers, args.lora_rank, args.hidden_size)
+                * 1e-3,
+            }, path)
+        paths.append(path)
+    return paths
+
+
+class DummyLoRAWorker:
+    """A worker running a small MLP with LoRA slots on CPU."""
+
+    def __init__(self, args):
+        self.weights = torch.randn(args.num_layers, args.hidden_size,
+                                   args.hidden_size) / args.hidden_size**0.5
+        self.slots_a = torch.zeros(args.max_loras, args.num_layers,
+                                   args.hidden_size, args.lora_rank)
+        self.slots_b = torch.zeros(args.max_loras, args.num_layers,
+                                   args.lora_rank, args.hidden_size)
+        self.max_cpu_loras = args.max_cpu_loras
+        # LoRA id -> weights, in LRU order.
+        self.cpu_cache: OrderedDict[int, Dict[str,
+                                              torch.Tensor]] = (OrderedDict())
+        # LoRA id -> slot, in LRU order.
+        self.slots: OrderedDict[int, int] = OrderedDict()
+        self.num_loads = 0
+        self.num_activations = 0
+
+    def _activate(self, lora_request: LoRARequest) -> int:
+        lora_id = lora_request.lora_int_id
+        if lora_id in self.slots:
+            self.slots.move_to_end(lora_id)
+            return self.slots[lora_id]
+        if lora_id in self.cpu_cache:
+            self.cpu_cache.move_to_end(lora_id)
+        else:
+            if len(self.cpu_cache) >= self.max_cpu_loras:
+                self.cpu_cache.popitem(last=False)
+            self.cpu_cache[lora_id] = load_file(lora_request.lora_path)
+            self.num_loads += 1
+        if len(self.slots) < self.slots_a.shape[0]:
+            slot = len(self.slots)
+        else:
+            _, slot = self.slots.popitem(last=False)
+        weights = self.cpu_cache[lora_id]
+        self.slots_a[slot].copy_(weights["lora_a"])
+        self.slots_b[slot].copy_(weights["lora_b"])
+        self.slots[lora_id] = slot
+        self.num_activations += 1
+        return slot
+
+    def execute(self, batch: List[Tuple[Optional[LoRARequest], int]]) -> None:
+        """Run a batch of (LoRA, number of tokens) entries."""
+        token_slots = []
+        for lora_request, num_tokens in batch:
+            slot = -1 if lora_request is None else self._activate(lora_request)
+            token_slots.extend([slot] * num_tokens)
+        slots = torch.tensor(token_slots)
+        x = torch.randn(len(token_slots), self.weights.shape[1])
+        # Like the punica kernels, LoRAs are applied per distinct slot.
+        slot_indices = [(slot, (slots == slot).nonzero().squeeze(1))
+                        for slot in slots.unique().tolist() if slot >= 0]
+        for layer in range(self.weights.shape[0]):
+            y = x @ self.weights[layer]
+            for slot, indices in slot_indices:
+                rows = x[indices]
+                y[indices] += (rows @ self.slots_a[slot, layer]
+                               ) @ self.slots_b[slot, layer]
+            x = torch.tanh(y)
+
+    @property
+    def resident_lora_ids(self) -> Set[int]:
+        return set(self.cpu_cache)
+
+    @property
+    def active_lora_ids(self) -> Set[int]:
+        return set(self.slots)
+
+
+def make_workload(args, adapter_paths: List[str]):
+    """Return the arrival times and adapters of the requests."""
+    rng = np.random.default_rng(args.seed)
+    ranks = np.arange(1, args.num_adapters + 1)
+    probs = ranks**-args.zipf_exponent
+    adapters = rng.choice(args.num_adapters,
+                          size=args.num_requests,
+                          p=probs / probs.sum())
+    if args.request_rate == float("inf"):
+        arrivals = np.zeros(args.num_requests)
+    else:
+        arrivals = np.cumsum(
+            rng.exponential(1.0 / args.request_rate, size=args.num_requests))
+    lora_requests = [
+        LoRARequest(f"adapter_{i}", int(i) + 1, lora_path=adapter_paths[i])
+        for i in adapters
+    ]
+    return arrivals, lora_requests
+
+
+def run(args, adapter_paths: List[str],
+        max_lora_loads_per_step: Optional[int]) -> Dict[str, float]:
+    torch.manual_seed(args.seed)
+    max_model_len = args.prompt_len + args.output_len
+    scheduler_config = SchedulerConfig(
+        "generate",
+        max_num_batched_tokens=args.max_num_batched_tokens,
+        max_num_seqs=args.max_num_seqs,
+        max_model_len=max_model_len)
+    cache_config = CacheConfig(BLOCK_SIZE, 1.0, 1, "auto")
+    cache_config.num_gpu_blocks = args.num_gpu_blocks
+    cache_config.num_cpu_blocks = 0
+    lora_config = LoRAConfig(max_lora_rank=args.lora_rank,
+                             max_loras=args.max_loras,
+                             max_cpu_loras=args.max_cpu_loras,
+                             max_lora_loads_per_step=max_lora_loads_per_step)
+    scheduler = Scheduler(scheduler_config, cache_config, lora_config)
+    worker = DummyLoRAWorker(args)
+    arrivals, lora_requests = make_workload(args, adapter_paths)
+
+    first_token_times: Dict[str, float] = {}
+    finish_times: Dict[str, float] = {}
+    arrival_times: Dict[str, float] = {}
+    num_adapters_per_step: List[int] = []
+    num_tokens = 0
+    next_request = 0
+    start = time.perf_counter()
+    while len(finish_times) < args.num_requests:
+        now = time.perf_counter() - start
+        while (next_request < args.num_requests
+               and arrivals[next_request] <= now):
+            request_id = str(next_request)
+            seq = Sequence(next_request,
+                           inputs=token_inputs([0] * args.prompt_len),
+                           block_size=BLOCK_SIZE,
+                           lora_request=lora_requests[next_request])
+            scheduler.add_seq_group(
+                SequenceGroup(
+                    request_id=request_id,
+                    seqs=[seq],
+                    arrival_time=time.time(),
+                    sampling_params=SamplingParams(max_tokens=args.output_len),
+                    lora_request=lora_requests[next_request]))
+            arrival_times[request_id] = now
+            next_request += 1
+
+        scheduler.resident_lora_ids = worker.resident_lora_ids
+        scheduler.active_lora_ids = worker.active_lora_ids
+        _, scheduler_outputs, _ = scheduler.schedule()
+        if scheduler_outputs.is_empty():
+            time.sleep(1e-3)
+            continue
+        worker.execute([
+            (scheduled.seq_group.lora_request, scheduled.token_chunk_size)
+            for scheduled in scheduler_outputs.scheduled_seq_groups
+        ])
+        num_adapters_per_step.append(len(scheduler_outputs.lora_requests))
+
+        now = time.perf_counter() - start
+        for scheduled in scheduler_outputs.scheduled_seq_groups:
+            seq_group = scheduled.seq_group
+            seq_group.update_num_computed_tokens(scheduled.token_chunk_size)
+            if seq_group.is_prefill():
+                continue
+            seq = seq_group.first_seq
+            seq.append_token_id(0, {0: Logprob(0.0)})
+            num_tokens += 1
+            first_token_times.setdefault(seq_group.request_id, now)
+            if seq.get_output_len() >= args.output_len:
+                seq.status = SequenceStatus.FINISHED_LENGTH_CAPPED
+                scheduler.free_seq(seq)
+                finish_times[seq_group.request_id] = now
+        scheduler.free_finished_seq_groups()
+    elapsed = time.perf_counter() - start
+
+    ttfts = [
+        first_token_times[request_id] - arrival_times[request_id]
+        for request_id in arrival_times
+    ]
+    latencies = [
+        finish_times[request_id] - arrival_times[request_id]
+        for request_id in arrival_times
+    ]
+    return {
+        "elapsed_s": elapsed,
+        "output_tokens_per_s": num_tokens / elapsed,
+        "mean_ttft_s": float(np.mean(ttfts)),
+        "p99_ttft_s": float(np.percentile(ttfts, 99)),
+        "max_latency_s": float(np.max(latencies)),
+        "mean_adapters_per_step": float(np.mean(num_adapters_per_step)),
+        "num_steps": len(num_adapters_per_step),
+        "num_adapter_loads": worker.num_loads,
+        "num_slot_activations": worker.num_activations,
+    }
+
+
+def main(args):
+    with tempfile.TemporaryDirectory(dir=args.adapter_dir) as tmp_dir:
+        adapter_paths = write_adapters(args, tmp_dir)
+        results = {}
+        for max_lora_loads_per_step in [None, *args.max_lora_loads_per_step]:
+            name = ("fcfs" if max_lora_loads_per_step is None else
+                    f"lora-aware (max {max_lora_loads_per_step} loads/step)")
+            results[name] = run(args, adapter_paths, max_lora_loads_per_step)
+            print(f"{name}: " +
+                  ", ".join(f"{key}={value:.3f}"
+                            if isinstance(value, float) else f"{key}={value}"
+                            for key, value in results[name].items()))
+    if args.output_json:
+        with open(args.output_json, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    parser = FlexibleArgumentParser(
+        description="Benchmark LoRA-aware batch formation with a "
+        "Zipf-distributed multi-adapter workload on CPU.")
+    parser.add_argument("--num-adapters", type=int, default=500)
+    parser.add_argument("--zipf-exponent", type=float, default=1.1)
+    parser.add_argument("--num-requests", type=int, default=2000)
+    parser.add_argument("--request-rate",
+                        type=float,
+                        default=float("inf"),
+                        help="Poisson arrival rate in requests/s. Requests "
+                        "all arrive at once by default.")
+    parser.add_argument("--prompt-len", type=int, default=64)
+    parser.add_argument("--output-len", type=int, default=16)
+    parser.add_argument("--max-loras", type=int, default=8)
+    parser.add_argument("--max-cpu-loras", type=int, default=32)
+    parser.add_argument("--lora-rank", type=int, default=16)
+    parser.add_argument("--max-lora-loads-per-step",
+                        type=int,
+                        nargs="+",
+                        default=[1, 2, 4],
+                        help="Values of max_lora_loads_per_step to compare "
+                        "with FCFS admission.")
+    parser.add_argument("--max-num-seqs", type=int, default=64)
+    parser.add_argument("--max-num-batched-tokens", type=int, default=2048)
+    parser.add_argument("--num-gpu-blocks", type=int, default=4096)
+    parser.add_argument("--hidden-size", type=int, default=256)
+    parser.add_argument("--num-layers", type=int, default=4)
+    parser.add_argument("--adapter-dir",
+                        type=str,
+                        default=None,
+                        help="Directory in which the random adapters are "
+                        "written. Defaults to the system temp directory.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output-json", type=str, default=None)
+    args = parser.parse_args()
+    main(args)
@@ -23,6 +23,10 @@ ShareGPT example usage:
         --num-prompts 20 \
         --repeat-count 5 \
         --input-length-range 128:256
+
+Add `--request-ordering prefix` or `--request-ordering length` to submit the
+requests to the engine grouped by shared prefix or longest first rather than
+in the order of the prompts, and compare the times of the orderings.
 """
 
 import dataclasses
@@ -190,7 +194,8 @@ def main(args):
 
     engine_args = EngineArgs.from_cli_args(args)
 
-    llm = LLM(**dataclasses.asdict(engine_args))
+    llm = LLM(**dataclasses.asdict(engine_args),
+              request_ordering=args.request_ordering)
 
     sampling_params = SamplingParams(temperature=0, max_tokens=args.output_len)
 
@@ -199,7 +204,7 @@ def main(args):
                                        repeat_count=args.repeat_count,
                                        sort=args.sort)
 
-    print("------start generating------")
+    print(f"------start generating ({args.request_ordering} order)------")
     test_prefix(
         llm=llm,
         prompts=prompts,
@@ -227,6 +232,12 @@ if __name__ == "__main__":
     parser.add_argument('--sort',
                         action='store_true',
                         help='Sort prompts by input length')
+    parser.add_argument('--request-ordering',
+                        type=str,
+                        choices=["input", "prefix", "length"],
+                        default="input",
+                        help='Order in which the LLM class submits the '
+                        'requests to the engine.')
     parser.add_argument('--input-length-range',
                         type=str,
                         required=True,
@@ -0,0 +1,197 @@
+"""Benchmark tensor parallel weight loading with full and sharded reads.
+
+Writes a random Llama-shaped checkpoint to disk and loads it into the
+tensor parallel linear layers of every rank, one CPU process per rank, for
+several tensor parallel sizes. With full reads every rank reads every full
+tensor; with sharded reads (VLLM_WEIGHT_LOADING_SHARDED_READS) each rank
+only reads the shards that its layers keep. Reports the load time of the
+slowest rank and the total bytes read by all ranks.
+"""
+import os
+import socket
+import tempfile
+import time
+from typing import Iterable, Tuple
+
+import torch
+import torch.multiprocessing as mp
+from benchmark_weight_loading import drop_page_cache, write_checkpoint
+from torch import nn
+
+from vllm.distributed import (destroy_distributed_environment,
+                              destroy_model_parallel,
+                              init_distributed_environment,
+                              initialize_model_parallel)
+from vllm.model_executor.layers.linear import (MergedColumnParallelLinear,
+                                               QKVParallelLinear,
+                                               RowParallelLinear)
+from vllm.model_executor.model_loader.weight_utils import (
+    WeightReadStats, default_weight_loader, lazy_safetensors_weights_iterator,
+    safetensors_weights_iterator)
+from vllm.utils import FlexibleArgumentParser
+
+HEAD_DIM = 128
+
+
+class DecoderLayer(nn.Module):
+
+    def __init__(self, hidden_size: int, intermediate_size: int):
+        super().__init__()
+        num_heads = hidden_size // HEAD_DIM
+        self.qkv_proj = QKVParallelLinear(hidden_size,
+                                          HEAD_DIM,
+                                          num_heads,
+                                          num_heads,
+                                          bias=False)
+        self.o_proj = RowParallelLinear(hidden_size, hidden_size, bias=False)
+        self.gate_up_proj = MergedColumnParallelLinear(hidden_size,
+                                                       [intermediate_size] * 2,
+                                                       bias=False)
+        self.down_proj = RowParallelLinear(intermediate_size,
+                                           hidden_size,
+                                           bias=False)
+        self.input_layernorm = nn.Parameter(torch.empty(hidden_size))
+        self.post_attention_layernorm = nn.Parameter(torch.empty(hidden_size))
+
+
+class Model(nn.Module):
+    """The decoder layers of a Llama model, loaded like LlamaModel."""
+
+    stacked_params_mapping = [
+        # (param_name, shard_name, shard_id)
+        ("qkv_proj", "self_attn.q_proj", "q"),
+        ("qkv_proj", "self_attn.k_proj", "k"),
+        ("qkv_proj", "self_attn.v_proj", "v"),
+        ("o_proj", "self_attn.o_proj", None),
+        ("gate_up_proj", "mlp.gate_proj", 0),
+        ("gate_up_proj", "mlp.up_proj", 1),
+        ("down_proj", "mlp.down_proj", None),
+    ]
+
+    def __init__(self, num_layers: int, hidden_size: int,
+                 intermediate_size: int):
+        super().__init__()
+        self.layers = nn.ModuleList(
+            DecoderLayer(hidden_size, intermediate_size)
+            for _ in range(num_layers))
+
+    def load_weights(self, weights: Iterable[Tuple[str, torch.Tensor]]):
+        params_dict = dict(self.named_parameters())
+        for name, loaded_weight in weights:
+            name = name[len("model."):]
+            for param_name, shard_name, shard_id in self.stacked_params_mapping:
+                if shard_name not in name:
+                    continue
+                param = params_dict[name.replace(shard_name, param_name)]
+                if shard_id is None:
+                    param.weight_loader(param, loaded_weight)
+                else:
+                    param.weight_loader(param, loaded_weight, shard_id)
+                break
+            else:
+                name = name.replace(".weight", "")
+                default_weight_loader(params_dict[name], loaded_weight)
+
+
+def counting_weights_iterator(files, stats: WeightReadStats):
+    """Full reads, counting the bytes read like the lazy iterator."""
+    for name, tensor in safetensors_weights_iterator(files):
+        stats.bytes_read += tensor.numel() * tensor.element_size()
+        yield name, tensor
+
+
+def run_rank(rank: int, tp_size: int, port: int, args, files, results) -> None:
+    init_distributed_environment(
+        world_size=tp_size,
+        rank=rank,
+        distributed_init_method=f"tcp://127.0.0.1:{port}",
+        local_rank=rank,
+        backend="gloo")
+    initialize_model_parallel(tp_size)
+    torch.set_default_dtype(getattr(torch, args.dtype))
+    model = Model(args.num_layers, args.hidden_size, args.intermediate_size)
+
+    for sharded in (False, True):
+        if rank == 0 and not args.keep_page_cache:
+            drop_page_cache(files)
+        torch.distributed.barrier()
+        stats = WeightReadStats()
+        start = time.perf_counter()
+        if sharded:
+            weights = lazy_safetensors_weights_iterator(files, stats)
+        else:
+            weights = counting_weights_iterator(files, stats)
+        model.load_weights(weights)
+        results.put(
+            (sharded, rank, time.perf_counter() - start, stats.bytes_read))
+
+    destroy_model_parallel()
+    destroy_distributed_environment()
+
+
+def get_open_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def main(args):
+    with tempfile.TemporaryDirectory(dir=args.checkpoint_dir) as tmp_dir:
+        files = write_checkpoint(args, tmp_dir)
+        checkpoint_bytes = sum(os.path.getsize(path) for path in files)
+        print(f"Wrote {len(files)} shards ({checkpoint_bytes / 1e9:.2f} GB) "
+              f"to {tmp_dir}")
+        print(f"{'TP':>4} {'reads':>8} {'load time (s)':>14} "
+              f"{'bytes read (GB)':>16}")
+
+        ctx = mp.get_context("spawn")
+        for tp_size in args.tp_sizes:
+            results = ctx.Queue()
+            port = get_open_port()
+            processes = [
+                ctx.Process(target=run_rank,
+                            args=(rank, tp_size, port, args, files, results))
+                for rank in range(tp_size)
+            ]
+            for process in processes:
+                process.start()
+            rows = [results.get() for _ in range(2 * tp_size)]
+            for process in processes:
+                process.join()
+                assert process.exitcode == 0
+
+            for sharded in (False, True):
+                mode_rows = [row for row in rows if row[0] == sharded]
+                load_time = max(row[2] for row in mode_rows)
+                bytes_read = sum(row[3] for row in mode_rows)
+                print(f"{tp_size:>4} {'sharded' if sharded else 'full':>8} "
+                      f"{load_time:>14.3f} {bytes_read / 1e9:>16.2f}")
+
+
+if __name__ == "__main__":
+    parser = FlexibleArgumentParser(
+        description="Benchmark tensor parallel weight loading with full and "
+        "sharded reads.")
+    parser.add_argument("--checkpoint-dir",
+                        type=str,
+                        default=None,
+                        help="Directory in which the random checkpoint is "
+                        "written. Defaults to the system temp directory.")
+    parser.add_argument("--num-layers", type=int, default=8)
+    parser.add_argument("--hidden-size", type=int, default=2048)
+    parser.add_argument("--intermediate-size", type=int, default=8192)
+    parser.add_argument("--dtype",
+                        type=str,
+                        default="bfloat16",
+                        choices=["float16", "bfloat16", "float32"])
+    parser.add_argument("--shard-size-gb", type=float, default=1.0)
+    parser.add_argument("--tp-sizes",
+                        type=int,
+                        nargs="+",
+                        default=[1, 2, 4, 8])
+    parser.add_argument("--keep-page-cache",
+                        action="store_true",
+                        help="Do not evict the checkpoint from the page "
+                        "cache before each run.")
+    args = parser.parse_args()
+    main(args)
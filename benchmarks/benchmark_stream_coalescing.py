@@ -0,0 +1,221 @@
+"""Benchmark the coalescing of the outputs of streamed chat completions.
+
+A simulated engine produces the tokens of `--num-streams` concurrent
+streams in bursts of `--tokens-per-burst` outputs every `--burst-interval-ms`
+milliseconds, as with multi-step scheduling or speculative decoding. The
+outputs go through the stream generator of `OpenAIServingChat` with each
+flush policy, and the clients take `--write-ms` milliseconds to write each
+event for a `--slow-client-fraction` of the streams. Reports the events sent
+per second, the fraction of the engine outputs merged into other events,
+and the latency from the production of each token to its reception by the
+client.
+"""
+import asyncio
+import gc
+import json
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from vllm.entrypoints.openai.protocol import (ChatCompletionRequest,
+                                              RequestResponseMetadata)
+from vllm.entrypoints.openai.serving_chat import OpenAIServingChat
+from vllm.entrypoints.openai.serving_engine import BaseModelPath
+# yapf conflicts with isort for this block
+# yapf: disable
+from vllm.entrypoints.openai.stream_coalescing import (
+    StreamFlushPolicy, coalesce_request_outputs)
+# yapf: enable
+from vllm.outputs import CompletionOutput, RequestOutput
+from vllm.utils import FlexibleArgumentParser
+
+MODEL_NAME = "meta-llama/Llama-3.1-8B-Instruct"
+
+FLUSH_POLICIES: Dict[str, Optional[StreamFlushPolicy]] = {
+    "every output": None,
+    "4 tokens": StreamFlushPolicy(max_tokens=4),
+    "20 ms": StreamFlushPolicy(max_delay_ms=20),
+    "16 tokens or 20 ms": StreamFlushPolicy(max_tokens=16, max_delay_ms=20),
+    "when writable": StreamFlushPolicy(when_writable=True),
+}
+
+
+@dataclass
+class FakeModelConfig:
+    task = "generate"
+    max_model_len = 8192
+    logits_processor_pattern = None
+
+
+class SimulatedEngine:
+    """Returns the outputs of every stream in bursts, whether or not the
+    stream generators keep up."""
+
+    def __init__(self, args):
+        self.args = args
+        self.queues: Dict[str, asyncio.Queue] = {}
+        # The time each token of each stream is produced.
+        self.token_times: Dict[str, List[float]] = {}
+        self.prompt_token_ids = [0] * args.input_len
+        self.num_bursts = -(-args.output_len // args.tokens_per_burst)
+        self.bursts: Dict[str, List[List[RequestOutput]]] = {}
+
+    async def run(self) -> None:
+        for burst_index in range(self.num_bursts):
+            await asyncio.sleep(self.args.burst_interval_ms / 1000)
+            now = time.perf_counter()
+            for request_id, queue in self.queues.items():
+                burst = self.bursts[request_id][burst_index]
+                self.token_times[request_id].extend(now for _ in burst)
+                queue.put_nowait(burst)
+
+    def make_output(self, request_id: str, i: int) -> RequestOutput:
+        finished = i == self.args.output_len - 1
+        return RequestOutput(
+            request_id,
+            prompt=None,
+            prompt_token_ids=self.prompt_token_ids,
+            prompt_logprobs=None,
+            outputs=[
+                CompletionOutput(index=0,
+                                 text=f" {i}",
+                                 token_ids=[i],
+                                 cumulative_logprob=None,
+                                 logprobs=None,
+                                 finish_reason="length" if finished else None)
+            ],
+            finished=finished)
+
+    def add_request(self, request_id: str) -> None:
+        # The outputs are built beforehand so that only the API server
+        # spends time in the event loop.
+        outputs = [
+            self.make_output(request_id, i)
+            for i in range(self.args.output_len)
+        ]
+        self.bursts[request_id] = [
+            outputs[start:start + self.args.tokens_per_burst]
+            for start in range(0, len(outputs), self.args.tokens_per_burst)
+        ]
+        self.queues[request_id] = asyncio.Queue()
+        self.token_times[request_id] = []
+
+    async def generate(self, request_id: str):
+        queue = self.queues[request_id]
+        while True:
+            for res in await queue.get():
+                yield res
+                if res.finished:
+                    return
+
+
+async def run_client(serving_chat: OpenAIServingChat, engine: SimulatedEngine,
+                     policy: Optional[StreamFlushPolicy], request_id: str,
+                     write_s: float, token_latencies: List[float]) -> int:
+    request = ChatCompletionRequest(model=MODEL_NAME,
+                                    messages=[{
+                                        "role": "user",
+                                        "content": "Hello"
+                                    }],
+                                    stream=True)
+    engine.add_request(request_id)
+    result_generator = engine.generate(request_id)
+    if policy is not None:
+        result_generator = coalesce_request_outputs(result_generator, policy)
+    token_times = engine.token_times[request_id]
+    num_events = 0
+    async for event in serving_chat.chat_completion_stream_generator(
+            request, result_generator, request_id, MODEL_NAME, [], None,
+            RequestResponseMetadata(request_id=request_id)):
+        num_events += 1
+        now = time.perf_counter()
+        data = event[len("data: "):].strip()
+        if data != "[DONE]":
+            content = json.loads(data)["choices"][0]["delta"].get("content")
+            if content:
+                token_latencies.extend(now - token_times[int(token)]
+                                       for token in content.split())
+        if write_s:
+            await asyncio.sleep(write_s)
+    return num_events
+
+
+async def run(args, policy: Optional[StreamFlushPolicy]) -> Dict[str, float]:
+    engine = SimulatedEngine(args)
+    serving_chat = OpenAIServingChat(
+        engine,  # type: ignore[arg-type]
+        FakeModelConfig(),  # type: ignore[arg-type]
+        [BaseModelPath(MODEL_NAME, MODEL_NAME)],
+        "assistant",
+        lora_modules=None,
+        prompt_adapters=None,
+        request_logger=None,
+        chat_template=None,
+        chat_template_content_format="auto")
+    num_slow = int(args.num_streams * args.slow_client_fraction)
+    token_latencies: List[float] = []
+    clients = [
+        asyncio.create_task(
+            run_client(serving_chat, engine, policy, f"chat-{i}",
+                       args.write_ms / 1000 if i < num_slow else 0.0,
+                       token_latencies)) for i in range(args.num_streams)
+    ]
+    # Let the clients add their requests, and keep the outputs built
+    # beforehand out of the garbage collections.
+    await asyncio.sleep(0)
+    gc.collect()
+    gc.freeze()
+    start = time.perf_counter()
+    await engine.run()
+    num_events = sum(await asyncio.gather(*clients))
+    elapsed = time.perf_counter() - start
+    gc.unfreeze()
+
+    # The role chunk and [DONE] are sent once per stream.
+    num_token_events = num_events - 2 * args.num_streams
+    num_outputs = args.num_streams * args.output_len
+    latencies_ms = np.array(token_latencies) * 1000
+    return {
+        "events_per_s": num_events / elapsed,
+        "events_saved": 1 - num_token_events / num_outputs,
+        "elapsed_s": elapsed,
+        "mean_token_latency_ms": float(np.mean(latencies_ms)),
+        "p50_token_latency_ms": float(np.percentile(latencies_ms, 50)),
+        "p99_token_latency_ms": float(np.percentile(latencies_ms, 99)),
+    }
+
+
+def main(args):
+    results = {}
+    for name, policy in FLUSH_POLICIES.items():
+        results[name] = asyncio.run(run(args, policy))
+        print(f"{name}: " + ", ".join(f"{key}={value:.3f}"
+                                      for key, value in results[name].items()))
+    if args.output_json:
+        with open(args.output_json, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    parser = FlexibleArgumentParser(
+        description="Benchmark the flush policies of streamed chat "
+        "completions with a simulated engine and slow clients.")
+    parser.add_argument("--num-streams", type=int, default=256)
+    parser.add_argument("--input-len", type=int, default=128)
+    parser.add_argument("--output-len", type=int, default=256)
+    parser.add_argument("--tokens-per-burst",
+                        type=int,
+                        default=8,
+                        help="Number of outputs the engine returns at once "
+                        "for each stream, e.g. the number of scheduler steps.")
+    parser.add_argument("--burst-interval-ms", type=float, default=80)
+    parser.add_argument("--slow-client-fraction", type=float, default=0.25)
+    parser.add_argument("--write-ms",
+                        type=float,
+                        default=5,
+                        help="Time a slow client takes to write an event.")
+    parser.add_argument("--output-json", type=str, default=None)
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,247 @@
+"""Benchmark the encoding of the chunks of streamed OpenAI responses.
+
+Drives the stream generators of `OpenAIServingChat` and
+`OpenAIServingCompletion` with a fake engine client that returns a token for
+every running stream at each step, as the engine does, and reports the
+number of chunks the API process encodes per second across
+`--num-streams` concurrent streams. Then compares the time spent encoding a
+chunk by building the response models and calling `model_dump_json`, as the
+generators did for every token, and with the stream encoders.
+"""
+import asyncio
+import json
+import time
+from dataclasses import dataclass
+from typing import AsyncGenerator, Dict, List
+
+from vllm.entrypoints.openai.protocol import (
+    ChatCompletionRequest, ChatCompletionResponseStreamChoice,
+    ChatCompletionStreamResponse, CompletionRequest,
+    CompletionResponseStreamChoice, CompletionStreamResponse, DeltaMessage,
+    RequestResponseMetadata, UsageInfo)
+from vllm.entrypoints.openai.serving_chat import OpenAIServingChat
+from vllm.entrypoints.openai.serving_completion import OpenAIServingCompletion
+from vllm.entrypoints.openai.serving_engine import BaseModelPath
+from vllm.entrypoints.openai.stream_encoder import (
+    ChatCompletionStreamEncoder, CompletionStreamEncoder)
+from vllm.outputs import CompletionOutput, RequestOutput
+from vllm.utils import FlexibleArgumentParser
+
+MODEL_NAME = "meta-llama/Llama-3.1-8B-Instruct"
+
+
+@dataclass
+class FakeModelConfig:
+    task = "generate"
+    max_model_len = 8192
+    logits_processor_pattern = None
+
+
+class FakeEngineClient:
+    """Yields a token to every running request at each engine step."""
+
+    def __init__(self, args):
+        self.output_len = args.output_len
+        self.step_event = asyncio.Event()
+        self.errored = False
+
+    async def run_steps(self, num_steps: int) -> None:
+        for _ in range(num_steps):
+            self.step_event.set()
+            self.step_event.clear()
+            await asyncio.sleep(0)
+
+    async def generate(self, request_id: str,
+                       prompt_token_ids: List[int]) -> AsyncGenerator:
+        for i in range(self.output_len):
+            await self.step_event.wait()
+            finished = i == self.output_len - 1
+            yield RequestOutput(
+                request_id,
+                prompt=None,
+                prompt_token_ids=prompt_token_ids,
+                prompt_logprobs=None,
+                outputs=[
+                    CompletionOutput(
+                        index=0,
+                        text=" token",
+                        token_ids=[i],
+                        cumulative_logprob=None,
+                        logprobs=None,
+                        finish_reason="length" if finished else None)
+                ],
+                finished=finished)
+
+
+async def drain(generator: AsyncGenerator[str, None]) -> int:
+    num_chunks = 0
+    async for _ in generator:
+        num_chunks += 1
+    return num_chunks
+
+
+async def run_streams(args, api: str) -> Dict[str, float]:
+    engine = FakeEngineClient(args)
+    base_model_paths = [BaseModelPath(MODEL_NAME, MODEL_NAME)]
+    stream_options = {
+        "include_usage": True,
+        "continuous_usage_stats": args.continuous_usage_stats
+    }
+    prompt_token_ids = list(range(args.input_len))
+    generators = []
+    for i in range(args.num_streams):
+        request_id = f"{api}-{i}"
+        metadata = RequestResponseMetadata(request_id=request_id)
+        results = engine.generate(request_id, prompt_token_ids)
+        if api == "chat":
+            serving_chat = OpenAIServingChat(
+                engine,  # type: ignore[arg-type]
+                FakeModelConfig(),  # type: ignore[arg-type]
+                base_model_paths,
+                "assistant",
+                lora_modules=None,
+                prompt_adapters=None,
+                request_logger=None,
+                chat_template=None,
+                chat_template_content_format="auto")
+            request = ChatCompletionRequest(model=MODEL_NAME,
+                                            messages=[{
+                                                "role": "user",
+                                                "content": "Hello"
+                                            }],
+                                            stream=True,
+                                            stream_options=stream_options)
+            generators.append(
+                serving_chat.chat_completion_stream_generator(
+                    request, results, request_id, MODEL_NAME, [], None,
+                    metadata))  # type: ignore[arg-type]
+        else:
+            serving_completion = OpenAIServingCompletion(
+                engine,  # type: ignore[arg-type]
+                FakeModelConfig(),  # type: ignore[arg-type]
+                base_model_paths,
+                lora_modules=None,
+                prompt_adapters=None,
+                request_logger=None)
+            request = CompletionRequest(model=MODEL_NAME,
+                                        prompt="Hello",
+                                        max_tokens=args.output_len,
+                                        stream=True,
+                                        stream_options=stream_options)
+
+            async def indexed(results=results):
+                async for res in results:
+                    yield 0, res
+
+            generators.append(
+                serving_completion.completion_stream_generator(
+                    request, indexed(), request_id, int(time.time()),
+                    MODEL_NAME, 1, None, metadata))  # type: ignore[arg-type]
+
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(drain(generator)) for generator in generators]
+    # Let the streams wait for the first step.
+    await asyncio.sleep(0)
+    await engine.run_steps(args.output_len)
+    num_chunks = sum(await asyncio.gather(*tasks))
+    elapsed = time.perf_counter() - start
+    return {"chunks_per_s": num_chunks / elapsed, "elapsed_s": elapsed}
+
+
+def benchmark_chunk_encoding(args) -> Dict[str, float]:
+    num_iters = 20000
+    created = int(time.time())
+    usage = (args.input_len, 10) if args.continuous_usage_stats else None
+
+    def chat_models() -> str:
+        chunk = ChatCompletionStreamResponse(
+            id="chatcmpl-0",
+            object="chat.completion.chunk",
+            created=created,
+            choices=[
+                ChatCompletionResponseStreamChoice(
+                    index=0,
+                    delta=DeltaMessage(content=" token"),
+                    logprobs=None,
+                    finish_reason=None)
+            ],
+            model=MODEL_NAME)
+        if usage is not None:
+            chunk.usage = UsageInfo(prompt_tokens=usage[0],
+                                    completion_tokens=usage[1],
+                                    total_tokens=sum(usage))
+        return f"data: {chunk.model_dump_json(exclude_unset=True)}\n\n"
+
+    def completion_models() -> str:
+        chunk = CompletionStreamResponse(id="cmpl-0",
+                                         created=created,
+                                         model=MODEL_NAME,
+                                         choices=[
+                                             CompletionResponseStreamChoice(
+                                                 index=0,
+                                                 text=" token",
+                                                 logprobs=None,
+                                                 finish_reason=None,
+                                                 stop_reason=None)
+                                         ])
+        if usage is not None:
+            chunk.usage = UsageInfo(prompt_tokens=usage[0],
+                                    completion_tokens=usage[1],
+                                    total_tokens=sum(usage))
+        return f"data: {chunk.model_dump_json(exclude_unset=False)}\n\n"
+
+    chat_encoder = ChatCompletionStreamEncoder("chatcmpl-0", created,
+                                               MODEL_NAME)
+    completion_encoder = CompletionStreamEncoder("cmpl-0", created, MODEL_NAME)
+    assert chat_models() == chat_encoder.encode_content_delta(0,
+                                                              " token",
+                                                              usage=usage)
+    assert completion_models() == completion_encoder.encode_text_delta(
+        0, " token", usage=usage)
+
+    results = {}
+    for name, encode in [
+        ("chat_models_us", chat_models),
+        ("chat_encoder_us",
+         lambda: chat_encoder.encode_content_delta(0, " token", usage=usage)),
+        ("completion_models_us", completion_models),
+        ("completion_encoder_us",
+         lambda: completion_encoder.encode_text_delta(0, " token", usage=usage)
+         ),
+    ]:
+        start = time.perf_counter()
+        for _ in range(num_iters):
+            encode()
+        results[name] = (time.perf_counter() - start) / num_iters * 1e6
+    return results
+
+
+def main(args):
+    results = {}
+    for api in ["chat", "completion"]:
+        results[api] = asyncio.run(run_streams(args, api))
+        print(f"{api} streams: " +
+              ", ".join(f"{key}={value:.2f}"
+                        for key, value in results[api].items()))
+    results["chunk_encoding"] = benchmark_chunk_encoding(args)
+    print("chunk encoding: " +
+          ", ".join(f"{key}={value:.2f}"
+                    for key, value in results["chunk_encoding"].items()))
+    if args.output_json:
+        with open(args.output_json, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    parser = FlexibleArgumentParser(
+        description="Benchmark the encoding of the chunks of streamed OpenAI "
+        "chat and completion responses.")
+    parser.add_argument("--num-streams", type=int, default=2000)
+    parser.add_argument("--input-len", type=int, default=128)
+    parser.add_argument("--output-len", type=int, default=64)
+    parser.add_argument("--continuous-usage-stats",
+                        action="store_true",
+                        help="Send the usage with every chunk.")
+    parser.add_argument("--output-json", type=str, default=None)
+    args = parser.parse_args()
+    main(args)
@@ -127,9 +127,11 @@ def run_vllm(
     requests: List[SampleRequest],
     n: int,
     engine_args: EngineArgs,
+    request_ordering: str = "input",
 ) -> float:
     from vllm import LLM, SamplingParams
-    llm = LLM(**dataclasses.asdict(engine_args))
+    llm = LLM(**dataclasses.asdict(engine_args),
+              request_ordering=request_ordering)
 
     # Add the requests to the engine.
     prompts: List[TextPrompt] = []
@@ -340,7 +342,8 @@ def main(args: argparse.Namespace):
                 ))
         else:
             elapsed_time = run_vllm(requests, args.n,
-                                    EngineArgs.from_cli_args(args))
+                                    EngineArgs.from_cli_args(args),
+                                    args.request_ordering)
     elif args.backend == "hf":
         assert args.tensor_parallel_size == 1
         elapsed_time = run_hf(requests, args.model, tokenizer, args.n,
@@ -371,6 +374,7 @@ def main(args: argparse.Namespace):
             "total_num_tokens": total_num_tokens,
             "requests_per_second": len(requests) / elapsed_time,
             "tokens_per_second": total_num_tokens / elapsed_time,
+            "request_ordering": args.request_ordering,
         }
         with open(args.output_json, "w") as f:
             json.dump(results, f, indent=4)
@@ -422,6 +426,13 @@ if __name__ == "__main__":
                         action='store_true',
                         default=False,
                         help="Disable decoupled async engine frontend.")
+    parser.add_argument(
+        "--request-ordering",
+        type=str,
+        choices=["input", "prefix", "length"],
+        default="input",
+        help="Order in which the LLM class submits the requests to the "
+        "engine. Run the benchmark with each ordering to compare them.")
     parser = AsyncEngineArgs.add_cli_args(parser)
     args = parser.parse_args()
     if args.tokenizer is None:
@@ -432,9 +443,13 @@ if __name__ == "__main__":
     else:
         assert args.input_len is None
 
+    if args.backend != "vllm" and args.request_ordering != "input":
+        raise ValueError("Request ordering is only for vLLM backend.")
     if args.backend == "vllm":
         if args.hf_max_batch_size is not None:
             raise ValueError("HF max batch size is only for HF backend.")
+        if args.async_engine and args.request_ordering != "input":
+            raise ValueError("Request ordering is only for the LLM class.")
     elif args.backend == "hf":
         if args.hf_max_batch_size is None:
             raise ValueError("HF max batch size is required for HF backend.")
@@ -0,0 +1,135 @@
+"""Benchmark the tokenization of prompts that share a long system prompt.
+
+Encodes `--num-prompts` prompts with a `TokenizerGroup` with and without its
+encode cache. Each prompt is a system prompt of `--system-prompt-len` words
+shared by all prompts, followed by a question of `--question-len` words, and
+a `--repeat-fraction` of the prompts repeat an earlier prompt. A byte-level
+BPE tokenizer is trained on the vocabulary of the prompts and saved to a
+temporary directory, so no model is downloaded. Reports the latency of the
+tokenization of each prompt and the hit rates of the cache.
+"""
+import json
+import random
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+from transformers import PreTrainedTokenizerFast
+
+from vllm.transformers_utils.tokenizer_group import TokenizerGroup
+from vllm.utils import FlexibleArgumentParser
+
+
+class Vocabulary:
+
+    def __init__(self, seed: int):
+        self.rng = random.Random(seed)
+        self.words = [
+            "".join(
+                self.rng.choice("abcdefghijklmnopqrstuvwxyz")
+                for _ in range(self.rng.randint(2, 9))) for _ in range(3000)
+        ]
+
+    def text(self, num_words: int) -> str:
+        return " ".join(self.rng.choice(self.words) for _ in range(num_words))
+
+
+def save_tokenizer(vocabulary: Vocabulary, path: str) -> None:
+    tokenizer = Tokenizer(models.BPE())
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    tokenizer.train_from_iterator(
+        [vocabulary.text(50) for _ in range(2000)],
+        trainers.BpeTrainer(
+            vocab_size=8000,
+            special_tokens=["<|im_start|>", "<|im_end|>", "<|endoftext|>"],
+            initial_alphabet=pre_tokenizers.ByteLevel.alphabet()))
+    PreTrainedTokenizerFast(tokenizer_object=tokenizer,
+                            eos_token="<|im_end|>",
+                            pad_token="<|endoftext|>").save_pretrained(path)
+
+
+def make_prompts(args, vocabulary: Vocabulary) -> List[str]:
+    system_prompt = vocabulary.text(args.system_prompt_len)
+    prompts: List[str] = []
+    for _ in range(args.num_prompts):
+        if prompts and vocabulary.rng.random() < args.repeat_fraction:
+            prompts.append(vocabulary.rng.choice(prompts))
+        else:
+            prompts.append(f"{system_prompt}\n\nQuestion: "
+                           f"{vocabulary.text(args.question_len)}")
+    return prompts
+
+
+def run(tokenizer_path: str, prompts: List[str],
+        cache_size: int) -> Dict[str, float]:
+    tokenizer_group = TokenizerGroup(tokenizer_path,
+                                     enable_lora=False,
+                                     max_num_seqs=1,
+                                     max_input_length=None,
+                                     encode_cache_size=cache_size)
+    latencies = []
+    for prompt in prompts:
+        start = time.perf_counter()
+        tokenizer_group.encode(prompt)
+        latencies.append(time.perf_counter() - start)
+    latencies_ms = np.array(latencies) * 1000
+    results = {
+        "mean_latency_ms": float(np.mean(latencies_ms)),
+        "p50_latency_ms": float(np.percentile(latencies_ms, 50)),
+        "p99_latency_ms": float(np.percentile(latencies_ms, 99)),
+    }
+    cache = tokenizer_group.encode_cache
+    if cache is not None:
+        results["hit_rate"] = cache.hit_rate
+        results["prefix_hit_rate"] = cache.prefix_hit_rate
+        results["mean_prefix_tokens"] = (cache.num_prefix_tokens /
+                                         max(cache.num_prefix_hits, 1))
+    return results
+
+
+def main(args):
+    vocabulary = Vocabulary(args.seed)
+    prompts = make_prompts(args, vocabulary)
+    results = {}
+    with tempfile.TemporaryDirectory() as tokenizer_path:
+        save_tokenizer(vocabulary, tokenizer_path)
+        for name, cache_size in [("no cache", 0), ("cache", args.cache_size)]:
+            results[name] = run(tokenizer_path, prompts, cache_size)
+            print(f"{name}: " +
+                  ", ".join(f"{key}={value:.3f}"
+                            for key, value in results[name].items()))
+    if args.output_json:
+        with open(args.output_json, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    parser = FlexibleArgumentParser(
+        description="Benchmark the tokenization of prompts with a long "
+        "shared system prompt with and without the encode cache of the "
+        "tokenizer group.")
+    parser.add_argument("--num-prompts", type=int, default=1000)
+    parser.add_argument("--system-prompt-len",
+                        type=int,
+                        default=4000,
+                        help="Number of words of the shared system prompt.")
+    parser.add_argument("--question-len",
+                        type=int,
+                        default=50,
+                        help="Number of words of the question of each prompt.")
+    parser.add_argument("--repeat-fraction",
+                        type=float,
+                        default=0.2,
+                        help="Fraction of the prompts that repeat an earlier "
+                        "prompt.")
+    parser.add_argument("--cache-size",
+                        type=int,
+                        default=256,
+                        help="Number of prompts cached for each tokenizer.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output-json", type=str, default=None)
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,103 @@
+"""Benchmark the tokenization of long prompts with tokenizer pools.
+
+Encodes `--num-prompts` documents of `--prompt-len` words, `--concurrency`
+at a time, with `encode_async` of a tokenizer group without a pool and of
+process tokenizer pools of each size of `--pool-sizes`. A byte-level BPE
+tokenizer is trained on the vocabulary of the documents and saved to a
+temporary directory, so no model is downloaded. Reports the prompts and
+tokens encoded per second, and the longest delay of a task that wakes up
+every millisecond in the event loop, which the API server would spend not
+serving requests.
+"""
+import asyncio
+import json
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmark_tokenizer_cache import Vocabulary, save_tokenizer
+
+from vllm.config import TokenizerPoolConfig
+from vllm.transformers_utils.tokenizer_group import (BaseTokenizerGroup,
+                                                     get_tokenizer_group)
+from vllm.utils import FlexibleArgumentParser
+
+
+async def measure_loop_lag(stop: asyncio.Event, lags: List[float]) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(time.perf_counter() - start - 0.001)
+
+
+async def run(args, tokenizer_group: BaseTokenizerGroup,
+              prompts: List[str]) -> Dict[str, float]:
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def encode(prompt: str) -> int:
+        async with semaphore:
+            return len(await tokenizer_group.encode_async(prompt))
+
+    stop = asyncio.Event()
+    lags: List[float] = []
+    lag_task = asyncio.create_task(measure_loop_lag(stop, lags))
+    start = time.perf_counter()
+    num_tokens = sum(await asyncio.gather(*(encode(p) for p in prompts)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await lag_task
+    return {
+        "prompts_per_s": len(prompts) / elapsed,
+        "tokens_per_s": num_tokens / elapsed,
+        "max_loop_lag_ms": max(lags, default=0.0) * 1000,
+    }
+
+
+def main(args):
+    vocabulary = Vocabulary(args.seed)
+    prompts = [
+        vocabulary.text(args.prompt_len) for _ in range(args.num_prompts)
+    ]
+    results = {}
+    with tempfile.TemporaryDirectory() as tokenizer_path:
+        save_tokenizer(vocabulary, tokenizer_path)
+        for pool_size in args.pool_sizes:
+            tokenizer_group = get_tokenizer_group(
+                TokenizerPoolConfig.create_config(pool_size, "process", None),
+                tokenizer_id=tokenizer_path,
+                enable_lora=False,
+                max_num_seqs=1,
+                max_input_length=None)
+            name = f"pool size {pool_size}" if pool_size else "no pool"
+            # Warm up the workers.
+            asyncio.run(run(args, tokenizer_group, prompts[:pool_size]))
+            results[name] = asyncio.run(run(args, tokenizer_group, prompts))
+            print(f"{name}: " +
+                  ", ".join(f"{key}={value:.1f}"
+                            for key, value in results[name].items()))
+            if pool_size:
+                tokenizer_group.shutdown()  # type: ignore[attr-defined]
+    if args.output_json:
+        with open(args.output_json, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    parser = FlexibleArgumentParser(
+        description="Benchmark the encode throughput of process tokenizer "
+        "pools against their size.")
+    parser.add_argument("--num-prompts", type=int, default=64)
+    parser.add_argument("--prompt-len",
+                        type=int,
+                        default=50000,
+                        help="Number of words of each prompt.")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--pool-sizes",
+                        type=int,
+                        nargs="+",
+                        default=[0, 1, 2, 4, 8],
+                        help="Sizes of the pools, 0 for no pool.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output-json", type=str, default=None)
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,139 @@
+"""Benchmark reading safetensors checkpoints from local disk.
+
+Writes a random Llama-shaped checkpoint (filled like the dummy load format)
+to disk and measures the throughput of the serial safetensors iterator and
+of the parallel read-ahead iterator for several thread counts.
+"""
+import os
+import tempfile
+import time
+from typing import Callable, Dict, Iterator, List, Tuple
+
+import torch
+from safetensors.torch import save_file
+
+from vllm.model_executor.model_loader.weight_utils import (
+    parallel_safetensors_weights_iterator, safetensors_weights_iterator)
+from vllm.utils import FlexibleArgumentParser
+
+
+def make_layer_weights(layer: int, hidden_size: int, intermediate_size: int,
+                       dtype: torch.dtype) -> Dict[str, torch.Tensor]:
+    prefix = f"model.layers.{layer}"
+    shapes = {
+        "self_attn.q_proj.weight": (hidden_size, hidden_size),
+        "self_attn.k_proj.weight": (hidden_size, hidden_size),
+        "self_attn.v_proj.weight": (hidden_size, hidden_size),
+        "self_attn.o_proj.weight": (hidden_size, hidden_size),
+        "mlp.gate_proj.weight": (intermediate_size, hidden_size),
+        "mlp.up_proj.weight": (intermediate_size, hidden_size),
+        "mlp.down_proj.weight": (hidden_size, intermediate_size),
+        "input_layernorm.weight": (hidden_size, ),
+        "post_attention_layernorm.weight": (hidden_size, ),
+    }
+    # Same distribution as initialize_dummy_weights.
+    return {
+        f"{prefix}.{name}": torch.empty(shape,
+                                        dtype=dtype).uniform_(-1e-3, 1e-3)
+        for name, shape in shapes.items()
+    }
+
+
+def write_checkpoint(args, checkpoint_dir: str) -> List[str]:
+    dtype = getattr(torch, args.dtype)
+    files: List[str] = []
+    shard: Dict[str, torch.Tensor] = {}
+    shard_bytes = 0
+
+    def flush():
+        nonlocal shard, shard_bytes
+        path = os.path.join(checkpoint_dir,
+                            f"model-{len(files):05d}.safetensors")
+        save_file(shard, path, metadata={"format": "pt"})
+        files.append(path)
+        shard, shard_bytes = {}, 0
+
+    for layer in range(args.num_layers):
+        weights = make_layer_weights(layer, args.hidden_size,
+                                     args.intermediate_size, dtype)
+        shard.update(weights)
+        shard_bytes += sum(w.numel() * w.element_size()
+                           for w in weights.values())
+        if shard_bytes >= args.shard_size_gb * 1e9:
+            flush()
+    if shard:
+        flush()
+    return files
+
+
+def drop_page_cache(files: List[str]) -> None:
+    """Evict the checkpoint from the page cache so reads hit the disk."""
+    for path in files:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+def run(name: str, files: List[str],
+        make_iterator: Callable[[], Iterator[Tuple[str, torch.Tensor]]],
+        drop_cache: bool) -> None:
+    if drop_cache:
+        drop_page_cache(files)
+    start = time.perf_counter()
+    total_bytes = 0
+    for _, tensor in make_iterator():
+        total_bytes += tensor.numel() * tensor.element_size()
+    elapsed = time.perf_counter() - start
+    print(f"{name:>16}: {total_bytes / 1e9:8.2f} GB in {elapsed:8.3f} s "
+          f"({total_bytes / 1e9 / elapsed:6.2f} GB/s)")
+
+
+def main(args):
+    with tempfile.TemporaryDirectory(dir=args.checkpoint_dir) as tmp_dir:
+        files = write_checkpoint(args, tmp_dir)
+        print(f"Wrote {len(files)} shards to {tmp_dir}")
+        drop_cache = not args.keep_page_cache
+
+        run("serial", files, lambda: safetensors_weights_iterator(files),
+            drop_cache)
+        for num_threads in args.num_threads:
+            run(f"parallel x{num_threads}",
+                files,
+                lambda num_threads=num_threads:
+                parallel_safetensors_weights_iterator(
+                    files,
+                    num_threads=num_threads,
+                    max_inflight_bytes=int(args.max_inflight_gb * 1e9)),
+                drop_cache)
+
+
+if __name__ == "__main__":
+    parser = FlexibleArgumentParser(
+        description="Benchmark safetensors checkpoint loading throughput.")
+    parser.add_argument("--checkpoint-dir",
+                        type=str,
+                        default=None,
+                        help="Directory in which the random checkpoint is "
+                        "written. Defaults to the system temp directory.")
+    parser.add_argument("--num-layers", type=int, default=16)
+    parser.add_argument("--hidden-size", type=int, default=2048)
+    parser.add_argument("--intermediate-size", type=int, default=8192)
+    parser.add_argument("--dtype",
+                        type=str,
+                        default="bfloat16",
+                        choices=["float16", "bfloat16", "float32"])
+    parser.add_argument("--shard-size-gb", type=float, default=1.0)
+    parser.add_argument("--num-threads",
+                        type=int,
+                        nargs="+",
+                        default=[1, 4, 8, 16])
+    parser.add_argument("--max-inflight-gb", type=float, default=4.0)
+    parser.add_argument("--keep-page-cache",
+                        action="store_true",
+                        help="Do not evict the checkpoint from the page "
+                        "cache before each run.")
+    args = parser.parse_args()
+    main(args)
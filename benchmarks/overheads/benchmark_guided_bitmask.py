@@ -0,0 +1,184 @@
+"""Micro-benchmark for the guided decoding stage of the logits processor.
+
+Measures the time spent per decoding step in guided decoding logits
+processors as the number of guided requests in a batch grows, comparing the
+batched bitmask stage of the logits processor layer against invoking the
+same processors row by row.
+"""
+import json
+import os
+import random
+import time
+from typing import Callable, List
+
+import torch
+from transformers import AutoTokenizer
+
+from vllm.model_executor.layers.logits_processor import (
+    _apply_logits_processors)
+from vllm.model_executor.sampling_metadata import SamplingMetadata
+from vllm.sequence import SamplingParams, SequenceData, SequenceGroupMetadata
+from vllm.utils import FlexibleArgumentParser, is_pin_memory_available
+
+DEFAULT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "name": {
+            "type": "string"
+        },
+        "age": {
+            "type": "integer"
+        },
+        "tags": {
+            "type": "array",
+            "items": {
+                "type": "string"
+            }
+        },
+    },
+    "required": ["name", "age", "tags"],
+}
+
+
+def make_processor_fn(backend: str, tokenizer,
+                      schema: str) -> Callable[[], object]:
+    if backend == "outlines":
+        from vllm.model_executor.guided_decoding.outlines_logits_processors import (  # noqa: E501
+            JSONLogitsProcessor)
+        return lambda: JSONLogitsProcessor(
+            schema, tokenizer, whitespace_pattern=None)
+
+    from vllm.model_executor.guided_decoding.xgrammar_decoding import (
+        GrammarConfig, TokenizerDataCache, XGrammarLogitsProcessor)
+    tokenizer_data = TokenizerDataCache.get_tokenizer_data(tokenizer)
+    config = GrammarConfig(tokenizer_hash=hash(tokenizer),
+                           vocab_size=len(tokenizer),
+                           json_str=schema,
+                           encoded_vocab=tokenizer_data.encoded_vocab,
+                           stop_token_ids=tokenizer_data.stop_token_ids,
+                           backend_str=tokenizer_data.backend_str,
+                           tokenizer_fingerprint=tokenizer_data.fingerprint)
+    return lambda: XGrammarLogitsProcessor(config)
+
+
+def _as_row_processor(processor):
+
+    def row_processor(past_tokens_ids, logits):
+        return processor(past_tokens_ids, logits)
+
+    return row_processor
+
+
+def _run(args, make_processor: Callable[[], object], vocab_size: int,
+         num_guided: int, per_row: bool) -> float:
+    random.seed(args.seed)
+    device = torch.device(args.device)
+    seq_group_metadata_list = []
+    seq_lens = []
+    for i in range(args.batch_size):
+        logits_processors: List = []
+        if i < num_guided:
+            processor = make_processor()
+            logits_processors.append(
+                _as_row_processor(processor) if per_row else processor)
+        seq_data = SequenceData.from_seqs(
+            [random.randrange(vocab_size) for _ in range(16)])
+        seq_group_metadata_list.append(
+            SequenceGroupMetadata(
+                request_id=f"bench_{i}",
+                is_prompt=False,
+                seq_data={i: seq_data},
+                sampling_params=SamplingParams(
+                    logits_processors=logits_processors),
+                block_tables={i: [1]},
+            ))
+        seq_lens.append(seq_data.get_len())
+
+    sampling_metadata = SamplingMetadata.prepare(
+        seq_group_metadata_list,
+        seq_lens,
+        query_lens=[1] * args.batch_size,
+        device=device,
+        pin_memory=device.type == "cuda" and is_pin_memory_available())
+
+    elapsed = 0.0
+    for step in range(args.warmup_steps + args.num_steps):
+        logits = torch.randn(args.batch_size,
+                             vocab_size,
+                             dtype=torch.float32,
+                             device=device)
+        if device.type == "cuda":
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        _apply_logits_processors(logits, sampling_metadata)
+        if device.type == "cuda":
+            torch.cuda.synchronize()
+        if step >= args.warmup_steps:
+            elapsed += time.perf_counter() - start
+
+        # Greedily sample the next tokens so that the grammars advance.
+        next_token_ids = logits.argmax(dim=-1).tolist()
+        for seq_group, token_id in zip(seq_group_metadata_list,
+                                       next_token_ids):
+            for seq_data in seq_group.seq_data.values():
+                seq_data.append_token_id(token_id, 0.0)
+    return elapsed / args.num_steps
+
+
+def main(args):
+    tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+    vocab_size = len(tokenizer)
+    schema = json.dumps(DEFAULT_SCHEMA)
+    if args.schema is not None:
+        with open(args.schema) as f:
+            schema = f.read()
+    make_processor = make_processor_fn(args.backend, tokenizer, schema)
+    # Read lazily by the logits processor layer on first use.
+    os.environ["VLLM_GUIDED_DECODING_BITMASK_THREADS"] = str(args.num_threads)
+
+    print(f"backend: {args.backend}, batch size: {args.batch_size}, "
+          f"vocab size: {vocab_size}, bitmask threads: {args.num_threads}")
+    print(f"{'guided':>8} {'per-row (ms)':>14} {'batched (ms)':>14} "
+          f"{'speedup':>8}")
+    for num_guided in args.num_guided:
+        num_guided = min(num_guided, args.batch_size)
+        per_row = _run(args, make_processor, vocab_size, num_guided, True)
+        batched = _run(args, make_processor, vocab_size, num_guided, False)
+        print(f"{num_guided:>8} {per_row * 1000:>14.3f} "
+              f"{batched * 1000:>14.3f} {per_row / batched:>7.2f}x")
+
+
+if __name__ == "__main__":
+    parser = FlexibleArgumentParser(
+        description="Benchmark the guided decoding bitmask stage.")
+    parser.add_argument("--tokenizer",
+                        type=str,
+                        default="meta-llama/Llama-3.2-1B-Instruct")
+    parser.add_argument("--backend",
+                        type=str,
+                        choices=["outlines", "xgrammar"],
+                        default="xgrammar")
+    parser.add_argument("--schema",
+                        type=str,
+                        default=None,
+                        help="Path to a JSON schema. Defaults to a small "
+                        "built-in schema.")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--num-guided",
+                        type=int,
+                        nargs="+",
+                        default=[1, 8, 32, 64, 128, 256],
+                        help="Numbers of guided requests in the batch.")
+    parser.add_argument("--num-threads",
+                        type=int,
+                        default=0,
+                        help="Threads used to fill the bitmask, see "
+                        "VLLM_GUIDED_DECODING_BITMASK_THREADS.")
+    parser.add_argument("--num-steps", type=int, default=20)
+    parser.add_argument("--warmup-steps", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--device",
+                        type=str,
+                        default="cuda" if torch.cuda.is_available() else "cpu")
+    args = parser.parse_args()
+    main(args)
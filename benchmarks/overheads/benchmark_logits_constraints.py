@@ -0,0 +1,126 @@
+"""Micro-benchmark for applying bad-words and logit-bias constraints.
+
+Compares the batched sparse stage of the logits processor layer against
+invoking the same processors row by row.
+"""
+import random
+import time
+from typing import List
+
+import torch
+
+from vllm.entrypoints.openai.logits_processors import LogitBiasLogitsProcessor
+from vllm.logits_process import NoBadWordsLogitsProcessor
+from vllm.model_executor.layers.logits_processor import (
+    _apply_logits_processors)
+from vllm.model_executor.sampling_metadata import SamplingMetadata
+from vllm.sequence import SamplingParams, SequenceData, SequenceGroupMetadata
+from vllm.utils import FlexibleArgumentParser, is_pin_memory_available
+
+
+def _make_processors(args, vocab_size: int, per_row: bool) -> List:
+    bad_words_ids = [[
+        random.randrange(vocab_size)
+        for _ in range(random.randint(1, args.max_bad_word_len))
+    ] for _ in range(args.num_bad_words)]
+    logit_bias = {
+        random.randrange(vocab_size): random.uniform(-100, 100)
+        for _ in range(args.num_logit_bias)
+    }
+    processors = [
+        NoBadWordsLogitsProcessor(bad_words_ids=bad_words_ids),
+        LogitBiasLogitsProcessor(logit_bias),
+    ]
+    if per_row:
+        # Hide the processors behind plain callables so that the layer
+        # falls back to calling them row by row.
+        return [_as_row_processor(p) for p in processors]
+    return processors
+
+
+def _as_row_processor(processor):
+
+    def row_processor(past_tokens_ids, logits):
+        return processor(past_tokens_ids, logits)
+
+    return row_processor
+
+
+def _run(args, per_row: bool) -> float:
+    random.seed(args.seed)
+    device = torch.device(args.device)
+    seq_group_metadata_list = []
+    seq_lens = []
+    for i in range(args.batch_size):
+        seq_data = SequenceData.from_seqs(
+            [random.randrange(args.vocab_size) for _ in range(16)],
+            [random.randrange(args.vocab_size) for _ in range(16)])
+        seq_group_metadata_list.append(
+            SequenceGroupMetadata(
+                request_id=f"bench_{i}",
+                is_prompt=False,
+                seq_data={i: seq_data},
+                sampling_params=SamplingParams(
+                    logits_processors=_make_processors(args, args.vocab_size,
+                                                       per_row)),
+                block_tables={i: [1]},
+            ))
+        seq_lens.append(seq_data.get_len())
+
+    sampling_metadata = SamplingMetadata.prepare(
+        seq_group_metadata_list,
+        seq_lens,
+        query_lens=[1] * args.batch_size,
+        device=device,
+        pin_memory=device.type == "cuda" and is_pin_memory_available())
+    logits = torch.randn(args.batch_size,
+                         args.vocab_size,
+                         dtype=torch.float32,
+                         device=device)
+
+    elapsed = 0.0
+    for step in range(args.warmup_steps + args.num_steps):
+        # Generate a new token for every sequence.
+        for seq_group in seq_group_metadata_list:
+            for seq_data in seq_group.seq_data.values():
+                seq_data.append_token_id(random.randrange(args.vocab_size),
+                                         0.0)
+        step_logits = logits.clone()
+        if device.type == "cuda":
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        _apply_logits_processors(step_logits, sampling_metadata)
+        if device.type == "cuda":
+            torch.cuda.synchronize()
+        if step >= args.warmup_steps:
+            elapsed += time.perf_counter() - start
+    return elapsed / args.num_steps
+
+
+def main(args):
+    per_row = _run(args, per_row=True)
+    batched = _run(args, per_row=False)
+    print(f"batch size: {args.batch_size}, bad words per request: "
+          f"{args.num_bad_words}, logit bias entries per request: "
+          f"{args.num_logit_bias}")
+    print(f"per-row processors: {per_row * 1000:.3f} ms/step")
+    print(f"batched sparse stage: {batched * 1000:.3f} ms/step")
+    print(f"speedup: {per_row / batched:.2f}x")
+
+
+if __name__ == "__main__":
+    parser = FlexibleArgumentParser(
+        description="Benchmark the bad-words / logit-bias constraint stage.")
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--vocab-size", type=int, default=32000)
+    parser.add_argument("--num-bad-words", type=int, default=64)
+    parser.add_argument("--max-bad-word-len", type=int, default=4)
+    parser.add_argument("--num-logit-bias", type=int, default=32)
+    parser.add_argument("--num-steps", type=int, default=20)
+    parser.add_argument("--warmup-steps", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--device",
+                        type=str,
+                        default="cuda" if torch.cuda.is_available() else "cpu")
+    args = parser.parse_args()
+    main(args)
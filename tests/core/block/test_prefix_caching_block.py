@@ -1,9 +1,11 @@
 import math
+import os
 import random
 from typing import List, Optional
 from unittest.mock import MagicMock
 
 import pytest
+from PIL import Image
 
 from tests.core.utils import create_dummy_lora_sequence, create_dummy_sequence
 from vllm.core.block.cpu_gpu_block_allocator import CpuGpuBlockAllocator
@@ -11,7 +13,10 @@ from vllm.core.block.interfaces import Block, BlockAllocator
 from vllm.core.block.prefix_caching_block import (ComputedBlocksTracker,
                                                   PrefixCachingBlock,
                                                   PrefixCachingBlockAllocator)
-from vllm.sequence import Logprob
+from vllm.inputs import token_inputs
+from vllm.lora.request import LoRARequest
+from vllm.lora.utils import _hash_adapter_files, get_adapter_fingerprint
+from vllm.sequence import Logprob, Sequence, compute_extra_hash
 from vllm.utils import Device
 
 
@@ -992,3 +997,125 @@ class TestComputedBlocksTracker:
         # The number of cached tokens matches the length of the tokens
         # for the cached LoRA sequence.
         assert tracker.get_num_cached_tokens(lora_seq) == len(tokens)
+
+    @staticmethod
+    def _cache_sequence(allocator: CpuGpuBlockAllocator, seq: Sequence):
+        TestPrefixCachingBlockAllocator.create_immutable_chain(
+            block_size=seq.block_size,
+            token_ids=seq.get_token_ids(),
+            allocator=allocator._allocators[Device.GPU],
+            extra_hash=seq.extra_hash(),
+        )
+        allocator.mark_blocks_as_computed([])
+
+    @staticmethod
+    def test_extra_hash_lora_fingerprint(tmp_path):
+        """
+        Test that LoRA sequences share cached blocks when their adapters have
+        the same weights, whatever their LoRA IDs and paths, and that the
+        extra hash is stable across restarts and changes with the weights.
+        """
+        block_size = 4
+        allocator = CpuGpuBlockAllocator.create(
+            allocator_type="prefix_caching",
+            num_gpu_blocks=16,
+            num_cpu_blocks=16,
+            block_size=block_size,
+        )
+        tracker = ComputedBlocksTracker(
+            allocator=allocator,
+            block_size=block_size,
+            enable_caching=True,
+        )
+        tokens = list(range(block_size * 4))
+
+        lora_dirs = []
+        for i, weights in enumerate([b"weights-a", b"weights-a",
+                                     b"weights-b"]):
+            lora_dir = tmp_path / f"lora_{i}"
+            lora_dir.mkdir()
+            (lora_dir / "adapter_model.safetensors").write_bytes(weights)
+            (lora_dir / "adapter_config.json").write_text('{"r": 8}')
+            lora_dirs.append(str(lora_dir))
+
+        lora_seq = create_dummy_lora_sequence(0, tokens, block_size, 1,
+                                              lora_dirs[0])
+        TestComputedBlocksTracker._cache_sequence(allocator, lora_seq)
+
+        # Another LoRA ID and path, but the same weights: cache hit.
+        same_weights_seq = create_dummy_lora_sequence(1, tokens, block_size, 2,
+                                                      lora_dirs[1])
+        assert same_weights_seq.extra_hash() == lora_seq.extra_hash()
+        assert tracker.get_num_cached_tokens(same_weights_seq) == len(tokens)
+
+        # The same LoRA ID and other weights: cache miss.
+        other_weights_seq = create_dummy_lora_sequence(2, tokens, block_size,
+                                                       1, lora_dirs[2])
+        assert tracker.get_num_cached_tokens(other_weights_seq) == 0
+
+        # The extra hash does not depend on the state of the process.
+        _hash_adapter_files.cache_clear()
+        restarted_seq = create_dummy_lora_sequence(3, tokens, block_size, 7,
+                                                   lora_dirs[0])
+        assert restarted_seq.extra_hash() == lora_seq.extra_hash()
+
+        # Updating the adapter in place changes its extra hash.
+        weights_path = os.path.join(lora_dirs[0], "adapter_model.safetensors")
+        with open(weights_path, "wb") as f:
+            f.write(b"weights-c")
+        os.utime(weights_path, ns=(0, 0))
+        updated_seq = create_dummy_lora_sequence(4, tokens, block_size, 1,
+                                                 lora_dirs[0])
+        assert updated_seq.extra_hash() != lora_seq.extra_hash()
+        assert tracker.get_num_cached_tokens(updated_seq) == 0
+
+        # The fingerprint computed by the client is used as is, without
+        # reading the files of the adapter.
+        fingerprint = get_adapter_fingerprint(lora_dirs[1])
+        lora_request = LoRARequest(lora_name="dummy",
+                                   lora_path="/does/not/exist",
+                                   lora_int_id=5)
+        assert compute_extra_hash(
+            token_inputs(tokens), lora_request,
+            lora_fingerprint=fingerprint) == same_weights_seq.extra_hash()
+
+    @staticmethod
+    def test_extra_hash_multi_modal():
+        """
+        Test that sequences with the same placeholder tokens only share cached
+        blocks when their multi-modal data has the same contents.
+        """
+        block_size = 4
+        allocator = CpuGpuBlockAllocator.create(
+            allocator_type="prefix_caching",
+            num_gpu_blocks=16,
+            num_cpu_blocks=16,
+            block_size=block_size,
+        )
+        tracker = ComputedBlocksTracker(
+            allocator=allocator,
+            block_size=block_size,
+            enable_caching=True,
+        )
+        tokens = [1, 2] + [9] * (block_size * 3) + [3, 4]
+
+        def create_mm_sequence(request_id: int, color: str) -> Sequence:
+            image = Image.new("RGB", (8, 8), color=color)
+            inputs = token_inputs(tokens, multi_modal_data={"image": image})
+            return Sequence(
+                seq_id=request_id,
+                inputs=inputs,
+                block_size=block_size,
+                extra_hash=compute_extra_hash(inputs),
+            )
+
+        mm_seq = create_mm_sequence(0, "red")
+        TestComputedBlocksTracker._cache_sequence(allocator, mm_seq)
+
+        assert mm_seq.extra_hash() is not None
+        assert tracker.get_num_cached_tokens(create_mm_sequence(
+            1, "red")) == len(tokens)
+        assert tracker.get_num_cached_tokens(create_mm_sequence(2,
+                                                                "blue")) == 0
+        assert tracker.get_num_cached_tokens(
+            create_dummy_sequence(3, tokens, block_size)) == 0
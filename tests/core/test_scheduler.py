@@ -1,6 +1,6 @@
 import time
 from collections import deque
-from typing import List, Set, Tuple
+from typing import List, Optional, Set, Tuple
 from unittest.mock import MagicMock
 
 import pytest  # noqa
@@ -8,9 +8,10 @@ from torch import Use  # noqa
 
 from vllm.config import CacheConfig, LoRAConfig, SchedulerConfig
 from vllm.core.interfaces import AllocStatus
-from vllm.core.scheduler import Scheduler, SchedulingBudget
+from vllm.core.scheduler import (LORA_MAX_BYPASSED_STEPS, Scheduler,
+                                 SchedulingBudget)
 from vllm.lora.request import LoRARequest
-from vllm.sequence import SequenceGroup
+from vllm.sequence import SequenceGroup, SequenceStatus
 
 from .utils import (append_new_token, append_new_token_seq,
                     append_new_token_seq_group, create_dummy_prompt,
@@ -307,6 +308,7 @@ def initialize_scheduler(
     num_gpu_blocks=8,
     enable_prefix_caching=False,
     enable_chunked_prefill=False,
+    policy="fcfs",
 ):
     block_size = block_size
     scheduler_config = SchedulerConfig(
@@ -315,6 +317,7 @@ def initialize_scheduler(
         max_num_seqs=max_num_seqs,
         max_model_len=max_model_len,
         enable_chunked_prefill=enable_chunked_prefill,
+        policy=policy,
     )
     cache_config = CacheConfig(
         block_size,
@@ -520,6 +523,135 @@ def test_prefill_schedule_max_lora():
     assert budget.num_batched_tokens == 60
 
 
+def test_prefill_schedule_loading_lora():
+    """
+    Test requests whose LoRA is being loaded in the background are only
+    admitted if no other request can run.
+    """
+    block_size = 4
+    lora_config = LoRAConfig(max_lora_rank=8, max_loras=2)
+    scheduler = initialize_scheduler(lora_config=lora_config,
+                                     block_size=block_size,
+                                     num_cpu_blocks=64,
+                                     num_gpu_blocks=64)
+    for i in range(2):
+        _, seq_group = create_dummy_prompt(str(i),
+                                           prompt_length=60,
+                                           block_size=block_size,
+                                           lora_request=LoRARequest(
+                                               lora_name=str(i),
+                                               lora_int_id=i + 1,
+                                               lora_path="abc"))
+        scheduler.add_seq_group(seq_group)
+    scheduler.loading_lora_ids = {1}
+
+    # A running request: the request using the loading LoRA waits.
+    budget = create_token_budget()
+    add_token_budget(budget, 0, 1)
+    output = scheduler._schedule_prefills(budget, set())
+    assert [s.seq_group.request_id for s in output.seq_groups] == ["1"]
+    assert [s.request_id for s in scheduler.waiting] == ["0"]
+
+    # Nothing else to run: the request is admitted.
+    output = scheduler._schedule_prefills(create_token_budget(), set())
+    assert [s.seq_group.request_id for s in output.seq_groups] == ["0"]
+
+
+@pytest.mark.parametrize("max_loras", [1, 2])
+def test_schedule_prefetch_loras(max_loras: int):
+    """
+    Test the LoRAs of waiting requests that are not in the batch are
+    published for prefetching, at most max_loras of them.
+    """
+    block_size = 4
+    lora_config = LoRAConfig(max_lora_rank=8, max_loras=max_loras)
+    scheduler = initialize_scheduler(lora_config=lora_config,
+                                     max_num_seqs=8,
+                                     max_token_budget=60,
+                                     max_model_len=60,
+                                     block_size=block_size,
+                                     num_cpu_blocks=64,
+                                     num_gpu_blocks=64)
+    for i, lora_int_id in enumerate([1, 2, 2, 0, 3]):
+        lora_request = LoRARequest(lora_name=str(lora_int_id),
+                                   lora_int_id=lora_int_id,
+                                   lora_path="abc") if lora_int_id else None
+        _, seq_group = create_dummy_prompt(str(i),
+                                           prompt_length=60,
+                                           block_size=block_size,
+                                           lora_request=lora_request)
+        scheduler.add_seq_group(seq_group)
+
+    _, out = schedule_and_update_computed_tokens(scheduler)
+    assert [s.seq_group.request_id for s in out.scheduled_seq_groups] == ["0"]
+    assert [r.lora_int_id
+            for r in out.prefetch_lora_requests] == [2, 3][:max_loras]
+
+
+def _add_lora_prompt(scheduler: Scheduler, request_id: str,
+                     lora_int_id: int) -> None:
+    _, seq_group = create_dummy_prompt(request_id,
+                                       prompt_length=4,
+                                       block_size=4,
+                                       lora_request=LoRARequest(
+                                           lora_name=str(lora_int_id),
+                                           lora_int_id=lora_int_id,
+                                           lora_path="abc"))
+    scheduler.add_seq_group(seq_group)
+
+
+def test_prefill_schedule_lora_aware():
+    """
+    Test requests are admitted grouped by LoRA, cheapest LoRAs first, with
+    a bounded number of LoRA loads per step.
+    """
+    lora_config = LoRAConfig(max_lora_rank=8,
+                             max_loras=4,
+                             max_lora_loads_per_step=1)
+    scheduler = initialize_scheduler(lora_config=lora_config,
+                                     num_cpu_blocks=64,
+                                     num_gpu_blocks=64)
+    for i, lora_int_id in enumerate([1, 2, 1, 3, 2]):
+        _add_lora_prompt(scheduler, str(i), lora_int_id)
+    scheduler.active_lora_ids = {3}
+    scheduler.resident_lora_ids = {2, 3}
+
+    curr_loras: Set[int] = set()
+    output = scheduler._schedule_prefills(create_token_budget(), curr_loras)
+    # LoRA 3 is in a GPU slot, and one LoRA is loaded: the one in the CPU
+    # cache.
+    assert [s.seq_group.request_id
+            for s in output.seq_groups] == ["3", "1", "4"]
+    assert curr_loras == {2, 3}
+    assert [s.request_id for s in scheduler.waiting] == ["0", "2"]
+
+
+def test_prefill_schedule_lora_aware_no_starvation():
+    """
+    Test a request that newer requests are admitted ahead of is eventually
+    admitted first.
+    """
+    lora_config = LoRAConfig(max_lora_rank=8,
+                             max_loras=1,
+                             max_lora_loads_per_step=1)
+    scheduler = initialize_scheduler(lora_config=lora_config,
+                                     num_cpu_blocks=64,
+                                     num_gpu_blocks=64)
+    scheduler.active_lora_ids = {1}
+    _add_lora_prompt(scheduler, "0", 2)
+    for step in range(LORA_MAX_BYPASSED_STEPS):
+        _add_lora_prompt(scheduler, str(step + 1), 1)
+        output = scheduler._schedule_prefills(create_token_budget(), set())
+        assert [s.seq_group.request_id
+                for s in output.seq_groups] == [str(step + 1)]
+
+    new_request_id = str(LORA_MAX_BYPASSED_STEPS + 1)
+    _add_lora_prompt(scheduler, new_request_id, 1)
+    output = scheduler._schedule_prefills(create_token_budget(), set())
+    assert [s.seq_group.request_id for s in output.seq_groups] == ["0"]
+    assert [s.request_id for s in scheduler.waiting] == [new_request_id]
+
+
 def test_prefill_schedule_no_block_manager_capacity():
     """
     Test sequence cannot be scheduled due to block manager has no capacity.
@@ -606,6 +738,114 @@ def test_decode_schedule_preempted():
     assert output.blocks_to_copy == []
 
 
+def _add_slo_prompt(scheduler: Scheduler,
+                    request_id: str,
+                    ttft_slo_ms: Optional[float] = None,
+                    tpot_slo_ms: Optional[float] = None,
+                    prompt_length: int = 4) -> SequenceGroup:
+    _, seq_group = create_dummy_prompt(request_id,
+                                       prompt_length=prompt_length,
+                                       block_size=4)
+    seq_group.sampling_params.ttft_slo_ms = ttft_slo_ms
+    seq_group.sampling_params.tpot_slo_ms = tpot_slo_ms
+    scheduler.add_seq_group(seq_group)
+    return seq_group
+
+
+@pytest.mark.parametrize("enable_chunked_prefill", [False, True])
+def test_schedule_deadline_order(enable_chunked_prefill: bool):
+    """Waiting requests are scheduled by earliest TTFT deadline, and the
+    requests without SLOs come last in arrival order."""
+    scheduler = initialize_scheduler(
+        max_num_seqs=2,
+        num_gpu_blocks=64,
+        enable_chunked_prefill=enable_chunked_prefill,
+        policy="deadline")
+    _add_slo_prompt(scheduler, "0")
+    _add_slo_prompt(scheduler, "1", ttft_slo_ms=60000)
+    _add_slo_prompt(scheduler, "2")
+    _add_slo_prompt(scheduler, "3", ttft_slo_ms=30000)
+
+    _, out = schedule_and_update_computed_tokens(scheduler)
+    assert [s.seq_group.request_id
+            for s in out.scheduled_seq_groups] == ["3", "1"]
+    assert [seq_group.request_id
+            for seq_group in scheduler.waiting] == ["0", "2"]
+
+
+def test_schedule_deadline_abort_expired():
+    """Waiting requests past their TTFT deadline are aborted and returned
+    as ignored, so that their clients get a response."""
+    scheduler = initialize_scheduler(max_num_seqs=1,
+                                     num_gpu_blocks=64,
+                                     policy="deadline")
+    running = _add_slo_prompt(scheduler,
+                              "0",
+                              ttft_slo_ms=100,
+                              tpot_slo_ms=1000)
+    expired = _add_slo_prompt(scheduler, "1", ttft_slo_ms=100)
+    waiting = _add_slo_prompt(scheduler, "2", ttft_slo_ms=60000)
+    _, out = schedule_and_update_computed_tokens(scheduler)
+    assert [s.seq_group for s in out.scheduled_seq_groups] == [running]
+    append_new_token_seq(running.first_seq, 1)
+    running.maybe_set_first_token_time(time.time())
+
+    # The deadline of the first token of request 1 passes, while request 0
+    # got its first token on time.
+    for seq_group in (running, expired):
+        seq_group.arrival_time -= 1
+    _, out = schedule_and_update_computed_tokens(scheduler)
+    assert out.ignored_seq_groups == [expired]
+    assert expired.is_finished()
+    assert expired.first_seq.status == SequenceStatus.FINISHED_ABORTED
+    assert scheduler.get_and_reset_finished_requests_ids() == ["1"]
+    assert list(scheduler.waiting) == [waiting]
+    assert [s.seq_group for s in out.scheduled_seq_groups] == [running]
+
+    # With another policy, the SLOs are ignored.
+    scheduler = initialize_scheduler(num_gpu_blocks=64)
+    expired = _add_slo_prompt(scheduler, "3", ttft_slo_ms=100)
+    expired.arrival_time -= 1
+    _, out = schedule_and_update_computed_tokens(scheduler)
+    assert [s.seq_group for s in out.scheduled_seq_groups] == [expired]
+
+
+def test_schedule_deadline_preempt_latest():
+    """The running request whose next token is due last is preempted
+    first."""
+    block_size = 4
+    scheduler = initialize_scheduler(block_size=block_size,
+                                     num_cpu_blocks=64,
+                                     num_gpu_blocks=64,
+                                     policy="deadline")
+    now = time.time()
+    for request_id, tpot_slo_ms in [("0", None), ("1", 100), ("2", 10)]:
+        seq_group = _add_slo_prompt(scheduler,
+                                    request_id,
+                                    tpot_slo_ms=tpot_slo_ms,
+                                    prompt_length=60)
+        scheduler.waiting.remove(seq_group)
+        scheduler._allocate_and_set_running(seq_group)
+        append_new_token_seq_group(60, seq_group, 1)
+        seq_group.maybe_set_first_token_time(now)
+        scheduler._add_seq_group_to_running(seq_group)
+    scheduler.block_manager.can_append_slots = MagicMock()
+
+    def cannot_append_earliest_group(seq_group, num_lookahead_slots):
+        return seq_group.request_id != "2"
+
+    scheduler.block_manager.can_append_slots.side_effect = (
+        cannot_append_earliest_group)
+
+    # The earliest deadline is request 2, which cannot be scheduled: the
+    # request without SLO is preempted for it, then request 1.
+    _, out = schedule_and_update_computed_tokens(scheduler)
+    assert out.preempted == 3
+    assert len(out.scheduled_seq_groups) == 0
+    assert [seq_group.request_id
+            for seq_group in scheduler.waiting] == ["2", "1", "0"]
+
+
 def test_schedule_decode_blocks_to_copy_update():
     """
     Verify blocks_to_copy is updated.
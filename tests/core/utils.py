@@ -9,7 +9,7 @@ from vllm.core.scheduler import Scheduler, SchedulerOutputs
 from vllm.inputs import EncoderDecoderInputs, token_inputs
 from vllm.lora.request import LoRARequest
 from vllm.sequence import (Logprob, Sequence, SequenceGroup,
-                           SequenceGroupMetadata)
+                           SequenceGroupMetadata, compute_extra_hash)
 
 
 def create_dummy_prompt(
@@ -46,14 +46,22 @@ def create_dummy_prompt(
     return prompt, seq_group
 
 
-def create_dummy_lora_sequence(request_id: int, token_ids: List[int],
-                               block_size: int, lora_int_id: int) -> Sequence:
+def create_dummy_lora_sequence(request_id: int,
+                               token_ids: List[int],
+                               block_size: int,
+                               lora_int_id: int,
+                               lora_path: Optional[str] = None) -> Sequence:
+    if lora_path is None:
+        lora_path = f"/dummy/lora_{lora_int_id}"
+    inputs = token_inputs(token_ids)
+    lora_request = LoRARequest(lora_name="dummy",
+                               lora_path=lora_path,
+                               lora_int_id=lora_int_id)
     return Sequence(seq_id=request_id,
-                    inputs=token_inputs(token_ids),
+                    inputs=inputs,
                     block_size=block_size,
-                    lora_request=LoRARequest(lora_name="dummy",
-                                             lora_path="/dummy",
-                                             lora_int_id=lora_int_id))
+                    lora_request=lora_request,
+                    extra_hash=compute_extra_hash(inputs, lora_request))
 
 
 def create_dummy_sequence(request_id: int, token_ids: List[int],
@@ -0,0 +1,70 @@
+import os
+from types import SimpleNamespace
+
+from vllm.engine.snapshot import (EngineSnapshot, engine_fingerprint,
+                                  is_engine_snapshot)
+from vllm.model_executor.model_loader.engine_image import (
+    restore_compile_cache, save_compile_cache)
+
+
+def _make_config(gpu_memory_utilization: float = 0.9, rank: int = 0):
+    return SimpleNamespace(
+        model_config=SimpleNamespace(dtype="bfloat16",
+                                     quantization=None,
+                                     max_model_len=4096,
+                                     enforce_eager=False),
+        cache_config=SimpleNamespace(
+            block_size=16,
+            cache_dtype="auto",
+            gpu_memory_utilization=gpu_memory_utilization,
+            swap_space_bytes=0,
+            num_gpu_blocks_override=None),
+        scheduler_config=SimpleNamespace(max_num_batched_tokens=8192,
+                                         max_num_seqs=256),
+        parallel_config=SimpleNamespace(tensor_parallel_size=1,
+                                        pipeline_parallel_size=1,
+                                        rank=rank),
+        device_config=SimpleNamespace(device_type="cpu"),
+        compilation_config=SimpleNamespace(cache_dir=""),
+        lora_config=None)
+
+
+def test_snapshot_block_counts(tmp_path):
+    snapshot_dir = str(tmp_path)
+    config = _make_config()
+    other_config = _make_config(gpu_memory_utilization=0.5)
+    assert engine_fingerprint(config) == engine_fingerprint(_make_config())
+    assert engine_fingerprint(config) != engine_fingerprint(other_config)
+
+    assert not is_engine_snapshot(snapshot_dir)
+    snapshot = EngineSnapshot()
+    snapshot.block_counts[engine_fingerprint(config)] = [100, 10]
+    snapshot.save(snapshot_dir)
+    assert is_engine_snapshot(snapshot_dir)
+
+    snapshot = EngineSnapshot.load(snapshot_dir)
+    assert snapshot.get_block_counts(config) == (100, 10)
+    # Profiled on other hardware or with another configuration.
+    assert snapshot.get_block_counts(other_config) is None
+
+
+def test_compile_cache_round_trip(tmp_path):
+    image_dir = str(tmp_path / "image")
+    for rank in range(2):
+        cache_dir = tmp_path / f"cache_{rank}"
+        (cache_dir / "inductor_cache").mkdir(parents=True)
+        (cache_dir / "inductor_hash_cache.py").write_text(f"[{rank}]")
+        config = _make_config(rank=rank)
+        config.compilation_config.cache_dir = str(cache_dir)
+        save_compile_cache(config, image_dir)
+
+    restored_dir = tmp_path / "restored"
+    restored_dir.mkdir()
+    restore_compile_cache(image_dir, 1, str(restored_dir))
+    assert (restored_dir / "inductor_hash_cache.py").read_text() == "[1]"
+    assert os.path.isdir(restored_dir / "inductor_cache")
+
+    # An existing cache is never overwritten.
+    (restored_dir / "inductor_hash_cache.py").write_text("[2]")
+    restore_compile_cache(image_dir, 1, str(restored_dir))
+    assert (restored_dir / "inductor_hash_cache.py").read_text() == "[2]"
@@ -0,0 +1,200 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from vllm.entrypoints.openai import admission
+from vllm.entrypoints.openai.admission import AdmissionController
+from vllm.outputs import CompletionOutput, RequestOutput
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(admission, "time", clock)
+    return clock
+
+
+def make_output(finished: bool) -> RequestOutput:
+    return RequestOutput(request_id="request",
+                         prompt=None,
+                         prompt_token_ids=[1, 2, 3],
+                         prompt_logprobs=None,
+                         outputs=[
+                             CompletionOutput(
+                                 index=0,
+                                 text=" 0",
+                                 token_ids=[0],
+                                 cumulative_logprob=None,
+                                 logprobs=None,
+                                 finish_reason="length" if finished else None)
+                         ],
+                         finished=finished)
+
+
+def calibrate(controller: AdmissionController, clock: FakeClock) -> None:
+    # 1000 prompt tokens get their first token after 1s.
+    assert controller.admit("calibration", 1000) is None
+    clock.now += 1.0
+    controller.record_ttft("calibration", 1.0)
+    controller.release("calibration")
+    assert controller.prefill_rate == 1000
+
+
+def test_admission_ttft_slo(clock: FakeClock):
+    controller = AdmissionController(default_ttft_slo_ms=500)
+    # Requests are admitted until the prefill rate is measured.
+    assert controller.estimate_ttft(10000) == 0
+    calibrate(controller, clock)
+    assert controller.backlog_tokens == 0
+
+    assert controller.admit("a", 300) is None
+    assert controller.admit("b", 150) is None
+    assert controller.estimate_ttft(100) == pytest.approx(0.55)
+    assert controller.admit("c", 100) == "ttft_slo"
+    # A request with a looser SLO is still admitted.
+    assert controller.admit("c", 100, ttft_slo_ms=1000) is None
+    assert controller.num_admitted == 4
+    assert controller.num_rejected == 1
+
+    # The backlog drains at the prefill rate.
+    clock.now += 0.4
+    assert controller.backlog_tokens == pytest.approx(150)
+    assert controller.admit("d", 100) is None
+
+    # Withdrawn requests leave the backlog.
+    controller.withdraw("d")
+    assert controller.backlog_tokens == pytest.approx(150)
+    assert controller.num_admitted == 4
+
+
+def test_admission_without_slo(clock: FakeClock):
+    controller = AdmissionController()
+    calibrate(controller, clock)
+    assert controller.admit("a", 100000) is None
+    assert controller.admit("b", 10) is None
+    assert controller.admit("c", 10, ttft_slo_ms=1000) == "ttft_slo"
+    with pytest.raises(ValueError):
+        AdmissionController(default_ttft_slo_ms=0)
+
+
+def test_admission_backlog(clock: FakeClock):
+    # Until the prefill rate is measured, the requests are admitted, and
+    # their prompt tokens leave the backlog when they finish.
+    controller = AdmissionController(default_ttft_slo_ms=500)
+    for request_id in ["a", "b", "c"]:
+        assert controller.admit(request_id, 1000) is None
+    assert controller.backlog_tokens == 3000
+    for request_id in ["a", "b", "c"]:
+        controller.release(request_id)
+    assert controller.backlog_tokens == 0
+
+    # The backlog drains in the order the requests were admitted, and a
+    # finished request only removes its tokens that are not drained yet.
+    controller = AdmissionController()
+    calibrate(controller, clock)
+    assert controller.backlog_tokens == 0
+    assert controller.admit("a", 1000) is None
+    assert controller.admit("b", 1000) is None
+    clock.now += 1.5
+    assert controller.backlog_tokens == pytest.approx(500)
+    controller.release("a")
+    assert controller.backlog_tokens == pytest.approx(500)
+    controller.release("b")
+    assert controller.backlog_tokens == 0
+
+
+@pytest.mark.parametrize("priority_scheduling", [True, False])
+def test_admission_low_priority(clock: FakeClock, priority_scheduling: bool):
+    controller = AdmissionController(default_ttft_slo_ms=1000,
+                                     priority_scheduling=priority_scheduling)
+    calibrate(controller, clock)
+    assert controller.admit("low", 400, priority=1) is None
+    # Low priority requests must fit within half of their SLO.
+    assert controller.admit("low2", 200, priority=1) == "ttft_slo"
+    # High priority requests are not delayed by low priority ones when the
+    # engine schedules requests by priority.
+    expected_ttft = 0.1 if priority_scheduling else 0.5
+    assert controller.estimate_ttft(100) == pytest.approx(expected_ttft)
+    assert controller.admit("high", 500) is None
+    assert controller.admit("low3", 10, priority=1) == "ttft_slo"
+
+    # The requests with a priority above 0 are shed when the KV cache is
+    # nearly full.
+    clock.now += 10
+    assert controller.admit("low4", 10, priority=1) is None
+    controller.kv_cache_usage = 0.95
+    assert controller.admit("low5", 10, priority=1) == "kv_cache_full"
+    assert controller.admit("high2", 10) is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("stream", [True, False])
+async def test_admission_track(clock: FakeClock, stream: bool):
+    controller = AdmissionController(default_ttft_slo_ms=500)
+
+    async def generate():
+        if stream:
+            clock.now += 0.5
+            yield make_output(finished=False)
+            clock.now += 1.0
+            yield make_output(finished=True)
+        else:
+            clock.now += 1.5
+            output = make_output(finished=True)
+            output.metrics = SimpleNamespace(arrival_time=10.0,
+                                             first_token_time=10.5)
+            yield output
+
+    assert controller.admit("request", 1000) is None
+    outputs = [res async for res in controller.track("request", generate())]
+    assert len(outputs) == (2 if stream else 1)
+    # The TTFT is measured from the first output, or from the metrics of
+    # the output of a request that is not streamed.
+    assert controller.prefill_rate == pytest.approx(2000)
+    assert "request" not in controller._requests
+
+    # The prefill rate is not updated from a request that is not streamed
+    # when the engine does not report its first token time, as V1 does.
+    async def generate_without_metrics():
+        clock.now += 10.0
+        yield make_output(finished=True)
+
+    assert controller.admit("no_metrics", 1000) is None
+    outputs = [
+        res async for res in controller.track("no_metrics",
+                                              generate_without_metrics())
+    ]
+    assert len(outputs) == 1
+    assert controller.prefill_rate == pytest.approx(2000)
+    assert "no_metrics" not in controller._requests
+
+    # Requests are released when their generator is dropped.
+    assert controller.admit("dropped", 10) is None
+    generator = controller.track("dropped", generate())
+    del generator
+    assert "dropped" not in controller._requests
+
+    # And when they are aborted.
+    async def wait_forever():
+        await asyncio.Event().wait()
+        yield make_output(finished=True)
+
+    assert controller.admit("aborted", 10) is None
+    generator = controller.track("aborted", wait_forever())
+    task = asyncio.create_task(generator.__anext__())
+    await asyncio.sleep(0)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    await generator.aclose()
+    assert "aborted" not in controller._requests
@@ -1,8 +1,19 @@
+import asyncio
+import json
+import random
 import subprocess
 import sys
 import tempfile
+from typing import List
 
-from vllm.entrypoints.openai.protocol import BatchRequestOutput
+import pytest
+
+from vllm.entrypoints.openai.protocol import (BatchRequestInput,
+                                              BatchRequestOutput,
+                                              EmbeddingRequest,
+                                              EmbeddingResponse,
+                                              EmbeddingResponseData, UsageInfo)
+from vllm.entrypoints.openai.run_batch import run_batch_file
 
 # ruff: noqa: E501
 INPUT_BATCH = """{"custom_id": "request-1", "method": "POST", "url": "/v1/chat/completions", "body": {"model": "NousResearch/Meta-Llama-3-8B-Instruct", "messages": [{"role": "system", "content": "You are a helpful assistant."},{"role": "user", "content": "Hello world!"}],"max_tokens": 1000}}
@@ -102,3 +113,135 @@ def test_embeddings():
             # Ensure that the output format conforms to the openai api.
             # Validation should throw if the schema is wrong.
             BatchRequestOutput.model_validate_json(line)
+
+
+class FakeEmbeddingHandler:
+    """Returns the index of the input as embedding after a random delay and
+    records the maximum number of concurrent requests."""
+
+    def __init__(self):
+        self.num_running = 0
+        self.max_running = 0
+        self.num_requests = 0
+        self.inputs: List[str] = []
+
+    async def __call__(self, request: EmbeddingRequest) -> EmbeddingResponse:
+        self.num_running += 1
+        self.num_requests += 1
+        self.inputs.append(request.input)
+        self.max_running = max(self.max_running, self.num_running)
+        await asyncio.sleep(random.uniform(0, 0.01))
+        self.num_running -= 1
+        return EmbeddingResponse(model=request.model,
+                                 data=[
+                                     EmbeddingResponseData(
+                                         index=0,
+                                         embedding=[float(request.input)])
+                                 ],
+                                 usage=UsageInfo())
+
+
+def write_embedding_batch(path: str, num_requests: int) -> None:
+    with open(path, "w") as f:
+        for i in range(num_requests):
+            url = "/bad_url" if i % 10 == 3 else "/v1/embeddings"
+            print(json.dumps({
+                "custom_id": f"request-{i}",
+                "method": "POST",
+                "url": url,
+                "body": {
+                    "model": "model",
+                    "input": str(i)
+                }
+            }),
+                  file=f)
+            if i % 7 == 0:
+                print("", file=f)
+
+
+def read_outputs(path: str):
+    with open(path) as f:
+        return [BatchRequestOutput.model_validate_json(line) for line in f]
+
+
+def run_fake_batch(input_path: str, output_path: str, **kwargs):
+    handler = FakeEmbeddingHandler()
+    handlers = {
+        "/v1/embeddings": (handler, "unsupported"),
+        "/v1/chat/completions": (None, "unsupported"),
+    }
+    asyncio.run(
+        run_batch_file(input_path,
+                       output_path,
+                       handlers,
+                       max_concurrent_requests=8,
+                       **kwargs))
+    return handler
+
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_streaming_batch(tmp_path, ordered: bool):
+    input_path = str(tmp_path / "input.jsonl")
+    output_path = str(tmp_path / "output.jsonl")
+    write_embedding_batch(input_path, 100)
+
+    handler = run_fake_batch(input_path, output_path, ordered=ordered)
+
+    assert 1 < handler.max_running <= 8
+    outputs = read_outputs(output_path)
+    custom_ids = [output.custom_id for output in outputs]
+    expected_ids = [f"request-{i}" for i in range(100)]
+    if ordered:
+        assert custom_ids == expected_ids
+    else:
+        assert sorted(custom_ids) == sorted(expected_ids)
+    for output in outputs:
+        i = int(output.custom_id.split("-")[1])
+        if i % 10 == 3:
+            assert output.response.status_code == 400
+        else:
+            assert output.response.body.data[0].embedding == [float(i)]
+
+
+def test_resume_batch(tmp_path):
+    input_path = str(tmp_path / "input.jsonl")
+    output_path = str(tmp_path / "output.jsonl")
+    write_embedding_batch(input_path, 50)
+    run_fake_batch(input_path, output_path)
+    with open(output_path) as f:
+        lines = f.readlines()
+
+    # Interrupted after 20 outputs, while writing the 21st.
+    with open(output_path, "w") as f:
+        f.writelines(lines[:20])
+        f.write(lines[20][:10])
+
+    handler = run_fake_batch(input_path, output_path, resume=True)
+    assert handler.num_requests == len(
+        [i for i in range(20, 50) if i % 10 != 3])
+    outputs = read_outputs(output_path)
+    assert [output.custom_id
+            for output in outputs] == [f"request-{i}" for i in range(50)]
+
+
+def test_ordered_requests_batch(tmp_path):
+    input_path = str(tmp_path / "input.jsonl")
+    output_path = str(tmp_path / "output.jsonl")
+    write_embedding_batch(input_path, 100)
+
+    def reverse_requests(requests: List[BatchRequestInput]) -> List[int]:
+        return list(reversed(range(len(requests))))
+
+    handler = run_fake_batch(input_path,
+                             output_path,
+                             order_requests_fn=reverse_requests)
+
+    # The requests are reversed within windows of 8 requests.
+    expected_inputs = [
+        str(i) for start in range(0, 100, 8)
+        for i in reversed(range(start, min(start + 8, 100))) if i % 10 != 3
+    ]
+    assert handler.inputs == expected_inputs
+    outputs = read_outputs(output_path)
+    assert [output.custom_id
+            for output in outputs] == [f"request-{i}" for i in range(100)]
@@ -1,11 +1,14 @@
 import asyncio
 from contextlib import suppress
 from dataclasses import dataclass
+from http import HTTPStatus
 from unittest.mock import MagicMock
 
 from vllm.config import MultiModalConfig
 from vllm.engine.multiprocessing.client import MQLLMEngineClient
-from vllm.entrypoints.openai.protocol import ChatCompletionRequest
+from vllm.entrypoints.openai.admission import AdmissionController
+from vllm.entrypoints.openai.protocol import (ChatCompletionRequest,
+                                              ErrorResponse)
 from vllm.entrypoints.openai.serving_chat import OpenAIServingChat
 from vllm.entrypoints.openai.serving_engine import BaseModelPath
 from vllm.transformers_utils.tokenizer import get_tokenizer
@@ -94,3 +97,45 @@ def test_serving_chat_should_set_correct_max_tokens():
         asyncio.run(serving_chat.create_chat_completion(req))
 
     assert mock_engine.generate.call_args.args[1].max_tokens == 10
+
+
+def test_serving_chat_admission_control():
+    mock_engine = MagicMock(spec=MQLLMEngineClient)
+    mock_engine.get_tokenizer.return_value = get_tokenizer(MODEL_NAME)
+    mock_engine.errored = False
+
+    admission_controller = AdmissionController()
+    serving_chat = OpenAIServingChat(mock_engine,
+                                     MockModelConfig(),
+                                     BASE_MODEL_PATHS,
+                                     response_role="assistant",
+                                     chat_template=CHAT_TEMPLATE,
+                                     chat_template_content_format="auto",
+                                     lora_modules=None,
+                                     prompt_adapters=None,
+                                     request_logger=None,
+                                     admission_controller=admission_controller)
+    # The engine has prefilled 100 tokens per second so far.
+    admission_controller.admit("earlier", 100)
+    admission_controller.record_ttft("earlier", 1.0)
+    admission_controller.release("earlier")
+
+    req = ChatCompletionRequest(
+        model=MODEL_NAME,
+        messages=[{
+            "role": "user",
+            "content": "what is 1+1?"
+        }],
+        ttft_slo_ms=1,
+    )
+    response = asyncio.run(serving_chat.create_chat_completion(req))
+    assert isinstance(response, ErrorResponse)
+    assert response.code == HTTPStatus.TOO_MANY_REQUESTS
+    mock_engine.generate.assert_not_called()
+    assert admission_controller.num_rejected == 1
+
+    req.ttft_slo_ms = None
+    with suppress(Exception):
+        asyncio.run(serving_chat.create_chat_completion(req))
+    mock_engine.generate.assert_called_once()
+    assert admission_controller.num_admitted == 2
@@ -0,0 +1,170 @@
+import asyncio
+import base64
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import List, Optional
+
+import numpy as np
+import torch
+
+from vllm.config import PoolerConfig
+from vllm.entrypoints.openai.protocol import (EmbeddingCompletionRequest,
+                                              EmbeddingResponse)
+from vllm.entrypoints.openai.serving_embedding import (EmbeddingCache,
+                                                       OpenAIServingEmbedding,
+                                                       _get_embedding)
+from vllm.entrypoints.openai.serving_engine import BaseModelPath
+from vllm.outputs import PoolingOutput, PoolingRequestOutput
+
+MODEL_NAME = "embedding-model"
+BASE_MODEL_PATHS = [BaseModelPath(name=MODEL_NAME, model_path=MODEL_NAME)]
+HIDDEN_SIZE = 8
+
+
+@dataclass
+class MockModelConfig:
+    model = MODEL_NAME
+    task = "embed"
+    max_model_len = 100
+    pooler_config = PoolerConfig(pooling_type="MEAN")
+
+
+class MockTokenizer:
+
+    def __call__(self, text: str, **kwargs):
+        return SimpleNamespace(input_ids=self.encode(text))
+
+    def encode(self, text: str, **kwargs) -> List[int]:
+        return [int(word) for word in text.split()]
+
+    def decode(self, token_ids: List[int], **kwargs) -> str:
+        return " ".join(map(str, token_ids))
+
+
+def embed(token_ids: List[int]) -> torch.Tensor:
+    return torch.full((HIDDEN_SIZE, ), sum(token_ids) / 3)
+
+
+class MockEngine:
+    """Returns an embedding computed from the prompt token ids."""
+
+    def __init__(self):
+        self.prompts: List[List[int]] = []
+        self.errored = False
+
+    async def get_tokenizer(self, lora_request=None):
+        return MockTokenizer()
+
+    async def encode(self, prompt, pooling_params, request_id, **kwargs):
+        token_ids = prompt["prompt_token_ids"]
+        self.prompts.append(token_ids)
+        await asyncio.sleep(0)
+        yield PoolingRequestOutput(request_id,
+                                   PoolingOutput(embed(token_ids)),
+                                   token_ids,
+                                   finished=True)
+
+
+def make_serving(cache_bytes: int):
+    engine = MockEngine()
+    serving = OpenAIServingEmbedding(engine,
+                                     MockModelConfig(),
+                                     BASE_MODEL_PATHS,
+                                     request_logger=None,
+                                     chat_template=None,
+                                     chat_template_content_format="auto",
+                                     embedding_cache_bytes=cache_bytes)
+    return engine, serving
+
+
+def create_embedding(serving: OpenAIServingEmbedding,
+                     inputs: List[str],
+                     encoding_format: str = "float") -> EmbeddingResponse:
+    request = EmbeddingCompletionRequest(model=MODEL_NAME,
+                                         input=inputs,
+                                         encoding_format=encoding_format)
+    response = asyncio.run(serving.create_embedding(request))
+    assert isinstance(response, EmbeddingResponse)
+    return response
+
+
+def check_embeddings(response: EmbeddingResponse, inputs: List[str]):
+    assert [data.embedding for data in response.data] == [
+        embed(MockTokenizer().encode(text)).tolist() for text in inputs
+    ]
+    assert response.usage.prompt_tokens == sum(
+        len(text.split()) for text in inputs)
+
+
+def test_embedding_cache():
+    engine, serving = make_serving(cache_bytes=1 << 20)
+
+    inputs = ["1 2 3", "4 5", "1 2 3", "6"]
+    check_embeddings(create_embedding(serving, inputs), inputs)
+    # The repeated prompt runs once.
+    assert engine.prompts == [[1, 2, 3], [4, 5], [6]]
+
+    inputs = ["6", "7 8", "4 5"]
+    check_embeddings(create_embedding(serving, inputs), inputs)
+    assert engine.prompts[3:] == [[7, 8]]
+    assert serving.embedding_cache is not None
+    assert len(serving.embedding_cache) == 4
+
+
+def test_embedding_cache_disabled():
+    engine, serving = make_serving(cache_bytes=0)
+    inputs = ["1 2 3", "1 2 3"]
+    check_embeddings(create_embedding(serving, inputs), inputs)
+    check_embeddings(create_embedding(serving, inputs), inputs)
+    assert len(engine.prompts) == 4
+    assert serving.embedding_cache is None
+
+
+def test_embedding_cache_eviction():
+    entry_bytes = HIDDEN_SIZE * 4
+    cache = EmbeddingCache(max_bytes=2 * entry_bytes)
+    keys = [EmbeddingCache.make_key(MODEL_NAME, "", [i]) for i in range(3)]
+    cache.put(keys[0], embed([0]))
+    cache.put(keys[1], embed([1]))
+    assert cache.get(keys[0]) is not None
+    cache.put(keys[2], embed([2]))
+    # The least recently used output is evicted.
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[2]) is not None
+    assert cache.num_bytes == 2 * entry_bytes
+    assert cache.hit_rate == 3 / 4
+
+    # Outputs larger than the cache are not cached.
+    cache.put(EmbeddingCache.make_key(MODEL_NAME, "", [3]),
+              torch.zeros(3 * HIDDEN_SIZE))
+    assert len(cache) == 2
+
+    assert EmbeddingCache.make_key(MODEL_NAME, "",
+                                   [1, 2]) != (EmbeddingCache.make_key(
+                                       MODEL_NAME, "", [1, 3]))
+    assert EmbeddingCache.make_key(MODEL_NAME, "",
+                                   [1]) != (EmbeddingCache.make_key(
+                                       "other-model", "", [1]))
+    assert EmbeddingCache.make_key(MODEL_NAME, "",
+                                   [1]) != (EmbeddingCache.make_key(
+                                       MODEL_NAME, "normalize", [1]))
+
+
+def test_base64_embedding():
+    for dtype in [torch.float32, torch.float16, torch.bfloat16]:
+        pooled_data = torch.randn(HIDDEN_SIZE, dtype=dtype)
+        embedding: Optional[str] = _get_embedding(
+            pooled_data, "base64")  # type: ignore[assignment]
+        # Same as encoding the list of floats.
+        assert embedding == base64.b64encode(
+            np.array(pooled_data.tolist(),
+                     dtype="float32").tobytes()).decode("utf-8")
+
+    _, serving = make_serving(cache_bytes=1 << 20)
+    inputs = ["1 2 3", "4 5"]
+    response = create_embedding(serving, inputs, encoding_format="base64")
+    for data, text in zip(response.data, inputs):
+        assert np.frombuffer(base64.b64decode(data.embedding),
+                             dtype="float32").tolist() == embed(
+                                 MockTokenizer().encode(text)).tolist()
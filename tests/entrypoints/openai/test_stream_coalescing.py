@@ -0,0 +1,152 @@
+import asyncio
+from typing import List, Optional
+
+import pytest
+
+from vllm.entrypoints.openai.stream_coalescing import (
+    StreamFlushPolicy, coalesce_request_outputs, merge_request_outputs)
+from vllm.outputs import CompletionOutput, RequestOutput
+
+
+def make_output(token_id: int,
+                index: int = 0,
+                finish_reason: Optional[str] = None) -> RequestOutput:
+    return RequestOutput(request_id="request",
+                         prompt=None,
+                         prompt_token_ids=[1, 2, 3],
+                         prompt_logprobs=None,
+                         outputs=[
+                             CompletionOutput(index=index,
+                                              text=f" {token_id}",
+                                              token_ids=[token_id],
+                                              cumulative_logprob=None,
+                                              logprobs=None,
+                                              finish_reason=finish_reason)
+                         ],
+                         finished=finish_reason is not None)
+
+
+async def generate(num_tokens: int, interval: float = 0.0):
+    for i in range(num_tokens):
+        await asyncio.sleep(interval)
+        last = i == num_tokens - 1
+        yield make_output(i, finish_reason="length" if last else None)
+
+
+async def collect(policy: StreamFlushPolicy,
+                  num_tokens: int,
+                  interval: float = 0.0,
+                  write_time: float = 0.0) -> List[List[int]]:
+    flushes = []
+    async for res in coalesce_request_outputs(generate(num_tokens, interval),
+                                              policy):
+        flushes.append(list(res.outputs[0].token_ids))
+        await asyncio.sleep(write_time)
+    return flushes
+
+
+def test_merge_request_outputs():
+    outputs = [
+        make_output(0, index=0),
+        make_output(1, index=1),
+        make_output(2, index=0, finish_reason="stop"),
+        make_output(3, index=1),
+    ]
+    merged = merge_request_outputs(outputs)
+    assert merged.prompt_token_ids == [1, 2, 3]
+    assert [output.index for output in merged.outputs] == [0, 1]
+    assert merged.outputs[0].text == " 0 2"
+    assert merged.outputs[0].token_ids == [0, 2]
+    assert merged.outputs[0].finish_reason == "stop"
+    assert merged.outputs[1].text == " 1 3"
+    assert merged.outputs[1].token_ids == [1, 3]
+    assert merged.outputs[1].finish_reason is None
+    # The merged outputs are not modified.
+    assert outputs[0].outputs[0].token_ids == [0]
+
+
+def test_flush_policy_validation():
+    assert not StreamFlushPolicy().coalesces
+    assert not StreamFlushPolicy(max_tokens=1).coalesces
+    assert StreamFlushPolicy(max_tokens=4, max_delay_ms=10).coalesces
+    with pytest.raises(ValueError):
+        StreamFlushPolicy(max_tokens=0)
+    with pytest.raises(ValueError):
+        StreamFlushPolicy(max_delay_ms=0)
+    with pytest.raises(ValueError):
+        StreamFlushPolicy(max_tokens=4, when_writable=True)
+
+
+@pytest.mark.asyncio
+async def test_flush_after_tokens():
+    flushes = await collect(StreamFlushPolicy(max_tokens=4), num_tokens=10)
+    # The first output is flushed right away and the last one ends the
+    # stream.
+    assert flushes == [[0], [1, 2, 3, 4], [5, 6, 7, 8], [9]]
+
+
+@pytest.mark.asyncio
+async def test_flush_after_delay():
+    flushes = await collect(StreamFlushPolicy(max_delay_ms=50),
+                            num_tokens=12,
+                            interval=0.02)
+    assert [token_id for flush in flushes
+            for token_id in flush] == list(range(12))
+    assert flushes[0] == [0]
+    # About two or three outputs are produced during each delay.
+    assert 3 <= len(flushes) <= 8
+
+
+@pytest.mark.asyncio
+async def test_flush_when_writable():
+    policy = StreamFlushPolicy(when_writable=True)
+    # A client that keeps up gets every output.
+    flushes = await collect(policy, num_tokens=5, interval=0.01)
+    assert flushes == [[i] for i in range(5)]
+
+    # The outputs are merged while a slow client writes.
+    flushes = await collect(policy,
+                            num_tokens=10,
+                            interval=0.01,
+                            write_time=0.035)
+    assert [token_id for flush in flushes
+            for token_id in flush] == list(range(10))
+    assert len(flushes) < 6
+
+
+@pytest.mark.asyncio
+async def test_error_after_buffered_outputs():
+
+    async def fail():
+        yield make_output(0)
+        yield make_output(1)
+        raise RuntimeError("engine dead")
+
+    results = []
+    with pytest.raises(RuntimeError, match="engine dead"):
+        async for res in coalesce_request_outputs(
+                fail(), StreamFlushPolicy(max_tokens=8)):
+            results.append(list(res.outputs[0].token_ids))
+    assert [token_id for flush in results for token_id in flush] == [0, 1]
+
+
+@pytest.mark.asyncio
+async def test_close_cancels_read_ahead():
+    cancelled = asyncio.Event()
+
+    async def endless():
+        try:
+            i = 0
+            while True:
+                yield make_output(i)
+                i += 1
+                await asyncio.sleep(0.001)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    stream = coalesce_request_outputs(endless(),
+                                      StreamFlushPolicy(max_tokens=2))
+    await stream.__anext__()
+    await stream.aclose()
+    await asyncio.wait_for(cancelled.wait(), timeout=1)
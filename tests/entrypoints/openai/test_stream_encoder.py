@@ -0,0 +1,107 @@
+import random
+from typing import Optional, Union
+
+import pytest
+
+from vllm.entrypoints.openai.protocol import (
+    ChatCompletionResponseStreamChoice, ChatCompletionStreamResponse,
+    CompletionResponseStreamChoice, CompletionStreamResponse, DeltaMessage,
+    UsageInfo)
+from vllm.entrypoints.openai.stream_encoder import (
+    ChatCompletionStreamEncoder, CompletionStreamEncoder)
+
+REQUEST_ID = "cmpl-\"id\"\\"
+MODEL_NAME = "org/model-é"
+CREATED = 1700000000
+
+TEXTS = [
+    "", "Hello", " world", "\n", "\"quoted\" \\ back\\slash", "tab\tcr\r",
+    "\x00\x01\x1f\x7f", "é ü 中文 😀", "\u2028\u2029", "</script>"
+]
+
+
+def random_text(rng: random.Random) -> str:
+    alphabet = [chr(c) for c in range(0, 0x80)] + ["é", "中", "😀", "\u2028"]
+    return "".join(rng.choices(alphabet, k=rng.randint(0, 8)))
+
+
+FINISHES = [(None, None), ("stop", None), ("stop", "</s>"), ("stop", 2),
+            ("length", None), ("abort", None)]
+
+
+@pytest.mark.parametrize("finish_reason,stop_reason", FINISHES)
+@pytest.mark.parametrize("with_usage", [False, True])
+def test_chat_completion_stream_encoder(finish_reason: Optional[str],
+                                        stop_reason: Optional[Union[int, str]],
+                                        with_usage: bool):
+    rng = random.Random(0)
+    encoder = ChatCompletionStreamEncoder(REQUEST_ID, CREATED, MODEL_NAME)
+    for index, text in enumerate(TEXTS +
+                                 [random_text(rng) for _ in range(100)]):
+        if finish_reason is None:
+            choice = ChatCompletionResponseStreamChoice(
+                index=index,
+                delta=DeltaMessage(content=text),
+                logprobs=None,
+                finish_reason=None)
+        else:
+            choice = ChatCompletionResponseStreamChoice(
+                index=index,
+                delta=DeltaMessage(content=text),
+                logprobs=None,
+                finish_reason=finish_reason,
+                stop_reason=stop_reason)
+        chunk = ChatCompletionStreamResponse(id=REQUEST_ID,
+                                             object="chat.completion.chunk",
+                                             created=CREATED,
+                                             choices=[choice],
+                                             model=MODEL_NAME)
+        usage = None
+        if with_usage:
+            usage = (index + 3, index)
+            chunk.usage = UsageInfo(prompt_tokens=index + 3,
+                                    completion_tokens=index,
+                                    total_tokens=2 * index + 3)
+        expected = f"data: {chunk.model_dump_json(exclude_unset=True)}\n\n"
+
+        assert encoder.encode_content_delta(index,
+                                            text,
+                                            finish_reason=finish_reason,
+                                            stop_reason=stop_reason,
+                                            usage=usage) == expected
+
+
+@pytest.mark.parametrize("finish_reason,stop_reason", FINISHES)
+@pytest.mark.parametrize("with_usage", [False, True])
+def test_completion_stream_encoder(finish_reason: Optional[str],
+                                   stop_reason: Optional[Union[int, str]],
+                                   with_usage: bool):
+    rng = random.Random(0)
+    encoder = CompletionStreamEncoder(REQUEST_ID, CREATED, MODEL_NAME)
+    for index, text in enumerate(TEXTS +
+                                 [random_text(rng) for _ in range(100)]):
+        chunk = CompletionStreamResponse(id=REQUEST_ID,
+                                         created=CREATED,
+                                         model=MODEL_NAME,
+                                         choices=[
+                                             CompletionResponseStreamChoice(
+                                                 index=index,
+                                                 text=text,
+                                                 logprobs=None,
+                                                 finish_reason=finish_reason,
+                                                 stop_reason=stop_reason,
+                                             )
+                                         ])
+        usage = None
+        if with_usage:
+            usage = (index + 3, index)
+            chunk.usage = UsageInfo(prompt_tokens=index + 3,
+                                    completion_tokens=index,
+                                    total_tokens=2 * index + 3)
+        expected = f"data: {chunk.model_dump_json(exclude_unset=False)}\n\n"
+
+        assert encoder.encode_text_delta(index,
+                                         text,
+                                         finish_reason=finish_reason,
+                                         stop_reason=stop_reason,
+                                         usage=usage) == expected
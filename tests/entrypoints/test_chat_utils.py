@@ -3,10 +3,13 @@ from typing import Optional
 
 import pytest
 from PIL import Image
+from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+from transformers import PreTrainedTokenizerFast
 
 from vllm.assets.image import ImageAsset
 from vllm.config import ModelConfig
-from vllm.entrypoints.chat_utils import (_try_extract_ast, load_chat_template,
+from vllm.entrypoints.chat_utils import (ChatPromptCache, _try_extract_ast,
+                                         load_chat_template,
                                          parse_chat_messages,
                                          parse_chat_messages_futures,
                                          resolve_chat_template_content_format)
@@ -797,3 +800,155 @@ def test_resolve_content_format_examples(template_path, expected_format):
     )
 
     assert resolved_format == expected_format
+
+
+def _train_chat_tokenizer(pre_tokenizer, decoder) -> PreTrainedTokenizerFast:
+    words = [
+        "the", "tool", "weather", "in", "paris", "is", "sunny", "call",
+        "function", "with", "arguments", "and", "return", "json", "hello"
+    ]
+    corpus = [
+        " ".join(words[(i * 7 + j) % len(words)] for j in range(12))
+        for i in range(200)
+    ]
+    tokenizer = Tokenizer(models.BPE())
+    tokenizer.pre_tokenizer = pre_tokenizer
+    tokenizer.decoder = decoder
+    tokenizer.train_from_iterator(
+        corpus,
+        trainers.BpeTrainer(
+            vocab_size=300,
+            special_tokens=["<|im_start|>", "<|im_end|>", "<|endoftext|>"],
+            initial_alphabet=pre_tokenizers.ByteLevel.alphabet()))
+    hf_tokenizer = PreTrainedTokenizerFast(tokenizer_object=tokenizer,
+                                           eos_token="<|im_end|>",
+                                           pad_token="<|endoftext|>")
+    hf_tokenizer.chat_template = load_chat_template(
+        EXAMPLES_DIR / "tool_chat_template_hermes.jinja")
+    return hf_tokenizer
+
+
+CHAT_TOOLS = [{
+    "type": "function",
+    "function": {
+        "name": "get_weather",
+        "description": "Return the weather in a city.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "city": {
+                    "type": "string"
+                }
+            },
+        },
+    },
+}]
+
+
+def _chat_turns(num_turns: int):
+    messages = [{"role": "system", "content": "You call the tools."}]
+    for i in range(num_turns):
+        messages.append({
+            "role": "user",
+            "content": f"What is the weather in paris {i}?"
+        })
+        yield list(messages)
+        messages.append({
+            "role": "assistant",
+            "content": f"The weather in paris is sunny {i}.\n\n"
+        })
+
+
+# yapf: disable
+@pytest.mark.parametrize(
+    ("pre_tokenizer", "decoder", "num_prefix_hits"),
+    [(pre_tokenizers.ByteLevel(add_prefix_space=False), decoders.ByteLevel(),
+      3),
+     (pre_tokenizers.Metaspace(prepend_scheme="always"), decoders.Metaspace(),
+      3),
+     # The text after the special tokens would be tokenized with a prefix
+     # space, so it is not tokenized separately.
+     (pre_tokenizers.Metaspace(prepend_scheme="first"), decoders.Metaspace(),
+      0)],
+)
+# yapf: enable
+def test_chat_prompt_cache(pre_tokenizer, decoder, num_prefix_hits):
+    tokenizer = _train_chat_tokenizer(pre_tokenizer, decoder)
+    cache = ChatPromptCache(max_bytes=1 << 20)
+    chat_template_kwargs = dict(chat_template=None,
+                                add_generation_prompt=True,
+                                tools=CHAT_TOOLS)
+
+    for num_turns, messages in enumerate(_chat_turns(4), start=1):
+        for _ in range(2):
+            lookup = cache.lookup(tokenizer, messages, chat_template_kwargs)
+            prompt = apply_hf_chat_template(tokenizer,
+                                            conversation=messages,
+                                            **chat_template_kwargs)
+            assert lookup.prompt in (None, prompt)
+            token_ids = cache.tokenize(tokenizer, lookup, prompt)
+            assert token_ids == tokenizer(prompt,
+                                          add_special_tokens=False).input_ids
+
+    # The second lookup of each conversation is a hit.
+    assert cache.num_queries == 8
+    assert cache.num_hits == 4
+    # Each turn after the first extends the prompt of the previous one.
+    assert cache.num_prefix_hits == num_prefix_hits
+
+
+def test_chat_prompt_cache_key():
+    tokenizer = _train_chat_tokenizer(
+        pre_tokenizers.ByteLevel(add_prefix_space=False), decoders.ByteLevel())
+    cache = ChatPromptCache(max_bytes=1 << 20)
+    messages = next(_chat_turns(1))
+
+    def lookup(**kwargs):
+        chat_template_kwargs = dict(chat_template=None,
+                                    add_generation_prompt=True,
+                                    tools=CHAT_TOOLS)
+        chat_template_kwargs.update(kwargs)
+        lookup = cache.lookup(tokenizer, messages, chat_template_kwargs)
+        prompt = apply_hf_chat_template(tokenizer,
+                                        conversation=messages,
+                                        **chat_template_kwargs)
+        cache.tokenize(tokenizer, lookup, prompt)
+        return lookup.prompt
+
+    assert lookup() is None
+    assert lookup() is not None
+    assert lookup(tools=None) is None
+    assert lookup(add_generation_prompt=False) is None
+    assert lookup(
+        chat_template=load_chat_template(EXAMPLES_DIR /
+                                         "template_chatml.jinja")) is None
+
+    # The least recently used prompts are evicted.
+    cache = ChatPromptCache(max_bytes=1)
+    assert lookup() is None
+    assert lookup() is None
+    assert len(cache) == 0
+
+
+def test_chat_prompt_cache_time_dependent_template():
+    tokenizer = _train_chat_tokenizer(
+        pre_tokenizers.ByteLevel(add_prefix_space=False), decoders.ByteLevel())
+    tokenizer.chat_template = (
+        "<|im_start|>system\nToday is {{ strftime_now('%d %b %Y') }}."
+        "<|im_end|>\n" + tokenizer.chat_template)
+    cache = ChatPromptCache(max_bytes=1 << 20)
+    messages = next(_chat_turns(1))
+    chat_template_kwargs = dict(chat_template=None, add_generation_prompt=True)
+
+    for _ in range(2):
+        lookup = cache.lookup(tokenizer, messages, chat_template_kwargs)
+        # The prompt may render another date, so it is rendered every time.
+        assert lookup.prompt is None
+        prompt = apply_hf_chat_template(tokenizer,
+                                        conversation=messages,
+                                        **chat_template_kwargs)
+        token_ids = cache.tokenize(tokenizer, lookup, prompt)
+        assert token_ids == tokenizer(prompt,
+                                      add_special_tokens=False).input_ids
+
+    assert cache.num_hits == 0
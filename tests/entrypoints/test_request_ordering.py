@@ -0,0 +1,96 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from vllm import LLM, SamplingParams
+from vllm.entrypoints.request_ordering import (get_prefix_hash_chain,
+                                               order_requests)
+from vllm.inputs import TextPrompt, TokensPrompt
+
+BLOCK_SIZE = 4
+
+
+def test_prefix_hash_chain():
+    chain = get_prefix_hash_chain(list(range(10)), BLOCK_SIZE)
+    assert len(chain) == 2
+    assert chain == get_prefix_hash_chain(list(range(8)), BLOCK_SIZE)
+    # A block hash depends on the blocks before it.
+    assert get_prefix_hash_chain([9, 9, 9, 9] + list(range(4, 8)),
+                                 BLOCK_SIZE)[1] != chain[1]
+    assert get_prefix_hash_chain(list(range(10)), BLOCK_SIZE,
+                                 extra_hash=1) != chain
+
+
+def test_order_requests_by_prefix():
+    system_a = [1] * 8
+    system_b = [2] * 8
+    prompts = [
+        system_a + [3] * 4,  # 0
+        system_b + [4] * 4,  # 1
+        system_a + [5] * 6,  # 2
+        [6] * 3,  # 3: no full block
+        system_b + [7] * 4,  # 4
+        system_a + [3] * 4 + [8] * 4,  # 5
+        None,  # 6: unknown tokens
+        system_a,  # 7
+    ]
+    order = order_requests("prefix", prompts, BLOCK_SIZE)
+
+    # The requests sharing system_a (the largest group) come first, then
+    # those sharing system_b. Within the system_a group, the requests under
+    # the block [3] * 4 come first, and the request ending at the system_a
+    # blocks after the requests continuing them.
+    assert order[:4] == [5, 0, 2, 7]
+    assert sorted(order[4:6]) == [1, 4]
+    # The requests without a full block or without tokens come last.
+    assert order[6:] == [3, 6]
+
+
+def test_order_requests_extra_hash():
+    prompts = [[1] * 8, [1] * 8, [1] * 8, [1] * 8]
+    order = order_requests("prefix",
+                           prompts,
+                           BLOCK_SIZE,
+                           extra_hashes=[None, 1, None, 1])
+    assert sorted(order[:2]) in ([0, 2], [1, 3])
+
+
+def test_order_requests_by_length():
+    prompts = [[1] * 3, None, [1] * 5, [2] * 3, [1] * 9]
+    assert order_requests("length", prompts, BLOCK_SIZE) == [4, 2, 0, 3, 1]
+    assert order_requests("input", prompts, BLOCK_SIZE) == [0, 1, 2, 3, 4]
+    with pytest.raises(ValueError):
+        order_requests("random", prompts, BLOCK_SIZE)  # type: ignore
+
+
+def test_llm_orders_tokenized_prompts():
+    """The text prompts tokenized for the ordering are added as token
+    prompts, so that they are not tokenized again."""
+    llm_engine = MagicMock()
+    llm_engine.cache_config.block_size = BLOCK_SIZE
+    llm_engine.get_tokenizer_group().encode.side_effect = (
+        lambda prompt, request_id, lora_request: [len(prompt)] * len(prompt))
+    llm = object.__new__(LLM)
+    llm.llm_engine = llm_engine
+    llm.request_counter = iter(range(100))
+    llm.request_ordering = "length"
+
+    prompts = [
+        "ab",
+        TextPrompt(prompt="abcdef", mm_processor_kwargs={"num_crops": 2}),
+        TokensPrompt(prompt_token_ids=[1, 2, 3, 4]),
+    ]
+    llm._validate_and_add_requests(prompts, SamplingParams(), None, None)
+
+    assert llm_engine.get_tokenizer_group().encode.call_count == 2
+    added = [(call.args[0], call.args[1])
+             for call in llm_engine.add_request.call_args_list]
+    # The request ids follow the order of the prompts.
+    assert added == [
+        ("1",
+         TokensPrompt(prompt_token_ids=[6] * 6,
+                      prompt="abcdef",
+                      mm_processor_kwargs={"num_crops": 2})),
+        ("2", prompts[2]),
+        ("0", TokensPrompt(prompt_token_ids=[2, 2], prompt="ab")),
+    ]
@@ -0,0 +1,132 @@
+import json
+import os
+
+import torch
+from safetensors.torch import save_file
+
+from vllm.lora.adapter_store import LoRAAdapterStore
+from vllm.lora.models import LoRAModel
+
+EXPECTED_LORA_MODULES = ["q_proj", "v_proj", "embed_tokens", "lm_head"]
+EMBEDDING_MODULES = {
+    "embed_tokens": "input_embeddings",
+    "lm_head": "output_embeddings",
+}
+EMBEDDING_PADDING_MODULES = ["lm_head"]
+
+
+def _write_adapter(lora_dir, seed: int, rank: int = 8, hidden: int = 64):
+    torch.manual_seed(seed)
+    os.makedirs(lora_dir, exist_ok=True)
+    tensors = {}
+    for layer in range(2):
+        for module in ("q_proj", "v_proj"):
+            prefix = f"base_model.model.model.layers.{layer}.self_attn.{module}"
+            tensors[f"{prefix}.lora_A.weight"] = torch.randn(rank, hidden)
+            tensors[f"{prefix}.lora_B.weight"] = torch.randn(hidden, rank)
+    tensors["base_model.model.lm_head.lora_A.weight"] = torch.randn(
+        rank, hidden)
+    tensors["base_model.model.lm_head.lora_B.weight"] = torch.randn(100, rank)
+    save_file(tensors, os.path.join(lora_dir, "adapter_model.safetensors"))
+    with open(os.path.join(lora_dir, "adapter_config.json"), "w") as f:
+        json.dump(
+            {
+                "r": rank,
+                "lora_alpha": 16,
+                "target_modules": ["q_proj", "v_proj", "lm_head"],
+            }, f)
+
+
+def _load(lora_dir: str, lora_model_id: int, **options) -> LoRAModel:
+    return LoRAModel.from_local_checkpoint(
+        lora_dir,
+        EXPECTED_LORA_MODULES,
+        lora_model_id=lora_model_id,
+        device="cpu",
+        embedding_modules=EMBEDDING_MODULES,
+        embedding_padding_modules=EMBEDDING_PADDING_MODULES,
+        **options)
+
+
+def _get(store: LoRAAdapterStore, lora_dir: str, lora_model_id: int,
+         **options) -> LoRAModel:
+    return store.get_or_load(lora_dir, lora_model_id,
+                             lambda: _load(lora_dir, lora_model_id, **options),
+                             **options)
+
+
+def _assert_equal(actual: LoRAModel, expected: LoRAModel):
+    assert actual.rank == expected.rank
+    assert actual.scaling_factor == expected.scaling_factor
+    assert actual.loras.keys() == expected.loras.keys()
+    for name, lora in expected.loras.items():
+        other = actual.loras[name]
+        assert other.scaling == lora.scaling
+        assert other.lora_a.shape == lora.lora_a.shape
+        assert torch.equal(other.lora_a, lora.lora_a)
+        assert torch.equal(other.lora_b, lora.lora_b)
+
+
+def test_adapter_store_hit(tmp_path):
+    lora_dir = str(tmp_path / "lora")
+    _write_adapter(lora_dir, seed=0)
+    store = LoRAAdapterStore(str(tmp_path / "store"), max_bytes=1 << 30)
+    options = dict(dtype=torch.bfloat16, target_embedding_padding=128)
+
+    expected = _load(lora_dir, 1, **options)
+    _assert_equal(_get(store, lora_dir, 1, **options), expected)
+    assert (store.num_hits, store.num_misses) == (0, 1)
+
+    # Another process, e.g. another tensor parallel worker, maps the
+    # stored adapter instead of loading it.
+    other_store = LoRAAdapterStore(store.store_dir, max_bytes=1 << 30)
+    lora = _get(other_store, lora_dir, 2, **options)
+    assert (other_store.num_hits, other_store.num_misses) == (1, 0)
+    assert lora.id == 2
+    _assert_equal(lora, expected)
+    assert lora.loras["lm_head"].lora_b.shape[1] == 128
+    assert lora.loras["lm_head"].lora_b.dtype == torch.bfloat16
+
+    # Other processing options are stored separately.
+    _get(other_store, lora_dir, 2, dtype=torch.float32)
+    assert other_store.num_misses == 1
+
+
+def test_adapter_store_invalidated_on_update(tmp_path):
+    lora_dir = str(tmp_path / "lora")
+    _write_adapter(lora_dir, seed=0)
+    store = LoRAAdapterStore(str(tmp_path / "store"), max_bytes=1 << 30)
+    _get(store, lora_dir, 1)
+
+    _write_adapter(lora_dir, seed=1)
+    stat = os.stat(os.path.join(lora_dir, "adapter_model.safetensors"))
+    os.utime(os.path.join(lora_dir, "adapter_model.safetensors"),
+             ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    lora = _get(store, lora_dir, 1)
+    assert store.num_misses == 2
+    _assert_equal(lora, _load(lora_dir, 1))
+
+
+def test_adapter_store_evicts_least_recently_used(tmp_path):
+    lora_dirs = [str(tmp_path / f"lora_{i}") for i in range(3)]
+    for i, lora_dir in enumerate(lora_dirs):
+        _write_adapter(lora_dir, seed=i)
+    store = LoRAAdapterStore(str(tmp_path / "store"), max_bytes=1 << 30)
+    _get(store, lora_dirs[0], 1)
+    entry_bytes = sum(
+        os.path.getsize(os.path.join(store.store_dir, name))
+        for name in os.listdir(store.store_dir) if name.endswith(".bin"))
+
+    # Room for two adapters.
+    store.max_bytes = 2 * entry_bytes
+    _get(store, lora_dirs[1], 2)
+    os.utime(store._paths(store.get_key(lora_dirs[0]))[0],
+             ns=(0, 1))  # Least recently used
+    lora = _get(store, lora_dirs[2], 3)
+    assert store.num_misses == 3
+    assert not os.path.exists(store._paths(store.get_key(lora_dirs[0]))[0])
+
+    _get(store, lora_dirs[1], 2)
+    assert store.num_hits == 1
+    # Evicted adapters stay usable by the processes that mapped them.
+    _assert_equal(lora, _load(lora_dirs[2], 3))
@@ -1,5 +1,6 @@
 import json
 import os
+import time
 from typing import Dict, List
 
 import pytest
@@ -539,6 +540,50 @@ def test_lru_cache_worker_adapter_manager(llama_2_7b_model_extra_embeddings,
             device)
 
 
+@pytest.mark.parametrize("device", CUDA_DEVICES)
+def test_lru_cache_worker_adapter_manager_prefetch(
+        llama_2_7b_model_extra_embeddings, sql_lora_files, device):
+    lora_config = LoRAConfig(max_lora_rank=8, max_cpu_loras=4, max_loras=2)
+    worker_adapter_manager = LRUCacheWorkerLoRAManager(
+        4, 2, llama_2_7b_model_extra_embeddings.unpadded_vocab_size -
+        lora_config.lora_extra_vocab_size, lora_config, device,
+        EMBEDDING_MODULES, EMBEDDING_PADDING_MODULES)
+    worker_adapter_manager.create_lora_manager(
+        llama_2_7b_model_extra_embeddings)
+
+    mapping = LoRAMapping([], [])
+    worker_adapter_manager.set_active_adapters(
+        [LoRARequest("1", 1, sql_lora_files)], mapping)
+    worker_adapter_manager.prefetch_adapters([
+        LoRARequest("2", 2, sql_lora_files),
+        LoRARequest("3", 3, sql_lora_files)
+    ])
+    while worker_adapter_manager.get_prefetch_stats().loading_lora_ids:
+        time.sleep(0.01)
+    assert worker_adapter_manager.list_adapters() == {1}
+
+    # The next batch adds the prefetched LoRAs to the CPU cache and
+    # activates them in the free GPU slots.
+    worker_adapter_manager.set_active_adapters(
+        [LoRARequest("1", 1, sql_lora_files)], mapping)
+    assert worker_adapter_manager.list_adapters() == {1, 2, 3}
+    assert worker_adapter_manager._adapter_manager.lora_index_to_id == [1, 2]
+    stats = worker_adapter_manager.get_prefetch_stats()
+    assert stats.num_prefetched == 2
+    assert stats.stall_time_avoided > 0
+    stall_time = stats.stall_time
+
+    # Prefetched LoRAs are not loaded again when batches use them.
+    worker_adapter_manager.set_active_adapters([
+        LoRARequest("2", 2, sql_lora_files),
+        LoRARequest("3", 3, sql_lora_files)
+    ], mapping)
+    assert set(
+        worker_adapter_manager._adapter_manager.lora_index_to_id) == {2, 3}
+    assert worker_adapter_manager.get_prefetch_stats().stall_time == (
+        stall_time)
+
+
 @pytest.mark.parametrize("device", CUDA_DEVICES)
 def test_worker_adapter_manager(llama_2_7b_model_extra_embeddings,
                                 sql_lora_files, device):
@@ -0,0 +1,124 @@
+import os
+
+import torch
+from torch import nn
+
+from vllm.model_executor.model_loader.engine_image import (
+    ImageManifest, is_engine_image, load_rank_image, save_rank_image,
+    set_module_attributes, set_module_tensors)
+from vllm.model_executor.parameter import ModelWeightParameter
+
+
+class _Model(nn.Module):
+
+    def __init__(self):
+        super().__init__()
+        self.embed = nn.Embedding(37, 19)
+        self.lm_head = nn.Linear(19, 37, bias=False)
+        # Tied weights are stored once.
+        self.lm_head.weight = self.embed.weight
+        self.norm = nn.Parameter(torch.randn(19).to(torch.bfloat16))
+        self.scale = nn.Parameter(torch.randn(()).half())
+        self.register_buffer("ids", torch.randint(0, 100, (5, 3)))
+        self.register_buffer("empty", torch.empty(0, 4))
+        # Derived by process_weights_after_loading, e.g. the KV cache scales.
+        self.lm_head._k_scale = 0.5
+
+
+def test_rank_image_round_trip(tmp_path):
+    torch.manual_seed(0)
+    model = _Model()
+    image_dir = str(tmp_path)
+    for tp_rank in range(2):
+        save_rank_image(model, image_dir, tp_rank=tp_rank, pp_rank=0)
+
+    manifest, tensors = load_rank_image(image_dir, tp_rank=1, pp_rank=0)
+    state_dict = model.state_dict()
+    assert set(tensors) == set(state_dict) - {"lm_head.weight"}
+    assert manifest.layout["lm_head.weight"].alias_of == "embed.weight"
+    for name, tensor in tensors.items():
+        assert tensor.dtype == state_dict[name].dtype
+        assert torch.equal(tensor, state_dict[name])
+        assert manifest.tensors[name].offset % 4096 == 0
+
+    # Scalar attributes of the modules are restored.
+    assert manifest.attributes["lm_head"] == {
+        "in_features": 19,
+        "out_features": 37,
+        "_k_scale": 0.5,
+    }
+    new_model = _Model()
+    set_module_attributes(new_model, manifest.attributes)
+    assert new_model.lm_head._k_scale == 0.5
+    # Tied weights stay tied.
+    set_module_tensors(new_model, manifest, tensors, torch.device("cpu"))
+    assert new_model.lm_head.weight is new_model.embed.weight
+    assert torch.equal(new_model.embed.weight, model.embed.weight)
+
+    # The tensors are private views of the file: writes stay in memory.
+    data_path = os.path.join(image_dir, manifest.data_file)
+    with open(data_path, "rb") as f:
+        data = f.read()
+    tensors["embed.weight"].zero_()
+    with open(data_path, "rb") as f:
+        assert f.read() == data
+
+
+def _process_weights(model: _Model) -> None:
+    """Mimics process_weights_after_loading of a quantization method."""
+    weight = model.lm_head.weight.data
+    scale = weight.abs().max() / 127
+    qweight = (weight / scale).to(torch.int8).t()
+    model.lm_head.weight = ModelWeightParameter(data=qweight,
+                                                input_dim=0,
+                                                output_dim=1,
+                                                weight_loader=None)
+    model.lm_head.weight_scale = nn.Parameter(scale, requires_grad=False)
+    model.lm_head.workspace = torch.zeros(8, dtype=torch.int32)
+    model.scale = None
+
+
+def test_rebuild_processed_tensors(tmp_path):
+    torch.manual_seed(0)
+    model = _Model()
+    _process_weights(model)
+    image_dir = str(tmp_path)
+    save_rank_image(model, image_dir, tp_rank=0, pp_rank=0)
+
+    # The tensors are rebuilt in the processed layout without processing
+    # the weights of the new model.
+    new_model = _Model()
+    manifest, tensors = load_rank_image(image_dir, tp_rank=0, pp_rank=0)
+    set_module_tensors(new_model, manifest, tensors, torch.device("cpu"))
+
+    weight = new_model.lm_head.weight
+    assert type(weight) is ModelWeightParameter
+    assert weight.input_dim == 0 and weight.output_dim == 1
+    assert not weight.requires_grad
+    assert torch.equal(weight, model.lm_head.weight)
+    assert new_model.embed.weight is not weight
+    assert torch.equal(new_model.embed.weight, model.embed.weight)
+    assert torch.equal(new_model.lm_head.weight_scale,
+                       model.lm_head.weight_scale)
+    assert "weight_scale" in dict(new_model.lm_head.named_parameters())
+    assert torch.equal(new_model.lm_head.workspace, model.lm_head.workspace)
+    assert new_model.scale is None
+    assert "scale" not in dict(new_model.named_parameters())
+    assert torch.equal(new_model.ids, model.ids)
+    # The parameters are views of the image.
+    data_ptr = weight.untyped_storage().data_ptr()
+    assert data_ptr == tensors["lm_head.weight"].untyped_storage().data_ptr()
+
+
+def test_image_manifest(tmp_path):
+    image_dir = str(tmp_path)
+    assert not is_engine_image(image_dir)
+    manifest = ImageManifest(tensor_parallel_size=2,
+                             pipeline_parallel_size=1,
+                             dtype="bfloat16",
+                             quantization="fp8",
+                             source_model="model",
+                             vllm_version="0.0.0")
+    manifest.save(image_dir)
+    assert is_engine_image(image_dir)
+    assert ImageManifest.load(image_dir) == manifest
@@ -0,0 +1,284 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from unittest.mock import MagicMock
+
+import pytest
+from interegular.patterns import InvalidSyntax
+from tokenizers import Tokenizer, models
+from transformers import PreTrainedTokenizerFast
+
+from vllm.engine.llm_engine import LLMEngine, SchedulerContext
+from vllm.entrypoints.llm import LLM
+from vllm.inputs import token_inputs
+from vllm.model_executor.guided_decoding import (
+    PendingGuidedDecodingLogitsProcessor,
+    get_guided_decoding_logits_processor_in_background,
+    get_pending_grammar_compilations, grammar_cache,
+    resolve_guided_decoding_logits_processors)
+from vllm.model_executor.guided_decoding.grammar_cache import (
+    PICKLE_SERIALIZER, CompiledGrammarCache, GrammarCacheKey,
+    get_tokenizer_hash, hash_grammar)
+from vllm.model_executor.guided_decoding.outlines_logits_processors import (
+    RegexLogitsProcessor)
+from vllm.sampling_params import GuidedDecodingParams, SamplingParams
+from vllm.sequence import Sequence, SequenceGroup
+
+
+def _key(grammar: str) -> GrammarCacheKey:
+    return GrammarCacheKey(backend="test",
+                           grammar_hash=hash_grammar(grammar),
+                           tokenizer_hash="tokenizer")
+
+
+def _make_tokenizer() -> PreTrainedTokenizerFast:
+    vocab = {
+        token: i
+        for i, token in enumerate(list("abc0123456789.") + ["<eos>"])
+    }
+    return PreTrainedTokenizerFast(tokenizer_object=Tokenizer(
+        models.WordLevel(vocab, unk_token="<eos>")),
+                                   eos_token="<eos>")
+
+
+def test_grammar_cache_lru():
+    cache = CompiledGrammarCache(max_size=2)
+    compiled = []
+
+    for grammar in ["a", "b", "a", "c", "b"]:
+
+        def compile_fn(grammar: str = grammar):
+            compiled.append(grammar)
+            return grammar.upper()
+
+        result = cache.get_or_compile(_key(grammar), compile_fn)
+        assert result == grammar.upper()
+
+    # "b" was evicted by "c" since "a" was used more recently.
+    assert compiled == ["a", "b", "c", "b"]
+    assert len(cache) == 2
+    assert cache.stats.hits == 1
+    assert cache.stats.misses == 4
+    assert cache.stats.evictions == 2
+    assert _key("a") not in cache
+
+
+def test_grammar_cache_disk(tmp_path):
+    cache = CompiledGrammarCache(max_size=4,
+                                 cache_dir=str(tmp_path),
+                                 max_disk_entries=2)
+    for grammar in ["a", "b", "c"]:
+        cache.get_or_compile(_key(grammar),
+                             partial(dict, grammar=grammar),
+                             serializer=PICKLE_SERIALIZER)
+    assert cache.stats.disk_writes == 3
+    # Only the most recent entries are kept on disk.
+    assert len(os.listdir(tmp_path / "test")) == 2
+
+    # A new cache, e.g. after a restart, loads the entries from disk.
+    restarted = CompiledGrammarCache(max_size=4, cache_dir=str(tmp_path))
+
+    def fail():
+        raise AssertionError("should not compile")
+
+    assert restarted.get_or_compile(_key("c"),
+                                    fail,
+                                    serializer=PICKLE_SERIALIZER) == {
+                                        "grammar": "c"
+                                    }
+    assert restarted.stats.disk_hits == 1
+    assert restarted.stats.misses == 0
+    # Entries without a serializer are never read from disk.
+    assert restarted.get_or_compile(_key("b"), lambda: "b") == "b"
+    assert restarted.stats.misses == 1
+
+    # Corrupted entries are discarded and recompiled.
+    for entry in os.listdir(tmp_path / "test"):
+        (tmp_path / "test" / entry).write_bytes(b"not a pickle")
+    restarted = CompiledGrammarCache(max_size=4, cache_dir=str(tmp_path))
+    assert restarted.get_or_compile(
+        _key("c"), lambda: "recompiled",
+        serializer=PICKLE_SERIALIZER) == "recompiled"
+    assert restarted.stats.disk_hits == 0
+    assert restarted.stats.misses == 1
+
+
+def test_outlines_guides_are_cached(tmp_path, monkeypatch):
+    cache = CompiledGrammarCache(max_size=4, cache_dir=str(tmp_path))
+    monkeypatch.setattr(grammar_cache, "_grammar_cache", cache)
+    tokenizer = _make_tokenizer()
+
+    regex = r"[a-c]{2,4}\.[0-9]"
+    first = RegexLogitsProcessor(regex, tokenizer)
+    second = RegexLogitsProcessor(regex, tokenizer)
+    assert first._guide is second._guide
+    assert cache.stats.misses == 1
+    assert cache.stats.hits == 1
+
+    # An equivalent tokenizer object maps to the same on-disk entry.
+    cache.clear()
+    third = RegexLogitsProcessor(regex, _make_tokenizer())
+    assert cache.stats.disk_hits == 1
+    assert (set(third._guide.get_next_instruction(0).tokens.tolist()) == set(
+        first._guide.get_next_instruction(0).tokens.tolist()))
+
+
+def test_tokenizer_hashes_are_bounded(monkeypatch):
+    monkeypatch.setattr(grammar_cache, "_tokenizer_hashes",
+                        grammar_cache.OrderedDict())
+    monkeypatch.setattr(grammar_cache, "_MAX_TOKENIZER_HASHES", 2)
+    tokenizer = _make_tokenizer()
+    tokenizer_hash = get_tokenizer_hash(tokenizer)
+    # In-memory tokenizers have no stable identity, so they are hashed on
+    # every call.
+    assert not grammar_cache._tokenizer_hashes
+
+    for name in ["a", "b", "c"]:
+        tokenizer.name_or_path = name
+        assert get_tokenizer_hash(tokenizer) == tokenizer_hash
+    assert [key[1] for key in grammar_cache._tokenizer_hashes] == ["b", "c"]
+
+    # Added tokens change the hash.
+    tokenizer.add_tokens(["<extra>"])
+    assert get_tokenizer_hash(tokenizer) != tokenizer_hash
+
+
+def test_grammar_cache_deduplicates_in_flight_compiles():
+    cache = CompiledGrammarCache(max_size=4)
+    started = threading.Event()
+    release = threading.Event()
+    num_compiles = 0
+
+    def compile_fn():
+        nonlocal num_compiles
+        num_compiles += 1
+        started.set()
+        assert release.wait(timeout=10)
+        return "compiled"
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        first = executor.submit(cache.get_or_compile, _key("a"), compile_fn)
+        assert started.wait(timeout=10)
+        second = executor.submit(cache.get_or_compile, _key("a"), compile_fn)
+        while cache.stats.in_flight_waits == 0:
+            assert not second.done()
+        release.set()
+        assert first.result() == second.result() == "compiled"
+
+    assert num_compiles == 1
+    assert cache.stats.misses == 1
+
+    # Failures are propagated to the waiters and not cached.
+    def fail():
+        raise ValueError("invalid grammar")
+
+    with pytest.raises(ValueError):
+        cache.get_or_compile(_key("b"), fail)
+    assert cache.get_or_compile(_key("b"), lambda: "b") == "b"
+
+
+def test_guided_processor_built_in_background(tmp_path, monkeypatch):
+    cache = CompiledGrammarCache(max_size=4, cache_dir=str(tmp_path))
+    monkeypatch.setattr(grammar_cache, "_grammar_cache", cache)
+    tokenizer = _make_tokenizer()
+
+    pending = get_guided_decoding_logits_processor_in_background(
+        GuidedDecodingParams(regex=r"[a-c]{2,4}", backend="outlines"),
+        tokenizer,
+        model_config=None)  # type: ignore[arg-type]
+    assert isinstance(pending, PendingGuidedDecodingLogitsProcessor)
+    logits_processors = [pending]
+    futures = get_pending_grammar_compilations(logits_processors)
+    assert futures == [pending.future]
+
+    resolved = resolve_guided_decoding_logits_processors(
+        logits_processors, futures)
+    assert len(resolved) == 1
+    assert isinstance(resolved[0], RegexLogitsProcessor)
+    assert cache.stats.misses == 1
+
+    # Invalid grammars fail when the processors are resolved.
+    pending = get_guided_decoding_logits_processor_in_background(
+        GuidedDecodingParams(regex=r"[a-c", backend="outlines"),
+        tokenizer,
+        model_config=None)  # type: ignore[arg-type]
+    futures = get_pending_grammar_compilations([pending])
+    with pytest.raises(InvalidSyntax):
+        resolve_guided_decoding_logits_processors([pending], futures)
+
+
+def test_failed_compile_fails_only_its_request(tmp_path, monkeypatch):
+    cache = CompiledGrammarCache(max_size=4, cache_dir=str(tmp_path))
+    monkeypatch.setattr(grammar_cache, "_grammar_cache", cache)
+    tokenizer = _make_tokenizer()
+
+    # An engine with only the state used to admit compiled requests.
+    engine = object.__new__(LLMEngine)
+    engine.scheduler = [MagicMock()]
+    engine.scheduler[0].get_num_unfinished_seq_groups.return_value = 0
+    engine.compiling_seq_groups = {}
+    engine.failed_requests = []
+    engine.seq_id_to_seq_group = {}
+
+    for seq_id, regex in enumerate([r"[a-c]{2,4}", r"[a-c"]):
+        pending = get_guided_decoding_logits_processor_in_background(
+            GuidedDecodingParams(regex=regex, backend="outlines"),
+            tokenizer,
+            model_config=None)  # type: ignore[arg-type]
+        seq_group = SequenceGroup(
+            request_id=str(seq_id),
+            seqs=[Sequence(seq_id, token_inputs([1, 2]), block_size=16)],
+            arrival_time=0.0,
+            sampling_params=SamplingParams(logits_processors=[pending]))
+        engine.compiling_seq_groups[str(seq_id)] = (
+            seq_group, get_pending_grammar_compilations([pending]))
+
+    while engine.compiling_seq_groups:
+        engine._admit_compiled_seq_groups(timeout=1)
+
+    # The valid request is scheduled, the invalid one fails on its own.
+    engine.scheduler[0].add_seq_group.assert_called_once()
+    assert engine.scheduler[0].add_seq_group.call_args[0][0].request_id == "0"
+    failed_requests = engine.get_and_reset_failed_requests()
+    assert [request_id for request_id, _ in failed_requests] == ["1"]
+    assert isinstance(failed_requests[0][1], InvalidSyntax)
+    assert not engine.get_and_reset_failed_requests()
+
+
+def test_failed_compile_aborts_the_batch():
+    # An engine whose first step reports a failed compile, while the other
+    # requests of the batch are still running.
+    llm_engine = MagicMock()
+    llm_engine.has_unfinished_requests.return_value = True
+    llm_engine.step.return_value = []
+    error = ValueError("invalid grammar")
+    llm_engine.get_and_reset_failed_requests.return_value = [("1", error)]
+    llm = object.__new__(LLM)
+    llm.llm_engine = llm_engine
+
+    with pytest.raises(ValueError, match="invalid grammar"):
+        llm._run_engine(use_tqdm=False)
+    llm_engine.abort_all_requests.assert_called_once()
+
+    # The engine aborts the requests in its queues and those compiling.
+    engine = object.__new__(LLMEngine)
+    engine.scheduler = [MagicMock()]
+    engine.scheduler[0].waiting = [MagicMock(request_id="2")]
+    engine.scheduler[0].running = [MagicMock(request_id="3")]
+    engine.scheduler[0].swapped = []
+    engine.compiling_seq_groups = {"4": MagicMock()}
+    engine.seq_id_to_seq_group = {"3": MagicMock()}
+    engine.scheduler_contexts = [SchedulerContext()]
+    engine.model_executor = MagicMock()
+    engine.abort_all_requests()
+    engine.scheduler[0].abort_seq_group.assert_called_once_with(
+        {"2", "3", "4"})
+    assert not engine.compiling_seq_groups
+    assert not engine.seq_id_to_seq_group
+
+
+@pytest.mark.parametrize("max_size", [0, -1])
+def test_grammar_cache_invalid_size(max_size: int):
+    with pytest.raises(ValueError):
+        CompiledGrammarCache(max_size=max_size)
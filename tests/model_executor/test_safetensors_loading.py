@@ -0,0 +1,90 @@
+import pytest
+import torch
+from safetensors.torch import save_file
+
+from vllm.model_executor.model_loader import weight_utils
+from vllm.model_executor.model_loader.weight_utils import (
+    WeightReadStats, lazy_safetensors_weights_iterator,
+    parallel_safetensors_weights_iterator, safetensors_weights_iterator)
+
+
+def _write_checkpoint(tmp_path, num_shards: int):
+    torch.manual_seed(0)
+    files = []
+    for shard in range(num_shards):
+        tensors = {
+            f"layers.{shard}.weight": torch.randn(37, 19),
+            f"layers.{shard}.bias": torch.randn(19).to(torch.bfloat16),
+            f"layers.{shard}.scale": torch.randn(()).half(),
+            f"layers.{shard}.ids": torch.randint(0, 100, (5, 3)),
+            f"layers.{shard}.empty": torch.empty(0, 4),
+        }
+        path = str(tmp_path / f"model-{shard:05d}.safetensors")
+        save_file(tensors, path, metadata={"format": "pt"})
+        files.append(path)
+    return files
+
+
+@pytest.mark.parametrize("num_threads", [1, 4])
+@pytest.mark.parametrize("max_inflight_bytes", [1, 256, 1 << 30])
+def test_parallel_safetensors_iterator(tmp_path, monkeypatch, num_threads: int,
+                                       max_inflight_bytes: int):
+    # Split the larger tensors into several chunked reads.
+    monkeypatch.setattr(weight_utils, "_READ_CHUNK_BYTES", 128)
+    files = _write_checkpoint(tmp_path, num_shards=3)
+
+    expected = list(safetensors_weights_iterator(files))
+    actual = list(
+        parallel_safetensors_weights_iterator(
+            files,
+            num_threads=num_threads,
+            max_inflight_bytes=max_inflight_bytes))
+
+    assert [name for name, _ in actual] == [name for name, _ in expected]
+    for (_, actual_tensor), (_, expected_tensor) in zip(actual, expected):
+        assert actual_tensor.dtype == expected_tensor.dtype
+        assert torch.equal(actual_tensor, expected_tensor)
+
+
+@pytest.mark.parametrize("tp_size", [1, 2, 4])
+def test_lazy_weights_read_only_narrowed_shards(tmp_path, tp_size: int):
+    files = _write_checkpoint(tmp_path, num_shards=2)
+    expected = dict(safetensors_weights_iterator(files))
+
+    stats = WeightReadStats()
+    for tp_rank in range(tp_size):
+        for name, lazy_weight in lazy_safetensors_weights_iterator(
+                files, stats):
+            full = expected[name]
+            assert lazy_weight.shape == full.shape
+            assert lazy_weight.dtype == full.dtype
+            if name.endswith(".weight"):
+                # Shard like ColumnParallelLinear then RowParallelLinear.
+                rows = full.shape[0] // tp_size
+                cols = full.shape[1] // tp_size
+                shard = lazy_weight.narrow(0, tp_rank * rows, rows).narrow(
+                    1, tp_rank * cols, cols)
+                param = torch.empty(rows, cols)
+                param.copy_(shard)
+                assert torch.equal(
+                    param, full[tp_rank * rows:(tp_rank + 1) * rows,
+                                tp_rank * cols:(tp_rank + 1) * cols])
+            elif name.endswith(".scale"):
+                assert lazy_weight.numel() == 1
+                assert lazy_weight.item() == full.item()
+            else:
+                # Other uses read the whole tensor.
+                assert torch.equal(torch.cat([lazy_weight]), full)
+                assert torch.equal(lazy_weight.to(full.dtype), full)
+
+    weight_bytes = sum(t.numel() * t.element_size()
+                       for name, t in expected.items()
+                       if name.endswith(".weight"))
+    other_bytes = sum(t.numel() * t.element_size()
+                      for name, t in expected.items()
+                      if not name.endswith(".weight"))
+    shard_bytes = sum(
+        (t.shape[0] // tp_size) * (t.shape[1] // tp_size) * t.element_size()
+        for name, t in expected.items() if name.endswith(".weight"))
+    assert stats.bytes_total == (weight_bytes + other_bytes) * tp_size
+    assert stats.bytes_read == (shard_bytes + other_bytes) * tp_size
@@ -0,0 +1,166 @@
+import itertools
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+import pytest
+import torch
+from torch import nn
+
+from vllm.model_executor.layers.quantization.base_config import (
+    QuantizeMethodBase)
+from vllm.model_executor.model_loader.weight_pipeline import (
+    ModelLoadingStats, WeightProcessingPipeline, get_weight_layer)
+from vllm.model_executor.model_loader.weight_utils import default_weight_loader
+
+NUM_LAYERS = 6
+
+
+class TransposeMethod(QuantizeMethodBase):
+    """Transposes the weight after loading, like a repacking method."""
+
+    def __init__(self, log: List[Tuple[str, str]]):
+        self.log = log
+
+    def create_weights(self, layer, *weight_args, **extra_weight_attrs):
+        raise NotImplementedError
+
+    def apply(self, layer, *args, **kwargs):
+        raise NotImplementedError
+
+    def process_weights_after_loading(self, layer: nn.Module) -> None:
+        self.log.append((layer.name, threading.current_thread().name))
+        layer.weight = nn.Parameter(layer.weight.t().contiguous(),
+                                    requires_grad=False)
+
+
+class Proj(nn.Module):
+
+    def __init__(self, name: str, log: List[Tuple[str, str]]):
+        super().__init__()
+        self.name = name
+        self.weight = nn.Parameter(torch.zeros(4, 3), requires_grad=False)
+        self.quant_method = TransposeMethod(log)
+
+
+class Layer(nn.Module):
+
+    def __init__(self, name: str, log: List[Tuple[str, str]]):
+        super().__init__()
+        self.up_proj = Proj(f"{name}.up_proj", log)
+        self.down_proj = Proj(f"{name}.down_proj", log)
+
+
+class ToyModel(nn.Module):
+
+    def __init__(self):
+        super().__init__()
+        self.log: List[Tuple[str, str]] = []
+        self.layers = nn.ModuleList(
+            [Layer(f"layers.{i}", self.log) for i in range(NUM_LAYERS)])
+        self.lm_head = Proj("lm_head", self.log)
+
+    def load_weights(self, weights: Iterable[Tuple[str, torch.Tensor]]):
+        params = dict(self.named_parameters())
+        for name, weight in weights:
+            param = params[name]
+            weight_loader = getattr(param, "weight_loader",
+                                    default_weight_loader)
+            weight_loader(param, weight)
+
+
+def make_checkpoint() -> Dict[str, torch.Tensor]:
+    torch.manual_seed(0)
+    names = [
+        f"layers.{i}.{proj}.weight" for i in range(NUM_LAYERS)
+        for proj in ("up_proj", "down_proj")
+    ] + ["lm_head.weight"]
+    return {name: torch.randn(4, 3) for name in names}
+
+
+def load(model: ToyModel, checkpoint: Dict[str, torch.Tensor],
+         weights: Iterable[Tuple[str, torch.Tensor]]) -> ModelLoadingStats:
+    stats = ModelLoadingStats()
+
+    def process_module(module: nn.Module) -> None:
+        module.quant_method.process_weights_after_loading(module)
+
+    pipeline = WeightProcessingPipeline(model,
+                                        list(checkpoint), process_module,
+                                        torch.device("cpu"), stats)
+    try:
+        model.load_weights(pipeline.wrap(weights))
+    finally:
+        pipeline.stop()
+    pipeline.process_remaining()
+    return stats
+
+
+def check_weights(model: ToyModel, checkpoint: Dict[str, torch.Tensor]):
+    for name, param in model.named_parameters():
+        assert torch.equal(param, checkpoint[name].t())
+        assert not hasattr(param, "weight_loader")
+
+
+def test_get_weight_layer():
+    assert get_weight_layer("model.layers.3.mlp.down_proj.weight") == (
+        "layers.3")
+    assert get_weight_layer("transformer.h.12") == "h.12"
+    assert get_weight_layer("model.layers.3.mlp.experts.7.w1") == "layers.3"
+    assert get_weight_layer("model.embed_tokens.weight") is None
+    assert get_weight_layer("model.layer3.weight") is None
+
+
+def test_pipeline_processes_layers_while_loading():
+    model = ToyModel()
+    checkpoint = make_checkpoint()
+    load(model, checkpoint, checkpoint.items())
+
+    check_weights(model, checkpoint)
+    processed = [name for name, _ in model.log]
+    assert sorted(processed) == sorted([
+        f"layers.{i}.{proj}" for i in range(NUM_LAYERS)
+        for proj in ("up_proj", "down_proj")
+    ] + ["lm_head"])
+    threads = dict(model.log)
+    for i in range(NUM_LAYERS):
+        assert threads[f"layers.{i}.up_proj"] == "vllm-weight-processing"
+    # The modules without a layer are processed after loading.
+    assert threads["lm_head"] == threading.current_thread().name
+    assert processed[-1] == "lm_head"
+
+
+def test_pipeline_buffered_weights():
+    """Modules whose weights are not loaded when their layer is read are
+    processed after loading."""
+    model = ToyModel()
+    checkpoint = make_checkpoint()
+
+    load(model, checkpoint, list(checkpoint.items()))
+    check_weights(model, checkpoint)
+
+    model = ToyModel()
+    original_load_weights = model.load_weights
+    model.load_weights = lambda weights: original_load_weights(list(weights))
+    load(model, checkpoint, checkpoint.items())
+    check_weights(model, checkpoint)
+    assert all(thread == threading.current_thread().name
+               for _, thread in model.log)
+
+
+def test_pipeline_late_write_fails():
+    """Loading weights into a module that was already processed fails."""
+    model = ToyModel()
+    checkpoint = make_checkpoint()
+    late_name = "layers.0.down_proj.weight"
+
+    def load_weights(weights):
+        params = dict(model.named_parameters())
+        for name, weight in itertools.chain(
+                weights, [(late_name, checkpoint[late_name])]):
+            weight_loader = getattr(params[name], "weight_loader",
+                                    default_weight_loader)
+            weight_loader(params[name], weight)
+
+    model.load_weights = load_weights
+    with pytest.raises(RuntimeError, match="layers.0.down_proj"):
+        load(model, checkpoint, checkpoint.items())
@@ -9,7 +9,7 @@ import torch
 from transformers import GenerationConfig, GenerationMixin
 
 import vllm.envs as envs
-from vllm.model_executor.layers.sampler import Sampler
+from vllm.model_executor.layers.sampler import Sampler, SequenceTokenCounts
 from vllm.model_executor.sampling_metadata import SamplingMetadata
 from vllm.model_executor.utils import set_random_seed
 from vllm.sequence import SamplingParams, SequenceData, SequenceGroupMetadata
@@ -731,6 +731,110 @@ def test_sampler_repetition_penalty_mixed(device: str):
     assert tokens1[1] == tokens2[0]
 
 
+@pytest.mark.parametrize("seed", RANDOM_SEEDS[:8])
+@pytest.mark.parametrize("device", CUDA_DEVICES)
+@pytest.mark.parametrize("max_num_seqs", [None, 0, 6])
+def test_sequence_token_counts(seed: int, device: str,
+                               max_num_seqs: Optional[int]):
+    """The persistent token counts match counts computed from scratch while
+    sequences grow, leave and rejoin the batch, also when the batch has more
+    sequences than the slots reserved."""
+    set_random_seed(seed)
+    vocab_size = 32
+    token_counts = SequenceTokenCounts()
+    if max_num_seqs is not None:
+        token_counts.reserve(max_num_seqs, vocab_size, torch.device(device))
+    all_seq_data = {
+        seq_id: SequenceData.from_seqs([
+            random.randrange(vocab_size) for _ in range(random.randint(1, 8))
+        ])
+        for seq_id in range(24)
+    }
+
+    for _ in range(10):
+        seq_ids = random.sample(sorted(all_seq_data), random.randint(1, 20))
+        seq_group_metadata_list: List[SequenceGroupMetadata] = []
+        for seq_id in seq_ids:
+            seq_data = all_seq_data[seq_id]
+            seq_data.append_token_id(random.randrange(vocab_size), 0.0)
+            seq_group_metadata_list.append(
+                SequenceGroupMetadata(
+                    request_id=f"test_{seq_id}",
+                    is_prompt=False,
+                    seq_data={seq_id: seq_data},
+                    sampling_params=SamplingParams(repetition_penalty=1.5),
+                    block_tables={seq_id: [1]},
+                ))
+        sampling_metadata = SamplingMetadata.prepare(
+            seq_group_metadata_list,
+            [all_seq_data[seq_id].get_len() for seq_id in seq_ids],
+            query_lens=[1] * len(seq_ids),
+            device=device,
+            pin_memory=is_pin_memory_available())
+
+        prompt_mask, output_bin_counts = token_counts.update(
+            sampling_metadata, vocab_size, torch.device(device))
+
+        for row, seq_id in enumerate(seq_ids):
+            seq_data = all_seq_data[seq_id]
+            expected_prompt_mask = torch.zeros(vocab_size, dtype=torch.bool)
+            expected_prompt_mask[list(seq_data.prompt_token_ids)] = True
+            expected_counts = torch.bincount(torch.tensor(
+                seq_data.output_token_ids),
+                                             minlength=vocab_size)
+            assert torch.equal(prompt_mask[row].cpu(), expected_prompt_mask)
+            assert torch.equal(output_bin_counts[row].cpu().long(),
+                               expected_counts)
+    if max_num_seqs is not None:
+        # The slots were not grown past the reserved ones.
+        assert token_counts.prompt_mask is not None
+        assert token_counts.prompt_mask.shape == (max_num_seqs + 1, vocab_size)
+
+
+@pytest.mark.parametrize("device", CUDA_DEVICES)
+def test_sequence_token_counts_reused_seq_ids(device: str):
+    """Like the target sequences of speculative decoding, the same seq ids
+    name other tokens on every step."""
+    vocab_size = 16
+    token_counts = SequenceTokenCounts()
+    token_counts.reserve(4, vocab_size, torch.device(device))
+    assert token_counts.prompt_mask is not None
+    assert token_counts.prompt_mask.shape == (5, vocab_size)
+
+    for step in range(4):
+        # Proposals of different tokens with the same lengths and seq ids.
+        all_seq_data = {
+            seq_id: SequenceData.from_seqs([1, 2], [step, step + seq_id])
+            for seq_id in range(3)
+        }
+        seq_group_metadata_list = [
+            SequenceGroupMetadata(
+                request_id=f"test_{seq_id}",
+                is_prompt=False,
+                seq_data={seq_id: seq_data},
+                sampling_params=SamplingParams(repetition_penalty=1.5),
+                block_tables={seq_id: [1]},
+            ) for seq_id, seq_data in all_seq_data.items()
+        ]
+        sampling_metadata = SamplingMetadata.prepare(
+            seq_group_metadata_list, [4] * len(all_seq_data),
+            query_lens=[1] * len(all_seq_data),
+            device=device,
+            pin_memory=is_pin_memory_available())
+        _, output_bin_counts = token_counts.update(sampling_metadata,
+                                                   vocab_size,
+                                                   torch.device(device))
+
+        for row, seq_data in enumerate(all_seq_data.values()):
+            expected_counts = torch.bincount(torch.tensor(
+                seq_data.output_token_ids),
+                                             minlength=vocab_size)
+            assert torch.equal(output_bin_counts[row].cpu().long(),
+                               expected_counts)
+    # The reserved slots were enough.
+    assert token_counts.prompt_mask.shape == (5, vocab_size)
+
+
 @pytest.mark.parametrize("device", CUDA_DEVICES)
 def test_sampler_include_gpu_probs_tensor(device: str):
     set_random_seed(42)
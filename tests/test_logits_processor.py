@@ -94,3 +94,236 @@ def test_logits_processors(seed: int, device: str):
                                fake_logits[:, 1],
                                rtol=1e-4,
                                atol=0.0)
+
+
+def _reference_bad_words_mask(bad_words_ids, past_tokens_ids, vocab_size):
+    mask = torch.zeros(vocab_size, dtype=torch.bool)
+    for bad_word_ids in bad_words_ids:
+        prefix = bad_word_ids[:-1]
+        if len(prefix) > len(past_tokens_ids):
+            continue
+        if not prefix or list(past_tokens_ids[-len(prefix):]) == prefix:
+            mask[bad_word_ids[-1]] = True
+    return mask
+
+
+@pytest.mark.parametrize("seed", list(range(8)))
+def test_sparse_logits_processors_batched(seed: int):
+    from vllm.entrypoints.openai.logits_processors import (
+        LogitBiasLogitsProcessor)
+    from vllm.logits_process import NoBadWordsLogitsProcessor
+
+    set_random_seed(seed)
+    vocab_size = 16
+    batch_size = 8
+    input_tensor = torch.rand((batch_size, 1024), dtype=torch.float32)
+    fake_logits = torch.zeros((batch_size, vocab_size), dtype=torch.float32)
+    logits_processor = MockLogitsProcessor(vocab_size, 1.0, fake_logits)
+
+    bad_words_ids = [[
+        random.randrange(vocab_size) for _ in range(random.randint(1, 3))
+    ] for _ in range(6)]
+    logit_bias = {random.randrange(vocab_size): 1.5, 3: -2.0}
+
+    seq_group_metadata_list = []
+    seq_lens = []
+    for i in range(batch_size):
+        seq_data = SequenceData.from_seqs([1, 2, 3])
+        seq_group_metadata_list.append(
+            SequenceGroupMetadata(
+                request_id=f"test_{i}",
+                is_prompt=False,
+                seq_data={i: seq_data},
+                sampling_params=SamplingParams(logits_processors=[
+                    NoBadWordsLogitsProcessor(bad_words_ids),
+                    LogitBiasLogitsProcessor(logit_bias),
+                ]),
+                block_tables={i: [1]},
+            ))
+        seq_lens.append(seq_data.get_len())
+
+    sampling_metadata = SamplingMetadata.prepare(seq_group_metadata_list,
+                                                 seq_lens,
+                                                 query_lens=[1] * batch_size,
+                                                 device="cpu",
+                                                 pin_memory=False)
+
+    # Advance the sequences over several steps so that the incremental
+    # match state of the bad words processor is exercised.
+    for _ in range(6):
+        logits_processor.fake_logits.zero_()
+        for seq_group in seq_group_metadata_list:
+            for seq_data in seq_group.seq_data.values():
+                seq_data.append_token_id(random.randrange(vocab_size), 0.0)
+        output = logits_processor(lm_head=None,
+                                  hidden_states=input_tensor,
+                                  sampling_metadata=sampling_metadata)
+
+        for row, seq_group in enumerate(seq_group_metadata_list):
+            seq_data = seq_group.seq_data[row]
+            expected = torch.zeros(vocab_size)
+            for token_id, bias in logit_bias.items():
+                expected[token_id] += bias
+            mask = _reference_bad_words_mask(bad_words_ids,
+                                             seq_data.output_token_ids,
+                                             vocab_size)
+            expected[mask] = float("-inf")
+            torch.testing.assert_close(output[row], expected)
+
+            # Calling the processor directly on a single row agrees with
+            # the batched stage.
+            for processor in seq_group.sampling_params.logits_processors:
+                row_logits = processor(seq_data.output_token_ids,
+                                       torch.zeros(vocab_size))
+                batched_logits = torch.zeros(vocab_size)
+                token_ids, biases = processor.get_sparse_bias(
+                    seq_data.output_token_ids, row)
+                for token_id, bias in zip(token_ids, biases):
+                    batched_logits[token_id] += bias
+                torch.testing.assert_close(row_logits, batched_logits)
+
+
+def test_logits_processors_keep_order():
+    from vllm.entrypoints.openai.logits_processors import (
+        LogitBiasLogitsProcessor)
+
+    vocab_size = 8
+    input_tensor = torch.rand((2, 1024), dtype=torch.float32)
+    fake_logits = torch.zeros((2, vocab_size), dtype=torch.float32)
+    logits_processor = MockLogitsProcessor(vocab_size, 1.0, fake_logits)
+
+    def double(token_ids, logits):
+        return logits * 2
+
+    # The biases before `double` are doubled, the ones after are not.
+    processors_list = [
+        [LogitBiasLogitsProcessor({3: 1.0}), double],
+        [
+            LogitBiasLogitsProcessor({3: 1.0}), double,
+            LogitBiasLogitsProcessor({5: 1.0})
+        ],
+    ]
+    seq_group_metadata_list = []
+    for i, processors in enumerate(processors_list):
+        seq_group_metadata_list.append(
+            SequenceGroupMetadata(
+                request_id=f"test_{i}",
+                is_prompt=False,
+                seq_data={i: SequenceData.from_seqs([1, 2, 3])},
+                sampling_params=SamplingParams(logits_processors=processors),
+                block_tables={i: [1]},
+            ))
+    sampling_metadata = SamplingMetadata.prepare(seq_group_metadata_list,
+                                                 [3, 3],
+                                                 query_lens=[1, 1],
+                                                 device="cpu",
+                                                 pin_memory=False)
+    output = logits_processor(lm_head=None,
+                              hidden_states=input_tensor,
+                              sampling_metadata=sampling_metadata)
+
+    expected = torch.zeros((2, vocab_size))
+    expected[:, 3] = 2.0
+    expected[1, 5] = 1.0
+    torch.testing.assert_close(output, expected)
+
+
+class _ModuloBitmaskProcessor:
+    """Allows the tokens congruent to the last generated token modulo
+    `modulus`, or every token before the first one is generated."""
+
+    def __init__(self, modulus: int):
+        self.modulus = modulus
+
+    def allowed(self, past_tokens_ids, vocab_size):
+        if not past_tokens_ids:
+            return None
+        return [
+            token_id for token_id in range(vocab_size)
+            if token_id % self.modulus == past_tokens_ids[-1] % self.modulus
+        ]
+
+
+@pytest.mark.parametrize("seed", list(range(4)))
+@pytest.mark.parametrize("num_threads", [0, 2])
+def test_bitmask_logits_processors_batched(seed: int, num_threads: int,
+                                           monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    import vllm.model_executor.layers.logits_processor as logits_processor_mod
+    from vllm.logits_process import BitmaskLogitsProcessor
+
+    class ModuloProcessor(_ModuloBitmaskProcessor, BitmaskLogitsProcessor):
+
+        def fill_bitmask(self, past_tokens_ids, bitmask, index):
+            allowed = self.allowed(past_tokens_ids, bitmask.shape[-1] * 32)
+            if allowed is None:
+                return False
+            bitmask[index] = 0
+            for token_id in allowed:
+                word, bit = divmod(token_id, 32)
+                bitmask[index, word] |= 1 << bit
+            return True
+
+    executor = ThreadPoolExecutor(num_threads) if num_threads else None
+    monkeypatch.setattr(logits_processor_mod, "_get_bitmask_executor",
+                        lambda: executor)
+
+    set_random_seed(seed)
+    vocab_size = 40
+    batch_size = 8
+    input_tensor = torch.rand((batch_size, 1024), dtype=torch.float32)
+    fake_logits = torch.rand((batch_size, vocab_size), dtype=torch.float32)
+    logits_processor = MockLogitsProcessor(vocab_size, 1.0, fake_logits)
+
+    seq_group_metadata_list = []
+    seq_lens = []
+    for i in range(batch_size):
+        seq_data = SequenceData.from_seqs([1, 2, 3])
+        # Some rows are unconstrained, some have two bitmask processors
+        # whose masks must be intersected.
+        processors = [
+            ModuloProcessor(m) for m in random.sample([2, 3, 5], i % 3)
+        ]
+        seq_group_metadata_list.append(
+            SequenceGroupMetadata(
+                request_id=f"test_{i}",
+                is_prompt=False,
+                seq_data={i: seq_data},
+                sampling_params=SamplingParams(logits_processors=processors),
+                block_tables={i: [1]},
+            ))
+        seq_lens.append(seq_data.get_len())
+
+    sampling_metadata = SamplingMetadata.prepare(seq_group_metadata_list,
+                                                 seq_lens,
+                                                 query_lens=[1] * batch_size,
+                                                 device="cpu",
+                                                 pin_memory=False)
+
+    for step in range(3):
+        if step > 0:
+            for seq_group in seq_group_metadata_list:
+                for seq_data in seq_group.seq_data.values():
+                    seq_data.append_token_id(random.randrange(vocab_size), 0.0)
+        logits_processor.fake_logits.copy_(fake_logits)
+        output = logits_processor(lm_head=None,
+                                  hidden_states=input_tensor,
+                                  sampling_metadata=sampling_metadata)
+
+        for row, seq_group in enumerate(seq_group_metadata_list):
+            past_tokens_ids = seq_group.seq_data[row].output_token_ids
+            expected = fake_logits[row].clone()
+            for processor in seq_group.sampling_params.logits_processors:
+                allowed = processor.allowed(past_tokens_ids, vocab_size)
+                if allowed is not None:
+                    mask = torch.ones(vocab_size, dtype=torch.bool)
+                    mask[allowed] = False
+                    expected[mask] = float("-inf")
+                # Calling the processor directly masks a single row.
+                row_logits = processor(past_tokens_ids,
+                                       fake_logits[row].clone())
+                if allowed is not None:
+                    assert torch.isinf(
+                        row_logits).sum() == vocab_size - len(allowed)
+            torch.testing.assert_close(output[row], expected)
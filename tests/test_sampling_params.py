@@ -1,5 +1,7 @@
 """Tests for the SamplingParams class.
 """
+import pytest
+
 from vllm import SamplingParams
 
 
@@ -8,6 +10,14 @@ def test_max_tokens_none():
     SamplingParams(temperature=0.01, top_p=0.1, max_tokens=None)
 
 
+def test_slo_must_be_positive():
+    """ttft_slo_ms and tpot_slo_ms must be positive if set"""
+    SamplingParams(ttft_slo_ms=500, tpot_slo_ms=50)
+    with pytest.raises(ValueError):
+        SamplingParams(ttft_slo_ms=0)
+    with pytest.raises(ValueError):
+        SamplingParams(tpot_slo_ms=-1)
+
+
 if __name__ == "__main__":
-    import pytest
     pytest.main([__file__])
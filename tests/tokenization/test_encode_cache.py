@@ -0,0 +1,109 @@
+import random
+from typing import List
+
+import pytest
+from tokenizers import (Tokenizer, decoders, models, pre_tokenizers,
+                        processors, trainers)
+from transformers import PreTrainedTokenizerFast
+
+from vllm.transformers_utils.tokenizer_group.encode_cache import EncodeCache
+
+WORDS = [
+    "the", "token", "tokens", "prefix", "system", "prompt", "answer",
+    "question", "é", "中文", "1234", "hello,", "world.", "don't", "\n", "  "
+]
+
+
+def _text(rng: random.Random, num_words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(num_words))
+
+
+def _train_tokenizer(pre_tokenizer: str,
+                     add_bos_eos: bool = False) -> PreTrainedTokenizerFast:
+    rng = random.Random(0)
+    tokenizer = Tokenizer(models.BPE())
+    if pre_tokenizer == "byte_level":
+        tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(
+            add_prefix_space=False)
+        tokenizer.decoder = decoders.ByteLevel()
+        alphabet = pre_tokenizers.ByteLevel.alphabet()
+    else:
+        tokenizer.pre_tokenizer = pre_tokenizers.Metaspace(
+            prepend_scheme="first")
+        tokenizer.decoder = decoders.Metaspace(prepend_scheme="first")
+        alphabet = []
+    tokenizer.train_from_iterator([_text(rng, 30) for _ in range(200)],
+                                  trainers.BpeTrainer(
+                                      vocab_size=500,
+                                      special_tokens=["<s>", "</s>"],
+                                      initial_alphabet=alphabet))
+    if add_bos_eos:
+        tokenizer.post_processor = processors.TemplateProcessing(
+            single="<s> $A </s>",
+            special_tokens=[("<s>", tokenizer.token_to_id("<s>")),
+                            ("</s>", tokenizer.token_to_id("</s>"))])
+    return PreTrainedTokenizerFast(tokenizer_object=tokenizer,
+                                   bos_token="<s>",
+                                   eos_token="</s>")
+
+
+def _prompts(num_prompts: int) -> List[str]:
+    rng = random.Random(1)
+    system_prompt = "You are a helpful assistant. " + _text(rng, 200)
+    prompts = []
+    for _ in range(num_prompts):
+        # The prompts continue the system prompt with all kinds of text,
+        # including text that merges with its last token.
+        separator = rng.choice(["", " ", "s", "\n\n", "'s", "1", "é"])
+        prompts.append(system_prompt + separator + _text(rng, 20))
+    return prompts
+
+
+@pytest.mark.parametrize("pre_tokenizer,add_bos_eos", [
+    ("byte_level", False),
+    ("byte_level", True),
+    ("metaspace", False),
+])
+def test_encode_cache(pre_tokenizer: str, add_bos_eos: bool):
+    tokenizer = _train_tokenizer(pre_tokenizer, add_bos_eos)
+    cache = EncodeCache(max_prompts=8)
+    prompts = _prompts(30)
+    for prompt in prompts:
+        assert cache.encode(tokenizer, prompt) == tokenizer.encode(prompt)
+    # After two prompts, the system prompt is registered and reused.
+    assert cache.num_queries == 30
+    assert cache.num_hits == 0
+    assert cache.num_prefix_hits == 28
+    assert cache.num_prefix_tokens > 28 * 100
+
+    # The last prompts are cached.
+    for prompt in prompts[-8:]:
+        assert cache.encode(tokenizer, prompt) == tokenizer.encode(prompt)
+    assert cache.num_hits == 8
+    assert cache.hit_rate == 8 / 38
+
+    # Unrelated prompts are tokenized in full.
+    rng = random.Random(2)
+    for _ in range(5):
+        prompt = _text(rng, 100)
+        assert cache.encode(tokenizer, prompt) == tokenizer.encode(prompt)
+    assert cache.num_prefix_hits == 28
+
+
+def test_encode_cache_per_tokenizer():
+    tokenizer = _train_tokenizer("byte_level")
+    lora_tokenizer = _train_tokenizer("byte_level", add_bos_eos=True)
+    cache = EncodeCache(max_prompts=8)
+    prompt = _prompts(1)[0]
+    assert cache.encode(tokenizer, prompt) == tokenizer.encode(prompt)
+    # The same prompt is tokenized again by another tokenizer.
+    assert cache.encode(lora_tokenizer,
+                        prompt) == lora_tokenizer.encode(prompt)
+    assert cache.num_hits == 0
+    assert cache.encode(lora_tokenizer,
+                        prompt) == lora_tokenizer.encode(prompt)
+    assert cache.num_hits == 1
+
+    # The cache of a tokenizer is dropped with it.
+    del lora_tokenizer
+    assert len(cache._caches) == 1
@@ -7,8 +7,14 @@ from unittest.mock import patch
 import pytest
 from transformers import AutoTokenizer, PreTrainedTokenizerBase
 
+from vllm.config import TokenizerPoolConfig
 from vllm.transformers_utils.tokenizer_group import (TokenizerGroup,
                                                      get_tokenizer_group)
+# yapf conflicts with isort for this block
+# yapf: disable
+from vllm.transformers_utils.tokenizer_group.process_tokenizer_group import (
+    ProcessPoolTokenizerGroup)
+# yapf: enable
 from vllm.transformers_utils.tokenizer_group.ray_tokenizer_group import (
     RayTokenizerGroupPool)
 
@@ -28,7 +34,7 @@ class CustomTokenizerGroup(TokenizerGroup):
 
 @pytest.mark.asyncio
 @pytest.mark.parametrize("tokenizer_group_type",
-                         [None, "ray", CustomTokenizerGroup])
+                         [None, "ray", "process", CustomTokenizerGroup])
 async def test_tokenizer_group(tokenizer_group_type):
     reference_tokenizer = AutoTokenizer.from_pretrained("gpt2")
     tokenizer_group = get_tokenizer_group(
@@ -52,7 +58,7 @@ async def test_tokenizer_group(tokenizer_group_type):
 
 
 @pytest.mark.asyncio
-@pytest.mark.parametrize("tokenizer_group_type", ["ray"])
+@pytest.mark.parametrize("tokenizer_group_type", ["ray", "process"])
 async def test_tokenizer_group_pool(tokenizer_group_type):
     reference_tokenizer = AutoTokenizer.from_pretrained("gpt2")
     tokenizer_group_pool = get_tokenizer_group(
@@ -212,3 +218,147 @@ async def test_tokenizer_group_ray_pool_fault_tolerance(tokenizer_group_type):
                                             lora_request=None)
     # Actors should stay the same.
     assert tokenizer_group_pool.tokenizer_actors == tokenizer_actors
+
+
+class FailingTokenizerGroup(TokenizerGroup):
+
+    def __init__(self, *args, fail_at: Optional[List[int]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.i = 0
+        self.fail_at = fail_at or []
+
+    def encode(self, *args, **kwargs):
+        self.i += 1
+        if self.i in self.fail_at:
+            sys.exit(1)
+        return super().encode(*args, **kwargs)
+
+
+class FailingProcessPoolTokenizerGroup(ProcessPoolTokenizerGroup):
+    _worker_cls = FailingTokenizerGroup
+
+
+@pytest.mark.asyncio
+async def test_tokenizer_group_process_pool_fault_tolerance():
+    """Test that the process tokenizer pool restarts its dead workers and
+    if that's not possible, marks itself as unhealthy."""
+    tokenizer_pool_config = get_tokenizer_pool_config("process")
+
+    # Fail at first iteration
+    fail_at = [1]
+    tokenizer_group_pool = FailingProcessPoolTokenizerGroup.from_config(
+        tokenizer_pool_config,
+        tokenizer_id="gpt2",
+        enable_lora=False,
+        max_num_seqs=1,
+        max_input_length=None,
+        fail_at=fail_at)
+    workers = tokenizer_group_pool.workers.copy()
+
+    # Modify fail at to not fail at all (will be re-read when the worker is
+    # restarted).
+    fail_at[0] = 1000
+
+    # We should recover successfully.
+    await tokenizer_group_pool.encode_async(request_id="1",
+                                            prompt="prompt",
+                                            lora_request=None)
+    tokenizer_group_pool.encode(request_id="1",
+                                prompt="prompt",
+                                lora_request=None)
+    assert len(tokenizer_group_pool.workers) == len(workers)
+    assert tokenizer_group_pool.workers != workers
+
+    # A worker that dies while idle is restarted by the health check, in the
+    # background when it runs in the event loop.
+    workers = tokenizer_group_pool.workers.copy()
+    workers[0].process.kill()
+    workers[0].process.join()
+    assert not tokenizer_group_pool.ping()
+    tokenizer_group_pool.check_health()
+    assert tokenizer_group_pool._restart_tasks
+    await asyncio.gather(*tokenizer_group_pool._restart_tasks)
+    assert tokenizer_group_pool.ping()
+    assert len(tokenizer_group_pool.workers) == len(workers)
+    assert tokenizer_group_pool.workers != workers
+    tokenizer_group_pool.shutdown()
+
+    # Fail at first iteration
+    fail_at = [1]
+    tokenizer_group_pool = FailingProcessPoolTokenizerGroup.from_config(
+        tokenizer_pool_config,
+        tokenizer_id="gpt2",
+        enable_lora=False,
+        max_num_seqs=1,
+        max_input_length=None,
+        fail_at=fail_at)
+
+    # We should fail after the restart.
+    with pytest.raises(RuntimeError):
+        await tokenizer_group_pool.encode_async(request_id="1",
+                                                prompt="prompt",
+                                                lora_request=None)
+
+    # check_health should raise the same thing
+    with pytest.raises(RuntimeError):
+        tokenizer_group_pool.check_health()
+    tokenizer_group_pool.shutdown()
+
+    # Ensure that tokenization errors are still propagated correctly and do
+    # not cause a restart.
+    tokenizer_group_pool = FailingProcessPoolTokenizerGroup.from_config(
+        tokenizer_pool_config,
+        tokenizer_id="gpt2",
+        enable_lora=False,
+        max_num_seqs=1,
+        max_input_length=2,
+        fail_at=[])
+    workers = tokenizer_group_pool.workers.copy()
+
+    # Prompt too long error
+    with pytest.raises(ValueError):
+        await tokenizer_group_pool.encode_async(request_id="1",
+                                                prompt="prompt" * 100,
+                                                lora_request=None)
+    await tokenizer_group_pool.encode_async(request_id="1",
+                                            prompt="prompt",
+                                            lora_request=None)
+    # Workers should stay the same.
+    assert tokenizer_group_pool.workers == workers
+    tokenizer_group_pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_tokenizer_group_process_pool_long_prompts():
+    """Test that long prompts are returned through shared memory, or
+    pickled when they do not fit, and that cancelled requests do not lose
+    their worker."""
+    reference_tokenizer = AutoTokenizer.from_pretrained("gpt2")
+    tokenizer_group_pool = get_tokenizer_group(
+        TokenizerPoolConfig(pool_size=2,
+                            pool_type="process",
+                            extra_config={"shm_bytes": 8 * 4096}),
+        tokenizer_id="gpt2",
+        enable_lora=False,
+        max_num_seqs=1,
+        max_input_length=None,
+    )
+    # Below, within and beyond the shared memory.
+    prompts = [" ".join(str(i) for i in range(n)) for n in [10, 2000, 5000]]
+    results = await asyncio.gather(*[
+        tokenizer_group_pool.encode_async(prompt=prompt)
+        for prompt in prompts * 3
+    ])
+    assert results == [reference_tokenizer.encode(p) for p in prompts * 3]
+
+    task = asyncio.create_task(
+        tokenizer_group_pool.encode_async(prompt=prompts[-1]))
+    await asyncio.sleep(0.001)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    await asyncio.gather(*tokenizer_group_pool._drain_tasks)
+    assert tokenizer_group_pool._idle_workers.qsize() == 2
+    assert tokenizer_group_pool.encode(
+        prompt=prompts[1]) == reference_tokenizer.encode(prompts[1])
+    tokenizer_group_pool.shutdown()
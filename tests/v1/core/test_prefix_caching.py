@@ -2,20 +2,24 @@
 import pytest
 
 from vllm.inputs import token_inputs
+from vllm.lora.request import LoRARequest
+from vllm.lora.utils import get_adapter_fingerprint
 from vllm.sampling_params import SamplingParams
 from vllm.utils import cdiv
 from vllm.v1.core.kv_cache_manager import KVCacheManager, Request
 from vllm.v1.core.kv_cache_utils import KVCacheBlock, hash_block_tokens
 
 
-def make_request(request_id, prompt_token_ids):
+def make_request(request_id, prompt_token_ids, lora_request=None):
     return Request(
         request_id=request_id,
         inputs=token_inputs(prompt_token_ids=prompt_token_ids),
         sampling_params=SamplingParams(max_tokens=17),
         eos_token_id=100,
         arrival_time=0,
-        lora_request=None,
+        lora_request=lora_request,
+        lora_fingerprint=None if lora_request is None else
+        get_adapter_fingerprint(lora_request.lora_path),
     )
 
 
@@ -416,3 +420,38 @@ def test_cache_blocks():
     )
     assert len(manager.cached_block_hash_to_block) == 3
     assert blocks[0].block_hash is not None
+
+
+def test_prefix_caching_lora():
+    """Blocks computed with a LoRA are only shared by requests with the same
+    LoRA."""
+    manager = KVCacheManager(
+        block_size=16,
+        num_gpu_blocks=10,
+        max_model_len=8192,
+        sliding_window=None,
+        enable_caching=True,
+        num_preallocate_tokens=0,
+    )
+    lora_1 = LoRARequest("lora_1", 1, lora_path="/path/to/lora_1")
+    lora_2 = LoRARequest("lora_2", 2, lora_path="/path/to/lora_2")
+    token_ids = [i for i in range(2) for _ in range(16)] + [2] * 3
+
+    req0 = make_request("0", token_ids, lora_1)
+    assert not manager.get_computed_blocks(req0)
+    blocks = manager.allocate_slots(req0, 35, [])
+    block_hash = manager.block_pool[0].block_hash
+    extra_keys = (get_adapter_fingerprint("/path/to/lora_1"), )
+    assert block_hash is not None and block_hash.extra_keys == extra_keys
+    assert block_hash == hash_block_tokens(None, token_ids[:16], extra_keys)
+    assert block_hash != hash_block_tokens(None, token_ids[:16])
+
+    # Same LoRA: cache hit.
+    req1 = make_request("1", token_ids, lora_1)
+    computed_blocks = manager.get_computed_blocks(req1)
+    assert [b.block_id
+            for b in computed_blocks] == [b.block_id for b in blocks][:2]
+    # Another LoRA or the base model: cache miss.
+    assert not manager.get_computed_blocks(make_request(
+        "2", token_ids, lora_2))
+    assert not manager.get_computed_blocks(make_request("3", token_ids))
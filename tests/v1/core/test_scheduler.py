@@ -0,0 +1,204 @@
+"""Tests of the LoRA support and of the deadline policy of the V1
+scheduler."""
+import time
+from typing import List, Optional
+
+from vllm.config import CacheConfig, LoRAConfig, SchedulerConfig
+from vllm.core.scheduler import LORA_MAX_BYPASSED_STEPS
+from vllm.inputs import token_inputs
+from vllm.lora.request import LoRARequest
+from vllm.sampling_params import SamplingParams
+from vllm.v1.core.scheduler import Scheduler, SchedulerOutput
+from vllm.v1.outputs import ModelRunnerOutput
+from vllm.v1.request import Request, RequestStatus
+
+BLOCK_SIZE = 16
+
+
+def create_scheduler(max_loras: int = 2,
+                     max_lora_loads_per_step: Optional[int] = None,
+                     max_num_seqs: int = 16,
+                     policy: str = "fcfs") -> Scheduler:
+    scheduler_config = SchedulerConfig("generate",
+                                       max_num_batched_tokens=1024,
+                                       max_num_seqs=max_num_seqs,
+                                       max_model_len=1024,
+                                       policy=policy)
+    cache_config = CacheConfig(BLOCK_SIZE, 1.0, 1, "auto")
+    cache_config.num_gpu_blocks = 1000
+    lora_config = LoRAConfig(max_lora_rank=8,
+                             max_loras=max_loras,
+                             max_lora_loads_per_step=max_lora_loads_per_step)
+    return Scheduler(scheduler_config, cache_config, lora_config)
+
+
+def create_request(request_id: str,
+                   lora_int_id: int,
+                   max_tokens: int = 16) -> Request:
+    lora_request = None
+    if lora_int_id > 0:
+        lora_request = LoRARequest(f"lora_{lora_int_id}",
+                                   lora_int_id,
+                                   lora_path=f"/path/to/lora_{lora_int_id}")
+    return Request(
+        request_id=request_id,
+        inputs=token_inputs(prompt_token_ids=[0] * BLOCK_SIZE),
+        sampling_params=SamplingParams(max_tokens=max_tokens, ignore_eos=True),
+        eos_token_id=None,
+        arrival_time=0,
+        lora_request=lora_request,
+    )
+
+
+def create_slo_request(request_id: str,
+                       ttft_slo_ms: Optional[float] = None,
+                       tpot_slo_ms: Optional[float] = None,
+                       arrival_time: Optional[float] = None) -> Request:
+    return Request(
+        request_id=request_id,
+        inputs=token_inputs(prompt_token_ids=[0] * BLOCK_SIZE),
+        sampling_params=SamplingParams(max_tokens=16,
+                                       ignore_eos=True,
+                                       ttft_slo_ms=ttft_slo_ms,
+                                       tpot_slo_ms=tpot_slo_ms),
+        eos_token_id=None,
+        arrival_time=time.time() if arrival_time is None else arrival_time,
+    )
+
+
+def scheduled_req_ids(output: SchedulerOutput) -> List[str]:
+    return [req.req_id for req in output.scheduled_new_reqs
+            ] + [req.req_id for req in output.scheduled_running_reqs]
+
+
+def run_step(scheduler: Scheduler, output: SchedulerOutput) -> None:
+    req_ids = [request.request_id for request in scheduler.running]
+    scheduler.update_from_output(
+        output,
+        ModelRunnerOutput(
+            req_ids=req_ids,
+            req_id_to_index={req_id: i
+                             for i, req_id in enumerate(req_ids)},
+            sampled_token_ids=[0] * len(req_ids),
+            logprob_token_ids_cpu=None,
+            logprobs_cpu=None,
+        ))
+
+
+def test_schedule_max_loras():
+    """Requests whose LoRA does not fit in the LoRA slots are skipped, in
+    order, and scheduled once their LoRA fits."""
+    scheduler = create_scheduler(max_loras=2)
+    for request_id, lora_int_id in enumerate([1, 2, 3, 1, 0, 3]):
+        scheduler.add_request(create_request(str(request_id), lora_int_id))
+
+    output = scheduler.schedule()
+    assert scheduled_req_ids(output) == ["0", "1", "3", "4"]
+    assert [request.request_id for request in scheduler.waiting] == ["2", "5"]
+    assert [lora.lora_int_id for lora in output.prefetch_lora_requests] == [3]
+
+    # The skipped requests are scheduled when the running requests finish.
+    scheduler.finish_requests(["0", "1", "3"], RequestStatus.FINISHED_ABORTED)
+    output = scheduler.schedule()
+    assert scheduled_req_ids(output) == ["2", "5", "4"]
+    assert not scheduler.waiting
+
+
+def test_schedule_max_lora_loads_per_step():
+    """At most max_lora_loads_per_step LoRAs that were not in the previous
+    step are added to a step."""
+    scheduler = create_scheduler(max_loras=4, max_lora_loads_per_step=1)
+    for request_id, lora_int_id in enumerate([1, 2, 1, 3]):
+        scheduler.add_request(create_request(str(request_id), lora_int_id))
+
+    output = scheduler.schedule()
+    assert scheduled_req_ids(output) == ["0", "2"]
+    run_step(scheduler, output)
+    output = scheduler.schedule()
+    assert [req.req_id for req in output.scheduled_new_reqs] == ["1"]
+    run_step(scheduler, output)
+    output = scheduler.schedule()
+    assert [req.req_id for req in output.scheduled_new_reqs] == ["3"]
+
+
+def test_schedule_lora_no_starvation():
+    """A request skipped for its LoRA for LORA_MAX_BYPASSED_STEPS steps
+    stops later requests from being scheduled until its LoRA fits."""
+    scheduler = create_scheduler(max_loras=1, max_num_seqs=64)
+    scheduler.add_request(create_request("0", 1, max_tokens=1000))
+    scheduler.add_request(create_request("1", 2))
+    output = scheduler.schedule()
+    assert scheduled_req_ids(output) == ["0"]
+
+    # Request 1 was bypassed by request 0 in the first step.
+    next_request_id = 2
+    for _ in range(LORA_MAX_BYPASSED_STEPS - 1):
+        # A later request with the LoRA in use bypasses request 1.
+        scheduler.add_request(create_request(str(next_request_id), 1))
+        next_request_id += 1
+        run_step(scheduler, output)
+        output = scheduler.schedule()
+        assert [req.req_id for req in output.scheduled_new_reqs
+                ] == [str(next_request_id - 1)]
+    assert scheduler.lora_bypassed_steps["1"] == LORA_MAX_BYPASSED_STEPS
+
+    scheduler.add_request(create_request(str(next_request_id), 1))
+    run_step(scheduler, output)
+    output = scheduler.schedule()
+    assert not output.scheduled_new_reqs
+    assert [request.request_id for request in scheduler.waiting
+            ][:2] == ["1", str(next_request_id)]
+
+
+def test_schedule_deadline_order():
+    """Waiting requests are scheduled by earliest TTFT deadline, and running
+    requests are ordered by the deadline of their next token."""
+    scheduler = create_scheduler(max_num_seqs=3, policy="deadline")
+    scheduler.add_request(create_slo_request("0"))
+    scheduler.add_request(create_slo_request("1", ttft_slo_ms=60000))
+    scheduler.add_request(create_slo_request("2", tpot_slo_ms=10))
+    scheduler.add_request(create_slo_request("3", ttft_slo_ms=30000))
+    output = scheduler.schedule()
+    assert scheduled_req_ids(output) == ["3", "1", "0"]
+
+    # Request 0 has no deadline, and requests 1 and 3 have no TPOT SLO.
+    run_step(scheduler, output)
+    scheduler.finish_requests("3", RequestStatus.FINISHED_ABORTED)
+    output = scheduler.schedule()
+    assert scheduled_req_ids(output) == ["2", "1", "0"]
+    assert [request.request_id
+            for request in scheduler.running] == ["1", "0", "2"]
+
+    run_step(scheduler, output)
+    output = scheduler.schedule()
+    assert [request.request_id
+            for request in scheduler.running] == ["2", "1", "0"]
+
+
+def test_finish_expired_requests():
+    """Waiting requests past their TTFT deadline are aborted."""
+    scheduler = create_scheduler(max_num_seqs=1, policy="deadline")
+    scheduler.add_request(create_slo_request("0", ttft_slo_ms=100))
+    scheduler.add_request(create_slo_request("1", ttft_slo_ms=100))
+    scheduler.add_request(create_slo_request("2", ttft_slo_ms=100))
+    output = scheduler.schedule()
+    assert scheduled_req_ids(output) == ["0"]
+    assert scheduler.finish_expired_requests() == []
+
+    # Request 1 is past its deadline.
+    scheduler.requests["0"].metrics.arrival_time -= 1
+    scheduler.requests["1"].metrics.arrival_time -= 1
+    outputs = scheduler.finish_expired_requests()
+    assert [(output.request_id, output.new_token_ids, output.finished,
+             output.finish_reason)
+            for output in outputs] == [("1", [], True, "abort")]
+    assert "1" not in scheduler.requests
+    assert "1" in scheduler.finished_req_ids
+    assert [request.request_id for request in scheduler.waiting] == ["2"]
+    assert [request.request_id for request in scheduler.running] == ["0"]
+
+    # With another policy, the SLOs are ignored.
+    scheduler = create_scheduler(max_num_seqs=1)
+    scheduler.add_request(
+        create_slo_request("0", ttft_slo_ms=100, arrival_time=0))
+    assert scheduler.finish_expired_requests() == []
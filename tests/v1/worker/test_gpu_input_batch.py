@@ -0,0 +1,181 @@
+import random
+from typing import Dict, List
+
+import numpy as np
+import pytest
+import torch
+
+from vllm.lora.request import LoRARequest
+from vllm.sampling_params import SamplingParams
+from vllm.v1.worker.gpu_input_batch import CachedRequestState, InputBatch
+
+VOCAB_SIZE = 64
+MAX_NUM_REQS = 8
+
+
+def _make_request(req_id: str, penalties: bool) -> CachedRequestState:
+    if penalties:
+        sampling_params = SamplingParams(presence_penalty=0.5,
+                                         frequency_penalty=0.25,
+                                         repetition_penalty=1.5)
+    else:
+        sampling_params = SamplingParams()
+    return CachedRequestState(
+        req_id=req_id,
+        prompt_token_ids=[
+            random.randrange(VOCAB_SIZE) for _ in range(random.randint(1, 16))
+        ],
+        prompt=None,
+        mm_inputs=[],
+        mm_positions=[],
+        sampling_params=sampling_params,
+        generator=None,
+        block_ids=[],
+        num_computed_tokens=0,
+        output_token_ids=[
+            random.randrange(VOCAB_SIZE) for _ in range(random.randint(0, 4))
+        ],
+    )
+
+
+def _check_token_state(input_batch: InputBatch,
+                       requests: Dict[str, CachedRequestState]):
+    sampling_metadata = input_batch.make_sampling_metadata()
+    assert sampling_metadata.no_penalties == input_batch.no_penalties
+    if input_batch.no_penalties:
+        return
+    assert sampling_metadata.penalty_req_indices is not None
+    assert sampling_metadata.prompt_token_mask is not None
+    assert sampling_metadata.output_token_counts is not None
+    penalty_req_indices = sampling_metadata.penalty_req_indices.tolist()
+    assert penalty_req_indices == sorted(
+        input_batch.req_id_to_index[req_id]
+        for req_id in input_batch.penalty_reqs)
+    assert len(input_batch.penalty_req_slots) == min(
+        len(input_batch.penalty_reqs), input_batch.max_num_penalty_reqs)
+    for row, req_index in enumerate(penalty_req_indices):
+        req_id = input_batch.req_ids[req_index]
+        assert req_id is not None
+        request = requests[req_id]
+        expected_mask = torch.zeros(VOCAB_SIZE, dtype=torch.bool)
+        expected_mask[request.prompt_token_ids] = True
+        expected_counts = torch.bincount(torch.tensor(request.output_token_ids,
+                                                      dtype=torch.long),
+                                         minlength=VOCAB_SIZE)
+        assert torch.equal(sampling_metadata.prompt_token_mask[row],
+                           expected_mask)
+        assert torch.equal(sampling_metadata.output_token_counts[row].long(),
+                           expected_counts)
+        assert sampling_metadata.repetition_penalties[req_index] == 1.5
+
+
+@pytest.mark.parametrize("seed", list(range(4)))
+@pytest.mark.parametrize("max_num_penalty_reqs", [MAX_NUM_REQS, 2, 0])
+def test_penalty_token_state(seed: int, max_num_penalty_reqs: int):
+    """The penalty token state stays in sync with the requests as tokens are
+    sampled and requests are added, removed and moved, also for the requests
+    beyond the persistent slots."""
+    random.seed(seed)
+    input_batch = InputBatch(max_num_reqs=MAX_NUM_REQS,
+                             max_model_len=1024,
+                             max_num_blocks_per_req=10,
+                             device=torch.device("cpu"),
+                             pin_memory=False,
+                             vocab_size=VOCAB_SIZE,
+                             max_num_penalty_reqs=max_num_penalty_reqs)
+    requests: Dict[str, CachedRequestState] = {}
+    next_req_id = 0
+
+    for _ in range(10):
+        # Remove some requests and add new ones in the freed slots.
+        removed_req_indices: List[int] = []
+        for req_id in random.sample(sorted(requests), len(requests) // 3):
+            req_index = input_batch.remove_request(req_id)
+            assert req_index is not None
+            removed_req_indices.append(req_index)
+            del requests[req_id]
+        removed_req_indices.sort(reverse=True)
+        while len(requests) < MAX_NUM_REQS - 2:
+            request = _make_request(str(next_req_id), random.random() < 0.5)
+            next_req_id += 1
+            requests[request.req_id] = request
+            req_index = (removed_req_indices.pop()
+                         if removed_req_indices else None)
+            input_batch.add_request(request, req_index)
+        if removed_req_indices:
+            input_batch.condense(removed_req_indices)
+        _check_token_state(input_batch, requests)
+
+        # Sample a token for every request.
+        req_indices: List[int] = []
+        token_ids: List[int] = []
+        for req_index in range(input_batch.num_reqs):
+            req_id = input_batch.req_ids[req_index]
+            assert req_id is not None
+            token_id = random.randrange(VOCAB_SIZE)
+            requests[req_id].output_token_ids.append(token_id)
+            req_indices.append(req_index)
+            token_ids.append(token_id)
+        input_batch.record_sampled_token_ids(req_indices, token_ids)
+        _check_token_state(input_batch, requests)
+
+
+@pytest.mark.parametrize("seed", list(range(4)))
+def test_lora_mapping(seed: int):
+    """The persistent LoRA mapping stays in sync with the requests as
+    requests are added, removed and moved."""
+    random.seed(seed)
+    input_batch = InputBatch(max_num_reqs=MAX_NUM_REQS,
+                             max_model_len=1024,
+                             max_num_blocks_per_req=10,
+                             device=torch.device("cpu"),
+                             pin_memory=False,
+                             vocab_size=VOCAB_SIZE,
+                             max_num_penalty_reqs=MAX_NUM_REQS)
+    lora_requests = [
+        LoRARequest(f"lora_{i}", i, lora_path=f"/path/to/lora_{i}")
+        for i in range(1, 4)
+    ]
+    requests: Dict[str, CachedRequestState] = {}
+    next_req_id = 0
+
+    for _ in range(10):
+        removed_req_indices: List[int] = []
+        for req_id in random.sample(sorted(requests), len(requests) // 3):
+            req_index = input_batch.remove_request(req_id)
+            assert req_index is not None
+            removed_req_indices.append(req_index)
+            del requests[req_id]
+        removed_req_indices.sort(reverse=True)
+        while len(requests) < MAX_NUM_REQS - 2:
+            request = _make_request(str(next_req_id), penalties=False)
+            request.lora_request = random.choice([None, *lora_requests])
+            next_req_id += 1
+            requests[request.req_id] = request
+            req_index = (removed_req_indices.pop()
+                         if removed_req_indices else None)
+            input_batch.add_request(request, req_index)
+        if removed_req_indices:
+            input_batch.condense(removed_req_indices)
+
+        num_scheduled_tokens = np.array(
+            [random.randint(1, 4) for _ in range(input_batch.num_reqs)],
+            dtype=np.int32)
+        prompt_lora_mapping, token_lora_mapping, active_lora_requests = (
+            input_batch.make_lora_inputs(num_scheduled_tokens))
+        expected_loras = [
+            requests[req_id].lora_request
+            for req_id in input_batch.req_ids[:input_batch.num_reqs]
+        ]
+        expected_lora_ids = [
+            0 if lora is None else lora.lora_int_id for lora in expected_loras
+        ]
+        assert prompt_lora_mapping == tuple(expected_lora_ids)
+        assert token_lora_mapping == tuple(
+            lora_id for lora_id, num_tokens in zip(expected_lora_ids,
+                                                   num_scheduled_tokens)
+            for _ in range(num_tokens))
+        assert active_lora_requests == {
+            lora
+            for lora in expected_loras if lora is not None
+        }
@@ -964,7 +964,8 @@ class TokenizerPoolConfig:
 
     Args:
         pool_size: Number of tokenizer workers in the pool.
-        pool_type: Type of the pool.
+        pool_type: Type of the pool, "ray" for Ray actors or "process" for
+            local processes.
         extra_config: Additional config for the pool.
             The way the config will be used depends on the
             pool type.
@@ -992,7 +993,7 @@ class TokenizerPoolConfig:
         return hash_str
 
     def __post_init__(self):
-        if self.pool_type not in ("ray", ) and not isinstance(
+        if self.pool_type not in ("ray", "process") and not isinstance(
                 self.pool_type, type):
             raise ValueError(f"Unknown pool type: {self.pool_type}")
         if not isinstance(self.extra_config, dict):
@@ -1041,6 +1042,7 @@ class LoadFormat(str, enum.Enum):
     GGUF = "gguf"
     BITSANDBYTES = "bitsandbytes"
     MISTRAL = "mistral"
+    ENGINE_IMAGE = "engine_image"
 
 
 @dataclass
@@ -1061,6 +1063,8 @@ class LoadConfig:
             "tensorizer" will use CoreWeave's tensorizer library for
                 fast weight loading.
             "bitsandbytes" will load nf4 type weights.
+            "engine_image" will load a vLLM engine image created with
+                `vllm convert-checkpoint`.
         model_loader_extra_config: The extra config for the model loader.
         ignore_patterns: The list of patterns to ignore when loading the model.
             Default to "original/**/*" to avoid repeated loading of llama's
@@ -1261,6 +1265,11 @@ class SchedulerConfig:
     # Maximum number of sequences to be processed in a single iteration.
     max_num_seqs: int = 128
 
+    # Maximum number of sequences whose token counts for the sampling
+    # penalties are kept on device across steps. The counts of the other
+    # sequences with penalties are rebuilt every step.
+    max_num_penalty_seqs: int = 32
+
     # Maximum length of a sequence (including prompt and generated text).
     max_model_len: int = 8192
 
@@ -1306,7 +1315,8 @@ class SchedulerConfig:
     # VLLM_USE_RAY_SPMD_WORKER=1
     send_delta_data: bool = False
 
-    # The scheduling policy to use. "fcfs" (default) or "priority".
+    # The scheduling policy to use. "fcfs" (default), "priority" or
+    # "deadline".
     policy: str = "fcfs"
 
     chunked_prefill_enabled: bool = field(init=False)
@@ -1385,6 +1395,12 @@ class SchedulerConfig:
                 "be greater than or equal to max_num_seqs "
                 f"({self.max_num_seqs}).")
 
+        if self.max_num_penalty_seqs < 0:
+            raise ValueError(
+                "max_num_penalty_seqs "
+                f"({self.max_num_penalty_seqs}) must be greater than or "
+                "equal to 0.")
+
         if self.num_lookahead_slots < 0:
             raise ValueError(
                 "num_lookahead_slots "
@@ -1909,6 +1925,10 @@ class LoRAConfig:
     lora_vocab_padding_size: ClassVar[int] = 256
     long_lora_scaling_factors: Optional[Tuple[float]] = None
     bias_enabled: bool = False
+    # If set, the scheduler admits waiting requests grouped by LoRA,
+    # preferring LoRAs that are in the batch or resident on the workers, and
+    # adds at most this many LoRAs that are not in GPU slots to each batch.
+    max_lora_loads_per_step: Optional[int] = None
 
     def compute_hash(self) -> str:
         """
@@ -1949,6 +1969,10 @@ class LoRAConfig:
             raise ValueError(
                 f"max_cpu_loras ({self.max_cpu_loras}) must be >= "
                 f"max_loras ({self.max_loras})")
+        if (self.max_lora_loads_per_step is not None
+                and self.max_lora_loads_per_step < 1):
+            raise ValueError(f"max_lora_loads_per_step "
+                             f"({self.max_lora_loads_per_step}) must be >= 1.")
 
     def verify_with_model_config(self, model_config: ModelConfig):
         if self.lora_dtype in (None, "auto"):
@@ -2788,6 +2812,17 @@ class CompilationConfig(BaseModel):
             self.cache_dir = cache_dir
 
             disabled = envs.VLLM_DISABLE_COMPILE_CACHE
+            model = vllm_config.model_config.model
+            if not disabled and os.path.isdir(model):
+                from vllm.engine.snapshot import is_engine_snapshot
+                from vllm.model_executor.model_loader.engine_image import (
+                    is_engine_image, restore_compile_cache)
+
+                # Only snapshots of engines restore their compiled graphs.
+                if is_engine_image(model) and is_engine_snapshot(model):
+                    restore_compile_cache(model,
+                                          vllm_config.parallel_config.rank,
+                                          cache_dir)
             from vllm.compilation.backends import InductorHashCache
             self.inductor_hash_cache: InductorHashCache = InductorHashCache(
                 self.cache_dir, disabled=disabled)
@@ -1,4 +1,6 @@
 import enum
+import itertools
+import math
 import os
 import random
 import time
@@ -13,6 +15,7 @@ from vllm.core.interfaces import AllocStatus, BlockSpaceManager
 from vllm.logger import init_logger
 from vllm.lora.request import LoRARequest
 from vllm.prompt_adapter.request import PromptAdapterRequest
+from vllm.sampling_params import SamplingParams
 from vllm.sequence import (Sequence, SequenceData, SequenceGroup,
                            SequenceGroupMetadata, SequenceGroupMetadataDelta,
                            SequenceStatus)
@@ -27,6 +30,32 @@ ENABLE_ARTIFICIAL_PREEMPT = bool(
 ARTIFICIAL_PREEMPTION_PROB = 0.5
 ARTIFICIAL_PREEMPTION_MAX_CNT = 500
 
+# With LoRA-aware admission, a waiting request that newer requests were
+# admitted ahead of in this many scheduling steps is admitted first.
+LORA_MAX_BYPASSED_STEPS = 16
+
+
+def get_slo_deadline(sampling_params: Optional[SamplingParams],
+                     arrival_time: float, first_token_time: Optional[float],
+                     num_output_tokens: int) -> float:
+    """Get the time by which the next token of a request is due to meet its
+    latency SLOs, or infinity if it has none.
+
+    The first token is due `ttft_slo_ms` after the arrival of the request,
+    and the token after `n` output tokens `n * tpot_slo_ms` after the first
+    token.
+    """
+    if sampling_params is None:
+        return math.inf
+    if first_token_time is None or num_output_tokens == 0:
+        if sampling_params.ttft_slo_ms is None:
+            return math.inf
+        return arrival_time + sampling_params.ttft_slo_ms / 1000
+    if sampling_params.tpot_slo_ms is None:
+        return math.inf
+    return (first_token_time +
+            num_output_tokens * sampling_params.tpot_slo_ms / 1000)
+
 
 class PreemptionMode(enum.Enum):
     """Preemption modes.
@@ -149,6 +178,9 @@ class SchedulerOutputs:
     # The number of requests in the running queue
     running_queue_size: int
     preempted: int
+    # LoRAs of waiting requests that are not in the batch, to be loaded by
+    # the workers in the background.
+    prefetch_lora_requests: List[LoRARequest] = field(default_factory=list)
 
     def __post_init__(self):
         # Swap in and swap out should never happen at the same time.
@@ -331,10 +363,22 @@ class Scheduler:
     ) -> None:
         self.scheduler_config = scheduler_config
         self.cache_config = cache_config
-        # Note for LoRA scheduling: the current policy is extremely
+        # Note for LoRA scheduling: the default policy is extremely
         # simple and NOT fair. It can lead to starvation of some
-        # LoRAs. This should be improved in the future.
+        # LoRAs. LoRA-aware admission (`max_lora_loads_per_step`) groups
+        # requests by LoRA and bounds how long a request can be bypassed.
         self.lora_config = lora_config
+        # LoRAs that the workers are loading in the background. Requests
+        # using them are not admitted while other requests can run, so that
+        # the batch does not wait for the load.
+        self.loading_lora_ids: Set[int] = set()
+        # LoRAs in the CPU cache of the workers, and those of them in GPU
+        # slots, as reported by the driver worker.
+        self.resident_lora_ids: Set[int] = set()
+        self.active_lora_ids: Set[int] = set()
+        # Number of scheduling steps in which newer requests were admitted
+        # ahead of each waiting request, with LoRA-aware admission.
+        self._lora_bypassed_steps: Dict[str, int] = {}
 
         version = "selfattn"
         if (self.scheduler_config.runner_type == "pooling"
@@ -427,6 +471,11 @@ class Scheduler:
     def lora_enabled(self) -> bool:
         return bool(self.lora_config)
 
+    @property
+    def lora_aware_admission(self) -> bool:
+        return (self.lora_config is not None
+                and self.lora_config.max_lora_loads_per_step is not None)
+
     @property
     def num_decoding_tokens_per_seq(self) -> int:
         """The number of new tokens."""
@@ -814,14 +863,113 @@ class Scheduler:
     def _get_priority(self,
                       seq_group: SequenceGroup) -> Tuple[Optional[int], float]:
         """ Get the priority of the sequence group.
-        Highest preference to user-defined priority, followed by arrival time.
+        Highest preference to user-defined priority, followed by arrival time,
+        or by the deadline of the next token with the deadline policy.
         Args:
             seq_group: The sequence group input.
         Returns:
             The priority of the sequence group.
         """
+        if self.scheduler_config.policy == "deadline":
+            return seq_group.priority, self._get_deadline(seq_group)
         return seq_group.priority, seq_group.arrival_time
 
+    def _get_deadline(self, seq_group: SequenceGroup) -> float:
+        return get_slo_deadline(seq_group.sampling_params,
+                                seq_group.arrival_time,
+                                seq_group.metrics.first_token_time,
+                                seq_group.first_seq.get_output_len())
+
+    def _order_by_deadline(self) -> None:
+        """Order the queues by earliest deadline first with the deadline
+        policy, so that the waiting requests with the earliest deadlines are
+        admitted first and the running requests with the latest deadlines
+        are preempted first. Requests without SLOs keep their order after
+        the others."""
+        self.waiting = deque(sorted(self.waiting, key=self._get_priority))
+        self.running = deque(sorted(self.running, key=self._get_priority))
+
+    def _abort_expired_seq_groups(self) -> List[SequenceGroup]:
+        """Abort the waiting requests whose first token is past its deadline,
+        rather than spend compute on responses that are too late."""
+        now = time.time()
+        expired: List[SequenceGroup] = []
+        waiting: Deque[SequenceGroup] = deque()
+        for seq_group in self.waiting:
+            if (seq_group.metrics.first_token_time is None
+                    and self._get_deadline(seq_group) < now):
+                expired.append(seq_group)
+            else:
+                waiting.append(seq_group)
+        if not expired:
+            return expired
+        self.waiting = waiting
+        for seq_group in expired:
+            self._finished_requests_ids.append(seq_group.request_id)
+            for seq in seq_group.get_seqs():
+                seq.status = SequenceStatus.FINISHED_ABORTED
+                self.free_seq(seq)
+            self._free_seq_group_cross_attn_blocks(seq_group)
+        logger.debug("Aborted %d requests past their TTFT deadline.",
+                     len(expired))
+        return expired
+
+    def _is_lora_starving(self, seq_group: SequenceGroup) -> bool:
+        return self._lora_bypassed_steps.get(seq_group.request_id,
+                                             0) >= LORA_MAX_BYPASSED_STEPS
+
+    def _order_waiting_by_lora(self, curr_loras: Set[int]) -> None:
+        """Order the waiting queue for LoRA-aware admission.
+
+        Requests bypassed for too long come first, in their original order.
+        The other requests are grouped by LoRA, so that all the waiting
+        requests of a LoRA are admitted with it, and the groups are ordered
+        by the cost of adding their LoRA to the batch: none for requests
+        without LoRA or whose LoRA is in the batch, then LoRAs in GPU slots,
+        then LoRAs in the CPU cache of the workers, then LoRAs to load.
+        Groups of the same cost are ordered by their first request.
+        """
+        first_priority: Dict[int, Tuple[Optional[int], float]] = {}
+        for seq_group in self.waiting:
+            lora_int_id = seq_group.lora_int_id
+            priority = self._get_priority(seq_group)
+            if (lora_int_id not in first_priority
+                    or priority < first_priority[lora_int_id]):
+                first_priority[lora_int_id] = priority
+
+        def lora_cost(lora_int_id: int) -> int:
+            if lora_int_id == 0 or lora_int_id in curr_loras:
+                return 1
+            if lora_int_id in self.active_lora_ids:
+                return 2
+            if lora_int_id in self.resident_lora_ids:
+                return 3
+            return 4
+
+        def key(seq_group: SequenceGroup):
+            priority = self._get_priority(seq_group)
+            if self._is_lora_starving(seq_group):
+                return (0, priority, 0, priority)
+            lora_int_id = seq_group.lora_int_id
+            return (lora_cost(lora_int_id), first_priority[lora_int_id],
+                    lora_int_id, priority)
+
+        self.waiting = deque(sorted(self.waiting, key=key))
+
+    def _update_lora_bypassed_steps(
+            self, seq_groups: List[ScheduledSequenceGroup]) -> None:
+        """Count a scheduling step for the waiting requests that newer
+        requests were admitted ahead of."""
+        last_priority = max(
+            self._get_priority(scheduled_seq_group.seq_group)
+            for scheduled_seq_group in seq_groups)
+        self._lora_bypassed_steps = {
+            seq_group.request_id:
+            self._lora_bypassed_steps.get(seq_group.request_id, 0) +
+            (self._get_priority(seq_group) < last_priority)
+            for seq_group in self.waiting
+        }
+
     def _schedule_priority_preemption(
         self,
         budget: SchedulingBudget,
@@ -919,6 +1067,11 @@ class Scheduler:
         ignored_seq_groups: List[SequenceGroup] = []
         seq_groups: List[ScheduledSequenceGroup] = []
 
+        if self.lora_aware_admission:
+            assert curr_loras is not None
+            self._order_waiting_by_lora(curr_loras)
+        num_lora_loads = 0
+
         waiting_queue = self.waiting
 
         leftover_waiting_sequences: Deque[SequenceGroup] = deque()
@@ -972,18 +1125,45 @@ class Scheduler:
                 continue
 
             lora_int_id = 0
+            is_lora_load = False
             if self.lora_enabled:
                 lora_int_id = seq_group.lora_int_id
                 assert curr_loras is not None
                 assert self.lora_config is not None
+                is_lora_load = (lora_int_id > 0
+                                and lora_int_id not in curr_loras
+                                and lora_int_id not in self.active_lora_ids)
+                # Requests bypassed for too long are not skipped: no newer
+                # request is admitted until they are.
+                is_starving = (self.lora_aware_admission
+                               and self._is_lora_starving(seq_group))
                 if (self.lora_enabled and lora_int_id > 0
                         and lora_int_id not in curr_loras
                         and len(curr_loras) >= self.lora_config.max_loras):
+                    if is_starving:
+                        break
                     # We don't have a space for another LoRA, so
                     # we ignore this request for now.
                     leftover_waiting_sequences.appendleft(seq_group)
                     waiting_queue.popleft()
                     continue
+                if (lora_int_id in self.loading_lora_ids
+                        and budget.num_curr_seqs > 0):
+                    if is_starving:
+                        break
+                    # The LoRA is being loaded in the background: run the
+                    # other requests rather than wait for the load.
+                    leftover_waiting_sequences.appendleft(seq_group)
+                    waiting_queue.popleft()
+                    continue
+                if (is_lora_load and not is_starving
+                        and self.lora_aware_admission and num_lora_loads >=
+                        self.lora_config.max_lora_loads_per_step):
+                    # Bound the number of LoRAs loaded into GPU slots per
+                    # step.
+                    leftover_waiting_sequences.appendleft(seq_group)
+                    waiting_queue.popleft()
+                    continue
 
             if (budget.num_batched_tokens >=
                     self.scheduler_config.max_num_batched_tokens):
@@ -1002,6 +1182,7 @@ class Scheduler:
             # Can schedule this request.
             if curr_loras is not None and lora_int_id > 0:
                 curr_loras.add(lora_int_id)
+            num_lora_loads += is_lora_load
             waiting_queue.popleft()
             self._allocate_and_set_running(seq_group)
 
@@ -1036,6 +1217,8 @@ class Scheduler:
         waiting_queue.extendleft(leftover_waiting_sequences)
         if len(seq_groups) > 0:
             self.prev_prompt = True
+            if self.lora_aware_admission:
+                self._update_lora_bypassed_steps(seq_groups)
 
         return SchedulerPrefillOutputs(
             seq_groups=seq_groups,
@@ -1075,8 +1258,8 @@ class Scheduler:
                                                curr_loras,
                                                enable_chunking=False)
 
-        if len(prefills.seq_groups
-               ) == 0 and self.scheduler_config.policy == "priority":
+        if len(prefills.seq_groups) == 0 and self.scheduler_config.policy in (
+                "priority", "deadline"):
             self._schedule_priority_preemption(budget)
 
         # Don't schedule decodes if prefills are scheduled.
@@ -1245,10 +1428,44 @@ class Scheduler:
 
     def _schedule(self) -> SchedulerOutputs:
         """Schedule queued requests."""
+        expired_seq_groups: List[SequenceGroup] = []
+        if self.scheduler_config.policy == "deadline":
+            expired_seq_groups = self._abort_expired_seq_groups()
+            self._order_by_deadline()
         if self.scheduler_config.chunked_prefill_enabled:
-            return self._schedule_chunked_prefill()
+            scheduler_outputs = self._schedule_chunked_prefill()
         else:
-            return self._schedule_default()
+            scheduler_outputs = self._schedule_default()
+        if expired_seq_groups:
+            # The aborted requests are returned like the ignored ones, so
+            # that their clients get a response.
+            scheduler_outputs.ignored_seq_groups.extend(expired_seq_groups)
+        if self.lora_enabled:
+            scheduler_outputs.prefetch_lora_requests = (
+                self._get_prefetch_lora_requests(scheduler_outputs))
+        return scheduler_outputs
+
+    def _get_prefetch_lora_requests(
+            self, scheduler_outputs: SchedulerOutputs) -> List[LoRARequest]:
+        """Return the LoRAs of the requests at the head of the waiting queue
+        that are not in the batch, so that the workers load them before the
+        requests are admitted."""
+        assert self.lora_config is not None
+        scheduled_lora_ids = {
+            lora_request.lora_int_id
+            for lora_request in scheduler_outputs.lora_requests
+        }
+        prefetch_lora_requests: Dict[int, LoRARequest] = {}
+        for seq_group in itertools.islice(self.waiting,
+                                          self.scheduler_config.max_num_seqs):
+            if len(prefetch_lora_requests) >= self.lora_config.max_loras:
+                break
+            lora_request = seq_group.lora_request
+            if (lora_request is not None
+                    and lora_request.lora_int_id not in scheduled_lora_ids):
+                prefetch_lora_requests.setdefault(lora_request.lora_int_id,
+                                                  lora_request)
+        return list(prefetch_lora_requests.values())
 
     def _can_append_slots(self, seq_group: SequenceGroup,
                           enable_chunking: bool) -> bool:
@@ -121,6 +121,7 @@ class EngineArgs:
     gpu_memory_utilization: float = 0.90
     max_num_batched_tokens: Optional[int] = None
     max_num_seqs: Optional[int] = None
+    max_num_penalty_seqs: int = 32
     max_logprobs: int = 20  # Default value for OpenAI Chat Completions API
     disable_log_stats: bool = False
     revision: Optional[str] = None
@@ -154,6 +155,7 @@ class EngineArgs:
     long_lora_scaling_factors: Optional[Tuple[float]] = None
     lora_dtype: Optional[Union[str, torch.dtype]] = 'auto'
     max_cpu_loras: Optional[int] = None
+    max_lora_loads_per_step: Optional[int] = None
     device: str = 'auto'
     num_scheduler_steps: int = 1
     multi_step_stream_outputs: bool = True
@@ -188,7 +190,7 @@ class EngineArgs:
     otlp_traces_endpoint: Optional[str] = None
     collect_detailed_traces: Optional[str] = None
     disable_async_output_proc: bool = False
-    scheduling_policy: Literal["fcfs", "priority"] = "fcfs"
+    scheduling_policy: Literal["fcfs", "priority", "deadline"] = "fcfs"
 
     override_neuron_config: Optional[Dict[str, Any]] = None
     override_pooler_config: Optional[PoolerConfig] = None
@@ -314,7 +316,9 @@ class EngineArgs:
             'CoreWeave. See the Tensorize vLLM Model script in the Examples '
             'section for more information.\n'
             '* "bitsandbytes" will load the weights using bitsandbytes '
-            'quantization.\n')
+            'quantization.\n'
+            '* "engine_image" will load a vLLM engine image created with '
+            '`vllm convert-checkpoint`.\n')
         parser.add_argument(
             '--config-format',
             default=EngineArgs.config_format,
@@ -506,6 +510,15 @@ class EngineArgs:
                             type=int,
                             default=EngineArgs.max_num_seqs,
                             help='Maximum number of sequences per iteration.')
+        parser.add_argument(
+            '--max-num-penalty-seqs',
+            type=int,
+            default=EngineArgs.max_num_penalty_seqs,
+            help='Maximum number of sequences whose token counts for the '
+            'presence, frequency and repetition penalties are kept on the '
+            'device across steps. The memory profiling reserves them. The '
+            'counts of the other sequences with penalties are rebuilt every '
+            'step.')
         parser.add_argument(
             '--max-logprobs',
             type=int,
@@ -573,14 +586,17 @@ class EngineArgs:
                             type=str,
                             default=EngineArgs.tokenizer_pool_type,
                             help='Type of tokenizer pool to use for '
-                            'asynchronous tokenization. Ignored '
-                            'if tokenizer_pool_size is 0.')
+                            'asynchronous tokenization, "ray" or "process". '
+                            'Ignored if tokenizer_pool_size is 0.')
         parser.add_argument('--tokenizer-pool-extra-config',
                             type=nullable_str,
                             default=EngineArgs.tokenizer_pool_extra_config,
                             help='Extra config for tokenizer pool. '
                             'This should be a JSON string that will be '
-                            'parsed into a dictionary. Ignored if '
+                            'parsed into a dictionary. For "ray", the '
+                            'options of the Ray actors. For "process", '
+                            '"shm_bytes", the size of the shared memory of '
+                            'each worker. Ignored if '
                             'tokenizer_pool_size is 0.')
 
         # Multimodal related configs
@@ -656,6 +672,16 @@ class EngineArgs:
             help=('Maximum number of LoRAs to store in CPU memory. '
                   'Must be >= than max_loras. '
                   'Defaults to max_loras.'))
+        parser.add_argument(
+            '--max-lora-loads-per-step',
+            type=int,
+            default=EngineArgs.max_lora_loads_per_step,
+            help=('If specified, the scheduler admits waiting requests '
+                  'grouped by LoRA, preferring LoRAs that are already in '
+                  'the batch or loaded on the workers, and adds at most this '
+                  'many LoRAs that are not in GPU slots to each batch. '
+                  'Requests bypassed by too many newer requests are '
+                  'admitted first, so that no request starves.'))
         parser.add_argument(
             '--fully-sharded-loras',
             action='store_true',
@@ -890,13 +916,17 @@ class EngineArgs:
 
         parser.add_argument(
             '--scheduling-policy',
-            choices=['fcfs', 'priority'],
+            choices=['fcfs', 'priority', 'deadline'],
             default="fcfs",
             help='The scheduling policy to use. "fcfs" (first come first served'
-            ', i.e. requests are handled in order of arrival; default) '
-            'or "priority" (requests are handled based on given '
+            ', i.e. requests are handled in order of arrival; default), '
+            '"priority" (requests are handled based on given '
             'priority (lower value means earlier handling) and time of '
-            'arrival deciding any ties).')
+            'arrival deciding any ties) or "deadline" (requests are handled '
+            'by the earliest deadline of their next token, set by the '
+            '`ttft_slo_ms` and `tpot_slo_ms` sampling parameters, and '
+            'waiting requests are aborted once their first token is past '
+            'its deadline).')
 
         parser.add_argument(
             '--override-neuron-config',
@@ -1163,6 +1193,7 @@ class EngineArgs:
             runner_type=model_config.runner_type,
             max_num_batched_tokens=self.max_num_batched_tokens,
             max_num_seqs=self.max_num_seqs,
+            max_num_penalty_seqs=self.max_num_penalty_seqs,
             max_model_len=model_config.max_model_len,
             num_lookahead_slots=num_lookahead_slots,
             delay_factor=self.scheduler_delay_factor,
@@ -1182,8 +1213,10 @@ class EngineArgs:
             lora_extra_vocab_size=self.lora_extra_vocab_size,
             long_lora_scaling_factors=self.long_lora_scaling_factors,
             lora_dtype=self.lora_dtype,
-            max_cpu_loras=self.max_cpu_loras if self.max_cpu_loras
-            and self.max_cpu_loras > 0 else None) if self.enable_lora else None
+            max_cpu_loras=self.max_cpu_loras
+            if self.max_cpu_loras and self.max_cpu_loras > 0 else None,
+            max_lora_loads_per_step=self.max_lora_loads_per_step,
+        ) if self.enable_lora else None
 
         if self.qlora_adapter_name_or_path is not None and \
             self.qlora_adapter_name_or_path != "":
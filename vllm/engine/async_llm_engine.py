@@ -15,7 +15,8 @@ from vllm.config import (DecodingConfig, LoRAConfig, ModelConfig,
 from vllm.core.scheduler import SchedulerOutputs
 from vllm.engine.arg_utils import AsyncEngineArgs
 from vllm.engine.async_timeout import asyncio_timeout
-from vllm.engine.llm_engine import LLMEngine, SchedulerOutputState
+from vllm.engine.llm_engine import (COMPILE_POLL_INTERVAL_S, LLMEngine,
+                                    SchedulerOutputState)
 from vllm.engine.metrics_types import StatLoggerBase
 from vllm.engine.protocol import EngineClient
 from vllm.executor.executor_base import ExecutorAsyncBase
@@ -35,7 +36,7 @@ from vllm.sampling_params import SamplingParams
 from vllm.sequence import ExecuteModelRequest
 from vllm.transformers_utils.tokenizer import AnyTokenizer
 from vllm.usage.usage_lib import UsageContext
-from vllm.utils import deprecate_kwargs, weak_bind
+from vllm.utils import deprecate_kwargs, make_async, weak_bind
 
 logger = init_logger(__name__)
 ENGINE_ITERATION_TIMEOUT_S = envs.VLLM_ENGINE_ITERATION_TIMEOUT_S
@@ -295,6 +296,9 @@ class _AsyncLLMEngine(LLMEngine):
         # batch has completed.
         if not self._has_remaining_steps(seq_group_metadata_list):
 
+            await self._admit_compiled_seq_groups_async(virtual_engine)
+            self._update_lora_state(virtual_engine)
+
             # Schedule iteration
             (seq_group_metadata_list, scheduler_outputs,
              allow_async_output_proc
@@ -343,7 +347,9 @@ class _AsyncLLMEngine(LLMEngine):
                 finished_requests_ids=finished_requests_ids,
                 # We use ExecuteModelRequest to pass the last sampled_token_ids
                 # to each of the non-last PP stages for in-place prepare_input.
-                last_sampled_token_ids=last_sampled_token_ids)
+                last_sampled_token_ids=last_sampled_token_ids,
+                prefetch_lora_requests=scheduler_outputs.prefetch_lora_requests
+            )
 
             if allow_async_output_proc:
                 execute_model_req.async_callback = self.async_callbacks[
@@ -415,6 +421,27 @@ class _AsyncLLMEngine(LLMEngine):
 
         return ctx.request_outputs
 
+    async def _admit_compiled_seq_groups_async(self,
+                                               virtual_engine: int) -> None:
+        if (self.compiling_seq_groups
+                and not self.scheduler[virtual_engine].has_unfinished_seqs()):
+            # Nothing else is left to run: wait briefly for a compilation to
+            # finish instead of spinning on empty steps. The wait is bounded
+            # so that new requests are still picked up promptly.
+            futures = [
+                asyncio.wrap_future(future)
+                for _, futures in self.compiling_seq_groups.values()
+                for future in futures
+            ]
+            for future in futures:
+                # Failures are reported when the request is admitted.
+                future.add_done_callback(
+                    lambda f: f.cancelled() or f.exception())
+            await asyncio.wait(futures,
+                               timeout=COMPILE_POLL_INTERVAL_S,
+                               return_when=asyncio.FIRST_COMPLETED)
+        self._admit_compiled_seq_groups()
+
     async def stop_remote_worker_execution_loop_async(self) -> None:
         """Stop the remote worker execution loop."""
         await self.model_executor.stop_remote_worker_execution_loop_async()
@@ -511,6 +538,14 @@ class _AsyncLLMEngine(LLMEngine):
                 guided_decoding_backend,
                 model_config=self.model_config)
 
+        extra_hash = None
+        if self.cache_config.enable_prefix_caching:
+            # Hashing the adapter weights and multi-modal data may be slow,
+            # so it runs off the event loop.
+            compute_extra_hash_async = make_async(self._compute_extra_hash)
+            extra_hash = await compute_extra_hash_async(
+                processed_inputs, lora_request, prompt_adapter_request)
+
         self._add_processed_request(
             request_id=request_id,
             processed_inputs=processed_inputs,
@@ -520,6 +555,7 @@ class _AsyncLLMEngine(LLMEngine):
             prompt_adapter_request=prompt_adapter_request,
             trace_headers=trace_headers,
             priority=priority,
+            extra_hash=extra_hash,
         )
 
     async def check_health_async(self) -> None:
@@ -810,6 +846,12 @@ class AsyncLLMEngine(EngineClient):
 
         request_outputs = await self.engine.step_async(virtual_engine)
 
+        # Fail the requests whose grammars failed to compile.
+        for request_id, error in self.engine.get_and_reset_failed_requests():
+            self._request_tracker.process_exception(request_id,
+                                                    error,
+                                                    verbose=self.log_requests)
+
         # Put the outputs into the corresponding streams.
         # If used as a callback, then already invoked inside
         # LLMEngine's _process_model_outputs
@@ -2,13 +2,15 @@ import copy
 import time
 from collections import Counter as collectionsCounter
 from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future
+from concurrent.futures import wait as wait_futures
 from contextlib import contextmanager
 from dataclasses import dataclass
 from functools import partial
 from typing import (TYPE_CHECKING, Any, Callable, ClassVar, Deque, Dict,
                     Iterable, List, Mapping, NamedTuple, Optional)
 from typing import Sequence as GenericSequence
-from typing import Set, Type, Union, cast, overload
+from typing import Set, Tuple, Type, Union, cast, overload
 
 import torch
 from typing_extensions import TypeVar, deprecated
@@ -25,6 +27,7 @@ from vllm.engine.output_processor.interfaces import (
     SequenceGroupOutputProcessor)
 from vllm.engine.output_processor.stop_checker import StopChecker
 from vllm.engine.output_processor.util import create_output_by_sequence_group
+from vllm.engine.snapshot import EngineSnapshot, is_engine_snapshot
 from vllm.entrypoints.openai.logits_processors import (
     get_logits_processors as get_openai_logits_processors)
 from vllm.executor.executor_base import ExecutorBase
@@ -38,7 +41,9 @@ from vllm.logger import init_logger
 from vllm.logits_process import get_bad_words_logits_processors
 from vllm.lora.request import LoRARequest
 from vllm.model_executor.guided_decoding import (
-    get_local_guided_decoding_logits_processor)
+    get_guided_decoding_logits_processor_in_background,
+    get_pending_grammar_compilations,
+    resolve_guided_decoding_logits_processors)
 from vllm.model_executor.layers.sampler import SamplerOutput
 from vllm.multimodal import MULTIMODAL_REGISTRY, MultiModalRegistry
 from vllm.outputs import (PoolingRequestOutput, RequestOutput,
@@ -49,7 +54,8 @@ from vllm.sampling_params import RequestOutputKind, SamplingParams
 from vllm.sequence import (ExecuteModelRequest, ParallelSampleSequenceGroup,
                            PoolingSequenceGroupOutput, Sequence, SequenceGroup,
                            SequenceGroupBase, SequenceGroupMetadata,
-                           SequenceGroupOutput, SequenceStatus)
+                           SequenceGroupOutput, SequenceStatus,
+                           compute_extra_hash)
 from vllm.tracing import (SpanAttributes, SpanKind, extract_trace_context,
                           init_tracer)
 from vllm.transformers_utils.config import try_get_generation_config
@@ -62,9 +68,16 @@ from vllm.usage.usage_lib import (UsageContext, is_usage_stats_enabled,
 from vllm.utils import Counter, Device, deprecate_kwargs, weak_bind
 from vllm.version import __version__ as VLLM_VERSION
 
+if TYPE_CHECKING:
+    from vllm.lora.worker_manager import LoRAPrefetchStats
+
 logger = init_logger(__name__)
 _LOCAL_LOGGING_INTERVAL_SEC = 5
 
+# Upper bound on how long an otherwise idle engine step waits for guided
+# decoding grammars to finish compiling.
+COMPILE_POLL_INTERVAL_S = 0.01
+
 
 def _load_generation_config_dict(model_config: ModelConfig) -> Dict[str, Any]:
     config = try_get_generation_config(
@@ -337,6 +350,11 @@ class LLMEngine:
             for _ in range(self.parallel_config.pipeline_parallel_size)
         ]
 
+        # LoRA loading stats of the driver worker and the stall times that
+        # were last logged.
+        self._lora_prefetch_stats: Optional[LoRAPrefetchStats] = None
+        self._logged_lora_stall_times = (0.0, 0.0)
+
         self.scheduler_contexts = [
             SchedulerContext(multi_step_stream_outputs=self.scheduler_config.
                              multi_step_stream_outputs)
@@ -370,6 +388,15 @@ class LLMEngine:
             for v_id in range(self.parallel_config.pipeline_parallel_size)
         ]
 
+        # Requests whose guided decoding grammars are still being compiled in
+        # the background. They are kept out of the schedulers, so that they
+        # do not block the running batch, and are admitted once compiled.
+        self.compiling_seq_groups: Dict[str, Tuple[SequenceGroup,
+                                                   List[Future]]] = {}
+        # Requests whose grammars failed to compile, with the error, for the
+        # engine clients to report to their callers.
+        self.failed_requests: List[Tuple[str, BaseException]] = []
+
         # Metric Logging.
         if self.log_stats:
             if stat_loggers is not None:
@@ -427,8 +454,20 @@ class LLMEngine:
         and the swap CPU cache.
         """
         start = time.time()
-        num_gpu_blocks, num_cpu_blocks = (
-            self.model_executor.determine_num_available_blocks())
+        block_counts = None
+        if is_engine_snapshot(self.model_config.model):
+            snapshot = EngineSnapshot.load(self.model_config.model)
+            block_counts = snapshot.get_block_counts(self.vllm_config)
+        if block_counts is not None:
+            # Memory profiling is deterministic for a given hardware and
+            # configuration, so the snapshot's result can be reused.
+            num_gpu_blocks, num_cpu_blocks = block_counts
+            logger.info(
+                "Using num_gpu_blocks=%d and num_cpu_blocks=%d from the "
+                "engine snapshot", num_gpu_blocks, num_cpu_blocks)
+        else:
+            num_gpu_blocks, num_cpu_blocks = (
+                self.model_executor.determine_num_available_blocks())
 
         if self.cache_config.num_gpu_blocks_override is not None:
             num_gpu_blocks_override = self.cache_config.num_gpu_blocks_override
@@ -600,6 +639,7 @@ class LLMEngine:
         prompt_adapter_request: Optional[PromptAdapterRequest],
         trace_headers: Optional[Mapping[str, str]] = None,
         priority: int = 0,
+        extra_hash: Optional[int] = None,
     ) -> Optional[SequenceGroup]:
         """Add a processed request to the engine's request pool.
         return the created sequence group.
@@ -615,6 +655,7 @@ class LLMEngine:
                 trace_headers=trace_headers,
                 prompt_adapter_request=prompt_adapter_request,
                 priority=priority,
+                extra_hash=extra_hash,
             )
             return None
 
@@ -632,11 +673,11 @@ class LLMEngine:
             encoder_inputs = None
 
         seq = Sequence(seq_id, decoder_inputs, block_size, eos_token_id,
-                       lora_request, prompt_adapter_request)
+                       lora_request, prompt_adapter_request, extra_hash)
 
         encoder_seq = (None if encoder_inputs is None else Sequence(
             seq_id, encoder_inputs, block_size, eos_token_id, lora_request,
-            prompt_adapter_request))
+            prompt_adapter_request, extra_hash))
 
         # Create a SequenceGroup based on SamplingParams or PoolingParams
         if isinstance(params, SamplingParams):
@@ -664,6 +705,19 @@ class LLMEngine:
             raise ValueError(
                 "Either SamplingParams or PoolingParams must be provided.")
 
+        if isinstance(params, SamplingParams):
+            futures = get_pending_grammar_compilations(
+                seq_group.sampling_params.logits_processors)
+            if not all(future.done() for future in futures):
+                self.compiling_seq_groups[request_id] = (seq_group, futures)
+                return seq_group
+            self._resolve_logits_processors(seq_group, futures)
+
+        self._add_seq_group_to_scheduler(seq_group)
+
+        return seq_group
+
+    def _add_seq_group_to_scheduler(self, seq_group: SequenceGroup) -> None:
         # Add the sequence group to the scheduler with least unfinished seqs.
         costs = [
             scheduler.get_num_unfinished_seq_groups()
@@ -672,7 +726,73 @@ class LLMEngine:
         min_cost_scheduler = self.scheduler[costs.index(min(costs))]
         min_cost_scheduler.add_seq_group(seq_group)
 
-        return seq_group
+    @staticmethod
+    def _resolve_logits_processors(seq_group: SequenceGroup,
+                                   futures: List[Future]) -> None:
+        sampling_params = seq_group.sampling_params
+        assert sampling_params is not None
+        if sampling_params.logits_processors:
+            sampling_params.logits_processors = (
+                resolve_guided_decoding_logits_processors(
+                    sampling_params.logits_processors, futures))
+
+    def _admit_compiled_seq_groups(self, timeout: float = 0) -> None:
+        """Moves the requests whose guided decoding grammars finished
+        compiling to the schedulers.
+
+        Args:
+            timeout: How long to wait for a compilation to finish if some
+                requests are still compiling.
+        """
+        if not self.compiling_seq_groups:
+            return
+        if timeout > 0:
+            pending = [
+                future for _, futures in self.compiling_seq_groups.values()
+                for future in futures
+            ]
+            wait_futures(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        compiling = list(self.compiling_seq_groups.items())
+        for request_id, (seq_group, futures) in compiling:
+            if (request_id not in self.compiling_seq_groups
+                    or not all(future.done() for future in futures)):
+                continue
+            del self.compiling_seq_groups[request_id]
+            try:
+                # Raises if the grammar failed to compile.
+                self._resolve_logits_processors(seq_group, futures)
+            except Exception as e:
+                self._fail_seq_group(seq_group, e)
+                continue
+            self._add_seq_group_to_scheduler(seq_group)
+
+    def _fail_seq_group(self, seq_group: SequenceGroup,
+                        error: BaseException) -> None:
+        """Finishes a request that was not added to the schedulers, such as
+        one whose grammar failed to compile, without failing the engine."""
+        logger.warning("Request %s failed: %s", seq_group.request_id, error)
+        for seq in seq_group.get_seqs():
+            seq.status = SequenceStatus.FINISHED_ABORTED
+        request_id = seq_group.request_id
+        group = self.seq_id_to_seq_group.pop(request_id, None)
+        if group is not None:
+            # A parallel sample failed: fail the whole request.
+            request_id = group.group_id
+            sibling_ids = [
+                seq_id for seq_id in group.seq_id_to_index
+                if seq_id != seq_group.request_id
+            ]
+            self.abort_request(sibling_ids)
+            for seq_id in sibling_ids:
+                self.seq_id_to_seq_group.pop(seq_id, None)
+        self.failed_requests.append((request_id, error))
+
+    def get_and_reset_failed_requests(self) -> List[Tuple[str, BaseException]]:
+        """Returns the requests that failed since the last call, with the
+        error to report to their callers."""
+        failed_requests = self.failed_requests
+        self.failed_requests = []
+        return failed_requests
 
     def stop_remote_worker_execution_loop(self) -> None:
         self.model_executor.stop_remote_worker_execution_loop()
@@ -688,6 +808,7 @@ class LLMEngine:
         trace_headers: Optional[Mapping[str, str]] = None,
         prompt_adapter_request: Optional[PromptAdapterRequest] = None,
         priority: int = 0,
+        lora_fingerprint: Optional[int] = None,
     ) -> None:
         ...
 
@@ -704,6 +825,7 @@ class LLMEngine:
         trace_headers: Optional[Mapping[str, str]] = None,
         prompt_adapter_request: Optional[PromptAdapterRequest] = None,
         priority: int = 0,
+        lora_fingerprint: Optional[int] = None,
     ) -> None:
         ...
 
@@ -721,6 +843,7 @@ class LLMEngine:
             trace_headers: Optional[Mapping[str, str]] = None,
             prompt_adapter_request: Optional[PromptAdapterRequest] = None,
             priority: int = 0,
+            lora_fingerprint: Optional[int] = None,
             *,
             inputs: Optional[PromptType] = None,  # DEPRECATED
     ) -> None:
@@ -742,6 +865,9 @@ class LLMEngine:
             trace_headers: OpenTelemetry trace headers.
             priority: The priority of the request.
                 Only applicable with priority scheduling.
+            lora_fingerprint: The fingerprint of the LoRA adapter, see
+                :func:`~vllm.lora.utils.get_adapter_fingerprint`. Computed
+                from the adapter files if None and prefix caching is enabled.
 
         Details:
             - Set arrival_time to the current time if it is None.
@@ -802,6 +928,13 @@ class LLMEngine:
         )
         processed_inputs = self.input_processor(preprocessed_inputs)
 
+        extra_hash = None
+        if self.cache_config.enable_prefix_caching:
+            extra_hash = self._compute_extra_hash(processed_inputs,
+                                                  lora_request,
+                                                  prompt_adapter_request,
+                                                  lora_fingerprint)
+
         self._add_processed_request(
             request_id=request_id,
             processed_inputs=processed_inputs,
@@ -811,8 +944,25 @@ class LLMEngine:
             prompt_adapter_request=prompt_adapter_request,
             trace_headers=trace_headers,
             priority=priority,
+            extra_hash=extra_hash,
         )
 
+    @staticmethod
+    def _compute_extra_hash(
+        processed_inputs: ProcessorInputs,
+        lora_request: Optional[LoRARequest],
+        prompt_adapter_request: Optional[PromptAdapterRequest],
+        lora_fingerprint: Optional[int] = None,
+    ) -> Optional[int]:
+        """Compute the extra hash of the block hashes of a request for
+        prefix caching, which depends on the decoder inputs."""
+        if is_encoder_decoder_inputs(processed_inputs):
+            decoder_inputs = processed_inputs["decoder"]
+        else:
+            decoder_inputs = processed_inputs
+        return compute_extra_hash(decoder_inputs, lora_request,
+                                  prompt_adapter_request, lora_fingerprint)
+
     def _validate_token_prompt(self, prompt: PromptType,
                                tokenizer: AnyTokenizer):
         # Guard against out-of-vocab tokens.
@@ -922,8 +1072,34 @@ class LLMEngine:
             >>> # abort the request
             >>> engine.abort_request(request_id)
         """
+        if isinstance(request_id, str):
+            request_id = (request_id, )
+        request_ids = set(request_id)
+        for compiling_request_id in request_ids:
+            self.compiling_seq_groups.pop(compiling_request_id, None)
         for scheduler in self.scheduler:
-            scheduler.abort_seq_group(request_id)
+            scheduler.abort_seq_group(request_ids)
+
+    def abort_all_requests(self) -> None:
+        """Aborts all the unfinished requests, e.g. those of a batch whose
+        caller fails before the batch finishes."""
+        request_ids = list(self.compiling_seq_groups)
+        for scheduler in self.scheduler:
+            for state_queue in [
+                    scheduler.waiting, scheduler.running, scheduler.swapped
+            ]:
+                request_ids.extend(seq_group.request_id
+                                   for seq_group in state_queue)
+        self.abort_request(request_ids)
+        for request_id in request_ids:
+            self.seq_id_to_seq_group.pop(request_id, None)
+        for ctx in self.scheduler_contexts:
+            # Drain async postprocessor (if exists), and drop the outputs of
+            # the aborted requests.
+            if len(ctx.output_queue) > 0:
+                self._process_model_outputs(ctx=ctx)
+            ctx.request_outputs.clear()
+        self.model_executor.stop_remote_worker_execution_loop()
 
     def get_model_config(self) -> ModelConfig:
         """Gets the model configuration."""
@@ -947,20 +1123,23 @@ class LLMEngine:
 
     def get_num_unfinished_requests(self) -> int:
         """Gets the number of unfinished requests."""
-        return sum(scheduler.get_num_unfinished_seq_groups()
-                   for scheduler in self.scheduler)
+        return len(self.compiling_seq_groups) + sum(
+            scheduler.get_num_unfinished_seq_groups()
+            for scheduler in self.scheduler)
 
     def has_unfinished_requests(self) -> bool:
         """Returns True if there are unfinished requests."""
-        return any(scheduler.has_unfinished_seqs()
-                   for scheduler in self.scheduler)
+        return bool(self.compiling_seq_groups) or any(
+            scheduler.has_unfinished_seqs() for scheduler in self.scheduler)
 
     def has_unfinished_requests_for_virtual_engine(
             self, virtual_engine: int) -> bool:
         """
         Returns True if there are unfinished requests for the virtual engine.
+        Requests that are still compiling are accounted to virtual engine 0.
         """
-        return self.scheduler[virtual_engine].has_unfinished_seqs()
+        return (self.scheduler[virtual_engine].has_unfinished_seqs()
+                or (virtual_engine == 0 and bool(self.compiling_seq_groups)))
 
     @staticmethod
     def _process_sequence_group_outputs(
@@ -1333,6 +1512,13 @@ class LLMEngine:
         # used is always 0.
         virtual_engine = 0
 
+        # If nothing else is left to run, wait briefly for a grammar
+        # compilation rather than spinning on empty steps. The wait is bounded
+        # so that engine loops still pick up new requests promptly.
+        self._admit_compiled_seq_groups(
+            timeout=0 if self.scheduler[virtual_engine].has_unfinished_seqs(
+            ) else COMPILE_POLL_INTERVAL_S)
+
         # These are cached outputs from previous iterations. None if on first
         # iteration
         cached_outputs = self.cached_scheduler_outputs[virtual_engine]
@@ -1349,6 +1535,8 @@ class LLMEngine:
         # This ensures that the scheduler is only called again when the current
         # batch has completed.
         if not self._has_remaining_steps(seq_group_metadata_list):
+            self._update_lora_state(virtual_engine)
+
             # Schedule iteration
             (seq_group_metadata_list, scheduler_outputs,
              allow_async_output_proc
@@ -1396,7 +1584,9 @@ class LLMEngine:
                 finished_requests_ids=finished_requests_ids,
                 # We use ExecuteModelRequest to pass the last sampled_token_ids
                 # to each of the non-last PP stages for in-place prepare_input.
-                last_sampled_token_ids=last_sampled_token_ids)
+                last_sampled_token_ids=last_sampled_token_ids,
+                prefetch_lora_requests=scheduler_outputs.prefetch_lora_requests
+            )
 
             if allow_async_output_proc:
                 execute_model_req.async_callback = self.async_callbacks[
@@ -1478,6 +1668,23 @@ class LLMEngine:
 
         return ctx.request_outputs
 
+    def _update_lora_state(self, virtual_engine: int) -> None:
+        """Tell the scheduler which LoRAs the workers are loading in the
+        background, so that it does not admit requests using them while
+        they load, and which LoRAs the workers hold."""
+        if not self.lora_config:
+            return
+        self._lora_prefetch_stats = (
+            self.model_executor.get_lora_prefetch_stats())
+        if self._lora_prefetch_stats is not None:
+            scheduler = self.scheduler[virtual_engine]
+            scheduler.loading_lora_ids = (
+                self._lora_prefetch_stats.loading_lora_ids)
+            scheduler.resident_lora_ids = (
+                self._lora_prefetch_stats.resident_lora_ids)
+            scheduler.active_lora_ids = (
+                self._lora_prefetch_stats.active_lora_ids)
+
     def _has_remaining_steps(
         self, seq_group_metadata_list: Optional[List[SequenceGroupMetadata]]
     ) -> bool:
@@ -1789,6 +1996,17 @@ class LLMEngine:
         else:
             spec_decode_metrics = None
 
+        # LoRA loading stats of the workers, which are cumulative.
+        lora_stall_time_iter = lora_stall_time_avoided_iter = 0.0
+        if self._lora_prefetch_stats is not None:
+            stall_time = self._lora_prefetch_stats.stall_time
+            stall_time_avoided = self._lora_prefetch_stats.stall_time_avoided
+            lora_stall_time_iter = (stall_time -
+                                    self._logged_lora_stall_times[0])
+            lora_stall_time_avoided_iter = (stall_time_avoided -
+                                            self._logged_lora_stall_times[1])
+            self._logged_lora_stall_times = (stall_time, stall_time_avoided)
+
         return Stats(
             now=now,
             # System stats
@@ -1832,7 +2050,9 @@ class LLMEngine:
             finished_reason_requests=finished_reason_requests,
             max_lora=str(max_lora_stat),
             waiting_lora_adapters=list(waiting_lora_adapters.keys()),
-            running_lora_adapters=list(running_lora_adapters.keys()))
+            running_lora_adapters=list(running_lora_adapters.keys()),
+            lora_stall_time_iter=lora_stall_time_iter,
+            lora_stall_time_avoided_iter=lora_stall_time_avoided_iter)
 
     def add_lora(self, lora_request: LoRARequest) -> bool:
         return self.model_executor.add_lora(lora_request)
@@ -2008,12 +2228,13 @@ class LLMEngine:
             guided_decoding.backend = guided_decoding.backend or \
                 self.decoding_config.guided_decoding_backend
 
-            processor = get_local_guided_decoding_logits_processor(
-                guided_params=guided_decoding,
-                tokenizer=tokenizer,
-                model_config=self.model_config)
-            if processor:
-                logits_processors.append(processor)
+            # The processor is built in the background and the request is
+            # only scheduled once its grammar is compiled.
+            logits_processors.append(
+                get_guided_decoding_logits_processor_in_background(
+                    guided_params=guided_decoding,
+                    tokenizer=tokenizer,
+                    model_config=self.model_config))
 
             # Unset so this doesn't get passed down to the model
             sampling_params.guided_decoding = None
@@ -106,6 +106,15 @@ class Metrics:
             name="vllm:num_preemptions_total",
             documentation="Cumulative number of preemption from the engine.",
             labelnames=labelnames)
+        self.counter_lora_stall_time = self._counter_cls(
+            name="vllm:lora_stall_time_seconds_total",
+            documentation="Time batches waited for LoRAs to be loaded.",
+            labelnames=labelnames)
+        self.counter_lora_stall_time_avoided = self._counter_cls(
+            name="vllm:lora_stall_time_avoided_seconds_total",
+            documentation="Time spent loading LoRAs in the background that "
+            "batches would otherwise have waited for.",
+            labelnames=labelnames)
         self.counter_prompt_tokens = self._counter_cls(
             name="vllm:prompt_tokens_total",
             documentation="Number of prefill tokens processed.",
@@ -587,6 +596,10 @@ class PrometheusStatLogger(StatLoggerBase):
         # Iteration level data
         self._log_counter(self.metrics.counter_num_preemption,
                           stats.num_preemption_iter)
+        self._log_counter(self.metrics.counter_lora_stall_time,
+                          stats.lora_stall_time_iter)
+        self._log_counter(self.metrics.counter_lora_stall_time_avoided,
+                          stats.lora_stall_time_avoided_iter)
         self._log_counter(self.metrics.counter_prompt_tokens,
                           stats.num_prompt_tokens_iter)
         self._log_counter(self.metrics.counter_generation_tokens,
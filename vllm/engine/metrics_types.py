@@ -68,6 +68,11 @@ class Stats:
 
     spec_decode_metrics: Optional["SpecDecodeWorkerMetrics"] = None
 
+    # Time batches waited for LoRAs to be loaded, and time spent loading
+    # LoRAs in the background that they would otherwise have waited for.
+    lora_stall_time_iter: float = 0.0
+    lora_stall_time_avoided_iter: float = 0.0
+
 
 class SupportsMetricsInfo(Protocol):
 
@@ -33,6 +33,9 @@ class RPCProcessRequest:
     trace_headers: Optional[Mapping[str, str]] = None
     prompt_adapter_request: Optional[PromptAdapterRequest] = None
     priority: int = 0
+    # The fingerprint of the LoRA adapter, computed by the client so that the
+    # engine loop does not read the files of the adapter.
+    lora_fingerprint: Optional[int] = None
 
     @overload
     def __init__(
@@ -44,6 +47,7 @@ class RPCProcessRequest:
         trace_headers: Optional[Mapping[str, str]] = None,
         prompt_adapter_request: Optional[PromptAdapterRequest] = None,
         priority: int = 0,
+        lora_fingerprint: Optional[int] = None,
     ) -> None:
         ...
 
@@ -59,6 +63,7 @@ class RPCProcessRequest:
         trace_headers: Optional[Mapping[str, str]] = None,
         prompt_adapter_request: Optional[PromptAdapterRequest] = None,
         priority: int = 0,
+        lora_fingerprint: Optional[int] = None,
     ) -> None:
         ...
 
@@ -75,6 +80,7 @@ class RPCProcessRequest:
             trace_headers: Optional[Mapping[str, str]] = None,
             prompt_adapter_request: Optional[PromptAdapterRequest] = None,
             priority: int = 0,
+            lora_fingerprint: Optional[int] = None,
             *,
             inputs: Optional[PromptType] = None,  # DEPRECATED
     ) -> None:
@@ -92,6 +98,7 @@ class RPCProcessRequest:
         self.trace_headers = trace_headers
         self.prompt_adapter_request = prompt_adapter_request
         self.priority = priority
+        self.lora_fingerprint = lora_fingerprint
 
 
 @dataclass
@@ -35,12 +35,13 @@ from vllm.inputs import PromptType
 from vllm.inputs.preprocess import InputPreprocessor
 from vllm.logger import init_logger
 from vllm.lora.request import LoRARequest
+from vllm.lora.utils import get_adapter_fingerprint
 from vllm.model_executor.layers.sampler import SamplerOutput
 from vllm.outputs import PoolingRequestOutput, RequestOutput
 from vllm.prompt_adapter.request import PromptAdapterRequest
 from vllm.sampling_params import SamplingParams
 from vllm.transformers_utils.tokenizer_group import init_tokenizer_from_configs
-from vllm.utils import deprecate_kwargs
+from vllm.utils import deprecate_kwargs, make_async
 
 logger = init_logger(__name__)
 
@@ -88,6 +89,7 @@ class MQLLMEngineClient(EngineClient):
         # Get the configs.
         self.model_config = engine_config.model_config
         self.decoding_config = engine_config.decoding_config
+        self.cache_config = engine_config.cache_config
 
         # Create the tokenizer group.
         self.tokenizer = init_tokenizer_from_configs(
@@ -595,6 +597,14 @@ class MQLLMEngineClient(EngineClient):
                     model_config=self.model_config
                 )
 
+        # Fingerprinting the LoRA adapter for prefix caching hashes (and may
+        # download) its files, so we do it here, off the event loop, rather
+        # than in the engine loop of the backend process.
+        lora_fingerprint = None
+        if lora_request is not None and self.cache_config.enable_prefix_caching:
+            lora_fingerprint = await make_async(get_adapter_fingerprint)(
+                lora_request.lora_path)
+
         # 1) Create output queue for this requests.
         queue: asyncio.Queue[Union[RequestOutput,
                                    BaseException]] = asyncio.Queue()
@@ -621,6 +631,7 @@ class MQLLMEngineClient(EngineClient):
                     trace_headers=trace_headers,
                     prompt_adapter_request=prompt_adapter_request,
                     priority=priority,
+                    lora_fingerprint=lora_fingerprint,
                 ))
 
             # 3) Send the RPCGenerateRequest to the MQLLMEngine.
@@ -202,7 +202,7 @@ class MQLLMEngine:
     def engine_step(self) -> List[RequestOutput]:
         """Engine step wrapper with error handling."""
         try:
-            return self.engine.step()
+            request_outputs = self.engine.step()
         except SystemExit:
             raise
         except BaseException as e:
@@ -213,6 +213,15 @@ class MQLLMEngine:
             self._send_outputs(rpc_err)
             raise e
 
+        # Fail the requests whose grammars failed to compile, without
+        # failing the engine.
+        for request_id, error in self.engine.get_and_reset_failed_requests():
+            self._send_outputs(
+                RPCError(request_id=request_id,
+                         is_engine_errored=False,
+                         exception=error))
+        return request_outputs
+
     def handle_new_input(self):
         """Handle new input from the socket"""
         try:
@@ -261,7 +270,8 @@ class MQLLMEngine:
                 lora_request=request.lora_request,
                 trace_headers=request.trace_headers,
                 prompt_adapter_request=request.prompt_adapter_request,
-                priority=request.priority)
+                priority=request.priority,
+                lora_fingerprint=request.lora_fingerprint)
 
             if self.log_requests:
                 logger.info("Added request %s.", request.request_id)
@@ -0,0 +1,160 @@
+"""Engine snapshots for warm restarts.
+
+A snapshot is an engine image (see
+`vllm.model_executor.model_loader.engine_image`) of an initialized engine
+that additionally records everything deterministic about its startup:
+
+- the processed weights of every rank, loaded with `mmap`;
+- the torch.compile cache of every rank (the `InductorHashCache` and the
+  Inductor and Triton artifacts it refers to);
+- the number of KV cache blocks found by memory profiling, keyed by a
+  fingerprint of the hardware and of the configuration they depend on;
+- the tokenizer used by the engine.
+
+An engine started from a snapshot with `--load-format engine_image` skips
+weight processing, reuses the compiled graphs and, on matching hardware,
+skips memory profiling. Snapshots are created with
+`vllm convert-checkpoint --snapshot`.
+"""
+import hashlib
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+import torch
+
+from vllm.config import VllmConfig
+from vllm.logger import init_logger
+from vllm.platforms import current_platform
+from vllm.version import __version__ as VLLM_VERSION
+
+if TYPE_CHECKING:
+    from vllm.engine.llm_engine import LLMEngine
+
+logger = init_logger(__name__)
+
+SNAPSHOT_MANIFEST_NAME = "vllm_snapshot.json"
+
+
+def engine_fingerprint(vllm_config: VllmConfig) -> str:
+    """Hash of the hardware and of the configuration that the number of KV
+    cache blocks found by memory profiling depends on."""
+    model_config = vllm_config.model_config
+    cache_config = vllm_config.cache_config
+    scheduler_config = vllm_config.scheduler_config
+    parallel_config = vllm_config.parallel_config
+    factors: List[Any] = [VLLM_VERSION, torch.__version__]
+    try:
+        factors.append(current_platform.get_device_name())
+        factors.append(current_platform.get_device_total_memory())
+    except NotImplementedError:
+        factors.append(vllm_config.device_config.device_type)
+    factors.extend([
+        model_config.dtype,
+        model_config.quantization,
+        model_config.max_model_len,
+        model_config.enforce_eager,
+        cache_config.block_size,
+        cache_config.cache_dtype,
+        cache_config.gpu_memory_utilization,
+        cache_config.swap_space_bytes,
+        cache_config.num_gpu_blocks_override,
+        getattr(cache_config, "cpu_kvcache_space_bytes", None),
+        scheduler_config.max_num_batched_tokens,
+        scheduler_config.max_num_seqs,
+        parallel_config.tensor_parallel_size,
+        parallel_config.pipeline_parallel_size,
+    ])
+    if vllm_config.lora_config is not None:
+        factors.append(vllm_config.lora_config.compute_hash())
+    return hashlib.sha256(str(factors).encode()).hexdigest()
+
+
+def is_engine_snapshot(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, SNAPSHOT_MANIFEST_NAME))
+
+
+@dataclass
+class EngineSnapshot:
+    """The startup state of the engines that a snapshot was taken from."""
+    # Engine fingerprint -> (num_gpu_blocks, num_cpu_blocks)
+    block_counts: Dict[str, List[int]] = field(default_factory=dict)
+
+    def save(self, snapshot_dir: str) -> None:
+        with open(os.path.join(snapshot_dir, SNAPSHOT_MANIFEST_NAME),
+                  "w") as f:
+            json.dump(asdict(self), f, indent=2)
+
+    @classmethod
+    def load(cls, snapshot_dir: str) -> "EngineSnapshot":
+        with open(os.path.join(snapshot_dir, SNAPSHOT_MANIFEST_NAME)) as f:
+            return cls(**json.load(f))
+
+    def get_block_counts(self,
+                         vllm_config: VllmConfig) -> Optional[Tuple[int, int]]:
+        block_counts = self.block_counts.get(engine_fingerprint(vllm_config))
+        if block_counts is None:
+            return None
+        num_gpu_blocks, num_cpu_blocks = block_counts
+        return num_gpu_blocks, num_cpu_blocks
+
+
+def save_engine_image(engine: "LLMEngine", path: str,
+                      source_model: str) -> None:
+    """Save the weights of all ranks of an initialized engine, with the
+    files of the source model, as an engine image."""
+    from huggingface_hub import snapshot_download
+
+    # Imported lazily, as the model loader imports the engine.
+    # yapf conflicts with isort for this block
+    # yapf: disable
+    from vllm.model_executor.model_loader.engine_image import (
+        ImageManifest, copy_model_files)
+
+    # yapf: enable
+
+    model_config = engine.model_config
+    parallel_config = engine.parallel_config
+    os.makedirs(path, exist_ok=True)
+    engine.model_executor.save_engine_image(path=path)
+
+    source_dir = model_config.model
+    if not os.path.isdir(source_dir):
+        source_dir = snapshot_download(
+            source_dir,
+            revision=model_config.revision,
+            ignore_patterns=["*.bin", "*.pt", "*.safetensors", "*.gguf"])
+    copy_model_files(source_dir, path)
+    # The global manifest is written last: it marks the image as complete.
+    ImageManifest(
+        tensor_parallel_size=parallel_config.tensor_parallel_size,
+        pipeline_parallel_size=parallel_config.pipeline_parallel_size,
+        dtype=str(model_config.dtype).removeprefix("torch."),
+        quantization=model_config.quantization,
+        source_model=source_model,
+        vllm_version=VLLM_VERSION,
+    ).save(path)
+
+
+def save_engine_snapshot(engine: "LLMEngine", path: str,
+                         source_model: str) -> None:
+    """Save a snapshot of an initialized engine.
+
+    Saving a snapshot of the same model from engines on different hardware
+    into the same directory adds their block counts to the snapshot.
+    """
+    save_engine_image(engine, path, source_model)
+
+    tokenizer = engine.get_tokenizer()
+    if hasattr(tokenizer, "save_pretrained"):
+        tokenizer.save_pretrained(path)
+
+    snapshot = (EngineSnapshot.load(path)
+                if is_engine_snapshot(path) else EngineSnapshot())
+    cache_config = engine.cache_config
+    snapshot.block_counts[engine_fingerprint(engine.vllm_config)] = [
+        cache_config.num_gpu_blocks, cache_config.num_cpu_blocks
+    ]
+    snapshot.save(path)
+    logger.info("Saved engine snapshot of %s to %s", source_model, path)
@@ -1,12 +1,19 @@
 import asyncio
 import codecs
+import hashlib
 import json
+import sys
+import threading
+import weakref
 from abc import ABC, abstractmethod
-from collections import defaultdict, deque
+from array import array
+from collections import OrderedDict, defaultdict, deque
+from dataclasses import dataclass
 from functools import lru_cache, partial
 from pathlib import Path
 from typing import (Any, Awaitable, Callable, Dict, Generic, Iterable, List,
-                    Literal, Mapping, Optional, Tuple, TypeVar, Union, cast)
+                    Literal, Mapping, MutableMapping, Optional, Tuple, TypeVar,
+                    Union, cast)
 
 import jinja2.nodes
 import transformers.utils.chat_template_utils as hf_chat_utils
@@ -1015,3 +1022,267 @@ def apply_mistral_chat_template(
         messages=messages,
         **kwargs,
     )
+
+
+@dataclass
+class _CachedChatPrompt:
+    prompt: str
+    prompt_token_ids: "array[int]"
+    add_generation_prompt: bool
+    continue_final_message: bool
+
+    @property
+    def num_bytes(self) -> int:
+        return (sys.getsizeof(self.prompt) +
+                self.prompt_token_ids.itemsize * len(self.prompt_token_ids))
+
+
+# The globals of the chat templates of transformers whose values change over
+# time, e.g. the date of the day in the system prompt of Llama 3.2.
+_TIME_DEPENDENT_TEMPLATE_GLOBALS = frozenset(["strftime_now"])
+
+
+@lru_cache(maxsize=32)
+def _is_time_dependent_template(chat_template: str) -> bool:
+    """Whether a chat template may render the same conversation differently
+    over time."""
+    jinja_ast = _try_extract_ast(chat_template)
+    if jinja_ast is None:
+        return True
+    return any(node.name in _TIME_DEPENDENT_TEMPLATE_GLOBALS
+               for node in jinja_ast.find_all(jinja2.nodes.Name))
+
+
+@dataclass
+class ChatPromptLookup:
+    """The keys of a conversation and of each of its prefixes in a
+    :class:`ChatPromptCache`, and its prompt if it was found."""
+    keys: List[bytes]
+    add_generation_prompt: bool
+    continue_final_message: bool
+    cached: Optional[_CachedChatPrompt] = None
+
+    @property
+    def prompt(self) -> Optional[str]:
+        return None if self.cached is None else self.cached.prompt
+
+
+class _SpecialTokenBoundaries:
+    """The special tokens of a tokenizer after which the text can be
+    tokenized separately from the text before them."""
+
+    _PROBE_PREFIX = "Hi there"
+    _PROBE_SUFFIXES = ("x", " x", "\n\nx y", "  \n")
+
+    def __init__(self, tokenizer: AnyTokenizer):
+        self.tokenizer = tokenizer
+        self.contents: Dict[int, str] = {
+            token_id: token.content
+            for token_id, token in tokenizer.added_tokens_decoder.items()
+            if token.special
+        }
+        self._is_safe: Dict[int, bool] = {}
+
+    def _encode(self, text: str) -> List[int]:
+        return self.tokenizer(text, add_special_tokens=False).input_ids
+
+    def is_safe(self, token_id: int) -> bool:
+        is_safe = self._is_safe.get(token_id)
+        if is_safe is None:
+            prefix = self._PROBE_PREFIX + self.contents[token_id]
+            prefix_ids = self._encode(prefix)
+            is_safe = all(
+                self._encode(prefix + suffix) == prefix_ids +
+                self._encode(suffix) for suffix in self._PROBE_SUFFIXES)
+            self._is_safe[token_id] = is_safe
+        return is_safe
+
+
+class ChatPromptCache:
+    """LRU cache of the rendered prompts of conversations and of their
+    token ids.
+
+    Multi-turn conversations are sent again with a few more messages on
+    every turn. A conversation is looked up by the hash of its messages, of
+    the chat template and of the arguments of the template, and its prompt
+    is not rendered nor tokenized again if it is found. Otherwise, the
+    prompt is rendered and the cached prompt of the longest prefix of the
+    conversation is looked up; if the new prompt extends it, only the text
+    after its last special token is tokenized and appended to its token ids.
+    Tokenizers split the text on special tokens before tokenizing it, so the
+    tokens up to a special token do not depend on the text after it. This
+    is checked once for each special token of each tokenizer, and the
+    prompt is tokenized in full after the special tokens for which it does
+    not hold, e.g. when the tokenizer adds a prefix space to every text.
+
+    The prompts of templates that render the current time, e.g. the date of
+    the day, are always rendered again, and only their token ids are reused.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[bytes, _CachedChatPrompt] = OrderedDict()
+        self._num_bytes = 0
+        # The prompts are looked up when the requests are preprocessed and
+        # added when they are tokenized, in the tokenizer thread.
+        self._lock = threading.Lock()
+        self._boundaries: MutableMapping[
+            AnyTokenizer,
+            _SpecialTokenBoundaries] = weakref.WeakKeyDictionary()
+
+        self.num_queries = 0
+        self.num_hits = 0
+        self.num_prefix_hits = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        return self.num_hits / self.num_queries if self.num_queries else 0.0
+
+    @property
+    def prefix_hit_rate(self) -> float:
+        return (self.num_prefix_hits /
+                self.num_queries if self.num_queries else 0.0)
+
+    def lookup(
+        self,
+        tokenizer: AnyTokenizer,
+        conversation: List[ConversationMessage],
+        chat_template_kwargs: Dict[str, Any],
+    ) -> ChatPromptLookup:
+        """Look up the prompt of a conversation rendered with
+        :func:`apply_hf_chat_template` and the given keyword arguments."""
+        template_kwargs = dict(chat_template_kwargs)
+        add_generation_prompt = bool(
+            template_kwargs.pop("add_generation_prompt", False))
+        continue_final_message = bool(
+            template_kwargs.pop("continue_final_message", False))
+        if template_kwargs.get("chat_template") is None:
+            template_kwargs["chat_template"] = tokenizer.chat_template
+
+        key = hashlib.sha256(
+            json.dumps([
+                tokenizer.name_or_path,
+                len(tokenizer), template_kwargs
+            ],
+                       sort_keys=True,
+                       default=repr).encode())
+        keys: List[bytes] = []
+        for message in conversation:
+            key.update(json.dumps(message, sort_keys=True,
+                                  default=repr).encode())
+            keys.append(key.copy().digest())
+
+        lookup = ChatPromptLookup(keys, add_generation_prompt,
+                                  continue_final_message)
+        # The cached prompt of a time-dependent template may be stale, so it
+        # is only reused as a prefix of the new prompt when it is tokenized.
+        chat_template = template_kwargs["chat_template"]
+        is_time_dependent = False
+        if isinstance(chat_template, str):
+            if isinstance(tokenizer.chat_template, dict):
+                # The name of one of the templates of the tokenizer.
+                chat_template = tokenizer.chat_template.get(
+                    chat_template, chat_template)
+            is_time_dependent = _is_time_dependent_template(chat_template)
+
+        with self._lock:
+            self.num_queries += 1
+            cached = (self._entries.get(keys[-1])
+                      if keys and not is_time_dependent else None)
+            if (cached is not None
+                    and cached.add_generation_prompt == add_generation_prompt
+                    and cached.continue_final_message
+                    == continue_final_message):
+                self._entries.move_to_end(keys[-1])
+                self.num_hits += 1
+                lookup.cached = cached
+        return lookup
+
+    def _find_prefix(self, lookup: ChatPromptLookup,
+                     prompt: str) -> Optional[_CachedChatPrompt]:
+        with self._lock:
+            for key in reversed(lookup.keys):
+                cached = self._entries.get(key)
+                if cached is not None and prompt.startswith(cached.prompt):
+                    self._entries.move_to_end(key)
+                    return cached
+        return None
+
+    def _tokenize_suffix(self, tokenizer: AnyTokenizer,
+                         cached: _CachedChatPrompt,
+                         prompt: str) -> Optional[List[int]]:
+        boundaries = self._boundaries.get(tokenizer)
+        if boundaries is None:
+            boundaries = self._boundaries[tokenizer] = (
+                _SpecialTokenBoundaries(tokenizer))
+
+        # The text after each special token only holds the special tokens
+        # after it, so the last occurrence of the content of the last special
+        # token is the token itself.
+        prefix_ids = cached.prompt_token_ids
+        prefix_end = len(cached.prompt)
+        for i in range(len(prefix_ids) - 1, -1, -1):
+            token_id = prefix_ids[i]
+            content = boundaries.contents.get(token_id)
+            if content is None:
+                continue
+            start = cached.prompt.rfind(content, 0, prefix_end)
+            if start < 0:
+                return None
+            if boundaries.is_safe(token_id):
+                prompt_token_ids = prefix_ids[:i + 1].tolist()
+                prompt_token_ids.extend(
+                    tokenizer(prompt[start + len(content):],
+                              add_special_tokens=False).input_ids)
+                return prompt_token_ids
+            prefix_end = start
+        return None
+
+    def tokenize(
+        self,
+        tokenizer: AnyTokenizer,
+        lookup: ChatPromptLookup,
+        prompt: str,
+    ) -> List[int]:
+        """Tokenize the prompt of a conversation looked up in the cache, and
+        add it to the cache."""
+        if lookup.cached is not None:
+            return lookup.cached.prompt_token_ids.tolist()
+
+        prompt_token_ids: Optional[List[int]] = None
+        cached = self._find_prefix(lookup, prompt)
+        if cached is not None:
+            prompt_token_ids = self._tokenize_suffix(tokenizer, cached,
+                                                     prompt)
+        if prompt_token_ids is None:
+            prompt_token_ids = tokenizer(prompt,
+                                         add_special_tokens=False).input_ids
+        else:
+            with self._lock:
+                self.num_prefix_hits += 1
+
+        if lookup.keys:
+            self._put(
+                lookup.keys[-1],
+                _CachedChatPrompt(prompt, array("q", prompt_token_ids),
+                                  lookup.add_generation_prompt,
+                                  lookup.continue_final_message))
+        return prompt_token_ids
+
+    def _put(self, key: bytes, cached: _CachedChatPrompt) -> None:
+        num_bytes = cached.num_bytes
+        if num_bytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._num_bytes -= old.num_bytes
+            while self._entries and (self._num_bytes + num_bytes
+                                     > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._num_bytes -= evicted.num_bytes
+            self._entries[key] = cached
+            self._num_bytes += num_bytes
@@ -20,8 +20,10 @@ from vllm.entrypoints.chat_utils import (ChatCompletionMessageParam,
                                          apply_mistral_chat_template,
                                          parse_chat_messages,
                                          resolve_chat_template_content_format)
+from vllm.entrypoints.request_ordering import RequestOrdering, order_requests
 from vllm.inputs import PromptType, SingletonPrompt, TextPrompt, TokensPrompt
-from vllm.inputs.parse import parse_and_batch_prompt
+from vllm.inputs.parse import (is_explicit_encoder_decoder_prompt,
+                               parse_and_batch_prompt, parse_singleton_prompt)
 from vllm.logger import init_logger
 from vllm.lora.request import LoRARequest
 from vllm.model_executor.guided_decoding.guided_fields import (
@@ -114,6 +116,12 @@ class LLM:
         compilation_config: Either an integer or a dictionary. If it is an
             integer, it is used as the level of compilation optimization. If it
             is a dictionary, it can specify the full compilation configuration.
+        request_ordering: The order in which the requests of a batch are
+            submitted to the engine. "prefix" submits the requests sharing a
+            prefix together so that they hit the prefix cache, "length"
+            submits the longest prompts first, and "input" keeps the order of
+            the prompts. The outputs are returned in the order of the prompts
+            in all cases. See :mod:`vllm.entrypoints.request_ordering`.
         **kwargs: Arguments for :class:`~vllm.EngineArgs`. (See
             :ref:`engine_args`)
 
@@ -174,6 +182,7 @@ class LLM:
         task: TaskOption = "auto",
         override_pooler_config: Optional[PoolerConfig] = None,
         compilation_config: Optional[Union[int, Dict[str, Any]]] = None,
+        request_ordering: RequestOrdering = "input",
         **kwargs,
     ) -> None:
         '''
@@ -231,6 +240,7 @@ class LLM:
             engine_args, usage_context=UsageContext.LLM_CLASS)
 
         self.request_counter = Counter()
+        self.request_ordering = request_ordering
 
     def __del__(self):
         if self.llm_engine and hasattr(self.llm_engine, "shutdown"):
@@ -1162,17 +1172,88 @@ class LLM:
                 # We only care about the final output
                 sp.output_kind = RequestOutputKind.FINAL_ONLY
 
+        # The request ids follow the order of the prompts, which is the
+        # order the outputs are returned in, whatever the order the requests
+        # are added in.
+        request_ids = [
+            str(next(self.request_counter)) for _ in range(num_requests)
+        ]
+
         # Add requests to the engine.
-        for i, prompt in enumerate(prompts):
+        order, prompts = self._order_requests(prompts, lora_request,
+                                              request_ids)
+        for i in order:
             self._add_request(
-                prompt,
+                prompts[i],
                 params[i] if isinstance(params, Sequence) else params,
                 lora_request=lora_request[i] if isinstance(
                     lora_request, Sequence) else lora_request,
                 prompt_adapter_request=prompt_adapter_request,
                 priority=priority[i] if priority else 0,
+                request_id=request_ids[i],
             )
 
+    def _order_requests(
+        self,
+        prompts: Sequence[PromptType],
+        lora_request: Optional[Union[Sequence[LoRARequest], LoRARequest]],
+        request_ids: List[str],
+    ) -> Tuple[List[int], Sequence[PromptType]]:
+        """Return the indices of the prompts in the order in which their
+        requests are added to the engine, and the prompts to add. The text
+        prompts tokenized for the ordering are replaced by token prompts, so
+        that they are not tokenized again."""
+        if self.request_ordering == "input" or len(prompts) <= 1:
+            return list(range(len(prompts))), prompts
+
+        from vllm.lora.utils import get_adapter_fingerprint
+        from vllm.multimodal import MULTIMODAL_REGISTRY
+
+        tokenizer_group = self.llm_engine.get_tokenizer_group()
+        prompt_token_ids: List[Optional[List[int]]] = []
+        extra_hashes: List[Optional[int]] = []
+        ordered_prompts = list(prompts)
+        for i, prompt in enumerate(prompts):
+            request_lora = (lora_request[i] if isinstance(
+                lora_request, Sequence) else lora_request)
+            extra_hashes.append(
+                None if request_lora is None else get_adapter_fingerprint(
+                    request_lora.lora_path))
+            if is_explicit_encoder_decoder_prompt(prompt):
+                prompt_token_ids.append(None)
+                continue
+            parsed = parse_singleton_prompt(prompt)
+            if parsed["type"] == "tokens":
+                prompt_token_ids.append(parsed["content"]["prompt_token_ids"])
+                continue
+
+            if parsed["type"] == "text":
+                text_prompt = parsed["content"]
+            else:
+                text_prompt = TextPrompt(prompt=parsed["content"])
+            token_ids = tokenizer_group.encode(text_prompt["prompt"],
+                                               request_id=request_ids[i],
+                                               lora_request=request_lora)
+            prompt_token_ids.append(token_ids)
+
+            tokens_prompt = TokensPrompt(prompt_token_ids=token_ids,
+                                         prompt=text_prompt["prompt"])
+            if "multi_modal_data" in text_prompt:
+                # The multi-modal processor works on the text of the prompt.
+                if MULTIMODAL_REGISTRY.has_processor(
+                        self.llm_engine.get_model_config()):
+                    continue
+                tokens_prompt["multi_modal_data"] = text_prompt[
+                    "multi_modal_data"]
+            if "mm_processor_kwargs" in text_prompt:
+                tokens_prompt["mm_processor_kwargs"] = text_prompt[
+                    "mm_processor_kwargs"]
+            ordered_prompts[i] = tokens_prompt
+        order = order_requests(self.request_ordering, prompt_token_ids,
+                               self.llm_engine.cache_config.block_size,
+                               extra_hashes)
+        return order, ordered_prompts
+
     def _add_request(
         self,
         prompt: PromptType,
@@ -1180,8 +1261,10 @@ class LLM:
         lora_request: Optional[LoRARequest] = None,
         prompt_adapter_request: Optional[PromptAdapterRequest] = None,
         priority: int = 0,
+        request_id: Optional[str] = None,
     ) -> None:
-        request_id = str(next(self.request_counter))
+        if request_id is None:
+            request_id = str(next(self.request_counter))
         self.llm_engine.add_request(
             request_id,
             prompt,
@@ -1232,6 +1315,17 @@ class LLM:
         total_out_toks = 0
         while self.llm_engine.has_unfinished_requests():
             step_outputs = self.llm_engine.step()
+            if not envs.VLLM_USE_V1:
+                # Raise the error of a request whose grammar failed to
+                # compile, after aborting the other requests of the batch so
+                # that they do not run on nor end up in the next batch.
+                failed_requests = (
+                    self.llm_engine.get_and_reset_failed_requests())
+                if failed_requests:
+                    self.llm_engine.abort_all_requests()
+                    if use_tqdm:
+                        pbar.close()
+                    raise failed_requests[0][1]
             for output in step_outputs:
                 if output.finished:
                     outputs.append(output)
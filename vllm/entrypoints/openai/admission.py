@@ -0,0 +1,349 @@
+"""Admission control of the requests of the OpenAI-compatible server.
+
+Without admission control, every request is sent to the engine, and under
+overload the queue of the engine grows until every request misses its
+deadline. The `AdmissionController` estimates the time to first token of
+each request before it is sent to the engine, and the requests that would
+not get their first token within their TTFT SLO are rejected right away,
+so that the admitted requests still meet theirs.
+
+The estimate models the queue of the engine as a backlog of prompt tokens
+that is prefilled at a measured rate. The prompt tokens of the admitted
+requests are added to the backlog, which drains over time at the prefill
+rate, highest priority first when the engine schedules requests by
+priority. The remaining prompt tokens of a request leave the backlog when
+it gets its first token or finishes. The prefill rate is measured from the
+time to first token of the requests: the backlog ahead of a request when it
+was admitted divided by its time to first token. The time to first token of
+streamed requests is measured when their first output arrives, and that of
+the other requests from the metrics of their output, when the engine
+reports them. Until the rate is measured, every request is admitted.
+
+Requests with a priority above 0 are shed first: they must fit within a
+fraction of their SLO, and are rejected while the KV cache of the engine
+is nearly full, as reported by `AdmissionStatLogger` when the engine runs
+in the same process.
+"""
+import time
+import weakref
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import AsyncGenerator, AsyncIterator, Dict, Optional
+
+from vllm.config import VllmConfig
+from vllm.engine.metrics_types import (StatLoggerBase, Stats,
+                                       SupportsMetricsInfo)
+from vllm.logger import init_logger
+from vllm.outputs import RequestOutput
+
+logger = init_logger(__name__)
+
+
+@dataclass
+class _AdmittedRequest:
+    admitted_at: float
+    num_prompt_tokens: int
+    priority: int
+    # The backlog ahead of the request when it was admitted, with its own
+    # prompt tokens.
+    num_tokens_ahead: float
+    first_token_seen: bool = False
+
+
+class AdmissionMetrics:
+    """Prometheus metrics of the admission controller."""
+
+    def __init__(self):
+        # Lazy import so that PROMETHEUS_MULTIPROC_DIR is set beforehand.
+        from prometheus_client import Counter, Gauge
+
+        self.counter_rejected = Counter(
+            name="vllm:admission_rejected_requests_total",
+            documentation="Number of requests rejected by the admission "
+            "controller.",
+            labelnames=["reason"])
+        self.gauge_backlog_tokens = Gauge(
+            name="vllm:admission_backlog_tokens",
+            documentation="Estimated number of prompt tokens of the admitted "
+            "requests that are not prefilled yet.",
+            multiprocess_mode="sum")
+        self.gauge_prefill_rate = Gauge(
+            name="vllm:admission_prefill_tokens_per_second",
+            documentation="Measured rate at which the engine prefills the "
+            "prompt tokens of the admitted requests.",
+            multiprocess_mode="mostrecent")
+
+
+_metrics: Optional[AdmissionMetrics] = None
+
+
+def get_admission_metrics() -> AdmissionMetrics:
+    global _metrics
+    if _metrics is None:
+        _metrics = AdmissionMetrics()
+    return _metrics
+
+
+class AdmissionController:
+    """Rejects the requests that would not meet their TTFT SLO.
+
+    Args:
+        default_ttft_slo_ms: The TTFT SLO of the requests that do not set
+            one. If None, only the requests that set one can be rejected.
+        priority_scheduling: Whether the engine schedules the requests by
+            priority, so that a request only waits for the backlog of the
+            requests with the same or a higher priority.
+        low_priority_slo_fraction: The fraction of their SLO within which
+            the requests with a priority above 0 must get their first token.
+        low_priority_kv_cache_usage: The KV cache usage above which the
+            requests with a priority above 0 are rejected.
+        rate_smoothing: The weight of each new measurement of the prefill
+            rate.
+        metrics: The Prometheus metrics to update, if any.
+    """
+
+    def __init__(self,
+                 default_ttft_slo_ms: Optional[float] = None,
+                 *,
+                 priority_scheduling: bool = False,
+                 low_priority_slo_fraction: float = 0.5,
+                 low_priority_kv_cache_usage: float = 0.9,
+                 rate_smoothing: float = 0.1,
+                 metrics: Optional[AdmissionMetrics] = None):
+        if default_ttft_slo_ms is not None and default_ttft_slo_ms <= 0:
+            raise ValueError("default_ttft_slo_ms must be positive, got "
+                             f"{default_ttft_slo_ms}.")
+        if not 0 < low_priority_slo_fraction <= 1:
+            raise ValueError("low_priority_slo_fraction must be in (0, 1], "
+                             f"got {low_priority_slo_fraction}.")
+        self.default_ttft_slo = (None if default_ttft_slo_ms is None else
+                                 default_ttft_slo_ms / 1000)
+        self.priority_scheduling = priority_scheduling
+        self.low_priority_slo_fraction = low_priority_slo_fraction
+        self.low_priority_kv_cache_usage = low_priority_kv_cache_usage
+        self.rate_smoothing = rate_smoothing
+        self.metrics = metrics
+
+        self._requests: Dict[str, _AdmittedRequest] = {}
+        # The prompt tokens not prefilled yet, by priority, in total and by
+        # request in the order the requests were admitted.
+        self._backlog: Dict[int, float] = defaultdict(float)
+        self._undrained: Dict[int, Dict[str, float]] = defaultdict(dict)
+        self._warned_no_prefill_rate = False
+        self._last_drain = time.monotonic()
+        # Moving averages of the tokens ahead of the requests and of their
+        # time to first token, whose ratio is the prefill rate.
+        self._mean_tokens_ahead: Optional[float] = None
+        self._mean_ttft: Optional[float] = None
+        # The KV cache usage of the engine, if it is reported.
+        self.kv_cache_usage: Optional[float] = None
+
+        self.num_admitted = 0
+        self.num_rejected = 0
+
+    @property
+    def prefill_rate(self) -> Optional[float]:
+        """The measured prefill rate in tokens per second."""
+        if not self._mean_ttft or self._mean_tokens_ahead is None:
+            return None
+        return self._mean_tokens_ahead / self._mean_ttft
+
+    @property
+    def backlog_tokens(self) -> float:
+        self._drain()
+        return sum(self._backlog.values())
+
+    def _drain(self) -> None:
+        now = time.monotonic()
+        rate = self.prefill_rate
+        if rate is not None:
+            drained = rate * (now - self._last_drain)
+            for priority in sorted(self._undrained):
+                undrained = self._undrained[priority]
+                for request_id in list(undrained):
+                    if drained <= 0:
+                        break
+                    num_tokens = min(undrained[request_id], drained)
+                    self._remove_undrained(priority, request_id, num_tokens)
+                    drained -= num_tokens
+        self._last_drain = now
+
+    def _remove_undrained(self,
+                          priority: int,
+                          request_id: str,
+                          num_tokens: Optional[float] = None) -> None:
+        """Remove prompt tokens of a request from the backlog, all of them
+        by default."""
+        undrained = self._undrained[priority]
+        remaining = undrained.pop(request_id, 0.0)
+        if num_tokens is None or num_tokens >= remaining:
+            num_tokens = remaining
+        else:
+            undrained[request_id] = remaining - num_tokens
+        self._backlog[priority] = max(self._backlog[priority] - num_tokens,
+                                      0.0)
+
+    def _tokens_ahead(self, priority: int) -> float:
+        if not self.priority_scheduling:
+            return sum(self._backlog.values())
+        return sum(num_tokens for p, num_tokens in self._backlog.items()
+                   if p <= priority)
+
+    def estimate_ttft(self,
+                      num_prompt_tokens: int,
+                      priority: int = 0) -> float:
+        """Estimate the time to first token in seconds of a request sent
+        now, or 0 if the prefill rate is not measured yet."""
+        self._drain()
+        rate = self.prefill_rate
+        if rate is None:
+            if not self._warned_no_prefill_rate:
+                self._warned_no_prefill_rate = True
+                logger.warning(
+                    "The prefill rate is not measured yet, so requests are "
+                    "admitted without estimating their time to first token. "
+                    "It is measured from streamed requests, or from the first "
+                    "token time that the engine reports for the others, "
+                    "which the V1 engine does not.")
+            return 0.0
+        return (self._tokens_ahead(priority) + num_prompt_tokens) / rate
+
+    def admit(self,
+              request_id: str,
+              num_prompt_tokens: int,
+              priority: int = 0,
+              ttft_slo_ms: Optional[float] = None) -> Optional[str]:
+        """Admit a request, or return why it is rejected.
+
+        An admitted request must then be tracked with `track`, or withdrawn
+        with `withdraw` if it is not sent to the engine.
+        """
+        self._drain()
+        ttft_slo = (self.default_ttft_slo
+                    if ttft_slo_ms is None else ttft_slo_ms / 1000)
+        reason = None
+        if (priority > 0 and self.kv_cache_usage is not None
+                and self.kv_cache_usage >= self.low_priority_kv_cache_usage):
+            reason = "kv_cache_full"
+        elif ttft_slo is not None:
+            if priority > 0:
+                ttft_slo *= self.low_priority_slo_fraction
+            if self.estimate_ttft(num_prompt_tokens, priority) > ttft_slo:
+                reason = "ttft_slo"
+        if reason is not None:
+            self.num_rejected += 1
+            if self.metrics is not None:
+                self.metrics.counter_rejected.labels(reason=reason).inc()
+            return reason
+
+        num_tokens_ahead = self._tokens_ahead(priority) + num_prompt_tokens
+        self._requests[request_id] = _AdmittedRequest(
+            admitted_at=time.monotonic(),
+            num_prompt_tokens=num_prompt_tokens,
+            priority=priority,
+            num_tokens_ahead=num_tokens_ahead)
+        self._backlog[priority] += num_prompt_tokens
+        self._undrained[priority][request_id] = float(num_prompt_tokens)
+        self.num_admitted += 1
+        self._update_gauges()
+        return None
+
+    def release(self, request_id: str) -> None:
+        """Forget a request that has finished, and remove its prompt tokens
+        from the backlog if they are not drained yet."""
+        request = self._requests.pop(request_id, None)
+        if request is not None:
+            self._drain()
+            self._remove_undrained(request.priority, request_id)
+            self._update_gauges()
+
+    def withdraw(self, request_id: str) -> None:
+        """Forget a request that was admitted but not sent to the engine,
+        and remove its prompt tokens from the backlog."""
+        request = self._requests.pop(request_id, None)
+        if request is not None:
+            self._drain()
+            self._remove_undrained(request.priority, request_id)
+            self.num_admitted -= 1
+            self._update_gauges()
+
+    def record_ttft(self, request_id: str, ttft: float) -> None:
+        """Measure the prefill rate from the time to first token of a
+        request."""
+        request = self._requests.get(request_id)
+        if request is None or request.first_token_seen or ttft <= 0:
+            return
+        request.first_token_seen = True
+        if self._mean_ttft is None or self._mean_tokens_ahead is None:
+            self._mean_ttft = ttft
+            self._mean_tokens_ahead = request.num_tokens_ahead
+        else:
+            self._drain()
+            w = self.rate_smoothing
+            self._mean_ttft += w * (ttft - self._mean_ttft)
+            self._mean_tokens_ahead += w * (request.num_tokens_ahead -
+                                            self._mean_tokens_ahead)
+        self._update_gauges()
+
+    def _update_gauges(self) -> None:
+        if self.metrics is None:
+            return
+        self.metrics.gauge_backlog_tokens.set(sum(self._backlog.values()))
+        rate = self.prefill_rate
+        if rate is not None:
+            self.metrics.gauge_prefill_rate.set(rate)
+
+    def track(
+        self, request_id: str, result_generator: AsyncIterator[RequestOutput]
+    ) -> AsyncGenerator[RequestOutput, None]:
+        """Measure the time to first token of an admitted request from its
+        outputs, and release it when it finishes."""
+        generator = self._track(request_id, result_generator)
+        # Release the request if the generator is dropped before it starts,
+        # e.g. when the client disconnects before the response is streamed.
+        weakref.finalize(generator, self.release, request_id)
+        return generator
+
+    async def _track(
+        self, request_id: str, result_generator: AsyncIterator[RequestOutput]
+    ) -> AsyncGenerator[RequestOutput, None]:
+        try:
+            async for res in result_generator:
+                request = self._requests.get(request_id)
+                if request is not None and not request.first_token_seen:
+                    ttft: Optional[float] = None
+                    if not res.finished:
+                        ttft = time.monotonic() - request.admitted_at
+                    elif res.metrics is not None and (
+                            res.metrics.first_token_time is not None):
+                        # The request was not streamed, and the engine
+                        # reports when the first token was sampled.
+                        ttft = (res.metrics.first_token_time -
+                                res.metrics.arrival_time)
+                    # Otherwise the engine does not report when the first
+                    # token was sampled, e.g. the V1 engine, and the latency
+                    # of the whole request is not its time to first token.
+                    if ttft is not None:
+                        self.record_ttft(request_id, ttft)
+                    # The prompt of the request is prefilled.
+                    self._remove_undrained(request.priority, request_id)
+                    self._update_gauges()
+                yield res
+        finally:
+            self.release(request_id)
+
+
+class AdmissionStatLogger(StatLoggerBase):
+    """Reports the KV cache usage of an engine in the same process to an
+    admission controller."""
+
+    def __init__(self, admission_controller: AdmissionController,
+                 vllm_config: VllmConfig) -> None:
+        super().__init__(local_interval=0, vllm_config=vllm_config)
+        self.admission_controller = admission_controller
+
+    def log(self, stats: Stats) -> None:
+        self.admission_controller.kv_cache_usage = stats.gpu_cache_usage_sys
+
+    def info(self, type: str, obj: SupportsMetricsInfo) -> None:
+        pass
@@ -33,6 +33,9 @@ from vllm.engine.protocol import EngineClient
 from vllm.entrypoints.chat_utils import load_chat_template
 from vllm.entrypoints.launcher import serve_http
 from vllm.entrypoints.logger import RequestLogger
+from vllm.entrypoints.openai.admission import (AdmissionController,
+                                               AdmissionStatLogger,
+                                               get_admission_metrics)
 from vllm.entrypoints.openai.cli_args import (make_arg_parser,
                                               validate_parsed_serve_args)
 # yapf conflicts with isort for this block
@@ -58,11 +61,12 @@ from vllm.entrypoints.openai.serving_engine import BaseModelPath, OpenAIServing
 from vllm.entrypoints.openai.serving_score import OpenAIServingScores
 from vllm.entrypoints.openai.serving_tokenization import (
     OpenAIServingTokenization)
+from vllm.entrypoints.openai.stream_coalescing import StreamFlushPolicy
 from vllm.entrypoints.openai.tool_parsers import ToolParserManager
 from vllm.logger import init_logger
 from vllm.usage.usage_lib import UsageContext
-from vllm.utils import (FlexibleArgumentParser, get_open_zmq_ipc_path,
-                        is_valid_ipv6_address)
+from vllm.utils import (FlexibleArgumentParser, GiB_bytes,
+                        get_open_zmq_ipc_path, is_valid_ipv6_address)
 from vllm.version import __version__ as VLLM_VERSION
 
 if envs.VLLM_USE_V1:
@@ -577,6 +581,25 @@ def init_app_state(
     resolved_chat_template = load_chat_template(args.chat_template)
     logger.info("Using supplied chat template:\n%s", resolved_chat_template)
 
+    stream_flush_policy = StreamFlushPolicy(
+        max_tokens=args.stream_flush_tokens,
+        max_delay_ms=args.stream_flush_interval_ms,
+        when_writable=args.stream_flush_when_writable)
+
+    admission_controller = None
+    if args.enable_admission_control:
+        admission_controller = AdmissionController(
+            args.default_ttft_slo_ms,
+            priority_scheduling=args.scheduling_policy == "priority",
+            metrics=get_admission_metrics())
+        # The KV cache usage is only reported by a V0 engine in this process.
+        if (not envs.VLLM_USE_V1 and isinstance(engine_client, AsyncLLMEngine)
+                and state.log_stats):
+            engine_client.add_logger(
+                "admission",
+                AdmissionStatLogger(admission_controller,
+                                    engine_client.engine.vllm_config))
+
     state.openai_serving_chat = OpenAIServingChat(
         engine_client,
         model_config,
@@ -591,6 +614,9 @@ def init_app_state(
         enable_auto_tools=args.enable_auto_tool_choice,
         tool_parser=args.tool_call_parser,
         enable_prompt_tokens_details=args.enable_prompt_tokens_details,
+        stream_flush_policy=stream_flush_policy,
+        chat_prompt_cache_bytes=int(args.chat_prompt_cache_size * GiB_bytes),
+        admission_controller=admission_controller,
     ) if model_config.runner_type == "generate" else None
     state.openai_serving_completion = OpenAIServingCompletion(
         engine_client,
@@ -600,6 +626,8 @@ def init_app_state(
         prompt_adapters=args.prompt_adapters,
         request_logger=request_logger,
         return_tokens_as_token_ids=args.return_tokens_as_token_ids,
+        stream_flush_policy=stream_flush_policy,
+        admission_controller=admission_controller,
     ) if model_config.runner_type == "generate" else None
     state.openai_serving_embedding = OpenAIServingEmbedding(
         engine_client,
@@ -608,6 +636,7 @@ def init_app_state(
         request_logger=request_logger,
         chat_template=resolved_chat_template,
         chat_template_content_format=args.chat_template_content_format,
+        embedding_cache_bytes=int(args.embedding_cache_size * GiB_bytes),
     ) if model_config.runner_type == "pooling" else None
     state.openai_serving_scores = OpenAIServingScores(
         engine_client,
@@ -246,6 +246,61 @@ def make_arg_parser(parser: FlexibleArgumentParser) -> FlexibleArgumentParser:
         action='store_true',
         default=False,
         help="If set to True, enable prompt_tokens_details in usage.")
+    parser.add_argument(
+        "--embedding-cache-size",
+        type=float,
+        default=0,
+        help="Size in GiB of the cache of the outputs of the Embeddings API, "
+        "keyed by the model, pooling config and prompt token ids. Prompts "
+        "found in the cache do not run through the engine. Disabled if 0.")
+    parser.add_argument(
+        "--chat-prompt-cache-size",
+        type=float,
+        default=0,
+        help="Size in GiB of the cache of the rendered prompts of chat "
+        "conversations and of their token ids. The prompt of a conversation "
+        "found in the cache is not rendered nor tokenized again, and only "
+        "the text after the cached prompt of an earlier turn of the "
+        "conversation is tokenized. Disabled if 0.")
+    parser.add_argument(
+        "--stream-flush-tokens",
+        type=int,
+        default=None,
+        help="Merge the outputs of streamed chat and completion requests "
+        "and send them once they hold this many tokens, instead of sending "
+        "an event for every engine step.")
+    parser.add_argument(
+        "--stream-flush-interval-ms",
+        type=float,
+        default=None,
+        help="Merge the outputs of streamed chat and completion requests "
+        "and send them once the oldest of them has waited this many "
+        "milliseconds. Can be combined with --stream-flush-tokens, in which "
+        "case the first condition met flushes the outputs.")
+    parser.add_argument(
+        "--stream-flush-when-writable",
+        action="store_true",
+        default=False,
+        help="Send the outputs of streamed chat and completion requests as "
+        "soon as the previous event has been written, merging the outputs "
+        "that arrived in the meantime. Cannot be combined with "
+        "--stream-flush-tokens or --stream-flush-interval-ms.")
+    parser.add_argument(
+        "--enable-admission-control",
+        action="store_true",
+        default=False,
+        help="Estimate the time to first token of each chat and completion "
+        "request from the prompt tokens queued in the engine and from its "
+        "measured prefill rate, and reject with status 429 the requests that "
+        "would not get their first token within their TTFT SLO, set by the "
+        "`ttft_slo_ms` request parameter or by --default-ttft-slo-ms. "
+        "Requests with a priority above 0 are rejected first.")
+    parser.add_argument(
+        "--default-ttft-slo-ms",
+        type=float,
+        default=None,
+        help="The TTFT SLO in milliseconds of the requests that do not set "
+        "`ttft_slo_ms`, used by --enable-admission-control.")
 
     return parser
 
@@ -263,6 +318,20 @@ def validate_parsed_serve_args(args: argparse.Namespace):
         raise TypeError("Error: --enable-auto-tool-choice requires "
                         "--tool-call-parser")
 
+    if args.stream_flush_when_writable and (
+            args.stream_flush_tokens is not None
+            or args.stream_flush_interval_ms is not None):
+        raise TypeError("Error: --stream-flush-when-writable cannot be "
+                        "combined with --stream-flush-tokens or "
+                        "--stream-flush-interval-ms")
+
+    if args.default_ttft_slo_ms is not None:
+        if not args.enable_admission_control:
+            raise TypeError("Error: --default-ttft-slo-ms requires "
+                            "--enable-admission-control")
+        if args.default_ttft_slo_ms <= 0:
+            raise ValueError("Error: --default-ttft-slo-ms must be positive")
+
 
 def create_parser_for_docs() -> FlexibleArgumentParser:
     parser_for_docs = FlexibleArgumentParser(
@@ -1,8 +1,10 @@
-from functools import lru_cache, partial
-from typing import Dict, FrozenSet, Iterable, List, Optional, Union
+from functools import lru_cache
+from typing import (Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple,
+                    Union)
 
 import torch
 
+from vllm.logits_process import SparseLogitsBiasProcessor
 from vllm.sampling_params import LogitsProcessor
 from vllm.transformers_utils.tokenizer import AnyTokenizer
 
@@ -40,14 +42,20 @@ def _get_allowed_token_ids_logits_processor(
     return AllowedTokenIdsLogitsProcessor(allowed_token_ids)
 
 
-def logit_bias_logits_processor(
-    logit_bias: Dict[int, float],
-    token_ids: List[int],
-    logits: torch.Tensor,
-) -> torch.Tensor:
-    for token_id, bias in logit_bias.items():
-        logits[token_id] += bias
-    return logits
+class LogitBiasLogitsProcessor(SparseLogitsBiasProcessor):
+    """Logits processor for adding a fixed bias to specific token ids.
+    Applied batch-wide as a sparse scatter by the logits processor layer."""
+
+    def __init__(self, logit_bias: Dict[int, float]):
+        self.token_ids: List[int] = list(logit_bias.keys())
+        self.biases: List[float] = list(logit_bias.values())
+
+    def get_sparse_bias(
+        self,
+        past_tokens_ids: Union[List[int], Tuple[int]],
+        seq_id: Optional[int] = None,
+    ) -> Tuple[Sequence[int], Sequence[float]]:
+        return self.token_ids, self.biases
 
 
 def get_logits_processors(
@@ -75,8 +83,7 @@ def get_logits_processors(
                 raise ValueError(f"token_id {token_id} in logit_bias contains "
                                  "out-of-vocab token id")
 
-        logits_processors.append(
-            partial(logit_bias_logits_processor, clamped_logit_bias))
+        logits_processors.append(LogitBiasLogitsProcessor(clamped_logit_bias))
 
     if allowed_token_ids is not None:
         logits_processors.append(
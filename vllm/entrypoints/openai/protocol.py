@@ -328,6 +328,23 @@ class ChatCompletionRequest(OpenAIBaseModel):
             "The priority of the request (lower means earlier handling; "
             "default: 0). Any priority other than 0 will raise an error "
             "if the served model does not use priority scheduling."))
+    ttft_slo_ms: Optional[float] = Field(
+        default=None,
+        description=(
+            "The time to first token in milliseconds within which the "
+            "request must be served. With admission control, the request is "
+            "rejected with status 429 if the server estimates that it would "
+            "not be. Defaults to the TTFT SLO of the server, if any. With "
+            "the deadline scheduling policy, the request is scheduled by "
+            "earliest deadline and aborted once its first token cannot be "
+            "on time."))
+    tpot_slo_ms: Optional[float] = Field(
+        default=None,
+        description=(
+            "The time per output token in milliseconds after the first "
+            "token within which the request must be served. With the "
+            "deadline scheduling policy, the request is scheduled and "
+            "preempted by the deadline of its next token."))
     request_id: str = Field(
         default_factory=lambda: f"{random_uuid()}",
         description=(
@@ -425,7 +442,9 @@ class ChatCompletionRequest(OpenAIBaseModel):
             output_kind=RequestOutputKind.DELTA if self.stream \
                 else RequestOutputKind.FINAL_ONLY,
             guided_decoding=guided_decoding,
-            logit_bias=self.logit_bias)
+            logit_bias=self.logit_bias,
+            ttft_slo_ms=self.ttft_slo_ms,
+            tpot_slo_ms=self.tpot_slo_ms)
 
     def _get_guided_json_from_tool(
             self) -> Optional[Union[str, dict, BaseModel]]:
@@ -655,6 +674,23 @@ class CompletionRequest(OpenAIBaseModel):
             "The priority of the request (lower means earlier handling; "
             "default: 0). Any priority other than 0 will raise an error "
             "if the served model does not use priority scheduling."))
+    ttft_slo_ms: Optional[float] = Field(
+        default=None,
+        description=(
+            "The time to first token in milliseconds within which the "
+            "request must be served. With admission control, the request is "
+            "rejected with status 429 if the server estimates that it would "
+            "not be. Defaults to the TTFT SLO of the server, if any. With "
+            "the deadline scheduling policy, the request is scheduled by "
+            "earliest deadline and aborted once its first token cannot be "
+            "on time."))
+    tpot_slo_ms: Optional[float] = Field(
+        default=None,
+        description=(
+            "The time per output token in milliseconds after the first "
+            "token within which the request must be served. With the "
+            "deadline scheduling policy, the request is scheduled and "
+            "preempted by the deadline of its next token."))
     logits_processors: Optional[LogitsProcessors] = Field(
         default=None,
         description=(
@@ -741,7 +777,9 @@ class CompletionRequest(OpenAIBaseModel):
                 else RequestOutputKind.FINAL_ONLY,
             guided_decoding=guided_decoding,
             logit_bias=self.logit_bias,
-            allowed_token_ids=self.allowed_token_ids)
+            allowed_token_ids=self.allowed_token_ids,
+            ttft_slo_ms=self.ttft_slo_ms,
+            tpot_slo_ms=self.tpot_slo_ms)
 
     @model_validator(mode="before")
     @classmethod
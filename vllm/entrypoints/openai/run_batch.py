@@ -1,7 +1,12 @@
 import asyncio
+import functools
+import json
+import os
+import resource
+import tempfile
+import time
 from http import HTTPStatus
-from io import StringIO
-from typing import Awaitable, Callable, List, Optional
+from typing import AsyncGenerator, Callable, Dict, List, Optional, Set, Tuple
 
 import aiohttp
 import torch
@@ -15,14 +20,19 @@ from vllm.entrypoints.logger import RequestLogger, logger
 from vllm.entrypoints.openai.protocol import (BatchRequestInput,
                                               BatchRequestOutput,
                                               BatchResponseData,
+                                              ChatCompletionRequest,
                                               ChatCompletionResponse,
+                                              EmbeddingChatRequest,
                                               EmbeddingResponse, ErrorResponse)
 # yapf: enable
 from vllm.entrypoints.openai.serving_chat import OpenAIServingChat
 from vllm.entrypoints.openai.serving_embedding import OpenAIServingEmbedding
 from vllm.entrypoints.openai.serving_engine import BaseModelPath
+from vllm.entrypoints.request_ordering import (REQUEST_ORDERINGS,
+                                               RequestOrdering, order_requests)
+from vllm.transformers_utils.tokenizer import AnyTokenizer
 from vllm.usage.usage_lib import UsageContext
-from vllm.utils import FlexibleArgumentParser, random_uuid
+from vllm.utils import FlexibleArgumentParser, GiB_bytes, random_uuid
 from vllm.version import __version__ as VLLM_VERSION
 
 
@@ -46,6 +56,50 @@ def parse_args():
         help="The path or url to a single output file. Currently supports "
         "local file paths, or web (http or https) urls. If a URL is specified,"
         " the file should be available via HTTP PUT.")
+    parser.add_argument(
+        "--max-concurrent-requests",
+        type=int,
+        default=None,
+        help="Maximum number of requests read from the input file but whose "
+        "output is not written yet. Bounds the memory used by the batch. "
+        "Defaults to twice the number of sequences the engine runs at once.")
+    parser.add_argument(
+        "--output-order",
+        type=str,
+        choices=["input", "completion"],
+        default="input",
+        help="Order of the outputs in the output file. With `input`, an "
+        "output is written once the outputs of all the requests before it "
+        "are written; with `completion`, as soon as it completes.")
+    parser.add_argument(
+        "--request-ordering",
+        type=str,
+        choices=REQUEST_ORDERINGS,
+        default="input",
+        help="Order in which the requests are submitted to the engine, within "
+        "each window of `--max-concurrent-requests` requests. `prefix` submits "
+        "the requests sharing a prefix together so that they hit the prefix "
+        "cache, `length` submits the longest prompts first and `input` keeps "
+        "the order of the input file. The order of the outputs is set by "
+        "`--output-order`.")
+    parser.add_argument(
+        "--fsync-interval",
+        type=float,
+        default=60.0,
+        help="Interval in seconds at which the outputs written to a local "
+        "output file are synced to disk, so that they survive a crash.")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Resume an interrupted batch: keep the outputs of the local "
+        "output file and skip the requests whose `custom_id` has an output.")
+    parser.add_argument(
+        "--embedding-cache-size",
+        type=float,
+        default=0,
+        help="Size in GiB of the cache of the embeddings, keyed by the model, "
+        "pooling config and prompt token ids, so that repeated inputs are "
+        "embedded once. Disabled if 0.")
     parser.add_argument("--response-role",
                         type=nullable_str,
                         default="assistant",
@@ -93,6 +147,9 @@ def parse_args():
 # each line of output with some prefix.
 _BAR_FORMAT = "{desc}: {percentage:3.0f}% Completed | {n_fmt}/{total_fmt} [{elapsed}<{remaining}, {rate_fmt}]\n"  # noqa: E501
 
+# Size of the chunks in which a remote input file is read.
+_READ_CHUNK_BYTES = 1 << 20
+
 
 class BatchProgressTracker:
 
@@ -102,6 +159,10 @@ class BatchProgressTracker:
 
     def submitted(self):
         self._total += 1
+        if self._pbar:
+            # The input file is read as the batch runs.
+            self._pbar.total = self._total
+            self._pbar.refresh()
 
     def completed(self):
         if self._pbar:
@@ -119,27 +180,116 @@ class BatchProgressTracker:
         return self._pbar
 
 
-async def read_file(path_or_url: str) -> str:
-    if path_or_url.startswith("http://") or path_or_url.startswith("https://"):
+def _is_url(path_or_url: str) -> bool:
+    return path_or_url.startswith("http://") or path_or_url.startswith(
+        "https://")
+
+
+async def read_file_lines(path_or_url: str) -> AsyncGenerator[str, None]:
+    """Yield the lines of a file as it is read."""
+    if _is_url(path_or_url):
         async with aiohttp.ClientSession() as session, \
                    session.get(path_or_url) as resp:
-            return await resp.text()
+            buffer = b""
+            async for chunk in resp.content.iter_chunked(_READ_CHUNK_BYTES):
+                buffer += chunk
+                *lines, buffer = buffer.split(b"\n")
+                for line in lines:
+                    yield line.decode("utf-8")
+            if buffer:
+                yield buffer.decode("utf-8")
     else:
         with open(path_or_url, encoding="utf-8") as f:
-            return f.read()
+            for line in f:
+                yield line
+
+
+async def upload_file(path: str, url: str) -> None:
+    async with aiohttp.ClientSession() as session:
+        with open(path, "rb") as f:
+            async with session.put(url, data=f):
+                pass
+
+
+def load_completed_custom_ids(path: str) -> Set[str]:
+    """Return the custom ids of the outputs in the output file of an
+    interrupted batch.
+
+    An output that was being written when the batch was interrupted is
+    truncated from the file, so that the batch can append to it.
+    """
+    completed: Set[str] = set()
+    if not os.path.exists(path):
+        return completed
+    valid_size = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                output = json.loads(line)
+            except json.JSONDecodeError:
+                break
+            completed.add(output["custom_id"])
+            valid_size += len(line)
+    if valid_size < os.path.getsize(path):
+        logger.warning("Truncating the incomplete last output of %s.", path)
+        with open(path, "rb+") as f:
+            f.truncate(valid_size)
+    return completed
+
+
+class BatchOutputWriter:
+    """Writes the outputs of a batch to a local file as they complete.
+
+    Args:
+        path: The path of the output file.
+        ordered: Whether the outputs are written in the order of their
+            indices, in which case completed outputs are held until the
+            outputs of all the requests before them are written.
+        fsync_interval: Interval in seconds at which the file is synced.
+        append: Whether to append to the file instead of truncating it.
+        on_written: Called for every output written.
+    """
+
+    def __init__(self, path: str, ordered: bool, fsync_interval: float,
+                 append: bool, on_written: Callable[[], None]):
+        self.ordered = ordered
+        self.fsync_interval = fsync_interval
+        self.on_written = on_written
+        self.num_written = 0
+        # Closed by close().
+        self._file = open(  # noqa: SIM115
+            path, "a" if append else "w", encoding="utf-8")
+        self._pending: Dict[int, BatchRequestOutput] = {}
+        self._next_index = 0
+        self._last_sync = time.monotonic()
+
+    def add(self, index: int, output: BatchRequestOutput) -> None:
+        if not self.ordered:
+            self._write(output)
+        else:
+            self._pending[index] = output
+            while self._next_index in self._pending:
+                self._write(self._pending.pop(self._next_index))
+                self._next_index += 1
+        if time.monotonic() - self._last_sync >= self.fsync_interval:
+            self.sync()
 
+    def _write(self, output: BatchRequestOutput) -> None:
+        self._file.write(output.model_dump_json() + "\n")
+        self.num_written += 1
+        self.on_written()
 
-async def write_file(path_or_url: str, data: str) -> None:
-    if path_or_url.startswith("http://") or path_or_url.startswith("https://"):
-        async with aiohttp.ClientSession() as session, \
-                   session.put(path_or_url, data=data.encode("utf-8")):
-            pass
-    else:
-        # We should make this async, but as long as this is always run as a
-        # standalone program, blocking the event loop won't effect performance
-        # in this particular case.
-        with open(path_or_url, "w", encoding="utf-8") as f:
-            f.write(data)
+    def sync(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._last_sync = time.monotonic()
+
+    def close(self) -> None:
+        assert not self._pending, "outputs are missing"
+        self.sync()
+        self._file.close()
 
 
 def make_error_request_output(request: BatchRequestInput,
@@ -156,11 +306,6 @@ def make_error_request_output(request: BatchRequestInput,
     return batch_output
 
 
-async def make_async_error_request_output(
-        request: BatchRequestInput, error_msg: str) -> BatchRequestOutput:
-    return make_error_request_output(request, error_msg)
-
-
 async def run_request(serving_engine_func: Callable,
                       request: BatchRequestInput,
                       tracker: BatchProgressTracker) -> BatchRequestOutput:
@@ -232,66 +377,244 @@ async def main(args):
         request_logger=request_logger,
         chat_template=None,
         chat_template_content_format="auto",
+        embedding_cache_bytes=int(args.embedding_cache_size * GiB_bytes),
     ) if model_config.runner_type == "pooling" else None
 
-    tracker = BatchProgressTracker()
-    logger.info("Reading batch from %s...", args.input_file)
-
-    # Submit all requests in the file to the engine "concurrently".
-    response_futures: List[Awaitable[BatchRequestOutput]] = []
-    for request_json in (await read_file(args.input_file)).strip().split("\n"):
+    handlers: Dict[str, Tuple[Optional[Callable], str]] = {
+        "/v1/chat/completions":
+        (None if openai_serving_chat is None else
+         openai_serving_chat.create_chat_completion,
+         "The model does not support Chat Completions API"),
+        "/v1/embeddings": (None if openai_serving_embedding is None else
+                           openai_serving_embedding.create_embedding,
+                           "The model does not support Embeddings API"),
+    }
+
+    max_concurrent_requests = args.max_concurrent_requests
+    if max_concurrent_requests is None:
+        # Keep a batch of requests waiting for every batch running.
+        max_concurrent_requests = (2 * engine_args.max_num_seqs *
+                                   engine_args.pipeline_parallel_size)
+
+    order_requests_fn = None
+    if args.request_ordering != "input":
+        order_requests_fn = make_order_requests_fn(
+            args.request_ordering, await engine.get_tokenizer(),
+            engine.engine.cache_config.block_size)
+
+    await run_batch_file(args.input_file,
+                         args.output_file,
+                         handlers,
+                         max_concurrent_requests=max_concurrent_requests,
+                         ordered=args.output_order == "input",
+                         fsync_interval=args.fsync_interval,
+                         resume=args.resume,
+                         order_requests_fn=order_requests_fn)
+
+
+def get_batch_prompt_token_ids(request: BatchRequestInput,
+                               tokenizer: AnyTokenizer) -> Optional[List[int]]:
+    """Return the prompt token ids of a request to order it, or None if
+    they cannot be computed without the serving objects, e.g. for messages
+    with content parts the chat template of the tokenizer does not take."""
+    body = request.body
+    try:
+        if isinstance(body, (ChatCompletionRequest, EmbeddingChatRequest)):
+            return tokenizer.apply_chat_template(
+                body.messages,  # type: ignore[arg-type]
+                tokenize=True,
+                add_generation_prompt=body.add_generation_prompt)
+        if isinstance(body.input, str):
+            return tokenizer.encode(body.input)
+        if body.input and isinstance(body.input[0], int):
+            return body.input  # type: ignore[return-value]
+    except Exception:
+        return None
+    return None
+
+
+def make_order_requests_fn(
+        ordering: RequestOrdering, tokenizer: AnyTokenizer,
+        block_size: int) -> Callable[[List[BatchRequestInput]], List[int]]:
+    """Return the function ordering a window of batch requests."""
+
+    def order_batch_requests(requests: List[BatchRequestInput]) -> List[int]:
+        return order_requests(
+            ordering,
+            [get_batch_prompt_token_ids(r, tokenizer) for r in requests],
+            block_size,
+            # The requests for different models, e.g. LoRA adapters, do not
+            # share blocks. The hashes only need to be stable within the
+            # process.
+            [hash(r.body.model) for r in requests])
+
+    return order_batch_requests
+
+
+async def read_batch_requests(
+    input_file: str,
+    skipped_ids: Set[str],
+    order_requests_fn: Optional[Callable[[List[BatchRequestInput]],
+                                         List[int]]] = None,
+    window_size: int = 1,
+) -> AsyncGenerator[Tuple[int, BatchRequestInput], None]:
+    """Yield the index and the request of each line of the input file, in
+    the order given by `order_requests_fn` within each window of
+    `window_size` requests."""
+    num_requests = 0
+    window: List[BatchRequestInput] = []
+
+    def flush_window() -> List[Tuple[int, BatchRequestInput]]:
+        start = num_requests - len(window)
+        ordered = [(start + i, window[i])
+                   for i in order_requests_fn(window)]  # type: ignore
+        window.clear()
+        return ordered
+
+    async for request_json in read_file_lines(input_file):
         # Skip empty lines.
         request_json = request_json.strip()
         if not request_json:
             continue
-
         request = BatchRequestInput.model_validate_json(request_json)
+        if request.custom_id in skipped_ids:
+            continue
+        num_requests += 1
+        if order_requests_fn is None:
+            yield num_requests - 1, request
+            continue
+        window.append(request)
+        if len(window) == window_size:
+            for item in flush_window():
+                yield item
+    if window:
+        for item in flush_window():
+            yield item
+
+
+async def run_batch_file(
+    input_file: str,
+    output_file: str,
+    handlers: Dict[str, Tuple[Optional[Callable], str]],
+    max_concurrent_requests: int,
+    ordered: bool = True,
+    fsync_interval: float = 60.0,
+    resume: bool = False,
+    order_requests_fn: Optional[Callable[[List[BatchRequestInput]],
+                                         List[int]]] = None
+) -> None:
+    """Run the requests of a batch input file and write their outputs.
+
+    The input file is read as requests are submitted, and at most
+    `max_concurrent_requests` requests are submitted but not written to the
+    output, so that the memory used does not grow with the size of the
+    batch. A remote output file is written locally and uploaded at the end.
+
+    Args:
+        input_file: The path or url of the input file.
+        output_file: The path or url of the output file.
+        handlers: The handler of each supported url of the requests and the
+            error returned for the url if the handler is None.
+        max_concurrent_requests: The maximum number of requests read but
+            not written.
+        ordered: Whether the outputs are written in the input order.
+        fsync_interval: Interval in seconds at which the output is synced.
+        resume: Whether to skip the requests whose outputs are already in
+            the local output file.
+        order_requests_fn: Returns the order in which to submit each window
+            of `max_concurrent_requests` requests, see
+            `make_order_requests_fn`. The requests are submitted in input
+            order if None.
+    """
+    if resume and _is_url(output_file):
+        raise ValueError("--resume requires a local output file.")
+    local_output_file = output_file
+    if _is_url(output_file):
+        local_output_file = tempfile.NamedTemporaryFile(suffix=".jsonl",
+                                                        delete=False).name
+    completed_ids = (load_completed_custom_ids(local_output_file)
+                     if resume else set())
+    if completed_ids:
+        logger.info("Resuming batch: skipping %d completed requests.",
+                    len(completed_ids))
 
-        # Determine the type of request and run it.
-        if request.url == "/v1/chat/completions":
-            handler_fn = (None if openai_serving_chat is None else
-                          openai_serving_chat.create_chat_completion)
-            if handler_fn is None:
-                response_futures.append(
-                    make_async_error_request_output(
-                        request,
-                        error_msg=
-                        "The model does not support Chat Completions API",
-                    ))
-                continue
-
-            response_futures.append(run_request(handler_fn, request, tracker))
-            tracker.submitted()
-        elif request.url == "/v1/embeddings":
-            handler_fn = (None if openai_serving_embedding is None else
-                          openai_serving_embedding.create_embedding)
-            if handler_fn is None:
-                response_futures.append(
-                    make_async_error_request_output(
-                        request,
-                        error_msg="The model does not support Embeddings API",
-                    ))
-                continue
-
-            response_futures.append(run_request(handler_fn, request, tracker))
-            tracker.submitted()
+    tracker = BatchProgressTracker()
+    window = asyncio.Semaphore(max_concurrent_requests)
+    writer = BatchOutputWriter(local_output_file,
+                               ordered=ordered,
+                               fsync_interval=fsync_interval,
+                               append=resume,
+                               on_written=window.release)
+    tasks: Set[asyncio.Task] = set()
+    errors: List[BaseException] = []
+
+    def on_done(index: int, task: asyncio.Task) -> None:
+        tasks.discard(task)
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            errors.append(task.exception())
+            window.release()
+            return
+        writer.add(index, task.result())
+
+    logger.info("Reading batch from %s...", input_file)
+    start = time.perf_counter()
+    num_requests = 0
+    try:
+        with tracker.pbar():
+            # A window of ordered requests fits in the concurrency window,
+            # so that an output waiting for the outputs before it to be
+            # written never holds back the requests it waits for.
+            async for index, request in read_batch_requests(
+                    input_file, completed_ids, order_requests_fn,
+                    max_concurrent_requests):
+                await window.acquire()
+                if errors:
+                    raise errors[0]
+                num_requests += 1
+
+                # Determine the type of request and run it.
+                handler_fn, unsupported_msg = handlers.get(
+                    request.url,
+                    (None, "Only /v1/chat/completions and /v1/embeddings are "
+                     "supported in the batch endpoint."))
+                if handler_fn is None:
+                    writer.add(
+                        index,
+                        make_error_request_output(request,
+                                                  error_msg=unsupported_msg))
+                    continue
+
+                tracker.submitted()
+                task = asyncio.create_task(
+                    run_request(handler_fn, request, tracker))
+                task.add_done_callback(functools.partial(on_done, index))
+                tasks.add(task)
+
+            if tasks:
+                await asyncio.wait(tasks)
+            if errors:
+                raise errors[0]
+    finally:
+        for task in tasks:
+            task.cancel()
+        if not errors:
+            writer.close()
         else:
-            response_futures.append(
-                make_async_error_request_output(
-                    request,
-                    error_msg="Only /v1/chat/completions and "
-                    "/v1/embeddings are supported in the batch endpoint.",
-                ))
-
-    with tracker.pbar():
-        responses = await asyncio.gather(*response_futures)
-
-    output_buffer = StringIO()
-    for response in responses:
-        print(response.model_dump_json(), file=output_buffer)
-
-    output_buffer.seek(0)
-    await write_file(args.output_file, output_buffer.read().strip())
+            writer.sync()
+
+    if local_output_file != output_file:
+        await upload_file(local_output_file, output_file)
+        os.remove(local_output_file)
+
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in KiB on Linux.
+    peak_rss_gib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**20
+    logger.info(
+        "Processed %d requests in %.1fs (%.2f req/s), peak RSS %.2f GiB.",
+        num_requests, elapsed, num_requests / elapsed if elapsed else 0.0,
+        peak_rss_gib)
 
 
 if __name__ == "__main__":
@@ -10,9 +10,11 @@ from fastapi import Request
 
 from vllm.config import ModelConfig
 from vllm.engine.protocol import EngineClient
-from vllm.entrypoints.chat_utils import (ChatTemplateContentFormatOption,
+from vllm.entrypoints.chat_utils import (ChatPromptCache,
+                                         ChatTemplateContentFormatOption,
                                          ConversationMessage)
 from vllm.entrypoints.logger import RequestLogger
+from vllm.entrypoints.openai.admission import AdmissionController
 from vllm.entrypoints.openai.protocol import (
     ChatCompletionLogProb, ChatCompletionLogProbs,
     ChatCompletionLogProbsContent, ChatCompletionNamedToolChoiceParam,
@@ -25,6 +27,9 @@ from vllm.entrypoints.openai.serving_engine import (BaseModelPath,
                                                     LoRAModulePath,
                                                     OpenAIServing,
                                                     PromptAdapterPath)
+from vllm.entrypoints.openai.stream_coalescing import (
+    StreamFlushPolicy, coalesce_request_outputs, get_stream_coalescing_metrics)
+from vllm.entrypoints.openai.stream_encoder import ChatCompletionStreamEncoder
 from vllm.entrypoints.openai.tool_parsers import ToolParser, ToolParserManager
 from vllm.logger import init_logger
 from vllm.outputs import CompletionOutput, RequestOutput
@@ -55,6 +60,9 @@ class OpenAIServingChat(OpenAIServing):
         enable_auto_tools: bool = False,
         tool_parser: Optional[str] = None,
         enable_prompt_tokens_details: bool = False,
+        stream_flush_policy: Optional[StreamFlushPolicy] = None,
+        chat_prompt_cache_bytes: int = 0,
+        admission_controller: Optional[AdmissionController] = None,
     ) -> None:
         super().__init__(engine_client=engine_client,
                          model_config=model_config,
@@ -68,6 +76,14 @@ class OpenAIServingChat(OpenAIServing):
         self.chat_template = chat_template
         self.chat_template_content_format: Final = chat_template_content_format
 
+        self.stream_flush_policy = stream_flush_policy if (
+            stream_flush_policy is not None
+            and stream_flush_policy.coalesces) else None
+
+        if chat_prompt_cache_bytes > 0:
+            self.chat_prompt_cache = ChatPromptCache(chat_prompt_cache_bytes)
+        self.admission_controller = admission_controller
+
         # set up tool use
         self.enable_auto_tools: bool = enable_auto_tools
         if self.enable_auto_tools:
@@ -209,6 +225,13 @@ class OpenAIServingChat(OpenAIServing):
                 trace_headers = (None if raw_request is None else await
                                  self._get_trace_headers(raw_request.headers))
 
+                admission_error = self._admit_request(request_id,
+                                                      engine_prompt,
+                                                      request.priority,
+                                                      request.ttft_slo_ms)
+                if admission_error is not None:
+                    return admission_error
+
                 if isinstance(sampling_params, BeamSearchParams):
                     generator = self.engine_client.beam_search(
                         prompt=engine_prompt,
@@ -226,8 +249,13 @@ class OpenAIServingChat(OpenAIServing):
                         priority=request.priority,
                     )
 
+                if self.admission_controller is not None:
+                    generator = self.admission_controller.track(
+                        request_id, generator)
                 generators.append(generator)
         except ValueError as e:
+            if self.admission_controller is not None:
+                self.admission_controller.withdraw(request_id)
             # TODO: Use a vllm-specific Validation Error
             return self.create_error_response(str(e))
 
@@ -240,6 +268,10 @@ class OpenAIServingChat(OpenAIServing):
 
         # Streaming response
         if request.stream:
+            if self.stream_flush_policy is not None:
+                result_generator = coalesce_request_outputs(
+                    result_generator, self.stream_flush_policy,
+                    get_stream_coalescing_metrics())
             return self.chat_completion_stream_generator(
                 request, result_generator, request_id, model_name,
                 conversation, tokenizer, request_metadata)
@@ -269,6 +301,8 @@ class OpenAIServingChat(OpenAIServing):
     ) -> AsyncGenerator[str, None]:
         created_time = int(time.time())
         chunk_object_type: Final = "chat.completion.chunk"
+        stream_encoder = ChatCompletionStreamEncoder(request_id, created_time,
+                                                     model_name)
         first_iteration = True
 
         # Send response for each token for each request.n (index)
@@ -423,6 +457,22 @@ class OpenAIServingChat(OpenAIServing):
                         # Chunked prefill case, don't return empty chunks
                         continue
 
+                    # Encode the chunks of plain content deltas, sent for
+                    # every token, without building the response models.
+                    if (logprobs is None and not tool_choice_function_name
+                            and not tool_choice_auto):
+                        previous_num_tokens[i] += len(output.token_ids)
+                        if output.finish_reason is not None:
+                            finish_reason_sent[i] = True
+                        yield stream_encoder.encode_content_delta(
+                            i,
+                            delta_text,
+                            finish_reason=output.finish_reason,
+                            stop_reason=output.stop_reason,
+                            usage=(num_prompt_tokens, previous_num_tokens[i])
+                            if include_continuous_usage else None)
+                        continue
+
                     delta_message: Optional[DeltaMessage]
 
                     # handle streaming deltas for tools with named tool_choice
@@ -9,6 +9,7 @@ from fastapi import Request
 from vllm.config import ModelConfig
 from vllm.engine.protocol import EngineClient
 from vllm.entrypoints.logger import RequestLogger
+from vllm.entrypoints.openai.admission import AdmissionController
 # yapf conflicts with isort for this block
 # yapf: disable
 from vllm.entrypoints.openai.protocol import (CompletionLogProbs,
@@ -25,6 +26,9 @@ from vllm.entrypoints.openai.serving_engine import (BaseModelPath,
                                                     LoRAModulePath,
                                                     OpenAIServing,
                                                     PromptAdapterPath)
+from vllm.entrypoints.openai.stream_coalescing import (
+    StreamFlushPolicy, coalesce_request_outputs, get_stream_coalescing_metrics)
+from vllm.entrypoints.openai.stream_encoder import CompletionStreamEncoder
 from vllm.logger import init_logger
 from vllm.outputs import RequestOutput
 from vllm.sampling_params import BeamSearchParams, SamplingParams
@@ -47,6 +51,8 @@ class OpenAIServingCompletion(OpenAIServing):
         prompt_adapters: Optional[List[PromptAdapterPath]],
         request_logger: Optional[RequestLogger],
         return_tokens_as_token_ids: bool = False,
+        stream_flush_policy: Optional[StreamFlushPolicy] = None,
+        admission_controller: Optional[AdmissionController] = None,
     ):
         super().__init__(engine_client=engine_client,
                          model_config=model_config,
@@ -56,6 +62,11 @@ class OpenAIServingCompletion(OpenAIServing):
                          request_logger=request_logger,
                          return_tokens_as_token_ids=return_tokens_as_token_ids)
 
+        self.stream_flush_policy = stream_flush_policy if (
+            stream_flush_policy is not None
+            and stream_flush_policy.coalesces) else None
+        self.admission_controller = admission_controller
+
     async def create_completion(
         self,
         request: CompletionRequest,
@@ -137,6 +148,17 @@ class OpenAIServingCompletion(OpenAIServing):
                 trace_headers = (await
                                  self._get_trace_headers(raw_request.headers))
 
+                admission_error = self._admit_request(request_id_item,
+                                                      engine_prompt,
+                                                      request.priority,
+                                                      request.ttft_slo_ms)
+                if admission_error is not None:
+                    # The prompts admitted before are not sent either.
+                    assert self.admission_controller is not None
+                    for j in range(i):
+                        self.admission_controller.withdraw(f"{request_id}-{j}")
+                    return admission_error
+
                 if isinstance(sampling_params, BeamSearchParams):
                     generator = self.engine_client.beam_search(
                         prompt=engine_prompt,
@@ -154,17 +176,18 @@ class OpenAIServingCompletion(OpenAIServing):
                         priority=request.priority,
                     )
 
+                if self.admission_controller is not None:
+                    generator = self.admission_controller.track(
+                        request_id_item, generator)
                 generators.append(generator)
         except ValueError as e:
+            # The prompts admitted before are not sent.
+            if self.admission_controller is not None:
+                for j in range(len(engine_prompts)):
+                    self.admission_controller.withdraw(f"{request_id}-{j}")
             # TODO: Use a vllm-specific Validation Error
             return self.create_error_response(str(e))
 
-        result_generator = merge_async_iterators(
-            *generators, is_cancelled=raw_request.is_disconnected)
-
-        model_name = self._get_model_name(lora_request)
-        num_prompts = len(engine_prompts)
-
         # Similar to the OpenAI API, when n != best_of, we do not stream the
         # results. In addition, we do not stream the results when use
         # beam search.
@@ -172,6 +195,19 @@ class OpenAIServingCompletion(OpenAIServing):
                   and (request.best_of is None or request.n == request.best_of)
                   and not request.use_beam_search)
 
+        if stream and self.stream_flush_policy is not None:
+            metrics = get_stream_coalescing_metrics()
+            generators = [
+                coalesce_request_outputs(generator, self.stream_flush_policy,
+                                         metrics) for generator in generators
+            ]
+
+        result_generator = merge_async_iterators(
+            *generators, is_cancelled=raw_request.is_disconnected)
+
+        model_name = self._get_model_name(lora_request)
+        num_prompts = len(engine_prompts)
+
         # Streaming response
         if stream:
             return self.completion_stream_generator(
@@ -242,6 +278,8 @@ class OpenAIServingCompletion(OpenAIServing):
         request_metadata: RequestResponseMetadata,
     ) -> AsyncGenerator[str, None]:
         num_choices = 1 if request.n is None else request.n
+        stream_encoder = CompletionStreamEncoder(request_id, created_time,
+                                                 model_name)
         previous_text_lens = [0] * num_choices * num_prompts
         previous_num_tokens = [0] * num_choices * num_prompts
         has_echoed = [False] * num_choices * num_prompts
@@ -322,6 +360,22 @@ class OpenAIServingCompletion(OpenAIServing):
                     finish_reason = output.finish_reason
                     stop_reason = output.stop_reason
 
+                    if include_continuous_usage:
+                        prompt_tokens = num_prompt_tokens[prompt_idx]
+                        completion_tokens = previous_num_tokens[i]
+
+                    # Encode the chunks without logprobs, sent for every
+                    # token, without building the response models.
+                    if logprobs is None:
+                        yield stream_encoder.encode_text_delta(
+                            i,
+                            delta_text,
+                            finish_reason=finish_reason,
+                            stop_reason=stop_reason,
+                            usage=(prompt_tokens, completion_tokens)
+                            if include_continuous_usage else None)
+                        continue
+
                     chunk = CompletionStreamResponse(
                         id=request_id,
                         created=created_time,
@@ -336,8 +390,6 @@ class OpenAIServingCompletion(OpenAIServing):
                             )
                         ])
                     if include_continuous_usage:
-                        prompt_tokens = num_prompt_tokens[prompt_idx]
-                        completion_tokens = previous_num_tokens[i]
                         chunk.usage = UsageInfo(
                             prompt_tokens=prompt_tokens,
                             completion_tokens=completion_tokens,
@@ -1,9 +1,13 @@
 import asyncio
 import base64
 import time
-from typing import AsyncGenerator, Final, List, Literal, Optional, Union, cast
+from collections import OrderedDict
+from typing import (AsyncGenerator, Dict, Final, List, Literal, Optional,
+                    Sequence, Union, cast)
 
 import numpy as np
+import torch
+from blake3 import blake3
 from fastapi import Request
 from typing_extensions import assert_never
 
@@ -18,28 +22,90 @@ from vllm.entrypoints.openai.protocol import (EmbeddingChatRequest,
                                               ErrorResponse, UsageInfo)
 from vllm.entrypoints.openai.serving_engine import BaseModelPath, OpenAIServing
 from vllm.logger import init_logger
-from vllm.outputs import (EmbeddingOutput, EmbeddingRequestOutput,
-                          PoolingRequestOutput)
+from vllm.outputs import PoolingOutput, PoolingRequestOutput
 from vllm.utils import merge_async_iterators
 
 logger = init_logger(__name__)
 
 
 def _get_embedding(
-    output: EmbeddingOutput,
+    pooled_data: torch.Tensor,
     encoding_format: Literal["float", "base64"],
 ) -> Union[List[float], str]:
+    if pooled_data.ndim != 1:
+        raise ValueError("pooled_data should be a 1-D embedding vector")
     if encoding_format == "float":
-        return output.embedding
+        return pooled_data.tolist()
     elif encoding_format == "base64":
         # Force to use float32 for base64 encoding
-        # to match the OpenAI python client behavior
-        embedding_bytes = np.array(output.embedding, dtype="float32").tobytes()
-        return base64.b64encode(embedding_bytes).decode("utf-8")
+        # to match the OpenAI python client behavior.
+        # Encode the buffer of the tensor rather than a list of its values.
+        embedding = pooled_data.to(device="cpu",
+                                   dtype=torch.float32).contiguous()
+        return base64.b64encode(embedding.numpy()).decode("utf-8")
 
     assert_never(encoding_format)
 
 
+class EmbeddingCache:
+    """LRU cache of the pooled outputs of embedding prompts.
+
+    The outputs are keyed by a digest of the model, the pooling config and
+    the prompt token ids, so that a prompt embedded before, e.g. a chunk of
+    a document ingested again, does not run through the engine. The cache
+    evicts the least recently used outputs beyond `max_bytes` bytes of
+    outputs.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.num_bytes = 0
+        self.num_hits = 0
+        self.num_queries = 0
+        self._outputs: OrderedDict[bytes, torch.Tensor] = OrderedDict()
+
+    @staticmethod
+    def make_key(model: str, pooling_config: str,
+                 prompt_token_ids: Sequence[int]) -> bytes:
+        hasher = blake3()
+        hasher.update(model.encode())
+        hasher.update(b"\0")
+        hasher.update(pooling_config.encode())
+        hasher.update(b"\0")
+        hasher.update(np.asarray(prompt_token_ids, dtype=np.int64).tobytes())
+        return hasher.digest()
+
+    def get(self, key: bytes) -> Optional[torch.Tensor]:
+        self.num_queries += 1
+        pooled_data = self._outputs.get(key)
+        if pooled_data is not None:
+            self.num_hits += 1
+            self._outputs.move_to_end(key)
+        return pooled_data
+
+    def put(self, key: bytes, pooled_data: torch.Tensor) -> None:
+        if key in self._outputs:
+            self._outputs.move_to_end(key)
+            return
+        size = pooled_data.numel() * pooled_data.element_size()
+        if size > self.max_bytes:
+            return
+        # Keep the cache off the device of the model.
+        pooled_data = pooled_data.cpu()
+        while self.num_bytes + size > self.max_bytes:
+            _, evicted = self._outputs.popitem(last=False)
+            self.num_bytes -= evicted.numel() * evicted.element_size()
+        self._outputs[key] = pooled_data
+        self.num_bytes += size
+
+    @property
+    def hit_rate(self) -> float:
+        return self.num_hits / self.num_queries if self.num_queries else 0.0
+
+    def __len__(self) -> int:
+        return len(self._outputs)
+
+
 def request_output_to_embedding_response(
         final_res_batch: List[PoolingRequestOutput], request_id: str,
         created_time: int, model_name: str,
@@ -47,10 +113,9 @@ def request_output_to_embedding_response(
     data: List[EmbeddingResponseData] = []
     num_prompt_tokens = 0
     for idx, final_res in enumerate(final_res_batch):
-        embedding_res = EmbeddingRequestOutput.from_base(final_res)
         prompt_token_ids = final_res.prompt_token_ids
 
-        embedding = _get_embedding(embedding_res.outputs, encoding_format)
+        embedding = _get_embedding(final_res.outputs.data, encoding_format)
         embedding_data = EmbeddingResponseData(index=idx, embedding=embedding)
         data.append(embedding_data)
 
@@ -81,6 +146,7 @@ class OpenAIServingEmbedding(OpenAIServing):
         request_logger: Optional[RequestLogger],
         chat_template: Optional[str],
         chat_template_content_format: ChatTemplateContentFormatOption,
+        embedding_cache_bytes: int = 0,
     ) -> None:
         super().__init__(engine_client=engine_client,
                          model_config=model_config,
@@ -91,6 +157,8 @@ class OpenAIServingEmbedding(OpenAIServing):
 
         self.chat_template = chat_template
         self.chat_template_content_format: Final = chat_template_content_format
+        self.embedding_cache = (EmbeddingCache(embedding_cache_bytes)
+                                if embedding_cache_bytes > 0 else None)
 
     async def create_embedding(
         self,
@@ -171,14 +239,43 @@ class OpenAIServingEmbedding(OpenAIServing):
             logger.exception("Error in preprocessing prompt inputs")
             return self.create_error_response(str(e))
 
+        num_prompts = len(engine_prompts)
+        final_res_batch: List[Optional[PoolingRequestOutput]]
+        final_res_batch = [None] * num_prompts
+
         # Schedule the request and get the result generator.
         generators: List[AsyncGenerator[PoolingRequestOutput, None]] = []
+        # The prompts whose output each generator yields.
+        generator_prompts: List[List[int]] = []
+        cache_keys: List[Optional[bytes]] = [None] * num_prompts
         try:
             pooling_params = request.to_pooling_params()
+            pooling_config = repr(
+                (self.model_config.pooler_config, pooling_params))
+            cache_model = (lora_request.lora_path
+                           if lora_request else self.model_config.model)
+            key_generators: Dict[bytes, int] = {}
 
             for i, engine_prompt in enumerate(engine_prompts):
                 request_id_item = f"{request_id}-{i}"
 
+                if (self.embedding_cache is not None
+                        and "multi_modal_data" not in engine_prompt):
+                    key = cache_keys[i] = self.embedding_cache.make_key(
+                        cache_model, pooling_config,
+                        engine_prompt["prompt_token_ids"])
+                    pooled_data = self.embedding_cache.get(key)
+                    if pooled_data is not None:
+                        final_res_batch[i] = PoolingRequestOutput(
+                            request_id_item, PoolingOutput(pooled_data),
+                            engine_prompt["prompt_token_ids"], True)
+                        continue
+                    # Prompts repeated within the request run once.
+                    if key in key_generators:
+                        generator_prompts[key_generators[key]].append(i)
+                        continue
+                    key_generators[key] = len(generators)
+
                 self._log_inputs(request_id_item,
                                  request_prompts[i],
                                  params=pooling_params,
@@ -198,6 +295,7 @@ class OpenAIServingEmbedding(OpenAIServing):
                 )
 
                 generators.append(generator)
+                generator_prompts.append([i])
         except ValueError as e:
             # TODO: Use a vllm-specific Validation Error
             return self.create_error_response(str(e))
@@ -207,14 +305,15 @@ class OpenAIServingEmbedding(OpenAIServing):
             is_cancelled=raw_request.is_disconnected if raw_request else None,
         )
 
-        num_prompts = len(engine_prompts)
-
         # Non-streaming response
-        final_res_batch: List[Optional[PoolingRequestOutput]]
-        final_res_batch = [None] * num_prompts
         try:
             async for i, res in result_generator:
-                final_res_batch[i] = res
+                for prompt_idx in generator_prompts[i]:
+                    final_res_batch[prompt_idx] = res
+                key = cache_keys[generator_prompts[i][0]]
+                if key is not None and res.finished:
+                    assert self.embedding_cache is not None
+                    self.embedding_cache.put(key, res.outputs.data)
 
             assert all(final_res is not None for final_res in final_res_batch)
 
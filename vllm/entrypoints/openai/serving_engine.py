@@ -16,6 +16,7 @@ from vllm.engine.protocol import EngineClient
 # yapf conflicts with isort for this block
 # yapf: disable
 from vllm.entrypoints.chat_utils import (ChatCompletionMessageParam,
+                                         ChatPromptCache, ChatPromptLookup,
                                          ChatTemplateContentFormatOption,
                                          ConversationMessage,
                                          apply_hf_chat_template,
@@ -23,6 +24,7 @@ from vllm.entrypoints.chat_utils import (ChatCompletionMessageParam,
                                          parse_chat_messages_futures,
                                          resolve_chat_template_content_format)
 from vllm.entrypoints.logger import RequestLogger
+from vllm.entrypoints.openai.admission import AdmissionController
 from vllm.entrypoints.openai.protocol import (ChatCompletionRequest,
                                               CompletionRequest,
                                               DetokenizeRequest,
@@ -141,6 +143,8 @@ class OpenAIServing:
 
         self.request_logger = request_logger
         self.return_tokens_as_token_ids = return_tokens_as_token_ids
+        self.chat_prompt_cache: Optional[ChatPromptCache] = None
+        self.admission_controller: Optional[AdmissionController] = None
 
         self._tokenizer_executor = ThreadPoolExecutor(max_workers=1)
 
@@ -149,6 +153,8 @@ class OpenAIServing:
         self._tokenize_prompt_input_or_inputs_async = make_async(
             self._tokenize_prompt_input_or_inputs,
             executor=self._tokenizer_executor)
+        self._tokenize_chat_prompt_async = make_async(
+            self._tokenize_chat_prompt, executor=self._tokenizer_executor)
 
     async def show_available_models(self) -> ModelList:
         """Show available models. Right now we only have one model."""
@@ -186,6 +192,28 @@ class OpenAIServing:
                              type=err_type,
                              code=status_code.value)
 
+    def _admit_request(
+            self, request_id: str, engine_prompt: TokensPrompt, priority: int,
+            ttft_slo_ms: Optional[float]) -> Optional[ErrorResponse]:
+        if self.admission_controller is None:
+            return None
+        reason = self.admission_controller.admit(
+            request_id, len(engine_prompt["prompt_token_ids"]), priority,
+            ttft_slo_ms)
+        if reason is None:
+            return None
+        if reason == "kv_cache_full":
+            message = ("The server is overloaded and does not admit requests "
+                       f"with priority {priority}. Please retry later.")
+        else:
+            message = ("The server is overloaded and would not return the "
+                       "first token of the request within its TTFT SLO. "
+                       "Please retry later.")
+        return self.create_error_response(
+            message,
+            err_type="TooManyRequestsError",
+            status_code=HTTPStatus.TOO_MANY_REQUESTS)
+
     def create_streaming_error_response(
             self,
             message: str,
@@ -342,6 +370,23 @@ class OpenAIServing:
                 add_special_tokens=add_special_tokens,
             ))
 
+    def _tokenize_chat_prompt(
+        self,
+        request: AnyRequest,
+        tokenizer: AnyTokenizer,
+        prompt: str,
+        chat_prompt_lookup: ChatPromptLookup,
+    ) -> TextTokensPrompt:
+        """
+        Tokenize a rendered chat prompt, reusing the token ids of the cached
+        prompt of the conversation or of one of its prefixes.
+        """
+        assert self.chat_prompt_cache is not None
+        input_ids = self.chat_prompt_cache.tokenize(tokenizer,
+                                                    chat_prompt_lookup, prompt)
+
+        return self._validate_input(request, input_ids, prompt)
+
     def _tokenize_prompt_inputs(
         self,
         request: AnyRequest,
@@ -469,12 +514,24 @@ class OpenAIServing:
 
         request_prompt: Union[str, List[int]]
         is_mistral_tokenizer = isinstance(tokenizer, MistralTokenizer)
+
+        # The cached token ids are those of the whole prompt, without
+        # special tokens added by the tokenizer.
+        chat_prompt_lookup: Optional[ChatPromptLookup] = None
+        if (self.chat_prompt_cache is not None and not is_mistral_tokenizer
+                and truncate_prompt_tokens is None and not add_special_tokens):
+            chat_prompt_lookup = self.chat_prompt_cache.lookup(
+                tokenizer, conversation, _chat_template_kwargs)
+
         if is_mistral_tokenizer:
             request_prompt = apply_mistral_chat_template(
                 tokenizer,
                 messages=messages,
                 **_chat_template_kwargs,
             )
+        elif (chat_prompt_lookup is not None
+              and chat_prompt_lookup.prompt is not None):
+            request_prompt = chat_prompt_lookup.prompt
         else:
             request_prompt = apply_hf_chat_template(
                 tokenizer,
@@ -498,7 +555,10 @@ class OpenAIServing:
             request = tool_parser(tokenizer).adjust_request(  # type: ignore
                 request=request)
 
-        if isinstance(request_prompt, str):
+        if isinstance(request_prompt, str) and chat_prompt_lookup is not None:
+            prompt_inputs = await self._tokenize_chat_prompt_async(
+                request, tokenizer, request_prompt, chat_prompt_lookup)
+        elif isinstance(request_prompt, str):
             prompt_inputs = await self._tokenize_prompt_input_async(
                 request,
                 tokenizer,
@@ -0,0 +1,214 @@
+"""Coalescing of the outputs of streamed requests into fewer events.
+
+The engine returns an output for every request at each step, and the
+stream generators send an event for each output. With multi-step
+scheduling or speculative decoding, or with clients that read slowly, that
+is many small writes. When a `StreamFlushPolicy` is configured, the outputs
+of a stream are read ahead of the stream generator and buffered, and the
+buffered deltas are merged into a single output when the policy flushes
+them: after a number of tokens, after a delay, or as soon as the previous
+event has been written. The outputs that arrive while an event is written
+are always merged. The first output of a stream is flushed right away, so
+the time to first token is not delayed.
+"""
+import asyncio
+import contextlib
+import time
+from dataclasses import dataclass
+from typing import AsyncGenerator, AsyncIterator, Dict, List, Optional
+
+from vllm.outputs import CompletionOutput, RequestOutput
+
+
+@dataclass(frozen=True)
+class StreamFlushPolicy:
+    """When the buffered outputs of a stream are sent to the client.
+
+    Args:
+        max_tokens: Flush once the buffered outputs hold this many tokens.
+        max_delay_ms: Flush once the oldest buffered output has waited this
+            many milliseconds.
+        when_writable: Flush as soon as the previous event has been written,
+            so that outputs are only merged when the client falls behind.
+    """
+    max_tokens: Optional[int] = None
+    max_delay_ms: Optional[float] = None
+    when_writable: bool = False
+
+    def __post_init__(self):
+        if self.max_tokens is not None and self.max_tokens < 1:
+            raise ValueError("max_tokens must be at least 1, got "
+                             f"{self.max_tokens}.")
+        if self.max_delay_ms is not None and self.max_delay_ms <= 0:
+            raise ValueError("max_delay_ms must be positive, got "
+                             f"{self.max_delay_ms}.")
+        if self.when_writable and (self.max_tokens is not None
+                                   or self.max_delay_ms is not None):
+            raise ValueError("when_writable flushes as soon as an event can "
+                             "be written and cannot be combined with "
+                             "max_tokens or max_delay_ms.")
+
+    @property
+    def coalesces(self) -> bool:
+        return (self.when_writable or self.max_delay_ms is not None
+                or (self.max_tokens is not None and self.max_tokens > 1))
+
+
+class StreamCoalescingMetrics:
+    """Prometheus metrics of the coalescing of streamed outputs.
+
+    The events saved per second are the rate of
+    `vllm:stream_engine_outputs_total` minus the rate of
+    `vllm:stream_events_total`."""
+
+    def __init__(self):
+        # Lazy import so that PROMETHEUS_MULTIPROC_DIR is set beforehand.
+        from prometheus_client import Counter, Histogram
+
+        self.counter_engine_outputs = Counter(
+            name="vllm:stream_engine_outputs_total",
+            documentation="Number of engine outputs of streamed requests.")
+        self.counter_events = Counter(
+            name="vllm:stream_events_total",
+            documentation="Number of flushes of the outputs of streamed "
+            "requests to their clients.")
+        self.histogram_flush_delay = Histogram(
+            name="vllm:stream_flush_delay_seconds",
+            documentation="Time the oldest output of a flush waited in the "
+            "buffer of its stream.",
+            buckets=[
+                0.0005, 0.001, 0.0025, 0.005, 0.01, 0.02, 0.04, 0.06, 0.08,
+                0.1, 0.25, 0.5, 1.0, 2.5
+            ])
+
+
+_metrics: Optional[StreamCoalescingMetrics] = None
+
+
+def get_stream_coalescing_metrics() -> StreamCoalescingMetrics:
+    global _metrics
+    if _metrics is None:
+        _metrics = StreamCoalescingMetrics()
+    return _metrics
+
+
+def merge_request_outputs(outputs: List[RequestOutput]) -> RequestOutput:
+    """Merge consecutive delta outputs of a request into one output."""
+    if len(outputs) == 1:
+        return outputs[0]
+
+    completions: Dict[int, CompletionOutput] = {}
+    for res in outputs:
+        for output in res.outputs:
+            merged = completions.get(output.index)
+            if merged is None:
+                completions[output.index] = CompletionOutput(
+                    index=output.index,
+                    text=output.text,
+                    token_ids=list(output.token_ids),
+                    cumulative_logprob=output.cumulative_logprob,
+                    logprobs=None
+                    if output.logprobs is None else list(output.logprobs),
+                    finish_reason=output.finish_reason,
+                    stop_reason=output.stop_reason,
+                    lora_request=output.lora_request)
+                continue
+            merged.text += output.text
+            merged.token_ids.extend(output.token_ids)  # type: ignore
+            if output.logprobs is not None:
+                if merged.logprobs is None:
+                    merged.logprobs = []
+                merged.logprobs.extend(output.logprobs)
+            merged.cumulative_logprob = output.cumulative_logprob
+            merged.finish_reason = output.finish_reason
+            merged.stop_reason = output.stop_reason
+
+    first, last = outputs[0], outputs[-1]
+    return RequestOutput(
+        request_id=last.request_id,
+        prompt=first.prompt,
+        prompt_token_ids=first.prompt_token_ids,
+        prompt_logprobs=first.prompt_logprobs,
+        outputs=list(completions.values()),
+        finished=last.finished,
+        metrics=last.metrics,
+        lora_request=first.lora_request,
+        encoder_prompt=first.encoder_prompt,
+        encoder_prompt_token_ids=first.encoder_prompt_token_ids,
+        num_cached_tokens=first.num_cached_tokens,
+        multi_modal_placeholders=first.multi_modal_placeholders)
+
+
+async def coalesce_request_outputs(
+    result_generator: AsyncIterator[RequestOutput],
+    policy: StreamFlushPolicy,
+    metrics: Optional[StreamCoalescingMetrics] = None,
+) -> AsyncGenerator[RequestOutput, None]:
+    """Read the outputs of a streamed request ahead of its consumer and
+    yield them merged according to `policy`.
+
+    Errors of `result_generator` are raised after the outputs buffered
+    before them are yielded.
+    """
+    buffer: List[RequestOutput] = []
+    buffer_start = 0.0
+    num_buffered_tokens = 0
+    done = False
+    error: Optional[BaseException] = None
+    new_output = asyncio.Event()
+
+    async def read_ahead() -> None:
+        nonlocal buffer_start, num_buffered_tokens, done, error
+        try:
+            async for res in result_generator:
+                if not buffer:
+                    buffer_start = time.monotonic()
+                buffer.append(res)
+                num_buffered_tokens += sum(
+                    len(output.token_ids) for output in res.outputs)
+                new_output.set()
+        except BaseException as e:
+            error = e
+        finally:
+            done = True
+            new_output.set()
+
+    max_delay = (None if policy.max_delay_ms is None else policy.max_delay_ms /
+                 1000)
+    first_flush = True
+    task = asyncio.create_task(read_ahead())
+    try:
+        while True:
+            if not buffer:
+                if done:
+                    if error is not None:
+                        raise error
+                    return
+                new_output.clear()
+                await new_output.wait()
+                continue
+
+            waited = time.monotonic() - buffer_start
+            if not (first_flush or done or policy.when_writable
+                    or buffer[-1].finished or
+                    (policy.max_tokens is not None
+                     and num_buffered_tokens >= policy.max_tokens) or
+                    (max_delay is not None and waited >= max_delay)):
+                new_output.clear()
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(
+                        new_output.wait(),
+                        None if max_delay is None else max_delay - waited)
+                continue
+
+            outputs = buffer[:]
+            buffer.clear()
+            num_buffered_tokens = 0
+            first_flush = False
+            if metrics is not None:
+                metrics.counter_engine_outputs.inc(len(outputs))
+                metrics.counter_events.inc()
+                metrics.histogram_flush_delay.observe(waited)
+            yield merge_request_outputs(outputs)
+    finally:
+        task.cancel()
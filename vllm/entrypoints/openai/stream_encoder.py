@@ -0,0 +1,89 @@
+"""Encoding of the chunks of streamed responses as server-sent events
+without building pydantic models.
+
+The chunks of a stream only differ in the delta of their choice and in
+their usage, so the encoders format the events from a prefix computed once
+per request and the encoded delta. The events are the same as the
+`model_dump_json` of the corresponding `ChatCompletionStreamResponse` and
+`CompletionStreamResponse`. Only the chunks sent for the tokens of plain
+text choices are encoded here; the chunks with logprobs, tool calls or
+roles are still built as models.
+"""
+from json.encoder import encode_basestring  # type: ignore[attr-defined]
+from typing import Optional, Tuple, Union
+
+# The prompt and completion tokens of a chunk.
+StreamUsage = Tuple[int, int]
+
+
+def _encode_stop_reason(stop_reason: Optional[Union[int, str]]) -> str:
+    if stop_reason is None:
+        return "null"
+    if isinstance(stop_reason, int):
+        return str(stop_reason)
+    return encode_basestring(stop_reason)
+
+
+def _encode_usage(usage: StreamUsage) -> str:
+    prompt_tokens, completion_tokens = usage
+    return (f'{{"prompt_tokens":{prompt_tokens},'
+            f'"total_tokens":{prompt_tokens + completion_tokens},'
+            f'"completion_tokens":{completion_tokens}')
+
+
+def _encode_prefix(request_id: str, object_type: str, created: int,
+                   model_name: str) -> str:
+    return (f'data: {{"id":{encode_basestring(request_id)},'
+            f'"object":"{object_type}","created":{created},'
+            f'"model":{encode_basestring(model_name)},"choices":[{{"index":')
+
+
+class ChatCompletionStreamEncoder:
+    """Encodes the content deltas of a chat completion stream, like the
+    `model_dump_json(exclude_unset=True)` of a `ChatCompletionStreamResponse`
+    with a `DeltaMessage(content=...)`."""
+
+    def __init__(self, request_id: str, created: int, model_name: str):
+        self._prefix = _encode_prefix(request_id, "chat.completion.chunk",
+                                      created, model_name)
+
+    def encode_content_delta(self,
+                             index: int,
+                             content: str,
+                             finish_reason: Optional[str] = None,
+                             stop_reason: Optional[Union[int, str]] = None,
+                             usage: Optional[StreamUsage] = None) -> str:
+        if finish_reason is None:
+            choice_end = ',"logprobs":null,"finish_reason":null}]'
+        else:
+            choice_end = (f',"logprobs":null,"finish_reason":'
+                          f'{encode_basestring(finish_reason)},"stop_reason":'
+                          f'{_encode_stop_reason(stop_reason)}}}]')
+        usage_str = "" if usage is None else (
+            f',"usage":{_encode_usage(usage)}}}')
+        return (f'{self._prefix}{index},"delta":{{"content":'
+                f'{encode_basestring(content)}}}{choice_end}{usage_str}}}\n\n')
+
+
+class CompletionStreamEncoder:
+    """Encodes the text deltas of a completion stream without logprobs, like
+    the `model_dump_json()` of a `CompletionStreamResponse`."""
+
+    def __init__(self, request_id: str, created: int, model_name: str):
+        self._prefix = _encode_prefix(request_id, "text_completion", created,
+                                      model_name)
+
+    def encode_text_delta(self,
+                          index: int,
+                          text: str,
+                          finish_reason: Optional[str] = None,
+                          stop_reason: Optional[Union[int, str]] = None,
+                          usage: Optional[StreamUsage] = None) -> str:
+        finish_reason_str = ("null" if finish_reason is None else
+                             encode_basestring(finish_reason))
+        usage_str = ("null" if usage is None else
+                     f'{_encode_usage(usage)},"prompt_tokens_details":null}}')
+        return (f'{self._prefix}{index},"text":{encode_basestring(text)},'
+                f'"logprobs":null,"finish_reason":{finish_reason_str},'
+                f'"stop_reason":{_encode_stop_reason(stop_reason)}}}],'
+                f'"usage":{usage_str}}}\n\n')
@@ -0,0 +1,93 @@
+"""Ordering of the requests of offline batches.
+
+The engine schedules the requests of a batch in the order they are added.
+Submitting the requests that share a prefix one after the other lets them
+find the prefix in the prefix cache before it is evicted, and submitting
+requests of similar lengths together makes the running batches more
+uniform. The outputs are still returned in the input order.
+
+The `prefix` ordering builds the tree of the prefix hash chains of the
+prompts, hashing full blocks like the block manager does, and submits the
+requests by a depth-first walk of the tree, visiting the subtrees holding
+the most requests first. The requests ending at the same block are
+submitted longest first. The `length` ordering submits the longest prompts
+first.
+"""
+from collections import Counter
+from typing import List, Literal, Optional, Sequence, Tuple, get_args
+
+from vllm.core.block.prefix_caching_block import PrefixCachingBlock
+
+RequestOrdering = Literal["input", "prefix", "length"]
+REQUEST_ORDERINGS: Tuple[str, ...] = get_args(RequestOrdering)
+
+
+def get_prefix_hash_chain(token_ids: Sequence[int],
+                          block_size: int,
+                          extra_hash: Optional[int] = None) -> List[int]:
+    """Return the hashes of the full blocks of a prompt, each of which
+    depends on the blocks before it, like the block hashes of the prefix
+    caching block allocator."""
+    hashes: List[int] = []
+    prev_block_hash: Optional[int] = None
+    for start in range(block_size, len(token_ids) + 1, block_size):
+        prev_block_hash = PrefixCachingBlock.hash_block_tokens(
+            prev_block_hash is None, prev_block_hash,
+            list(token_ids[start - block_size:start]), extra_hash)
+        hashes.append(prev_block_hash)
+    return hashes
+
+
+def order_requests(
+        ordering: RequestOrdering,
+        prompt_token_ids: Sequence[Optional[Sequence[int]]],
+        block_size: int,
+        extra_hashes: Optional[Sequence[Optional[int]]] = None) -> List[int]:
+    """Return the indices of the requests in the order they are submitted.
+
+    Args:
+        ordering: The ordering of the requests.
+        prompt_token_ids: The prompt token ids of each request, or None if
+            they are not known, in which case the request is submitted after
+            the others, in input order.
+        block_size: The block size of the KV cache.
+        extra_hashes: The hash of the factors other than the tokens that
+            the blocks of each request depend on, such as the LoRA adapter.
+    """
+    num_requests = len(prompt_token_ids)
+    if ordering == "input":
+        return list(range(num_requests))
+    if ordering not in REQUEST_ORDERINGS:
+        raise ValueError(f"Unknown request ordering {ordering!r}, expected "
+                         f"one of {REQUEST_ORDERINGS}.")
+
+    known = [i for i in range(num_requests) if prompt_token_ids[i] is not None]
+    unknown = [i for i in range(num_requests) if prompt_token_ids[i] is None]
+    if ordering == "length":
+        # sort is stable, so prompts of the same length keep the input order.
+        known.sort(key=lambda i: -len(prompt_token_ids[i]))  # type: ignore
+        return known + unknown
+
+    chains = {
+        i: get_prefix_hash_chain(
+            prompt_token_ids[i],  # type: ignore[arg-type]
+            block_size,
+            extra_hashes[i] if extra_hashes is not None else None)
+        for i in known
+    }
+    # Number of requests under each node of the tree. The hash of a block
+    # identifies the whole prefix up to the block.
+    num_requests_under: Counter = Counter()
+    for chain in chains.values():
+        num_requests_under.update(chain)
+
+    def sort_key(i: int) -> Tuple[Tuple[int, int], ...]:
+        # The children of a node are visited by decreasing number of
+        # requests, and the requests ending at the node (whose key is
+        # greater than the key of any child) after its children.
+        return tuple((-num_requests_under[block_hash], block_hash)
+                     for block_hash in chains[i]) + (
+                         (0, -len(prompt_token_ids[i])), )  # type: ignore
+
+    known.sort(key=sort_key)
+    return known + unknown
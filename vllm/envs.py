@@ -72,6 +72,18 @@ if TYPE_CHECKING:
     VLLM_ENABLE_V1_MULTIPROCESSING: bool = True
     VLLM_LOG_BATCHSIZE_INTERVAL: float = -1
     VLLM_DISABLE_COMPILE_CACHE: bool = False
+    VLLM_GUIDED_DECODING_CACHE_SIZE: int = 1024
+    VLLM_GUIDED_DECODING_CACHE_DIR: str = os.path.join(VLLM_CACHE_ROOT,
+                                                       "guided_decoding")
+    VLLM_DISABLE_GUIDED_DECODING_DISK_CACHE: bool = False
+    VLLM_GUIDED_DECODING_BITMASK_THREADS: int = 0
+    VLLM_WEIGHT_LOADING_THREADS: int = 0
+    VLLM_WEIGHT_LOADING_MAX_INFLIGHT_GB: float = 4.0
+    VLLM_WEIGHT_LOADING_SHARDED_READS: bool = False
+    VLLM_WEIGHT_LOADING_PIPELINED: bool = False
+    VLLM_LORA_ADAPTER_STORE_GB: float = 0
+    VLLM_LORA_ADAPTER_STORE_DIR: str = "/dev/shm/vllm_lora_adapter_store"
+    VLLM_TOKENIZER_CACHE_SIZE: int = 0
 
 
 def get_default_cache_root():
@@ -466,6 +478,72 @@ environment_variables: Dict[str, Callable[[], Any]] = {
     lambda: float(os.getenv("VLLM_LOG_BATCHSIZE_INTERVAL", "-1")),
     "VLLM_DISABLE_COMPILE_CACHE":
     lambda: bool(int(os.getenv("VLLM_DISABLE_COMPILE_CACHE", "0"))),
+
+    # Maximum number of compiled guided decoding grammars kept in memory
+    "VLLM_GUIDED_DECODING_CACHE_SIZE":
+    lambda: int(os.getenv("VLLM_GUIDED_DECODING_CACHE_SIZE", "1024")),
+
+    # Directory where serializable compiled guided decoding grammars are
+    # persisted across restarts
+    "VLLM_GUIDED_DECODING_CACHE_DIR":
+    lambda: os.path.expanduser(
+        os.getenv(
+            "VLLM_GUIDED_DECODING_CACHE_DIR",
+            os.path.join(get_default_cache_root(), "vllm", "guided_decoding"),
+        )),
+
+    # If set, compiled guided decoding grammars are only cached in memory
+    "VLLM_DISABLE_GUIDED_DECODING_DISK_CACHE":
+    lambda: bool(int(os.getenv("VLLM_DISABLE_GUIDED_DECODING_DISK_CACHE", "0"))
+                 ),
+
+    # Number of threads used to fill the guided decoding token bitmasks of a
+    # batch in parallel. If 0, the bitmasks are filled on the calling thread
+    "VLLM_GUIDED_DECODING_BITMASK_THREADS":
+    lambda: int(os.getenv("VLLM_GUIDED_DECODING_BITMASK_THREADS", "0")),
+
+    # Number of threads used to read safetensors checkpoints ahead of the
+    # model's weight loading. If 0, the shards are read serially.
+    "VLLM_WEIGHT_LOADING_THREADS":
+    lambda: int(os.getenv("VLLM_WEIGHT_LOADING_THREADS", "0")),
+
+    # Maximum size in GB of the tensors read ahead but not yet loaded into
+    # the model when VLLM_WEIGHT_LOADING_THREADS is set.
+    "VLLM_WEIGHT_LOADING_MAX_INFLIGHT_GB":
+    lambda: float(os.getenv("VLLM_WEIGHT_LOADING_MAX_INFLIGHT_GB", "4")),
+
+    # If set, tensor parallel ranks read only their shard of each tensor of
+    # safetensors checkpoints instead of every full tensor.
+    "VLLM_WEIGHT_LOADING_SHARDED_READS":
+    lambda: bool(int(os.getenv("VLLM_WEIGHT_LOADING_SHARDED_READS", "0"))),
+
+    # If set, the weights of each layer of a safetensors checkpoint are
+    # processed after loading (e.g. repacked for quantization kernels) on a
+    # worker thread as soon as the layer is loaded, while the next layers are
+    # read, instead of after the whole checkpoint is loaded.
+    "VLLM_WEIGHT_LOADING_PIPELINED":
+    lambda: bool(int(os.getenv("VLLM_WEIGHT_LOADING_PIPELINED", "0"))),
+
+    # Size in GB of the host-level store of processed LoRA adapters that is
+    # shared by the workers of all engines on the host. Each adapter is then
+    # loaded from disk once and mapped by every worker. If 0, every worker
+    # loads its adapters itself.
+    "VLLM_LORA_ADAPTER_STORE_GB":
+    lambda: float(os.getenv("VLLM_LORA_ADAPTER_STORE_GB", "0")),
+
+    # Directory of the shared LoRA adapter store, which should be on a
+    # memory-backed file system.
+    "VLLM_LORA_ADAPTER_STORE_DIR":
+    lambda: os.path.expanduser(
+        os.getenv("VLLM_LORA_ADAPTER_STORE_DIR",
+                  "/dev/shm/vllm_lora_adapter_store")),
+
+    # Number of prompts whose token ids are cached by the tokenizer group
+    # for each tokenizer. The prompts that start with a text common to
+    # several prompts, such as a shared system prompt, also only have the
+    # text after it tokenized. If 0, the prompts are always tokenized.
+    "VLLM_TOKENIZER_CACHE_SIZE":
+    lambda: int(os.getenv("VLLM_TOKENIZER_CACHE_SIZE", "0")),
 }
 
 # end-env-vars-definition
@@ -232,6 +232,9 @@ class CPUExecutor(ExecutorBase):
     def list_loras(self) -> Set[int]:
         return self.driver_method_invoker(self.driver_worker, "list_loras")
 
+    def save_engine_image(self, path: str) -> None:
+        self._run_workers("save_engine_image", path=path)
+
     def add_prompt_adapter(
             self, prompt_adapter_request: PromptAdapterRequest) -> bool:
         return all(
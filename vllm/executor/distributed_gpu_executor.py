@@ -129,6 +129,9 @@ class DistributedGPUExecutor(GPUExecutor):
                           pattern=pattern,
                           max_size=max_size)
 
+    def save_engine_image(self, path: str) -> None:
+        self._run_workers("save_engine_image", path=path)
+
     @abstractmethod
     def _driver_execute_model(
         self, execute_model_req: Optional[ExecuteModelRequest]
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional, Set, Tuple
+from typing import TYPE_CHECKING, List, Optional, Set, Tuple
 
 from vllm.config import VllmConfig
 from vllm.lora.request import LoRARequest
@@ -7,6 +7,9 @@ from vllm.model_executor.layers.sampler import SamplerOutput
 from vllm.prompt_adapter.request import PromptAdapterRequest
 from vllm.sequence import ExecuteModelRequest
 
+if TYPE_CHECKING:
+    from vllm.lora.worker_manager import LoRAPrefetchStats
+
 
 class ExecutorBase(ABC):
     """Base class for all executors.
@@ -89,6 +92,12 @@ class ExecutorBase(ABC):
     def list_loras(self) -> Set[int]:
         raise NotImplementedError
 
+    def get_lora_prefetch_stats(self) -> Optional["LoRAPrefetchStats"]:
+        """Return the LoRA loading stats of the driver worker, or None if
+        they are not available, e.g. as the driver worker is not in the
+        engine process."""
+        return None
+
     @abstractmethod
     def add_prompt_adapter(
             self, prompt_adapter_request: PromptAdapterRequest) -> bool:
@@ -1,4 +1,4 @@
-from typing import Any, Dict, List, Optional, Set, Tuple, Union
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple, Union
 
 from vllm.executor.executor_base import ExecutorAsyncBase, ExecutorBase
 from vllm.logger import init_logger
@@ -10,6 +10,9 @@ from vllm.utils import (get_distributed_init_method, get_ip, get_open_port,
                         make_async)
 from vllm.worker.worker_base import WorkerWrapperBase
 
+if TYPE_CHECKING:
+    from vllm.lora.worker_manager import LoRAPrefetchStats
+
 logger = init_logger(__name__)
 
 
@@ -103,6 +106,9 @@ class GPUExecutor(ExecutorBase):
     def list_loras(self) -> Set[int]:
         return self.driver_worker.list_loras()
 
+    def get_lora_prefetch_stats(self) -> Optional["LoRAPrefetchStats"]:
+        return self.driver_worker.get_lora_prefetch_stats()
+
     def add_prompt_adapter(
             self, prompt_adapter_request: PromptAdapterRequest) -> bool:
         assert prompt_adapter_request.prompt_adapter_id > 0, \
@@ -122,6 +128,9 @@ class GPUExecutor(ExecutorBase):
     def list_prompt_adapters(self) -> Set[int]:
         return self.driver_worker.list_prompt_adapters()
 
+    def save_engine_image(self, path: str) -> None:
+        self.driver_worker.save_engine_image(path)
+
     def check_health(self) -> None:
         # GPUExecutor will always be healthy as long as
         # it's running.
@@ -1,7 +1,7 @@
 import asyncio
 import os
 from functools import partial
-from typing import Any, List, Optional
+from typing import TYPE_CHECKING, Any, List, Optional
 
 from vllm.executor.distributed_gpu_executor import (  # yapf: disable
     DistributedGPUExecutor, DistributedGPUExecutorAsync)
@@ -16,6 +16,9 @@ from vllm.utils import (_run_task_with_lock, cuda_device_count_stateless,
                         get_distributed_init_method, get_open_port, make_async,
                         update_environment_variables)
 
+if TYPE_CHECKING:
+    from vllm.lora.worker_manager import LoRAPrefetchStats
+
 logger = init_logger(__name__)
 
 
@@ -119,6 +122,10 @@ class MultiprocessingGPUExecutor(DistributedGPUExecutor):
         """
         return self.driver_worker.execute_model(execute_model_req)
 
+    def get_lora_prefetch_stats(self) -> Optional["LoRAPrefetchStats"]:
+        # The other workers load the same LoRAs at the same time.
+        return self.driver_worker.get_lora_prefetch_stats()
+
     def _run_workers(
         self,
         method: str,
@@ -42,6 +42,12 @@ class TokensPrompt(TypedDict):
     token_type_ids: NotRequired[List[int]]
     """A list of token type IDs to pass to the cross encoder model."""
 
+    prompt: NotRequired[str]
+    """
+    Optional text the token IDs were obtained from, which is returned in the
+    outputs instead of being decoded.
+    """
+
     multi_modal_data: NotRequired["MultiModalDataDict"]
     """
     DEPRECATED: Optional multi-modal data to pass to the model,
@@ -1,4 +1,4 @@
-from typing import Callable, List, Tuple, Union
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
 
 import torch
 
@@ -14,6 +14,117 @@ first argument, and returns a modified tensor of logits
 to sample from."""
 
 
+class SparseLogitsBiasProcessor:
+    """Base class for logits processors whose effect on a row of logits is
+    an additive bias on a small set of token ids.
+
+    Instead of being invoked row by row, these processors are collected by
+    the logits processor layer, which applies the biases of the whole batch
+    as a single sparse scatter over the logits tensor before the other
+    processors. Processors that follow another kind of processor of the
+    request are still applied row by row, in order. Calling the processor
+    directly still works and applies the bias to a single row.
+    """
+
+    def get_sparse_bias(
+        self,
+        past_tokens_ids: Union[List[int], Tuple[int]],
+        seq_id: Optional[int] = None,
+    ) -> Tuple[Sequence[int], Sequence[float]]:
+        """Return the token ids to bias and the bias for each of them."""
+        raise NotImplementedError
+
+    def check_vocab_size(self, vocab_size: int) -> None:
+        """Validate the processor's token ids against the vocab size."""
+        pass
+
+    def __call__(
+        self,
+        past_tokens_ids: Union[List[int], Tuple[int]],
+        logits: torch.Tensor,
+    ) -> torch.Tensor:
+        self.check_vocab_size(logits.shape[-1])
+        token_ids, biases = self.get_sparse_bias(past_tokens_ids)
+        if token_ids:
+            logits.index_put_(
+                (torch.tensor(token_ids, device=logits.device), ),
+                torch.tensor(biases, dtype=logits.dtype, device=logits.device),
+                accumulate=True)
+        return logits
+
+
+def allocate_token_bitmask(batch_size: int,
+                           vocab_size: int,
+                           pin_memory: bool = False) -> torch.Tensor:
+    """Allocate a packed CPU bitmask of allowed tokens with every token
+    allowed.
+
+    Bit ``j`` of word ``i`` in a row is set iff token ``32 * i + j`` is
+    allowed, which matches the layout used by xgrammar.
+    """
+    return torch.full((batch_size, (vocab_size + 31) // 32),
+                      -1,
+                      dtype=torch.int32,
+                      pin_memory=pin_memory)
+
+
+def apply_token_bitmask_(logits: torch.Tensor,
+                         bitmask: torch.Tensor,
+                         rows: Optional[List[int]] = None) -> None:
+    """Set the logits of disallowed tokens to -inf in place.
+
+    Args:
+        logits: Logits of shape [num_rows, vocab_size].
+        bitmask: Packed bitmask of shape [len(rows), ceil(vocab_size / 32)].
+        rows: Rows of `logits` that the bitmask rows apply to. Defaults to
+            all rows.
+    """
+    vocab_size = logits.shape[-1]
+    bitmask = bitmask.to(device=logits.device, non_blocking=True)
+    shifts = torch.arange(32, dtype=torch.int32, device=logits.device)
+    disallowed = ((bitmask.unsqueeze(-1) >> shifts) & 1).flatten(1) == 0
+    disallowed = disallowed[:, :vocab_size]
+    if rows is None:
+        logits.masked_fill_(disallowed, -float("inf"))
+    else:
+        row_indices = torch.tensor(rows, device=logits.device)
+        logits[row_indices] = logits[row_indices].masked_fill(
+            disallowed, -float("inf"))
+
+
+class BitmaskLogitsProcessor:
+    """Base class for logits processors that restrict a row of logits to a
+    set of allowed tokens, such as guided decoding processors.
+
+    Instead of being invoked row by row, these processors fill their row of
+    a packed bitmask of the whole batch (see :func:`allocate_token_bitmask`)
+    which the logits processor layer then applies with a single vectorized
+    masked fill after the other processors. Processors that precede another
+    kind of processor of the request are still applied row by row, in
+    order. Calling the processor directly still works and masks a single
+    row.
+    """
+
+    def fill_bitmask(self, past_tokens_ids: Union[List[int], Tuple[int]],
+                     bitmask: torch.Tensor, index: int) -> bool:
+        """Fill ``bitmask[index]`` with the tokens allowed next.
+
+        Returns False, leaving the bitmask untouched, if the row is not
+        restricted at this step.
+        """
+        raise NotImplementedError
+
+    def __call__(
+        self,
+        past_tokens_ids: Union[List[int], Tuple[int]],
+        logits: torch.Tensor,
+    ) -> torch.Tensor:
+        bitmask = allocate_token_bitmask(1, logits.shape[-1])
+        if self.fill_bitmask(past_tokens_ids, bitmask, 0):
+            apply_token_bitmask_(logits.unsqueeze(0), bitmask)
+        return logits
+
+
 def get_bad_words_logits_processors(
         bad_words: List[str],
         tokenizer: AnyTokenizer) -> List[LogitsProcessor]:
@@ -45,62 +156,79 @@ def get_bad_words_logits_processors(
     return [NoBadWordsLogitsProcessor(bad_words_ids=bad_words_ids)]
 
 
-class NoBadWordsLogitsProcessor:
-    _SMALLEST_LOGIT = float("-inf")
-    _NEUTRAL_LOGIT = 0.0
+class _BadWordsTrieNode:
+    __slots__ = ("children", "banned_next")
 
-    def __init__(self, bad_words_ids: List[List[int]]):
-        self.bad_words_ids = bad_words_ids
-        self.word_bias: torch.FloatTensor = None
-
-    def __call__(
-        self,
-        past_tokens_ids: Union[List[int], Tuple[int]],
-        logits: torch.FloatTensor,
-    ) -> torch.Tensor:
-        if self.word_bias is None:
-            self._init_word_bias(logits=logits)
-
-        last_token_bias = torch.zeros_like(logits)
-
-        for bad_word_ids in self.bad_words_ids:
-            if len(bad_word_ids) == 1:  # 1-token words already processed
-                continue
-
-            if len(bad_word_ids) > len(past_tokens_ids) + 1:
-                continue
+    def __init__(self) -> None:
+        self.children: Dict[int, _BadWordsTrieNode] = {}
+        # Tokens that complete a bad word when generated from this node.
+        self.banned_next: List[int] = []
 
-            prefix_length = len(bad_word_ids) - 1
-            last_token_id = bad_word_ids[-1]
-            actual_prefix = past_tokens_ids[-prefix_length:]
-            expected_prefix = bad_word_ids[:prefix_length]
 
-            assert len(actual_prefix) == len(expected_prefix)
+class NoBadWordsLogitsProcessor(SparseLogitsBiasProcessor):
+    """Bans the last token of each bad word whenever the previously
+    generated tokens end with the rest of that word.
 
-            is_match = tuple(actual_prefix) == tuple(expected_prefix)
-            last_token_bias[last_token_id] += (self._SMALLEST_LOGIT if is_match
-                                               else self._NEUTRAL_LOGIT)
-
-        logits = logits + self.word_bias + last_token_bias
-
-        return logits
-
-    def _init_word_bias(self, logits: torch.FloatTensor) -> None:
-        # Code based on NoBadWordsLogitsProcessor and SequenceBiasLogitsProcessor  # noqa: E501
-        # from https://github.com/huggingface/transformers/blob/main/src/transformers/generation/logits_process.py
+    The bad words are compiled into a trie over their prefixes (all tokens
+    but the last). Each sequence keeps the set of trie nodes matched by the
+    suffixes of its output so far, which is advanced only with the tokens
+    generated since the previous step.
+    """
+    _SMALLEST_LOGIT = float("-inf")
+    _NEUTRAL_LOGIT = 0.0
 
-        vocab_size = logits.shape[-1]
+    def __init__(self, bad_words_ids: List[List[int]]):
+        self.bad_words_ids = bad_words_ids
+        self._vocab_size: Optional[int] = None
 
-        self._check_token_ids_bounds(vocab_size=vocab_size)
+        self._root = _BadWordsTrieNode()
+        for bad_word_ids in bad_words_ids:
+            node = self._root
+            for token_id in bad_word_ids[:-1]:
+                node = node.children.setdefault(token_id, _BadWordsTrieNode())
+            node.banned_next.append(bad_word_ids[-1])
 
-        self.word_bias = torch.zeros((vocab_size, ),
-                                     dtype=torch.float,
-                                     device=logits.device)
+        # seq_id -> (number of tokens consumed, matched trie nodes)
+        self._match_states: Dict[int, Tuple[int, List[_BadWordsTrieNode]]] = {}
 
-        for bad_word_ids in self.bad_words_ids:
-            if len(bad_word_ids) == 1:
-                bad_word_id = bad_word_ids[-1]
-                self.word_bias[bad_word_id] = self._SMALLEST_LOGIT
+    def get_sparse_bias(
+        self,
+        past_tokens_ids: Union[List[int], Tuple[int]],
+        seq_id: Optional[int] = None,
+    ) -> Tuple[Sequence[int], Sequence[float]]:
+        # Without a seq_id the match state cannot be attributed to a
+        # sequence, so it is recomputed from scratch and not kept.
+        if seq_id is not None:
+            num_consumed, active = self._match_states.get(seq_id, (0, []))
+        else:
+            num_consumed, active = 0, []
+        if num_consumed > len(past_tokens_ids):
+            # The sequence was reset (e.g. it was forked or recomputed).
+            num_consumed, active = 0, []
+
+        root = self._root
+        for token_id in past_tokens_ids[num_consumed:]:
+            next_active: List[_BadWordsTrieNode] = []
+            child = root.children.get(token_id)
+            if child is not None:
+                next_active.append(child)
+            for node in active:
+                child = node.children.get(token_id)
+                if child is not None:
+                    next_active.append(child)
+            active = next_active
+        if seq_id is not None:
+            self._match_states[seq_id] = (len(past_tokens_ids), active)
+
+        banned = list(root.banned_next)
+        for node in active:
+            banned.extend(node.banned_next)
+        return banned, [self._SMALLEST_LOGIT] * len(banned)
+
+    def check_vocab_size(self, vocab_size: int) -> None:
+        if self._vocab_size != vocab_size:
+            self._check_token_ids_bounds(vocab_size=vocab_size)
+            self._vocab_size = vocab_size
 
     def _check_token_ids_bounds(self, vocab_size: int) -> None:
         invalid_token_ids = []
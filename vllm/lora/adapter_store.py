@@ -0,0 +1,240 @@
+"""A host-level store of processed LoRA adapters shared across processes.
+
+Every worker of every engine on a host would otherwise read, parse and
+process (cast, transpose, pad and scale) each adapter it activates. The
+store keeps the processed adapter weights in files of a memory-backed
+directory (`VLLM_LORA_ADAPTER_STORE_DIR`, in `/dev/shm` by default): the
+first worker that needs an adapter loads it from disk and writes it to the
+store, and all other workers map the stored file into memory, so that the
+adapter is parsed once per host and its weights are kept in host memory
+once. Entries are keyed by the adapter path, the modification times of its
+files and the processing options, and the least recently used entries are
+evicted when the store grows beyond its size in bytes.
+
+Each entry consists of a data file holding the tensors at aligned offsets
+and a JSON file describing the adapter, which is written last and
+therefore marks the entry as complete.
+"""
+import contextlib
+import functools
+import hashlib
+import json
+import mmap
+import os
+from typing import Any, Callable, Dict, Optional
+
+import filelock
+import torch
+
+import vllm.envs as envs
+from vllm.logger import init_logger
+from vllm.lora.lora import LoRALayerWeights
+from vllm.lora.models import LoRAModel
+from vllm.lora.utils import get_adapter_files_state
+
+logger = init_logger(__name__)
+
+_ALIGNMENT = 64
+_TENSOR_FIELDS = ("lora_a", "lora_b", "bias", "embeddings_tensor")
+
+
+class LoRAAdapterStore:
+    """A store of processed LoRA adapters in files of a shared directory.
+
+    Args:
+        store_dir: Directory of the store, shared by all processes using
+            the store. Should be on a memory-backed file system.
+        max_bytes: Size of the store. Least recently used entries are
+            evicted when the adapters in the store exceed this size.
+    """
+
+    def __init__(self, store_dir: str, max_bytes: int):
+        self.store_dir = store_dir
+        self.max_bytes = max_bytes
+        os.makedirs(store_dir, exist_ok=True)
+        # mode 0o666 is required for the filelock to be shared across users
+        self._lock = filelock.FileLock(os.path.join(store_dir, "store.lock"),
+                                       mode=0o666)
+        self.num_hits = 0
+        self.num_misses = 0
+
+    def get_key(self, lora_dir: str, **options) -> str:
+        factors = [
+            os.path.realpath(lora_dir),
+            get_adapter_files_state(lora_dir),
+            sorted((name, str(value)) for name, value in options.items()),
+        ]
+        return hashlib.sha256(str(factors).encode()).hexdigest()
+
+    def _paths(self, key: str):
+        prefix = os.path.join(self.store_dir, key)
+        return prefix + ".json", prefix + ".bin"
+
+    def _lock_path(self, key: str) -> str:
+        return os.path.join(self.store_dir, key + ".lock")
+
+    def get_or_load(self, lora_dir: str, lora_model_id: int,
+                    load: Callable[[], LoRAModel], **options) -> LoRAModel:
+        """Return the adapter in `lora_dir` from the store, or load it with
+        `load` and add it to the store.
+
+        `options` are all the arguments of `load` other than `lora_dir` and
+        `lora_model_id` that change the processed adapter, e.g. its dtype.
+        """
+        key = self.get_key(lora_dir, **options)
+        lora = self._try_read(key, lora_model_id)
+        if lora is not None:
+            return lora
+        # Concurrent workers wait for the first one to add the adapter
+        # rather than all loading it.
+        lock = filelock.FileLock(self._lock_path(key), mode=0o666)
+        with lock.acquire(poll_interval=0.005):
+            lora = self._try_read(key, lora_model_id)
+            if lora is not None:
+                return lora
+            self.num_misses += 1
+            lora = load()
+            self._write(key, lora)
+        self._evict(keep=key)
+        return lora
+
+    def _try_read(self, key: str, lora_model_id: int) -> Optional[LoRAModel]:
+        # Complete entries are never modified, so they can be read without
+        # holding a lock.
+        if not os.path.isfile(self._paths(key)[0]):
+            return None
+        try:
+            lora = self._read(key, lora_model_id)
+        except FileNotFoundError:
+            return None  # Evicted concurrently
+        self.num_hits += 1
+        return lora
+
+    def _write(self, key: str, lora: LoRAModel) -> None:
+        manifest_path, data_path = self._paths(key)
+        manifest: Dict[str, Any] = {
+            "rank": lora.rank,
+            "scaling_factor": lora.scaling_factor,
+            "loras": {},
+        }
+        tmp_path = f"{data_path}.{os.getpid()}.tmp"
+        offset = 0
+        with open(tmp_path, "wb") as f:
+            for module_name, layer in lora.loras.items():
+                entry: Dict[str, Any] = {
+                    "rank": layer.rank,
+                    "lora_alpha": layer.lora_alpha,
+                    "scaling": layer.scaling,
+                    "tensors": {},
+                }
+                for field in _TENSOR_FIELDS:
+                    tensor = getattr(layer, field)
+                    if tensor is None:
+                        continue
+                    # LoRA weights are transposed views of the checkpoint
+                    # tensors: store them in their memory layout.
+                    transposed = (tensor.dim() == 2
+                                  and not tensor.is_contiguous()
+                                  and tensor.t().is_contiguous())
+                    data = (tensor.t() if transposed else tensor).contiguous()
+                    nbytes = data.numel() * data.element_size()
+                    offset = -(-offset // _ALIGNMENT) * _ALIGNMENT
+                    f.seek(offset)
+                    if nbytes:
+                        f.write(
+                            data.reshape(-1).view(torch.uint8).numpy().data)
+                    entry["tensors"][field] = {
+                        "dtype": str(data.dtype).removeprefix("torch."),
+                        "shape": list(data.shape),
+                        "offset": offset,
+                        "transposed": transposed,
+                    }
+                    offset += nbytes
+                manifest["loras"][module_name] = entry
+            f.truncate(offset)
+        os.replace(tmp_path, data_path)
+        with open(manifest_path + ".tmp", "w") as f:
+            json.dump(manifest, f)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+    def _read(self, key: str, lora_model_id: int) -> LoRAModel:
+        manifest_path, data_path = self._paths(key)
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        # Mark the entry as recently used.
+        os.utime(manifest_path)
+        buffer: Optional[mmap.mmap] = None
+        with open(data_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size:
+                # A private mapping: the pages are shared with the other
+                # processes using the adapter until they are written to.
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+        loras: Dict[str, LoRALayerWeights] = {}
+        for module_name, entry in manifest["loras"].items():
+            tensors: Dict[str, torch.Tensor] = {}
+            for field, spec in entry["tensors"].items():
+                dtype = getattr(torch, spec["dtype"])
+                numel = 1
+                for size in spec["shape"]:
+                    numel *= size
+                if numel == 0:
+                    tensor = torch.empty(spec["shape"], dtype=dtype)
+                else:
+                    tensor = torch.frombuffer(buffer,
+                                              dtype=dtype,
+                                              count=numel,
+                                              offset=spec["offset"]).reshape(
+                                                  spec["shape"])
+                tensors[field] = tensor.t() if spec["transposed"] else tensor
+            loras[module_name] = LoRALayerWeights(
+                module_name,
+                entry["rank"],
+                entry["lora_alpha"],
+                tensors["lora_a"],
+                tensors["lora_b"],
+                bias=tensors.get("bias"),
+                embeddings_tensor=tensors.get("embeddings_tensor"),
+                scaling=entry["scaling"])
+        return LoRAModel(lora_model_id,
+                         manifest["rank"],
+                         loras,
+                         scaling_factor=manifest["scaling_factor"])
+
+    def _evict(self, keep: str) -> None:
+        with self._lock:
+            entries = []
+            total_bytes = 0
+            for name in os.listdir(self.store_dir):
+                if not name.endswith(".json"):
+                    continue
+                key = name[:-len(".json")]
+                manifest_path, data_path = self._paths(key)
+                try:
+                    last_used = os.stat(manifest_path).st_mtime_ns
+                    size = os.path.getsize(data_path)
+                except FileNotFoundError:
+                    continue
+                entries.append((last_used, key, size))
+                total_bytes += size
+            entries.sort()
+            for _, key, size in entries:
+                if total_bytes <= self.max_bytes:
+                    break
+                if key == keep:
+                    continue
+                # Processes using the adapter keep their mapping of it.
+                for path in (*self._paths(key), self._lock_path(key)):
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(path)
+                total_bytes -= size
+                logger.debug("Evicted LoRA adapter %s from the store", key)
+
+
+@functools.lru_cache(maxsize=None)
+def get_lora_adapter_store() -> Optional[LoRAAdapterStore]:
+    """The adapter store of this process, or None if it is disabled."""
+    if envs.VLLM_LORA_ADAPTER_STORE_GB <= 0:
+        return None
+    return LoRAAdapterStore(envs.VLLM_LORA_ADAPTER_STORE_DIR,
+                            int(envs.VLLM_LORA_ADAPTER_STORE_GB * (1 << 30)))
@@ -1,8 +1,10 @@
+import functools
 import os
 import re
 from typing import List, Optional, Set, Tuple, Type, Union
 
 import huggingface_hub
+from blake3 import blake3
 from huggingface_hub.utils import (EntryNotFoundError, HfHubHTTPError,
                                    HFValidationError, RepositoryNotFoundError)
 from torch import nn
@@ -190,3 +192,68 @@ def get_adapter_absolute_path(lora_path: str) -> str:
         return lora_path
 
     return local_snapshot_path
+
+
+# The files of an adapter whose contents change the outputs of the adapter.
+_ADAPTER_WEIGHTS_SUFFIXES = (".safetensors", ".bin", ".pt")
+_ADAPTER_CONFIG_NAME = "adapter_config.json"
+
+
+def get_adapter_files_state(lora_dir: str) -> List[Tuple[str, int, int]]:
+    """The names, sizes and modification times of the files of an adapter,
+    which change whenever the adapter is updated in place."""
+    state = []
+    for name in sorted(os.listdir(lora_dir)):
+        stat = os.stat(os.path.join(lora_dir, name))
+        state.append((name, stat.st_size, stat.st_mtime_ns))
+    return state
+
+
+def _digest_to_int(digest: bytes) -> int:
+    return int.from_bytes(digest[:8], "little")
+
+
+@functools.lru_cache(maxsize=1024)
+def _resolve_adapter_path(lora_path: str) -> str:
+    return get_adapter_absolute_path(lora_path)
+
+
+@functools.lru_cache(maxsize=1024)
+def _hash_adapter_files(lora_dir: str, files_state: Tuple[Tuple[str, int, int],
+                                                          ...]) -> int:
+    hasher = blake3()
+    for name, _, _ in files_state:
+        if not (name.endswith(_ADAPTER_WEIGHTS_SUFFIXES)
+                or name == _ADAPTER_CONFIG_NAME):
+            continue
+        hasher.update(name.encode())
+        hasher.update(b"\0")
+        with open(os.path.join(lora_dir, name), "rb") as f:
+            while chunk := f.read(1 << 20):
+                hasher.update(chunk)
+    return _digest_to_int(hasher.digest())
+
+
+def get_adapter_fingerprint(lora_path: str) -> int:
+    """
+    Returns a stable 64-bit hash of the contents of the adapter at lora_path.
+
+    Unlike the ids of the adapter requests, which are assigned by the server
+    and may change across restarts, the fingerprint only depends on the
+    weights and config of the adapter, so it is the same in every process and
+    for every path or id pointing at the same adapter. The fingerprint is
+    recomputed when the files of the adapter change.
+
+    Parameters:
+    lora_path (str): The path to the lora model, which can be an absolute path,
+                     a relative path, or a Hugging Face model identifier.
+
+    Returns:
+    int: The fingerprint of the adapter. If the adapter cannot be found
+         locally, the hash of lora_path.
+    """
+    lora_dir = _resolve_adapter_path(lora_path)
+    if not os.path.isdir(lora_dir):
+        return _digest_to_int(blake3(lora_path.encode()).digest())
+    return _hash_adapter_files(lora_dir,
+                               tuple(get_adapter_files_state(lora_dir)))
@@ -1,5 +1,10 @@
+import functools
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from contextlib import contextmanager
-from typing import Any, Dict, List, Literal, Optional, Set, Type, Union
+from dataclasses import dataclass, field
+from typing import (Any, Dict, Iterable, List, Literal, Optional, Set, Tuple,
+                    Type, Union)
 
 import torch
 
@@ -10,6 +15,7 @@ from vllm.adapter_commons.utils import (add_adapter_worker,
 from vllm.adapter_commons.worker_manager import AbstractWorkerManager
 from vllm.config import LoRAConfig
 from vllm.logger import init_logger
+from vllm.lora.adapter_store import get_lora_adapter_store
 from vllm.lora.models import (LoRAModel, LoRAModelManager,
                               LRUCacheLoRAModelManager, create_lora_manager)
 from vllm.lora.request import LoRARequest
@@ -18,6 +24,24 @@ from vllm.lora.utils import get_adapter_absolute_path
 logger = init_logger(__name__)
 
 
+@dataclass
+class LoRAPrefetchStats:
+    """LoRA cache state and loading stats of a worker. Times are
+    cumulative, in seconds."""
+    # LoRAs being loaded in the background.
+    loading_lora_ids: Set[int] = field(default_factory=set)
+    # LoRAs in the CPU cache, and those of them in GPU slots.
+    resident_lora_ids: Set[int] = field(default_factory=set)
+    active_lora_ids: Set[int] = field(default_factory=set)
+    # Number of LoRAs loaded in the background.
+    num_prefetched: int = 0
+    # Time batches waited for LoRAs to be loaded.
+    stall_time: float = 0.0
+    # Time spent loading LoRAs in the background that batches would
+    # otherwise have waited for.
+    stall_time_avoided: float = 0.0
+
+
 class WorkerLoRAManager(AbstractWorkerManager):
     """WorkerLoRAManager that manages LoRA models on the worker side.
 
@@ -92,18 +116,32 @@ class WorkerLoRAManager(AbstractWorkerManager):
                 else:
                     expected_lora_modules.append(module)
             lora_path = get_adapter_absolute_path(lora_request.lora_path)
-            lora = self._lora_model_cls.from_local_checkpoint(
-                lora_path,
-                expected_lora_modules,
+            options = dict(
                 max_position_embeddings=self.max_position_embeddings,
-                lora_model_id=lora_request.lora_int_id,
-                device="cpu",
                 dtype=self.lora_config.lora_dtype,
                 target_embedding_padding=self.vocab_size +
                 self.lora_config.lora_extra_vocab_size,
                 embedding_modules=self.embedding_modules,
                 embedding_padding_modules=self.embedding_padding_modules,
             )
+            load = functools.partial(
+                self._lora_model_cls.from_local_checkpoint,
+                lora_path,
+                expected_lora_modules,
+                lora_model_id=lora_request.lora_int_id,
+                device="cpu",
+                **options)
+            adapter_store = get_lora_adapter_store()
+            if (adapter_store is not None
+                    and self._lora_model_cls is LoRAModel):
+                lora = adapter_store.get_or_load(
+                    lora_path,
+                    lora_request.lora_int_id,
+                    load,
+                    expected_lora_modules=sorted(expected_lora_modules),
+                    **options)
+            else:
+                lora = load()
         except Exception as e:
             raise RuntimeError(f"Loading lora {lora_path} failed") from e
         if lora.rank > self.lora_config.max_lora_rank:
@@ -167,6 +205,16 @@ class LRUCacheWorkerLoRAManager(WorkerLoRAManager):
 
     _manager_cls: Type[LRUCacheLoRAModelManager] = LRUCacheLoRAModelManager
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # LoRAs of requests expected to be scheduled soon are loaded on a
+        # background thread; the loaded LoRAs are added to the caches by the
+        # main thread.
+        self._prefetch_executor: Optional[ThreadPoolExecutor] = None
+        self._prefetches: Dict[int, Future] = {}
+        self._prefetch_lora_ids: Set[int] = set()
+        self._prefetch_stats = LoRAPrefetchStats()
+
     def create_lora_manager(
         self,
         model: torch.nn.Module,
@@ -195,6 +243,7 @@ class LRUCacheWorkerLoRAManager(WorkerLoRAManager):
                 f"({self._adapter_manager.lora_slots}).")
         for lora in loras_map.values():
             self.add_adapter(lora)
+        self._add_prefetched_adapters()
 
     def add_adapter(self, lora_request: LoRARequest) -> bool:
         if lora_request.lora_int_id not in self.list_adapters():
@@ -203,7 +252,12 @@ class LRUCacheWorkerLoRAManager(WorkerLoRAManager):
                 assert isinstance(self._adapter_manager,
                                   LRUCacheLoRAModelManager)
                 self._adapter_manager.remove_oldest_adapter()
-            lora = self._load_adapter(lora_request)
+            lora = self._get_prefetched_adapter(lora_request.lora_int_id)
+            if lora is None:
+                start = time.perf_counter()
+                lora = self._load_adapter(lora_request)
+                self._prefetch_stats.stall_time += (time.perf_counter() -
+                                                    start)
             loaded = self._adapter_manager.add_adapter(lora)
         else:
             # If the lora is already loaded, just touch it to
@@ -212,3 +266,91 @@ class LRUCacheWorkerLoRAManager(WorkerLoRAManager):
                 lora_request.lora_int_id) is not None
         self._adapter_manager.activate_adapter(lora_request.lora_int_id)
         return loaded
+
+    def remove_adapter(self, adapter_id: int) -> bool:
+        self._prefetches.pop(adapter_id, None)
+        return super().remove_adapter(adapter_id)
+
+    def remove_all_adapters(self):
+        self._prefetches.clear()
+        super().remove_all_adapters()
+
+    def prefetch_adapters(self, lora_requests: Iterable[LoRARequest]) -> None:
+        """Start loading the given LoRAs on a background thread.
+
+        The scheduler passes the LoRAs of the requests that it expects to
+        schedule soon; they are added to the CPU cache, and to free GPU
+        slots, once loaded.
+        """
+        self._prefetch_lora_ids = set()
+        registered_lora_ids = self.list_adapters()
+        for lora_request in lora_requests:
+            lora_id = lora_request.lora_int_id
+            self._prefetch_lora_ids.add(lora_id)
+            if lora_id in self._prefetches or lora_id in registered_lora_ids:
+                continue
+            if self._prefetch_executor is None:
+                self._prefetch_executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="lora_prefetch")
+            self._prefetches[lora_id] = self._prefetch_executor.submit(
+                self._timed_load_adapter, lora_request)
+
+    def get_prefetch_stats(self) -> LoRAPrefetchStats:
+        self._prefetch_stats.loading_lora_ids = {
+            lora_id
+            for lora_id, future in self._prefetches.items()
+            if not future.done()
+        }
+        self._prefetch_stats.resident_lora_ids = self.list_adapters()
+        self._prefetch_stats.active_lora_ids = {
+            lora_id
+            for lora_id in self._adapter_manager.lora_index_to_id
+            if lora_id is not None
+        }
+        return self._prefetch_stats
+
+    def _timed_load_adapter(
+            self, lora_request: LoRARequest) -> Tuple[LoRAModel, float]:
+        start = time.perf_counter()
+        lora = self._load_adapter(lora_request)
+        return lora, time.perf_counter() - start
+
+    def _get_prefetched_adapter(self, lora_id: int) -> Optional[LoRAModel]:
+        """Return a LoRA loaded in the background, waiting for its load to
+        complete. Return None if it was not prefetched or failed to load."""
+        future = self._prefetches.pop(lora_id, None)
+        if future is None:
+            return None
+        start = time.perf_counter()
+        try:
+            lora, load_time = future.result()
+        except Exception:
+            # Loaded again by the caller, which raises the error.
+            return None
+        wait_time = time.perf_counter() - start
+        self._prefetch_stats.num_prefetched += 1
+        self._prefetch_stats.stall_time += wait_time
+        self._prefetch_stats.stall_time_avoided += max(load_time - wait_time,
+                                                       0.0)
+        return lora
+
+    def _add_prefetched_adapters(self) -> None:
+        """Add the LoRAs loaded in the background to the CPU cache if it has
+        room, and activate them if there are free GPU slots. Loaded LoRAs
+        that no longer are to be prefetched, e.g. as their requests were
+        aborted, are dropped."""
+        for lora_id, future in list(self._prefetches.items()):
+            if not future.done():
+                continue
+            if len(self._adapter_manager) >= self._adapter_manager.capacity:
+                # Evicting could remove a LoRA of the batch: keep the LoRA
+                # until a batch uses it.
+                if lora_id not in self._prefetch_lora_ids:
+                    del self._prefetches[lora_id]
+                continue
+            lora = self._get_prefetched_adapter(lora_id)
+            if lora is None:
+                continue
+            self._adapter_manager.add_adapter(lora)
+            if None in self._adapter_manager.lora_index_to_id:
+                self._adapter_manager.activate_adapter(lora_id)
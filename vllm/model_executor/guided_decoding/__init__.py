@@ -1,11 +1,15 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 
 from vllm.logger import init_logger
+from vllm.model_executor.guided_decoding.grammar_cache import (
+    get_compiled_grammar_cache, get_grammar_compile_executor)
 from vllm.platforms import CpuArchEnum, current_platform
 
 if TYPE_CHECKING:
+    from concurrent.futures import Future
+
     from transformers import PreTrainedTokenizer
 
     from vllm.config import ModelConfig
@@ -137,3 +141,92 @@ def get_local_guided_decoding_logits_processor(
     raise ValueError(
         f"Unknown guided decoding backend '{guided_params.backend}'. "
         "Must be one of 'outlines, 'lm-format-enforcer', 'xgrammar'")
+
+
+class PendingGuidedDecodingLogitsProcessor:
+    """Placeholder for a guided decoding logits processor that is being
+    built, and its grammar compiled, in the background.
+
+    Engines keep requests holding a placeholder out of the running batch
+    until the build is done (see :func:`get_pending_grammar_compilations`)
+    and then swap in the built processor with
+    :func:`resolve_guided_decoding_logits_processors`.
+    """
+
+    def __init__(self, future: Future[LogitsProcessor | None]):
+        self.future = future
+
+    def __call__(self, *args: Any) -> Any:
+        raise RuntimeError("The guided decoding logits processor has not "
+                           "finished compiling.")
+
+
+def get_guided_decoding_logits_processor_in_background(
+        guided_params: GuidedDecodingParams, tokenizer: PreTrainedTokenizer,
+        model_config: ModelConfig) -> PendingGuidedDecodingLogitsProcessor:
+    """Builds the guided decoding logits processor on the shared grammar
+    compilation thread pool, so that the caller is not blocked on a cold
+    grammar compilation."""
+    future = get_grammar_compile_executor().submit(
+        _build_compiled_logits_processor, guided_params, tokenizer,
+        model_config)
+    return PendingGuidedDecodingLogitsProcessor(future)
+
+
+def _build_compiled_logits_processor(
+        guided_params: GuidedDecodingParams, tokenizer: PreTrainedTokenizer,
+        model_config: ModelConfig) -> LogitsProcessor | None:
+    processor = get_local_guided_decoding_logits_processor(
+        guided_params, tokenizer, model_config)
+    if _compiles_lazily(processor):
+        processor._ensure_ctx()  # type: ignore[union-attr]
+    return processor
+
+
+def _compiles_lazily(processor: Any) -> bool:
+    # xgrammar processors compile their grammar on first use, which would
+    # otherwise happen inside the model step.
+    from vllm.model_executor.guided_decoding.xgrammar_decoding import (
+        XGrammarLogitsProcessor)
+    return isinstance(processor,
+                      XGrammarLogitsProcessor) and processor.ctx is None
+
+
+def get_pending_grammar_compilations(
+        logits_processors: list[Any] | None) -> list[Future]:
+    """Returns the futures of the grammar compilations that the given logits
+    processors wait for. The request is ready once all of them are done.
+
+    Compilation is started in the background for processors that would
+    otherwise compile their grammar lazily on first use and whose grammar
+    is not cached yet.
+    """
+    futures: list[Future] = []
+    for processor in logits_processors or []:
+        if isinstance(processor, PendingGuidedDecodingLogitsProcessor):
+            futures.append(processor.future)
+        elif _compiles_lazily(processor):
+            if processor.grammar_cache_key() in get_compiled_grammar_cache():
+                processor._ensure_ctx()
+            else:
+                futures.append(get_grammar_compile_executor().submit(
+                    processor._ensure_ctx))
+    return futures
+
+
+def resolve_guided_decoding_logits_processors(
+        logits_processors: list[Any], futures: list[Future]) -> list[Any]:
+    """Replaces finished placeholders with the processors they built.
+
+    Raises the error of a failed compilation, e.g. for an invalid grammar.
+    """
+    for future in futures:
+        future.result()
+    resolved = []
+    for processor in logits_processors:
+        if isinstance(processor, PendingGuidedDecodingLogitsProcessor):
+            processor = processor.future.result()
+            if processor is None:
+                continue
+        resolved.append(processor)
+    return resolved
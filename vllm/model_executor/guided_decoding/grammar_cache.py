@@ -0,0 +1,355 @@
+"""Bounded cache for compiled guided decoding grammars.
+
+Compiling a JSON schema, regex or grammar into a token-level automaton is
+by far the most expensive part of a guided decoding request. The compiled
+artifacts only depend on the grammar, the tokenizer and the backend, so
+they are cached here under a stable key made of those three parts.
+
+Entries are kept in a bounded in-memory LRU. Backends whose artifacts can
+be serialized may additionally persist them to disk under
+``VLLM_GUIDED_DECODING_CACHE_DIR`` so that they survive restarts.
+Concurrent requests for a grammar that is being compiled wait for the
+in-flight compilation instead of compiling it again.
+"""
+import contextlib
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import (Any, Callable, Dict, Iterable, NamedTuple, Optional, Tuple,
+                    TypeVar)
+
+import vllm.envs as envs
+from vllm.logger import init_logger
+
+logger = init_logger(__name__)
+
+T = TypeVar("T")
+
+
+class GrammarCacheKey(NamedTuple):
+    """Key of a compiled grammar: backend, grammar and tokenizer hashes."""
+    backend: str
+    grammar_hash: str
+    tokenizer_hash: str
+
+
+class GrammarSerializer(NamedTuple):
+    """Converts compiled grammars of one backend to and from bytes."""
+    dumps: Callable[[Any], bytes]
+    loads: Callable[[bytes], Any]
+
+
+PICKLE_SERIALIZER = GrammarSerializer(dumps=pickle.dumps, loads=pickle.loads)
+
+
+@dataclass
+class GrammarCacheStats:
+    hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    disk_writes: int = 0
+    # Lookups that waited for the in-flight compilation of the same key.
+    in_flight_waits: int = 0
+    # Total seconds spent compiling grammars on cache misses.
+    compile_time: float = 0.0
+    # Total seconds spent reading and deserializing disk entries.
+    disk_load_time: float = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.disk_hits + self.misses
+        return (self.hits + self.disk_hits) / total if total else 0.0
+
+
+def hash_grammar(*parts: str) -> str:
+    """Returns a stable hash of a grammar spec given as string parts."""
+    hasher = hashlib.sha256()
+    for part in parts:
+        hasher.update(part.encode("utf-8"))
+        hasher.update(b"\0")
+    return hasher.hexdigest()
+
+
+def hash_vocab(encoded_vocab: Iterable[str], *extra: Any) -> str:
+    """Returns a stable hash of a vocabulary ordered by token id.
+
+    Unlike ``hash(tokenizer)``, the result is the same across processes
+    and restarts, which makes it usable as part of an on-disk cache key.
+    """
+    hasher = hashlib.sha256()
+    for token in encoded_vocab:
+        hasher.update(token.encode("utf-8", errors="surrogatepass"))
+        hasher.update(b"\0")
+    for value in extra:
+        hasher.update(repr(value).encode("utf-8"))
+        hasher.update(b"\0")
+    return hasher.hexdigest()
+
+
+# Hashes of the vocabularies of the most recently used tokenizers.
+_MAX_TOKENIZER_HASHES = 16
+_tokenizer_hashes: OrderedDict[Tuple[str, str, int], str] = OrderedDict()
+_tokenizer_hashes_lock = threading.Lock()
+
+
+def get_tokenizer_hash(tokenizer: Any) -> str:
+    """Returns a stable hash of a HuggingFace tokenizer's vocabulary."""
+    # Tokenizers loaded from the same path with the same number of tokens
+    # have the same vocabulary, so the hash is memoized under those rather
+    # than under the object, whose id may be reused once it is freed.
+    name_or_path = getattr(tokenizer, "name_or_path", "")
+    key = (type(tokenizer).__name__, name_or_path, len(tokenizer))
+    if name_or_path:
+        with _tokenizer_hashes_lock:
+            tokenizer_hash = _tokenizer_hashes.get(key)
+            if tokenizer_hash is not None:
+                _tokenizer_hashes.move_to_end(key)
+                return tokenizer_hash
+
+    vocab = sorted(tokenizer.get_vocab().items(), key=lambda x: x[1])
+    tokenizer_hash = hash_vocab(
+        (token for token, _ in vocab),
+        type(tokenizer).__name__,
+        sorted(getattr(tokenizer, "all_special_tokens", [])))
+    if name_or_path:
+        with _tokenizer_hashes_lock:
+            _tokenizer_hashes[key] = tokenizer_hash
+            if len(_tokenizer_hashes) > _MAX_TOKENIZER_HASHES:
+                _tokenizer_hashes.popitem(last=False)
+    return tokenizer_hash
+
+
+class CompiledGrammarCache:
+    """Thread-safe LRU cache of compiled grammars with optional disk tier.
+
+    Args:
+        max_size: Maximum number of compiled grammars kept in memory.
+        cache_dir: Directory used to persist serializable entries. Disk
+            persistence is disabled if None.
+        max_disk_entries: Maximum number of entries kept on disk per
+            backend. The least recently used files are removed first.
+    """
+
+    def __init__(self,
+                 max_size: int,
+                 cache_dir: Optional[str] = None,
+                 max_disk_entries: Optional[int] = None):
+        if max_size <= 0:
+            raise ValueError(
+                f"max_size must be a positive integer, got {max_size}.")
+        self.max_size = max_size
+        self.cache_dir = cache_dir
+        self.max_disk_entries = (max_disk_entries if max_disk_entries
+                                 is not None else 8 * max_size)
+        self.stats = GrammarCacheStats()
+        self._entries: OrderedDict[GrammarCacheKey, Any] = OrderedDict()
+        self._in_flight: Dict[GrammarCacheKey, Future] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: GrammarCacheKey) -> bool:
+        return key in self._entries
+
+    def get(self, key: GrammarCacheKey) -> Optional[Any]:
+        """Returns the in-memory entry for the key, or None."""
+        with self._lock:
+            return self._get_locked(key)
+
+    def _get_locked(self, key: GrammarCacheKey) -> Optional[Any]:
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+        return value
+
+    def put(self, key: GrammarCacheKey, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def get_or_compile(self,
+                       key: GrammarCacheKey,
+                       compile_fn: Callable[[], T],
+                       serializer: Optional[GrammarSerializer] = None) -> T:
+        """Returns the compiled grammar for the key, compiling it on a miss.
+
+        The lookup order is memory, then disk (only if a serializer is given
+        and disk persistence is enabled), then ``compile_fn``. Freshly
+        compiled grammars are written to disk when possible. If another
+        thread is already compiling the same key, this waits for its result.
+        """
+        with self._lock:
+            value = self._get_locked(key)
+            if value is not None:
+                return value
+            in_flight = self._in_flight.get(key)
+            if in_flight is None:
+                self._in_flight[key] = Future()
+            else:
+                self.stats.in_flight_waits += 1
+        if in_flight is not None:
+            return in_flight.result()
+
+        future = self._in_flight[key]
+        try:
+            value = self._load_or_compile(key, compile_fn, serializer)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(value)
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+        return value
+
+    def _load_or_compile(self, key: GrammarCacheKey, compile_fn: Callable[[],
+                                                                          T],
+                         serializer: Optional[GrammarSerializer]) -> T:
+        use_disk = self.cache_dir is not None and serializer is not None
+        if use_disk:
+            assert serializer is not None
+            value = self._load_from_disk(key, serializer)
+            if value is not None:
+                self.put(key, value)
+                return value
+
+        start = time.perf_counter()
+        value = compile_fn()
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.stats.misses += 1
+            self.stats.compile_time += elapsed
+        logger.debug("Compiled %s grammar %s in %.3f s.", key.backend,
+                     key.grammar_hash[:12], elapsed)
+        self.put(key, value)
+        if use_disk:
+            assert serializer is not None
+            self._save_to_disk(key, value, serializer)
+        return value
+
+    def clear(self) -> None:
+        """Drops all in-memory entries. Files on disk are kept."""
+        with self._lock:
+            self._entries.clear()
+
+    def _backend_dir(self, key: GrammarCacheKey) -> str:
+        assert self.cache_dir is not None
+        return os.path.join(self.cache_dir, key.backend)
+
+    def _entry_path(self, key: GrammarCacheKey) -> str:
+        return os.path.join(
+            self._backend_dir(key),
+            f"{key.tokenizer_hash[:16]}-{key.grammar_hash}.bin")
+
+    def _load_from_disk(self, key: GrammarCacheKey,
+                        serializer: GrammarSerializer) -> Optional[Any]:
+        path = self._entry_path(key)
+        start = time.perf_counter()
+        try:
+            with open(path, "rb") as f:
+                value = serializer.loads(f.read())
+            # Refresh the modification time which drives disk eviction.
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            # Corrupted or incompatible (e.g. written by another backend
+            # version) entries are discarded and recompiled.
+            logger.warning("Failed to load compiled grammar from %s: %s", path,
+                           e)
+            with contextlib.suppress(OSError):
+                os.remove(path)
+            return None
+        with self._lock:
+            self.stats.disk_hits += 1
+            self.stats.disk_load_time += time.perf_counter() - start
+        return value
+
+    def _save_to_disk(self, key: GrammarCacheKey, value: Any,
+                      serializer: GrammarSerializer) -> None:
+        backend_dir = self._backend_dir(key)
+        try:
+            data = serializer.dumps(value)
+            os.makedirs(backend_dir, exist_ok=True)
+            # Write to a temporary file first so that concurrent readers
+            # (e.g. other engine processes) never see partial entries.
+            fd, tmp_path = tempfile.mkstemp(dir=backend_dir, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, self._entry_path(key))
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+        except Exception as e:
+            logger.warning("Failed to persist compiled grammar to %s: %s",
+                           backend_dir, e)
+            return
+        with self._lock:
+            self.stats.disk_writes += 1
+        self._prune_disk(backend_dir)
+
+    def _prune_disk(self, backend_dir: str) -> None:
+        try:
+            entries = [
+                entry for entry in os.scandir(backend_dir)
+                if entry.name.endswith(".bin")
+            ]
+            if len(entries) <= self.max_disk_entries:
+                return
+            entries.sort(key=lambda entry: entry.stat().st_mtime)
+            for entry in entries[:len(entries) - self.max_disk_entries]:
+                os.remove(entry.path)
+        except OSError as e:
+            logger.debug("Failed to prune grammar cache %s: %s", backend_dir,
+                         e)
+
+
+_grammar_cache: Optional[CompiledGrammarCache] = None
+
+
+def get_compiled_grammar_cache() -> CompiledGrammarCache:
+    """Returns the process-wide compiled grammar cache."""
+    global _grammar_cache
+    if _grammar_cache is None:
+        cache_dir = (None if envs.VLLM_DISABLE_GUIDED_DECODING_DISK_CACHE else
+                     envs.VLLM_GUIDED_DECODING_CACHE_DIR)
+        _grammar_cache = CompiledGrammarCache(
+            max_size=envs.VLLM_GUIDED_DECODING_CACHE_SIZE, cache_dir=cache_dir)
+    return _grammar_cache
+
+
+# It's not yet clear that using more provides a benefit, and it could
+# potentially starve other processes on the machine. We'll cap this for now and
+# adjust later if testing proves it to help overcome a bottleneck.
+_MAX_COMPILE_WORKERS = 16
+
+_compile_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_grammar_compile_executor() -> ThreadPoolExecutor:
+    """Returns the thread pool shared by background grammar compilations.
+
+    A thread pool is used rather than a process pool because compiled
+    grammars (e.g. xgrammar's CompiledGrammar) cannot be sent back across
+    process boundaries; the backends do the heavy lifting in native code.
+    """
+    global _compile_executor
+    if _compile_executor is None:
+        max_workers = min(os.cpu_count() or 2, _MAX_COMPILE_WORKERS)
+        _compile_executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="grammar_compile")
+    return _compile_executor
@@ -1,6 +1,4 @@
 import asyncio
-import concurrent.futures
-import os
 from enum import Enum
 from json import dumps as json_dumps
 from re import escape as regex_escape
@@ -8,6 +6,8 @@ from typing import Tuple, Union
 
 from transformers import PreTrainedTokenizerBase
 
+from vllm.model_executor.guided_decoding.grammar_cache import (
+    get_grammar_compile_executor)
 from vllm.model_executor.guided_decoding.outlines_logits_processors import (
     CFGLogitsProcessor, JSONLogitsProcessor, RegexLogitsProcessor)
 from vllm.sampling_params import GuidedDecodingParams
@@ -47,13 +47,6 @@ pair   : UNESCAPED_STRING ":" value
 %ignore WS
 """
 
-global_thread_pool = None  # used for generating logits processor fsm
-
-# It's not yet clear that using more provides a benefit, and it could
-# potentially starve other processes on the machine. We'll cap this for now and
-# adjust later if testing proves it to help overcome a bottleneck.
-_MAX_THREADPOOL_WORKERS = 16
-
 
 async def get_outlines_guided_decoding_logits_processor(
     guided_params: GuidedDecodingParams, tokenizer: PreTrainedTokenizerBase
@@ -65,20 +58,13 @@ async def get_outlines_guided_decoding_logits_processor(
     We cache logit processors by (guide, tokenizer), and on cache hit
     we make a shallow copy to reuse the same underlying FSM.
     """
-    global global_thread_pool
     guide, mode = _get_guide_and_mode(guided_params)
     if not guide or not mode:
         return None
 
-    if global_thread_pool is None:
-        max_workers = os.cpu_count() or 2
-        if max_workers > _MAX_THREADPOOL_WORKERS:
-            max_workers = _MAX_THREADPOOL_WORKERS
-        global_thread_pool = concurrent.futures.ThreadPoolExecutor(
-            max_workers=max_workers)
     loop = asyncio.get_running_loop()
 
-    return await loop.run_in_executor(global_thread_pool,
+    return await loop.run_in_executor(get_grammar_compile_executor(),
                                       _get_logits_processor, guide, tokenizer,
                                       mode, guided_params.whitespace_pattern)
 
@@ -14,31 +14,40 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import copy
+import importlib.metadata
 import json
 from collections import defaultdict
 from functools import lru_cache
-from typing import Callable, DefaultDict, Dict, List, Union
+from typing import Callable, DefaultDict, Dict, List, Tuple, Union
 
 import numpy as np
 import torch
 from lark import Lark
 from outlines import grammars
-from outlines.caching import cache
 from outlines.fsm.guide import CFGGuide, Generate, Guide, RegexGuide, Write
 from outlines_core.fsm.json_schema import build_regex_from_schema
 from pydantic import BaseModel
 from transformers import PreTrainedTokenizerBase
 
+from vllm.logits_process import BitmaskLogitsProcessor
+from vllm.model_executor.guided_decoding.grammar_cache import (
+    PICKLE_SERIALIZER, GrammarCacheKey, get_compiled_grammar_cache,
+    get_tokenizer_hash, hash_grammar)
 
-class BaseLogitsProcessor:
+# Compiled guides are persisted with pickle, so entries written by another
+# outlines version must not be reused.
+_OUTLINES_VERSION = importlib.metadata.version("outlines_core")
+
+
+class BaseLogitsProcessor(BitmaskLogitsProcessor):
 
     def __init__(self, guide: Guide):
         self._guide: Guide = guide
         self._fsm_state: DefaultDict[int, int] = defaultdict(int)
 
-    def __call__(self, input_ids: List[int],
-                 scores: torch.Tensor) -> torch.Tensor:
-        """Use the FSM to bias the logits before sampling the next token."""
+    def _get_allowed_tokens(self, input_ids: Union[List[int], Tuple[int]]):
+        """Advance the FSM with the last token and return the token ids
+        allowed next."""
         seq_id = hash(tuple(input_ids))
 
         if len(input_ids) > 0:
@@ -68,38 +77,47 @@ class BaseLogitsProcessor:
             state=self._fsm_state[seq_id])
 
         if type(instruction) == Generate:  # noqa: E721
-            allowed_tokens = instruction.tokens
+            return instruction.tokens
         elif type(instruction) == Write:  # noqa: E721
             # TODO: support fast forward tokens
-            allowed_tokens = [instruction.tokens[0]]
-        else:
-            raise TypeError(
-                f"Unsupported instruction type {type(instruction)}")
-
-        mask = torch.full((scores.shape[-1], ),
-                          -torch.inf,
-                          device=scores.device)
+            return [instruction.tokens[0]]
+        raise TypeError(f"Unsupported instruction type {type(instruction)}")
+
+    def fill_bitmask(self, past_tokens_ids: Union[List[int], Tuple[int]],
+                     bitmask: torch.Tensor, index: int) -> bool:
+        """Use the FSM to select the tokens allowed next."""
+        allowed_tokens = self._get_allowed_tokens(past_tokens_ids)
+        if allowed_tokens is None:
+            return False
         # The tokenizer may support more token ids than the model can generate,
         # eg. Llama 3.2 Vision models have an `<|image|>` token with id 128256
         # but scores.shape == torch.Size([128256])
         # Using NumPy is faster for filtering token ids
-        allowed_tokens = np.array(allowed_tokens, dtype=np.int64)
-        allowed_tokens = torch.tensor(allowed_tokens, device=scores.device)
-        allowed_tokens = allowed_tokens.masked_select(
-            allowed_tokens < scores.shape[-1])
-        mask.index_fill_(0, allowed_tokens, 0)
-        scores.add_(mask)
-        return scores
+        allowed_tokens = np.asarray(allowed_tokens, dtype=np.int64)
+        allowed_tokens = allowed_tokens[allowed_tokens < bitmask.shape[-1] *
+                                        32]
+        row = bitmask[index].numpy().view(np.uint32)
+        row[:] = 0
+        bits = np.left_shift(np.uint32(1),
+                             (allowed_tokens & 31).astype(np.uint32))
+        np.bitwise_or.at(row, allowed_tokens >> 5, bits)
+        return True
 
 
 class RegexLogitsProcessor(BaseLogitsProcessor):
 
     @classmethod
-    @cache()
     def _get_guide(cls, regex_string: str,
                    tokenizer: PreTrainedTokenizerBase) -> Guide:
-        tokenizer = _adapt_tokenizer(tokenizer)
-        return RegexGuide.from_regex(regex_string, tokenizer)
+        key = GrammarCacheKey(backend="outlines-regex",
+                              grammar_hash=hash_grammar(
+                                  _OUTLINES_VERSION, regex_string),
+                              tokenizer_hash=get_tokenizer_hash(tokenizer))
+        return get_compiled_grammar_cache().get_or_compile(
+            key,
+            lambda: RegexGuide.from_regex(regex_string,
+                                          _adapt_tokenizer(tokenizer)),
+            serializer=PICKLE_SERIALIZER)
 
     def __init__(self, regex_string: str, tokenizer: PreTrainedTokenizerBase):
         """Compile the FSM that drives the regex-structured generation.
@@ -154,10 +172,15 @@ class JSONLogitsProcessor(RegexLogitsProcessor):
 class CFGLogitsProcessor(BaseLogitsProcessor):
 
     @classmethod
-    @cache()
     def _get_guide(cls, cfg: str, tokenizer: PreTrainedTokenizerBase) -> Guide:
-        tokenizer = _adapt_tokenizer(tokenizer)
-        return CFGGuide(cfg, tokenizer)
+        # The Lark parser held by CFGGuide does not pickle reliably (see
+        # BaseLogitsProcessor), so CFG guides are only cached in memory.
+        key = GrammarCacheKey(backend="outlines-cfg",
+                              grammar_hash=hash_grammar(
+                                  _OUTLINES_VERSION, cfg),
+                              tokenizer_hash=get_tokenizer_hash(tokenizer))
+        return get_compiled_grammar_cache().get_or_compile(
+            key, lambda: CFGGuide(cfg, _adapt_tokenizer(tokenizer)))
 
     def __init__(self, cfg: str, tokenizer: PreTrainedTokenizerBase):
         """Compile the FSM that drives the context free grammar generation.
@@ -14,6 +14,9 @@ try:
 except ImportError:
     pass
 
+from vllm.logits_process import BitmaskLogitsProcessor
+from vllm.model_executor.guided_decoding.grammar_cache import (
+    GrammarCacheKey, get_compiled_grammar_cache, hash_grammar, hash_vocab)
 from vllm.model_executor.guided_decoding.xgrammar_utils import (
     convert_lark_to_gbnf, grammar_is_likely_lark)
 
@@ -42,6 +45,8 @@ class TokenizerData(NamedTuple):
     encoded_vocab: list[str]
     stop_token_ids: list[int] | None
     backend_str: str
+    # Stable across processes, unlike hash(tokenizer).
+    fingerprint: str
 
 
 class TokenizerDataCache:
@@ -79,7 +84,9 @@ class TokenizerDataCache:
             cls._cache[tokenizer_hash] = TokenizerData(
                 encoded_vocab=encoded_vocab,
                 stop_token_ids=stop_token_ids,
-                backend_str=backend_str)
+                backend_str=backend_str,
+                fingerprint=hash_vocab(encoded_vocab, stop_token_ids,
+                                       backend_str))
 
         return cls._cache[tokenizer_hash]
 
@@ -103,8 +110,13 @@ class GrammarCompilerCache:
                 xgr_core.TokenizerInfo.from_huggingface(
                     config.encoded_vocab, config.backend_str,
                     config.vocab_size, config.stop_token_ids))
+            # Compiled grammars are cached in the bounded
+            # CompiledGrammarCache, so the unbounded cache of the compiler
+            # itself is disabled.
             cls._cache[cache_key] = xgr.GrammarCompiler(
-                tokenizer_info, max_threads=config.max_threads)
+                tokenizer_info,
+                max_threads=config.max_threads,
+                cache_enabled=False)
 
         return cls._cache[cache_key]
 
@@ -122,6 +134,7 @@ class GrammarConfig:
     encoded_vocab: list[str] | None = None
     stop_token_ids: list[int] | None = None
     backend_str: str | None = None
+    tokenizer_fingerprint: str | None = None
 
     @classmethod
     def from_guided_params(cls,
@@ -156,6 +169,7 @@ class GrammarConfig:
                        stop_token_ids=stop_token_ids,
                        backend_str=backend_str,
                        tokenizer_hash=tokenizer_hash,
+                       tokenizer_fingerprint=tokenizer_data.fingerprint,
                        max_threads=max_threads)
         elif guided_params.grammar:
             # XGrammar only supports GBNF grammars, so we must convert Lark
@@ -185,6 +199,7 @@ class GrammarConfig:
                        stop_token_ids=stop_token_ids,
                        backend_str=backend_str,
                        tokenizer_hash=tokenizer_hash,
+                       tokenizer_fingerprint=tokenizer_data.fingerprint,
                        max_threads=max_threads)
         elif guided_params.json_object:
             return cls(json_object=True,
@@ -193,6 +208,7 @@ class GrammarConfig:
                        stop_token_ids=stop_token_ids,
                        backend_str=backend_str,
                        tokenizer_hash=tokenizer_hash,
+                       tokenizer_fingerprint=tokenizer_data.fingerprint,
                        max_threads=max_threads)
         else:
             raise ValueError(
@@ -201,15 +217,14 @@ class GrammarConfig:
 
 
 @dataclass
-class XGrammarLogitsProcessor:
+class XGrammarLogitsProcessor(BitmaskLogitsProcessor):
     """Wrapper class to support pickle protocol"""
     config: GrammarConfig
 
     ctx: xgr.CompiledGrammar | None = None
-    token_bitmask: torch.Tensor = None  # type: ignore[assignment]
-    matchers: list[xgr.GrammarMatcher] = field(default_factory=list)
-    batch_size: int = field(default=1)
-    prefilled: bool = field(default=False)
+    matcher: xgr.GrammarMatcher | None = None
+    # Number of generated tokens already accepted by the matcher.
+    num_consumed: int = field(default=0)
 
     def __getstate__(self) -> dict[str, Any]:
         return {'config': self.config}
@@ -218,61 +233,59 @@ class XGrammarLogitsProcessor:
         self.config = state['config']
 
         self.ctx = None
-        self.matchers = []
-        self.batch_size = 1
-        self.token_bitmask = None  # type: ignore[assignment]
-        self.prefilled = False
+        self.matcher = None
+        self.num_consumed = 0
+
+    def grammar_cache_key(self) -> GrammarCacheKey:
+        """Returns the key of the compiled grammar in the grammar cache."""
+        if self.config.json_str is not None:
+            grammar_hash = hash_grammar("json", self.config.json_str)
+        elif self.config.grammar_str is not None:
+            grammar_hash = hash_grammar("grammar", self.config.grammar_str)
+        elif self.config.json_object:
+            grammar_hash = hash_grammar("json_object")
+        else:
+            raise ValueError(
+                "Invalid configuration for xgrammar logits processor")
+        tokenizer_fingerprint = (self.config.tokenizer_fingerprint
+                                 or str(self.config.tokenizer_hash))
+        return GrammarCacheKey(backend="xgrammar",
+                               grammar_hash=grammar_hash,
+                               tokenizer_hash=hash_grammar(
+                                   tokenizer_fingerprint,
+                                   str(self.config.vocab_size)))
+
+    def _compile(self) -> xgr.CompiledGrammar:
+        compiler = GrammarCompilerCache.get_compiler(self.config)
+        if self.config.json_str is not None:
+            return compiler.compile_json_schema(self.config.json_str)
+        elif self.config.grammar_str is not None:
+            return compiler.compile_grammar(self.config.grammar_str)
+        return compiler.compile_builtin_json_grammar()
 
     def _ensure_ctx(self):
         """Lazily initialize the processor in the worker process"""
         if self.ctx is None:
-            compiler = GrammarCompilerCache.get_compiler(self.config)
-            if self.config.json_str is not None:
-                self.ctx = compiler.compile_json_schema(self.config.json_str)
-            elif self.config.grammar_str is not None:
-                self.ctx = compiler.compile_grammar(self.config.grammar_str)
-            elif self.config.json_object:
-                self.ctx = compiler.compile_builtin_json_grammar()
-            else:
-                raise ValueError(
-                    "Invalid configuration for xgrammar logits processor")
-
-    def __call__(self, input_ids: list[int],
-                 scores: torch.Tensor) -> torch.Tensor:
-        if self.ctx is None:
-            self._ensure_ctx()
-
-        if len(self.matchers) == 0:
-            self.matchers = [
-                xgr.GrammarMatcher(self.ctx) for _ in range(self.batch_size)
-            ]
-            self.token_bitmask = xgr.allocate_token_bitmask(
-                self.batch_size, self.config.vocab_size)
-
-        if not self.prefilled:
-            # Have not sampled a token yet
-            self.prefilled = True
-        else:
-            for i, matcher in enumerate(self.matchers):
-                if not matcher.is_terminated():
-                    sampled_token = input_ids[-1]
-                    assert self.matchers[i].accept_token(sampled_token)
-
-        for i, matcher in enumerate(self.matchers):
-            if not matcher.is_terminated():
-                # @ubospica: ideally, fill_next_token_bitmask should be
-                # parallelized with model decoding
-                # See https://github.com/vllm-project/vllm/pull/10785/files#r1864278303
-                matcher.fill_next_token_bitmask(self.token_bitmask, i)
-
-        # token_bitmask is a CPU tensor for use with accept_token and
-        # fill_next_token_bitmask so we move it to the device of scores
-        device_type = scores.device.type
-        if device_type != "cuda":
-            scores = scores.to("cpu")
-        xgr.apply_token_bitmask_inplace(scores,
-                                        self.token_bitmask.to(scores.device))
-        if device_type != "cuda":
-            scores = scores.to(device_type)
-
-        return scores
+            # xgrammar does not expose a way to serialize compiled grammars,
+            # so they are only cached in memory.
+            self.ctx = get_compiled_grammar_cache().get_or_compile(
+                self.grammar_cache_key(), self._compile)
+
+    def fill_bitmask(self, past_tokens_ids: list[int] | tuple[int],
+                     bitmask: torch.Tensor, index: int) -> bool:
+        self._ensure_ctx()
+        if (self.matcher is None or self.num_consumed > len(past_tokens_ids)):
+            # First step, or the sequence was reset (e.g. recomputed).
+            self.matcher = xgr.GrammarMatcher(self.ctx)
+            self.num_consumed = 0
+
+        for token_id in past_tokens_ids[self.num_consumed:]:
+            if self.matcher.is_terminated():
+                break
+            assert self.matcher.accept_token(token_id)
+        self.num_consumed = len(past_tokens_ids)
+
+        if self.matcher.is_terminated():
+            return False
+        self.matcher.fill_next_token_bitmask(bitmask, index)
+        return True
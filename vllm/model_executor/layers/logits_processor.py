@@ -1,6 +1,7 @@
 """A layer that compute logits from hidden_stats."""
 import inspect
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 import torch
 import torch.nn as nn
@@ -8,10 +9,15 @@ import torch.nn as nn
 import vllm.envs as envs
 from vllm.distributed import (tensor_model_parallel_all_gather,
                               tensor_model_parallel_gather)
+from vllm.logits_process import (BitmaskLogitsProcessor,
+                                 SparseLogitsBiasProcessor,
+                                 allocate_token_bitmask, apply_token_bitmask_)
 from vllm.model_executor.layers.vocab_parallel_embedding import (
     VocabParallelEmbedding)
 from vllm.model_executor.sampling_metadata import SamplingMetadata
 from vllm.platforms import current_platform
+from vllm.sequence import SequenceData
+from vllm.utils import is_pin_memory_available
 
 
 class LogitsProcessor(nn.Module):
@@ -130,6 +136,15 @@ def _apply_logits_processors(
 ) -> torch.Tensor:
     found_logits_processors = False
     logits_processed = 0
+    # Sparse biases of the whole batch, applied with a single scatter.
+    bias_rows: List[int] = []
+    bias_token_ids: List[int] = []
+    bias_values: List[float] = []
+    # Rows restricted by bitmask processors, masked with a single fill.
+    bitmask_rows: List[Tuple[int, Sequence[int],
+                             List[BitmaskLogitsProcessor]]] = []
+    # Rows with processors that are applied one row at a time.
+    processed_rows: List[Tuple[int, int, SequenceData, List[Any]]] = []
     for seq_group in sampling_metadata.seq_groups:
         seq_ids = seq_group.seq_ids
         sampling_params = seq_group.sampling_params
@@ -137,23 +152,53 @@ def _apply_logits_processors(
         if logits_processors:
             found_logits_processors = True
 
+            # The processors are applied in order: the sparse processors
+            # before the first other processor are applied with the batched
+            # scatter, which comes first, and the bitmask processors after
+            # the last other processor with the batched mask, which comes
+            # last. Sparse biases and bitmasks commute with each other.
+            row_indices = [
+                i for i, logits_processor in enumerate(logits_processors)
+                if not isinstance(logits_processor, (SparseLogitsBiasProcessor,
+                                                     BitmaskLogitsProcessor))
+            ]
+            first_row = row_indices[0] if row_indices else len(
+                logits_processors)
+            last_row = row_indices[-1] if row_indices else -1
+            sparse_processors: List[SparseLogitsBiasProcessor] = []
+            bitmask_processors: List[BitmaskLogitsProcessor] = []
+            row_processors = []
+            for i, logits_processor in enumerate(logits_processors):
+                if isinstance(logits_processor, SparseLogitsBiasProcessor):
+                    logits_processor.check_vocab_size(logits.shape[-1])
+                    if i < first_row:
+                        sparse_processors.append(logits_processor)
+                        continue
+                elif isinstance(logits_processor, BitmaskLogitsProcessor):
+                    if i > last_row:
+                        bitmask_processors.append(logits_processor)
+                        continue
+                row_processors.append(logits_processor)
+
             for seq_id, logits_row_idx in zip(seq_ids,
                                               seq_group.sample_indices):
-                logits_row = logits[logits_row_idx]
-                past_tokens_ids = seq_group.seq_data[seq_id].output_token_ids
-                prompt_tokens_ids = seq_group.seq_data[seq_id].prompt_token_ids
-
-                for logits_processor in logits_processors:
-                    parameters = inspect.signature(logits_processor).parameters
-                    if len(parameters) == 3:
-                        logits_row = logits_processor(prompt_tokens_ids,
-                                                      past_tokens_ids,
-                                                      logits_row)
-                    else:
-                        logits_row = logits_processor(past_tokens_ids,
-                                                      logits_row)
-
-                logits[logits_row_idx] = logits_row
+                seq_data = seq_group.seq_data[seq_id]
+                past_tokens_ids = seq_data.output_token_ids
+
+                for sparse_processor in sparse_processors:
+                    token_ids, biases = sparse_processor.get_sparse_bias(
+                        past_tokens_ids, seq_id)
+                    bias_rows.extend([logits_row_idx] * len(token_ids))
+                    bias_token_ids.extend(token_ids)
+                    bias_values.extend(biases)
+
+                if bitmask_processors:
+                    bitmask_rows.append(
+                        (logits_row_idx, past_tokens_ids, bitmask_processors))
+
+                if row_processors:
+                    processed_rows.append(
+                        (logits_row_idx, seq_id, seq_data, row_processors))
 
         logits_processed += len(seq_group.sample_indices) + len(
             seq_group.prompt_logprob_indices)
@@ -161,4 +206,128 @@ def _apply_logits_processors(
     if found_logits_processors:
         # verifies that no rows in logits were missed unexpectedly
         assert logits_processed == logits.shape[0]
+    if bias_rows:
+        _apply_sparse_logits_bias(logits, bias_rows, bias_token_ids,
+                                  bias_values)
+    for logits_row_idx, seq_id, seq_data, row_processors in processed_rows:
+        logits_row = logits[logits_row_idx]
+        past_tokens_ids = seq_data.output_token_ids
+        prompt_tokens_ids = seq_data.prompt_token_ids
+
+        for logits_processor in row_processors:
+            if isinstance(logits_processor, SparseLogitsBiasProcessor):
+                # Passes the sequence id so that the processor keeps its
+                # incremental state.
+                token_ids, biases = logits_processor.get_sparse_bias(
+                    past_tokens_ids, seq_id)
+                if token_ids:
+                    logits_row.index_put_(
+                        (torch.tensor(token_ids, device=logits.device), ),
+                        torch.tensor(biases,
+                                     dtype=logits.dtype,
+                                     device=logits.device),
+                        accumulate=True)
+                continue
+            parameters = inspect.signature(logits_processor).parameters
+            if len(parameters) == 3:
+                logits_row = logits_processor(prompt_tokens_ids,
+                                              past_tokens_ids, logits_row)
+            else:
+                logits_row = logits_processor(past_tokens_ids, logits_row)
+
+        logits[logits_row_idx] = logits_row
+    if bitmask_rows:
+        _apply_bitmask_logits_processors(logits, bitmask_rows)
     return logits
+
+
+def _apply_sparse_logits_bias(
+    logits: torch.Tensor,
+    rows: List[int],
+    token_ids: List[int],
+    biases: List[float],
+) -> None:
+    """Add `biases` at (`rows`, `token_ids`) of `logits` in place with a
+    single scatter. Duplicate positions accumulate."""
+    pin_memory = logits.device.type != "cpu" and is_pin_memory_available()
+    indices = torch.tensor([rows, token_ids],
+                           dtype=torch.long,
+                           device="cpu",
+                           pin_memory=pin_memory)
+    values = torch.tensor(biases,
+                          dtype=logits.dtype,
+                          device="cpu",
+                          pin_memory=pin_memory)
+    indices = indices.to(device=logits.device, non_blocking=True)
+    values = values.to(device=logits.device, non_blocking=True)
+    logits.index_put_((indices[0], indices[1]), values, accumulate=True)
+
+
+_bitmask_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_bitmask_executor() -> Optional[ThreadPoolExecutor]:
+    global _bitmask_executor
+    if (_bitmask_executor is None
+            and envs.VLLM_GUIDED_DECODING_BITMASK_THREADS > 0):
+        _bitmask_executor = ThreadPoolExecutor(
+            max_workers=envs.VLLM_GUIDED_DECODING_BITMASK_THREADS,
+            thread_name_prefix="guided_bitmask")
+    return _bitmask_executor
+
+
+def _apply_bitmask_logits_processors(
+    logits: torch.Tensor,
+    rows: List[Tuple[int, Sequence[int], List[BitmaskLogitsProcessor]]],
+) -> None:
+    """Fill one packed bitmask for all `rows` from their processors and
+    mask the disallowed tokens of `logits` with a single vectorized op.
+
+    The bitmask is filled on the CPU before anything waits for the device,
+    so it overlaps with the model forward pass still running there.
+    """
+    vocab_size = logits.shape[-1]
+    pin_memory = logits.device.type != "cpu" and is_pin_memory_available()
+    bitmask = allocate_token_bitmask(len(rows), vocab_size, pin_memory)
+    restricted = [False] * len(rows)
+
+    def fill_row(i: int) -> None:
+        _, past_tokens_ids, processors = rows[i]
+        scratch: Optional[torch.Tensor] = None
+        for processor in processors:
+            if not restricted[i]:
+                restricted[i] = processor.fill_bitmask(past_tokens_ids,
+                                                       bitmask, i)
+                continue
+            # Several processors restrict this row: intersect their masks.
+            if scratch is None:
+                scratch = allocate_token_bitmask(1, vocab_size)
+            else:
+                scratch.fill_(-1)
+            if processor.fill_bitmask(past_tokens_ids, scratch, 0):
+                bitmask[i] &= scratch[0]
+
+    executor = _get_bitmask_executor()
+    if executor is not None and len(rows) > 1:
+        # The rows of a sequence group share their processors, which are
+        # stateful, so each group is filled by a single task.
+        groups: Dict[int, List[int]] = {}
+        for i, (_, _, processors) in enumerate(rows):
+            groups.setdefault(id(processors), []).append(i)
+
+        def fill_group(indices: List[int]) -> None:
+            for i in indices:
+                fill_row(i)
+
+        list(executor.map(fill_group, groups.values()))
+    else:
+        for i in range(len(rows)):
+            fill_row(i)
+
+    restricted_rows = [i for i in range(len(rows)) if restricted[i]]
+    if not restricted_rows:
+        return
+    if len(restricted_rows) < len(rows):
+        bitmask = bitmask[restricted_rows]
+    apply_token_bitmask_(logits, bitmask,
+                         [rows[i][0] for i in restricted_rows])
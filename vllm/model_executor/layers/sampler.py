@@ -4,21 +4,24 @@ import warnings
 from dataclasses import dataclass
 from importlib.util import find_spec
 from math import inf
-from typing import Dict, Iterator, List, Optional, Tuple, Union
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Union
 
 import msgspec
 import torch
 import torch.nn as nn
 
 import vllm.envs as envs
+from vllm.model_executor.layers.utils import apply_penalties
 from vllm.model_executor.sampling_metadata import (SamplingMetadata,
                                                    SamplingTensors,
                                                    SequenceGroupToSample)
 from vllm.sampling_params import SamplingType
 from vllm.sequence import (VLLM_INVALID_TOKEN_ID,
                            CompletionSequenceGroupOutput, Logprob,
-                           PromptLogprobs, SampleLogprobs, SequenceOutput)
+                           PromptLogprobs, SampleLogprobs, SequenceData,
+                           SequenceOutput)
 from vllm.spec_decode.metrics import SpecDecodeWorkerMetrics
+from vllm.utils import async_tensor_h2d, is_pin_memory_available
 
 if envs.VLLM_USE_FLASHINFER_SAMPLER and find_spec("flashinfer"):
     import flashinfer.sampling
@@ -186,6 +189,16 @@ class Sampler(nn.Module):
         self.include_gpu_probs_tensor = False
         self.should_modify_greedy_probs_inplace = False
 
+        # Per-sequence token counts for the penalties, kept across steps.
+        self._token_counts = SequenceTokenCounts()
+
+    def reserve_token_counts(self, num_seqs: int, vocab_size: int,
+                             device: torch.device) -> None:
+        """Allocate the token counts of the penalties for at most
+        `num_seqs` sequences, so that the memory profiling accounts for
+        them."""
+        self._token_counts.reserve(num_seqs, vocab_size, device)
+
     def _init_sampling_tensors(
         self,
         logits: torch.Tensor,
@@ -239,14 +252,10 @@ class Sampler(nn.Module):
         _, vocab_size = logits.shape
 
         # Prepare sampling tensors with pinned memory to avoid blocking.
+        # NOTE: The token counts used by the penalties are not part of the
+        # sampling tensors, so they can be reused even with penalties.
         if not sampling_metadata.reuse_sampling_tensors:
             self._init_sampling_tensors(logits, sampling_metadata)
-        elif self._do_penalties:
-            # In this case, the sampling tensors logic depends on
-            # "output_tokens" of a sequence. As a result, we cannot
-            # reuse sampling tensors, since "output_tokens" changes
-            # between decode runs.
-            self._init_sampling_tensors(logits, sampling_metadata)
 
         assert self._sampling_tensors is not None
         sampling_tensors = self._sampling_tensors
@@ -258,11 +267,12 @@ class Sampler(nn.Module):
 
         # Apply presence and frequency penalties.
         if do_penalties:
-            logits = _apply_penalties(logits, sampling_tensors.prompt_tokens,
-                                      sampling_tensors.output_tokens,
-                                      sampling_tensors.presence_penalties,
-                                      sampling_tensors.frequency_penalties,
-                                      sampling_tensors.repetition_penalties)
+            prompt_mask, output_bin_counts = self._token_counts.update(
+                sampling_metadata, vocab_size, logits.device)
+            logits = apply_penalties(logits, prompt_mask, output_bin_counts,
+                                     sampling_tensors.presence_penalties,
+                                     sampling_tensors.frequency_penalties,
+                                     sampling_tensors.repetition_penalties)
 
         # Use float32 to apply temperature scaling.
         # Use in-place division to avoid creating a new tensor.
@@ -336,21 +346,266 @@ class Sampler(nn.Module):
         return self.should_modify_greedy_probs_inplace
 
 
-def _get_bin_counts_and_mask(
-    tokens: torch.Tensor,
-    vocab_size: int,
-    num_seqs: int,
-) -> Tuple[torch.Tensor, torch.Tensor]:
-    # Compute the bin counts for the tokens.
-    # vocab_size + 1 for padding.
-    bin_counts = torch.zeros((num_seqs, vocab_size + 1),
-                             dtype=torch.long,
-                             device=tokens.device)
-    bin_counts.scatter_add_(1, tokens, torch.ones_like(tokens))
-    bin_counts = bin_counts[:, :vocab_size]
-    mask = bin_counts > 0
+class SequenceTokenCounts:
+    """Prompt token masks and output token counts used by the penalties,
+    kept on device across steps.
+
+    Each sequence owns a row (slot) of the persistent tensors. The row is
+    built from the prompt and output tokens when the sequence is first
+    seen; afterwards only the tokens generated since the previous step are
+    added. Seq ids are not unique over time, e.g. speculative decoding
+    hands out the same ids to different proposals every step, so a row is
+    only reused for the same `SequenceData`, which only grows, and is
+    rebuilt otherwise. Slots of sequences that are no longer scheduled are
+    reused in least-recently-used order. Once the slots are reserved, their
+    number is capped; the rows of the sequences that do not get a slot are
+    built from scratch every step. Slot 0 is kept empty for the rows that
+    only compute prompt logprobs.
+    """
 
-    return bin_counts, mask
+    def __init__(self) -> None:
+        self.prompt_mask: Optional[torch.Tensor] = None
+        self.output_bin_counts: Optional[torch.Tensor] = None
+
+        self._seq_id_to_slot: Dict[int, int] = {}
+        # Per slot: the owning sequence and the data its counts were built
+        # from, its prompt length, the number of its output tokens already
+        # counted, and the step in which it was last used.
+        self._slot_seq_ids: List[Optional[int]] = []
+        self._slot_seq_data: List[Optional[SequenceData]] = []
+        self._prompt_lens: List[int] = []
+        self._num_counted: List[int] = []
+        self._last_used_step: List[int] = []
+        self._free_slots: List[int] = []
+        self._eviction_candidates: Optional[List[int]] = None
+        self._step = 0
+        # The maximum number of slots, set when they are reserved.
+        self._max_num_slots: Optional[int] = None
+
+    def update(
+        self,
+        sampling_metadata: SamplingMetadata,
+        vocab_size: int,
+        device: torch.device,
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Bring the counts up to date with the sequences in
+        `sampling_metadata` and return the prompt mask and output bin counts
+        for each row of the logits."""
+        if (self.prompt_mask is None or self.prompt_mask.shape[1] != vocab_size
+                or self.prompt_mask.device != device):
+            self._reset(vocab_size, device)
+        self._step += 1
+        self._eviction_candidates = None
+
+        # Map each logits row to the slot of its sequence.
+        row_slots: List[int] = []
+        sampled_seqs: List[Tuple[int, Optional[int], SequenceData]] = []
+        seen_seq_ids: Set[int] = set()
+        for seq_group in sampling_metadata.seq_groups:
+            if (seq_group.is_prompt
+                    and seq_group.sampling_params.prompt_logprobs is not None):
+                row_slots.extend([0] * len(seq_group.prompt_logprob_indices))
+            if not seq_group.do_sample:
+                continue
+            for seq_id in seq_group.seq_ids:
+                key: Optional[int] = seq_id
+                slot = -1
+                if seq_id in seen_seq_ids:
+                    # The seq_id does not identify the sequence in this
+                    # batch, so do not track its tokens.
+                    key = None
+                else:
+                    seen_seq_ids.add(seq_id)
+                    slot = self._seq_id_to_slot.get(seq_id, -1)
+                    if slot >= 0:
+                        self._last_used_step[slot] = self._step
+                sampled_seqs.append(
+                    (len(row_slots), key, seq_group.seq_data[seq_id]))
+                row_slots.append(slot)
+
+        # Collect the tokens to add to the rows, allocating slots for the
+        # sequences that are not tracked yet.
+        rebuild_slots: List[int] = []
+        prompt_rows: List[int] = []
+        prompt_token_ids: List[int] = []
+        output_rows: List[int] = []
+        output_token_ids: List[int] = []
+        # The tokens of the rows of the sequences without a slot.
+        untracked_prompt_rows: List[int] = []
+        untracked_prompt_token_ids: List[int] = []
+        untracked_output_rows: List[int] = []
+        untracked_output_token_ids: List[int] = []
+        for row, key, seq_data in sampled_seqs:
+            slot = row_slots[row]
+            prompt_len = seq_data.get_prompt_len()
+            seq_output_token_ids = seq_data.output_token_ids_array
+            rebuild = slot < 0
+            if rebuild and key is not None:
+                slot = row_slots[row] = self._allocate(key, vocab_size, device)
+            if slot < 0:
+                # Gather the empty slot 0, and add all the tokens to the row.
+                row_slots[row] = 0
+                untracked_prompt_rows.extend([row] * prompt_len)
+                untracked_prompt_token_ids.extend(
+                    seq_data.prompt_token_ids_array)
+                untracked_output_rows.extend([row] * len(seq_output_token_ids))
+                untracked_output_token_ids.extend(seq_output_token_ids)
+                continue
+            if not rebuild:
+                # Rebuild if the seq id now names other tokens, or if the
+                # sequence was reset since the last step.
+                rebuild = (self._slot_seq_data[slot] is not seq_data
+                           or self._prompt_lens[slot] != prompt_len or
+                           self._num_counted[slot] > len(seq_output_token_ids))
+            self._slot_seq_data[slot] = seq_data
+            if rebuild:
+                rebuild_slots.append(slot)
+                prompt_rows.extend([slot] * prompt_len)
+                prompt_token_ids.extend(seq_data.prompt_token_ids_array)
+                self._prompt_lens[slot] = prompt_len
+                num_counted = 0
+            else:
+                num_counted = self._num_counted[slot]
+            new_token_ids = seq_output_token_ids[num_counted:]
+            output_rows.extend([slot] * len(new_token_ids))
+            output_token_ids.extend(new_token_ids)
+            self._num_counted[slot] = len(seq_output_token_ids)
+
+        assert self.prompt_mask is not None
+        assert self.output_bin_counts is not None
+        pin_memory = device.type != "cpu" and is_pin_memory_available()
+        if rebuild_slots:
+            rebuild_t = async_tensor_h2d(rebuild_slots, torch.long, device,
+                                         pin_memory)
+            self.prompt_mask[rebuild_t] = False
+            self.output_bin_counts[rebuild_t] = 0
+        if prompt_rows:
+            indices = async_tensor_h2d([prompt_rows, prompt_token_ids],
+                                       torch.long, device, pin_memory)
+            self.prompt_mask[indices[0], indices[1]] = True
+        if output_rows:
+            indices = async_tensor_h2d([output_rows, output_token_ids],
+                                       torch.long, device, pin_memory)
+            self.output_bin_counts.index_put_(
+                (indices[0], indices[1]),
+                torch.ones_like(indices[0],
+                                dtype=self.output_bin_counts.dtype),
+                accumulate=True)
+
+        row_slots_t = async_tensor_h2d(row_slots, torch.long, device,
+                                       pin_memory)
+        prompt_mask = self.prompt_mask[row_slots_t]
+        output_bin_counts = self.output_bin_counts[row_slots_t]
+        if untracked_prompt_rows:
+            indices = async_tensor_h2d(
+                [untracked_prompt_rows, untracked_prompt_token_ids],
+                torch.long, device, pin_memory)
+            prompt_mask[indices[0], indices[1]] = True
+        if untracked_output_rows:
+            indices = async_tensor_h2d(
+                [untracked_output_rows, untracked_output_token_ids],
+                torch.long, device, pin_memory)
+            output_bin_counts.index_put_(
+                (indices[0], indices[1]),
+                torch.ones_like(indices[0], dtype=output_bin_counts.dtype),
+                accumulate=True)
+        return prompt_mask, output_bin_counts
+
+    def reserve(self, num_seqs: int, vocab_size: int,
+                device: torch.device) -> None:
+        """Allocate the slots of `num_seqs` sequences up front, so that the
+        memory profiling accounts for them, and track at most `num_seqs`
+        sequences from then on."""
+        # Slot 0 is not used by any sequence.
+        self._max_num_slots = num_seqs + 1
+        if (self.prompt_mask is None or self.prompt_mask.shape[1] != vocab_size
+                or self.prompt_mask.device != device
+                or self.prompt_mask.shape[0] != self._max_num_slots):
+            self._reset(vocab_size, device, self._max_num_slots)
+
+    def _reset(self,
+               vocab_size: int,
+               device: torch.device,
+               num_slots: Optional[int] = None) -> None:
+        if num_slots is None:
+            # Keep the reserved capacity.
+            num_slots = (1 if self.prompt_mask is None else
+                         self.prompt_mask.shape[0])
+        # Free the old tensors before allocating the new ones.
+        self.prompt_mask = None
+        self.output_bin_counts = None
+        self.prompt_mask = torch.zeros((num_slots, vocab_size),
+                                       dtype=torch.bool,
+                                       device=device)
+        self.output_bin_counts = torch.zeros((num_slots, vocab_size),
+                                             dtype=torch.int32,
+                                             device=device)
+        self._seq_id_to_slot.clear()
+        self._slot_seq_ids = [None] * num_slots
+        self._slot_seq_data = [None] * num_slots
+        self._prompt_lens = [0] * num_slots
+        self._num_counted = [0] * num_slots
+        self._last_used_step = [0] * num_slots
+        self._free_slots = list(range(num_slots - 1, 0, -1))
+
+    def _allocate(self, seq_id: int, vocab_size: int,
+                  device: torch.device) -> int:
+        """Returns a slot for the sequence, or -1 if all the slots are used
+        in the current step and their number is capped."""
+        if not self._free_slots:
+            if self._eviction_candidates is None:
+                # Slots not used in the current step, least recently used
+                # last so that it is evicted first.
+                self._eviction_candidates = sorted(
+                    (slot for slot in range(1, len(self._slot_seq_ids))
+                     if self._last_used_step[slot] < self._step),
+                    key=lambda slot: self._last_used_step[slot],
+                    reverse=True)
+            if self._eviction_candidates:
+                slot = self._eviction_candidates.pop()
+                old_seq_id = self._slot_seq_ids[slot]
+                if old_seq_id is not None:
+                    del self._seq_id_to_slot[old_seq_id]
+                self._free_slots.append(slot)
+            elif (self._max_num_slots is not None
+                  and len(self._slot_seq_ids) >= self._max_num_slots):
+                return -1
+            else:
+                self._grow(vocab_size, device)
+
+        slot = self._free_slots.pop()
+        self._seq_id_to_slot[seq_id] = slot
+        self._slot_seq_ids[slot] = seq_id
+        self._last_used_step[slot] = self._step
+        return slot
+
+    def _grow(self, vocab_size: int, device: torch.device) -> None:
+        assert self.prompt_mask is not None
+        assert self.output_bin_counts is not None
+        old_num_slots = self.prompt_mask.shape[0]
+        new_num_slots = max(2 * old_num_slots, 16)
+        if self._max_num_slots is not None:
+            new_num_slots = min(new_num_slots, self._max_num_slots)
+        num_new_slots = new_num_slots - old_num_slots
+        self.prompt_mask = torch.cat([
+            self.prompt_mask,
+            torch.zeros((num_new_slots, vocab_size),
+                        dtype=torch.bool,
+                        device=device)
+        ])
+        self.output_bin_counts = torch.cat([
+            self.output_bin_counts,
+            torch.zeros((num_new_slots, vocab_size),
+                        dtype=torch.int32,
+                        device=device)
+        ])
+        self._slot_seq_ids.extend([None] * num_new_slots)
+        self._slot_seq_data.extend([None] * num_new_slots)
+        self._prompt_lens.extend([0] * num_new_slots)
+        self._num_counted.extend([0] * num_new_slots)
+        self._last_used_step.extend([0] * num_new_slots)
+        self._free_slots = list(range(new_num_slots - 1, old_num_slots - 1,
+                                      -1))
 
 
 def _apply_min_tokens_penalty(
@@ -400,29 +655,6 @@ def _apply_min_tokens_penalty(
     return logits
 
 
-def _apply_penalties(logits: torch.Tensor, prompt_tokens_tensor: torch.Tensor,
-                     output_tokens_tensor: torch.Tensor,
-                     presence_penalties: torch.Tensor,
-                     frequency_penalties: torch.Tensor,
-                     repetition_penalties: torch.Tensor) -> torch.Tensor:
-    num_seqs, vocab_size = logits.shape
-    _, prompt_mask = _get_bin_counts_and_mask(prompt_tokens_tensor, vocab_size,
-                                              num_seqs)
-    output_bin_counts, output_mask = _get_bin_counts_and_mask(
-        output_tokens_tensor, vocab_size, num_seqs)
-
-    repetition_penalties = repetition_penalties[:, None].repeat(1, vocab_size)
-    repetition_penalties[~(prompt_mask | output_mask)] = 1.0
-    logits = torch.where(logits > 0, logits / repetition_penalties,
-                         logits * repetition_penalties)
-
-    # We follow the definition in OpenAI API.
-    # Refer to https://platform.openai.com/docs/api-reference/parameter-details
-    logits -= frequency_penalties.unsqueeze_(dim=1) * output_bin_counts
-    logits -= presence_penalties.unsqueeze_(dim=1) * output_mask
-    return logits
-
-
 def _apply_top_k_top_p(
     logits: torch.Tensor,
     p: torch.Tensor,
@@ -0,0 +1,34 @@
+"""Utility methods for model layers."""
+import torch
+
+
+def apply_penalties(logits: torch.Tensor, prompt_mask: torch.Tensor,
+                    output_bin_counts: torch.Tensor,
+                    presence_penalties: torch.Tensor,
+                    frequency_penalties: torch.Tensor,
+                    repetition_penalties: torch.Tensor) -> torch.Tensor:
+    """
+    Applies presence, frequency and repetition penalties to the logits.
+
+    logits : The input logits tensor of shape [num_seqs, vocab_size]
+    prompt_mask: A boolean tensor of shape [num_seqs, vocab_size] marking
+        the tokens that appear in the prompt.
+    output_bin_counts: A tensor of shape [num_seqs, vocab_size] with the
+        number of times each token appears in the output so far.
+    presence_penalties: The presence penalties of shape (num_seqs, )
+    frequency_penalties: The frequency penalties of shape (num_seqs, )
+    repetition_penalties: The repetition penalties of shape (num_seqs, )
+    """
+    _, vocab_size = logits.shape
+    output_mask = output_bin_counts > 0
+
+    repetition_penalties = repetition_penalties[:, None].repeat(1, vocab_size)
+    repetition_penalties[~(prompt_mask | output_mask)] = 1.0
+    logits = torch.where(logits > 0, logits / repetition_penalties,
+                         logits * repetition_penalties)
+
+    # We follow the definition in OpenAI API.
+    # Refer to https://platform.openai.com/docs/api-reference/parameter-details
+    logits -= frequency_penalties.unsqueeze(dim=1) * output_bin_counts
+    logits -= presence_penalties.unsqueeze(dim=1) * output_mask
+    return logits
@@ -0,0 +1,406 @@
+"""The vLLM engine image checkpoint format.
+
+An engine image stores the parameters of each tensor and pipeline parallel
+rank exactly as they are laid out at runtime, i.e. sharded, after
+`process_weights_after_loading` and after any quantization repacking. Each
+rank has a raw data file holding the tensors at page-aligned offsets and a
+JSON manifest describing them, so that loading is an `mmap` of the data
+file and a `torch.frombuffer` per tensor, with no deserialization or
+transformation. The manifest also records the runtime layout of the
+tensors of the modules, i.e. whether they are parameters (and of which
+class, with which attributes), buffers or plain attributes, and the scalar
+attributes of the modules, such as the KV cache scales, that
+`process_weights_after_loading` derives from weights it does not keep. The
+loader rebuilds the tensors of the modules from the image in this layout,
+so that `process_weights_after_loading` is not run again.
+
+Layout of an engine image directory::
+
+    vllm_image.json                 # global manifest, see ImageManifest
+    rank-tp{tp}-pp{pp}.json         # per-rank manifest, see RankManifest
+    rank-tp{tp}-pp{pp}.bin          # per-rank tensor data
+    compile_cache/rank_{rank}/      # torch.compile cache of each rank, if
+                                    # the engine compiled the model
+    config.json, tokenizer files... # copied from the source model
+
+Engine images are created with `vllm convert-checkpoint`.
+"""
+import importlib
+import json
+import mmap
+import os
+import shutil
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+from torch import nn
+
+from vllm.config import VllmConfig
+from vllm.logger import init_logger
+
+logger = init_logger(__name__)
+
+IMAGE_FORMAT_VERSION = 3
+IMAGE_MANIFEST_NAME = "vllm_image.json"
+# Tensor data is page aligned so that every tensor of the mmapped file is
+# suitably aligned for any dtype.
+_ALIGNMENT = 4096
+_COMPILE_CACHE_DIR = "compile_cache"
+
+
+def _rank_prefix(tp_rank: int, pp_rank: int) -> str:
+    return f"rank-tp{tp_rank}-pp{pp_rank}"
+
+
+@dataclass
+class TensorEntry:
+    dtype: str
+    shape: List[int]
+    offset: int
+    nbytes: int
+
+
+@dataclass
+class TensorLayout:
+    """How a tensor of a module is held at runtime."""
+    # "parameter", "buffer" or "attribute" (a plain tensor attribute).
+    kind: str
+    # The class of a parameter.
+    cls: Optional[str] = None
+    # The scalar attributes of a parameter, e.g. its sharded dimensions.
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    # The name of the tensor this one is the same object as, e.g. for tied
+    # embeddings, in which case it has no data of its own.
+    alias_of: Optional[str] = None
+    # Whether the parameter or buffer is set to None.
+    is_none: bool = False
+
+
+@dataclass
+class RankManifest:
+    """Tensors of one rank and their location in the rank's data file, the
+    runtime layout of the tensors of the rank's modules, and the scalar
+    attributes of the rank's modules."""
+    data_file: str
+    tensors: Dict[str, TensorEntry] = field(default_factory=dict)
+    # Tensor name -> layout, in the order of the modules.
+    layout: Dict[str, TensorLayout] = field(default_factory=dict)
+    # Module name -> attribute name -> value.
+    attributes: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, path: str) -> "RankManifest":
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data_file=data["data_file"],
+                   tensors={
+                       name: TensorEntry(**entry)
+                       for name, entry in data["tensors"].items()
+                   },
+                   layout={
+                       name: TensorLayout(**entry)
+                       for name, entry in data["layout"].items()
+                   },
+                   attributes=data["attributes"])
+
+
+@dataclass
+class ImageManifest:
+    """Global description of an engine image, checked against the engine
+    configuration when the image is loaded."""
+    tensor_parallel_size: int
+    pipeline_parallel_size: int
+    dtype: str
+    quantization: Optional[str]
+    source_model: str
+    vllm_version: str
+    format_version: int = IMAGE_FORMAT_VERSION
+
+    def save(self, image_dir: str) -> None:
+        with open(os.path.join(image_dir, IMAGE_MANIFEST_NAME), "w") as f:
+            json.dump(asdict(self), f, indent=2)
+
+    @classmethod
+    def load(cls, image_dir: str) -> "ImageManifest":
+        with open(os.path.join(image_dir, IMAGE_MANIFEST_NAME)) as f:
+            return cls(**json.load(f))
+
+
+def is_engine_image(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, IMAGE_MANIFEST_NAME))
+
+
+def _dtype_name(dtype: torch.dtype) -> str:
+    return str(dtype).removeprefix("torch.")
+
+
+_ATTRIBUTE_TYPES = (bool, int, float, str, type(None))
+# Attributes of every module, such as `training`, which are not restored.
+_MODULE_INTERNALS = frozenset(vars(nn.Module()))
+
+
+def _scalar_attributes(obj: Any, exclude=frozenset()) -> Dict[str, Any]:
+    # Exact types only, e.g. enums would not survive the round trip.
+    return {
+        name: value
+        for name, value in vars(obj).items()
+        if name not in exclude and type(value) in _ATTRIBUTE_TYPES
+    }
+
+
+def get_module_attributes(model: nn.Module) -> Dict[str, Dict[str, Any]]:
+    """Return the scalar attributes of the modules of `model`."""
+    attributes: Dict[str, Dict[str, Any]] = {}
+    for module_name, module in model.named_modules():
+        module_attributes = _scalar_attributes(module, _MODULE_INTERNALS)
+        if module_attributes:
+            attributes[module_name] = module_attributes
+    return attributes
+
+
+def _module_tensors(module: nn.Module):
+    """The persistent tensors of a module: its parameters, its persistent
+    buffers and its plain tensor attributes, with their kind."""
+    for name, param in module._parameters.items():
+        yield name, param, "parameter"
+    for name, buffer in module._buffers.items():
+        if name not in module._non_persistent_buffers_set:
+            yield name, buffer, "buffer"
+    for name, value in vars(module).items():
+        if isinstance(value, torch.Tensor):
+            yield name, value, "attribute"
+
+
+def get_tensor_layout(
+    model: nn.Module
+) -> Tuple[Dict[str, TensorLayout], Dict[str, torch.Tensor]]:
+    """Return the layout of the tensors of the modules of `model`, and the
+    tensors to store: one per object, so that e.g. tied embeddings are
+    stored once."""
+    layout: Dict[str, TensorLayout] = {}
+    tensors: Dict[str, torch.Tensor] = {}
+    names_by_id: Dict[int, str] = {}
+    for module_name, module in model.named_modules():
+        prefix = f"{module_name}." if module_name else ""
+        for name, tensor, kind in _module_tensors(module):
+            full_name = prefix + name
+            entry = TensorLayout(kind=kind)
+            if tensor is None:
+                entry.is_none = True
+            elif id(tensor) in names_by_id:
+                entry.alias_of = names_by_id[id(tensor)]
+            else:
+                names_by_id[id(tensor)] = full_name
+                tensors[full_name] = tensor
+            if kind == "parameter" and tensor is not None:
+                entry.cls = (f"{type(tensor).__module__}."
+                             f"{type(tensor).__qualname__}")
+                entry.attributes = _scalar_attributes(tensor)
+            layout[full_name] = entry
+    return layout, tensors
+
+
+def _make_parameter(entry: TensorLayout, tensor: torch.Tensor) -> nn.Parameter:
+    assert entry.cls is not None
+    module_name, _, cls_name = entry.cls.rpartition(".")
+    cls = getattr(importlib.import_module(module_name), cls_name, None)
+    if not (isinstance(cls, type) and issubclass(cls, nn.Parameter)):
+        raise ValueError(f"Engine image has parameters of unknown class "
+                         f"{entry.cls}.")
+    # Bypass the constructors, e.g. of the vLLM parameters, which take the
+    # weight loaders only used before the weights are processed.
+    param = cls.__new__(cls, tensor, requires_grad=False)
+    for name, value in entry.attributes.items():
+        setattr(param, name, value)
+    return param
+
+
+def set_module_tensors(model: nn.Module, manifest: RankManifest,
+                       tensors: Dict[str, torch.Tensor],
+                       device: torch.device) -> None:
+    """Replace the tensors of the modules of `model` with those of the image,
+    in the runtime layout recorded in the manifest.
+
+    The parameters and buffers that are not in the layout, e.g. because
+    `process_weights_after_loading` replaced or deleted them, are removed.
+    On CPU the tensors are views of the image, other devices copy them.
+    """
+    modules = dict(model.named_modules())
+    for module_name, module in modules.items():
+        prefix = f"{module_name}." if module_name else ""
+        for name, _, kind in list(_module_tensors(module)):
+            if kind != "attribute" and prefix + name not in manifest.layout:
+                delattr(module, name)
+
+    values: Dict[str, Optional[torch.Tensor]] = {}
+    for full_name, entry in manifest.layout.items():
+        module_name, _, name = full_name.rpartition(".")
+        module = modules.get(module_name)
+        if module is None:
+            raise ValueError(f"Engine image has tensor {full_name} of "
+                             f"unknown module {module_name}.")
+        value: Optional[torch.Tensor]
+        if entry.is_none:
+            value = None
+        elif entry.alias_of is not None:
+            value = values[entry.alias_of]
+        else:
+            if full_name not in tensors:
+                raise ValueError(f"Missing tensor {full_name} in engine "
+                                 "image.")
+            value = tensors[full_name]
+            current = getattr(module, name, None)
+            if (isinstance(current, torch.Tensor)
+                    and current.dtype == value.dtype
+                    and current.dim() == value.dim()
+                    and current.shape != value.shape
+                    and all(size >= image_size for size, image_size in zip(
+                        current.shape, value.shape))):
+                # If loading with LoRA enabled, additional padding may be
+                # added to certain parameters. We only load into a narrowed
+                # view.
+                current_data = current.data
+                for dim, size in enumerate(value.shape):
+                    current_data = current_data.narrow(dim, 0, size)
+                current_data.copy_(value)
+                values[full_name] = current
+                continue
+            if value.device != device:
+                value = value.to(device)
+            if entry.kind == "parameter":
+                value = _make_parameter(entry, value)
+        values[full_name] = value
+
+        module._parameters.pop(name, None)
+        module._buffers.pop(name, None)
+        module.__dict__.pop(name, None)
+        if entry.kind == "parameter":
+            module._parameters[name] = value  # type: ignore[assignment]
+        elif entry.kind == "buffer":
+            module._buffers[name] = value
+        else:
+            module.__dict__[name] = value
+
+
+def set_module_attributes(model: nn.Module,
+                          attributes: Dict[str, Dict[str, Any]]) -> None:
+    """Restore the attributes returned by `get_module_attributes`."""
+    modules = dict(model.named_modules())
+    for module_name, module_attributes in attributes.items():
+        module = modules.get(module_name)
+        if module is None:
+            raise ValueError(f"Engine image has attributes of unknown module "
+                             f"{module_name}.")
+        for name, value in module_attributes.items():
+            setattr(module, name, value)
+
+
+def save_rank_image(model: nn.Module, image_dir: str, tp_rank: int,
+                    pp_rank: int) -> None:
+    """Write the runtime state of this rank's model to `image_dir`."""
+    os.makedirs(image_dir, exist_ok=True)
+    prefix = _rank_prefix(tp_rank, pp_rank)
+    layout, state_dict = get_tensor_layout(model)
+    manifest = RankManifest(data_file=f"{prefix}.bin",
+                            layout=layout,
+                            attributes=get_module_attributes(model))
+
+    data_path = os.path.join(image_dir, manifest.data_file)
+    tmp_path = data_path + ".tmp"
+    offset = 0
+    with open(tmp_path, "wb") as f:
+        for name in sorted(state_dict):
+            tensor = state_dict[name].detach().contiguous().cpu()
+            nbytes = tensor.numel() * tensor.element_size()
+            offset = -(-offset // _ALIGNMENT) * _ALIGNMENT
+            f.seek(offset)
+            if nbytes:
+                f.write(tensor.reshape(-1).view(torch.uint8).numpy().data)
+            manifest.tensors[name] = TensorEntry(dtype=_dtype_name(
+                tensor.dtype),
+                                                 shape=list(tensor.shape),
+                                                 offset=offset,
+                                                 nbytes=nbytes)
+            offset += nbytes
+        f.truncate(offset)
+    os.replace(tmp_path, data_path)
+    # The manifest is written last: a rank is complete iff it exists.
+    with open(os.path.join(image_dir, f"{prefix}.json"), "w") as f:
+        json.dump(asdict(manifest), f)
+    logger.info("Saved engine image of rank tp=%d pp=%d (%.2f GiB) to %s",
+                tp_rank, pp_rank, offset / (1 << 30), image_dir)
+
+
+def load_rank_image(
+        image_dir: str, tp_rank: int,
+        pp_rank: int) -> Tuple[RankManifest, Dict[str, torch.Tensor]]:
+    """Map the data file of a rank into memory and return its tensors.
+
+    The tensors are views of a private (copy-on-write) mapping of the file:
+    no data is read until the tensors are accessed, and writing to them
+    never modifies the image.
+    """
+    manifest_path = os.path.join(image_dir,
+                                 f"{_rank_prefix(tp_rank, pp_rank)}.json")
+    if not os.path.isfile(manifest_path):
+        raise ValueError(f"Engine image {image_dir} has no data for rank "
+                         f"tp={tp_rank} pp={pp_rank}.")
+    manifest = RankManifest.load(manifest_path)
+    tensors: Dict[str, torch.Tensor] = {}
+    with open(os.path.join(image_dir, manifest.data_file), "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        # The mapping stays valid after the file is closed and is released
+        # when the last tensor viewing it is freed.
+        buffer = mmap.mmap(f.fileno(), 0,
+                           access=mmap.ACCESS_COPY) if size else None
+    for name, entry in manifest.tensors.items():
+        dtype = getattr(torch, entry.dtype)
+        if entry.nbytes == 0:
+            tensors[name] = torch.empty(entry.shape, dtype=dtype)
+            continue
+        tensors[name] = torch.frombuffer(
+            buffer, dtype=torch.uint8, count=entry.nbytes,
+            offset=entry.offset).view(dtype).reshape(entry.shape)
+    return manifest, tensors
+
+
+def copy_model_files(source_dir: str, image_dir: str) -> None:
+    """Copy the config, tokenizer and other non-weight files of the source
+    model, so that the image can be passed as the model of an engine."""
+    for name in os.listdir(source_dir):
+        path = os.path.join(source_dir, name)
+        if os.path.splitext(name)[1] in (".bin", ".pt", ".safetensors",
+                                         ".gguf"):
+            continue
+        if name.endswith(".safetensors.index.json"):
+            continue
+        if os.path.isdir(path):
+            shutil.copytree(path,
+                            os.path.join(image_dir, name),
+                            dirs_exist_ok=True)
+        else:
+            shutil.copy(path, image_dir)
+
+
+def save_compile_cache(vllm_config: VllmConfig, image_dir: str) -> None:
+    """Copy the torch.compile cache of this rank to `image_dir`."""
+    cache_dir = vllm_config.compilation_config.cache_dir
+    if not cache_dir or not os.path.isdir(cache_dir):
+        return
+    shutil.copytree(cache_dir,
+                    os.path.join(image_dir, _COMPILE_CACHE_DIR,
+                                 f"rank_{vllm_config.parallel_config.rank}"),
+                    dirs_exist_ok=True)
+
+
+def restore_compile_cache(image_dir: str, rank: int, cache_dir: str) -> None:
+    """Populate an empty torch.compile cache directory of this rank with the
+    cache saved in an engine image, so that compiled graphs are reused."""
+    saved_cache_dir = os.path.join(image_dir, _COMPILE_CACHE_DIR,
+                                   f"rank_{rank}")
+    if not os.path.isdir(saved_cache_dir) or os.listdir(cache_dir):
+        return
+    shutil.copytree(saved_cache_dir, cache_dir, dirs_exist_ok=True)
+    logger.info("Restored the torch.compile cache from engine image %s",
+                image_dir)
@@ -8,6 +8,7 @@ import inspect
 import itertools
 import math
 import os
+import time
 import warnings
 from abc import ABC, abstractmethod
 from contextlib import contextmanager
@@ -22,9 +23,10 @@ from torch import nn
 from transformers import AutoModelForCausalLM
 from transformers.utils import SAFE_WEIGHTS_INDEX_NAME
 
+import vllm.envs as envs
 from vllm.config import (LoadConfig, LoadFormat, ModelConfig, ParallelConfig,
                          VllmConfig, set_current_vllm_config)
-from vllm.distributed import (get_tensor_model_parallel_rank,
+from vllm.distributed import (get_pp_group, get_tensor_model_parallel_rank,
                               get_tensor_model_parallel_world_size)
 from vllm.envs import VLLM_USE_MODELSCOPE
 from vllm.logger import init_logger
@@ -33,18 +35,24 @@ from vllm.model_executor.layers.linear import (LinearBase,
                                                QKVParallelLinear,
                                                ReplicatedLinear,
                                                RowParallelLinear)
-from vllm.model_executor.layers.quantization.base_config import (
-    QuantizeMethodBase)
+from vllm.model_executor.model_loader.engine_image import (
+    IMAGE_FORMAT_VERSION, ImageManifest, is_engine_image, load_rank_image,
+    save_rank_image, set_module_attributes, set_module_tensors)
 from vllm.model_executor.model_loader.tensorizer import (
     TensorizerConfig, is_vllm_tensorized, load_with_tensorizer,
     serialize_vllm_model, tensorizer_weights_iterator)
 from vllm.model_executor.model_loader.utils import (get_model_architecture,
                                                     set_default_torch_dtype)
+from vllm.model_executor.model_loader.weight_pipeline import (
+    ModelLoadingStats, WeightProcessingPipeline, get_modules_to_process,
+    timed_weights_iterator)
 from vllm.model_executor.model_loader.weight_utils import (
     download_safetensors_index_file_from_hf, download_weights_from_hf,
     filter_duplicate_safetensors_files, filter_files_not_needed_for_inference,
     get_gguf_extra_tensor_names, gguf_quant_weights_iterator,
-    initialize_dummy_weights, np_cache_weights_iterator, pt_weights_iterator,
+    initialize_dummy_weights, lazy_safetensors_weights_iterator,
+    np_cache_weights_iterator, parallel_safetensors_weights_iterator,
+    pt_weights_iterator, safetensors_weight_names,
     safetensors_weights_iterator)
 from vllm.model_executor.utils import set_weight_attrs
 from vllm.platforms import current_platform
@@ -183,6 +191,8 @@ class DefaultModelLoader(BaseModelLoader):
         if load_config.model_loader_extra_config:
             raise ValueError(f"Model loader extra config is not supported for "
                              f"load format {load_config.load_format}")
+        # Time spent in each phase of the last load_model call.
+        self.load_stats: Optional[ModelLoadingStats] = None
 
     def _maybe_download_from_modelscope(
             self, model: str, revision: Optional[str]) -> Optional[str]:
@@ -304,6 +314,16 @@ class DefaultModelLoader(BaseModelLoader):
                 hf_folder,
                 hf_weights_files,
             )
+        elif (use_safetensors and envs.VLLM_WEIGHT_LOADING_SHARDED_READS
+              and get_tensor_model_parallel_world_size() > 1):
+            weights_iterator = lazy_safetensors_weights_iterator(
+                hf_weights_files)
+        elif use_safetensors and envs.VLLM_WEIGHT_LOADING_THREADS > 0:
+            weights_iterator = parallel_safetensors_weights_iterator(
+                hf_weights_files,
+                num_threads=envs.VLLM_WEIGHT_LOADING_THREADS,
+                max_inflight_bytes=int(
+                    envs.VLLM_WEIGHT_LOADING_MAX_INFLIGHT_GB * 1e9))
         elif use_safetensors:
             weights_iterator = safetensors_weights_iterator(hf_weights_files)
         else:
@@ -351,18 +371,80 @@ class DefaultModelLoader(BaseModelLoader):
                               model_config.revision,
                               fall_back_to_pt=True)
 
+    def _get_all_weight_names(self, model_config: ModelConfig,
+                              model: nn.Module) -> Optional[List[str]]:
+        """Return the names of all the weights of the checkpoint, read from
+        the headers of its files, or None if it is not in the safetensors
+        format."""
+        sources = [
+            DefaultModelLoader.Source(
+                model_config.model,
+                model_config.revision,
+                prefix="",
+                fall_back_to_pt=getattr(model, "fall_back_to_pt_during_load",
+                                        True),
+            ),
+            *cast(Iterable[DefaultModelLoader.Source],
+                  getattr(model, "secondary_weights", ())),
+        ]
+        names: List[str] = []
+        for source in sources:
+            _, hf_weights_files, use_safetensors = self._prepare_weights(
+                source.model_or_path, source.revision, source.fall_back_to_pt)
+            if (not use_safetensors
+                    or self.load_config.load_format == LoadFormat.NPCACHE):
+                return None
+            names.extend(
+                source.prefix + name
+                for name in safetensors_weight_names(hf_weights_files))
+        return names
+
     def load_model(self, vllm_config: VllmConfig) -> nn.Module:
         device_config = vllm_config.device_config
         model_config = vllm_config.model_config
 
+        stats = ModelLoadingStats()
+        start = time.perf_counter()
         target_device = torch.device(device_config.device)
         with set_default_torch_dtype(model_config.dtype):
             with target_device:
                 model = _initialize_model(vllm_config=vllm_config)
+            stats.initialize_s = time.perf_counter() - start
+
+            def process_module(module: nn.Module) -> None:
+                # When quant methods need to process weights after loading
+                # (for repacking, quantizing, etc), they expect parameters
+                # to be on the global target device. This scope is for the
+                # case where cpu offloading is used, where we will move the
+                # parameters onto device for processing and back off after.
+                with device_loading_context(module, target_device):
+                    module.quant_method.process_weights_after_loading(module)
+
+            pipeline = None
+            if envs.VLLM_WEIGHT_LOADING_PIPELINED:
+                weight_names = self._get_all_weight_names(model_config, model)
+                if weight_names is None:
+                    logger.warning(
+                        "VLLM_WEIGHT_LOADING_PIPELINED is only supported for "
+                        "safetensors checkpoints. Processing the weights "
+                        "after loading them.")
+                else:
+                    pipeline = WeightProcessingPipeline(
+                        model, weight_names, process_module, target_device,
+                        stats)
+                    stats.pipelined = True
 
             weights_to_load = {name for name, _ in model.named_parameters()}
-            loaded_weights = model.load_weights(
-                self._get_all_weights(model_config, model))
+            weights = timed_weights_iterator(
+                self._get_all_weights(model_config, model), stats)
+            load_start = time.perf_counter()
+            try:
+                loaded_weights = model.load_weights(
+                    weights if pipeline is None else pipeline.wrap(weights))
+            finally:
+                stats.load_s = time.perf_counter() - load_start - stats.read_s
+                if pipeline is not None:
+                    pipeline.stop()
             # We only enable strict check for non-quantized models
             # that have loaded weights tracking currently.
             if model_config.quantization is None and loaded_weights is not None:
@@ -372,16 +454,17 @@ class DefaultModelLoader(BaseModelLoader):
                         "Following weights were not initialized from "
                         f"checkpoint: {weights_not_loaded}")
 
-            for _, module in model.named_modules():
-                quant_method = getattr(module, "quant_method", None)
-                if isinstance(quant_method, QuantizeMethodBase):
-                    # When quant methods need to process weights after loading
-                    # (for repacking, quantizing, etc), they expect parameters
-                    # to be on the global target device. This scope is for the
-                    # case where cpu offloading is used, where we will move the
-                    # parameters onto device for processing and back off after.
-                    with device_loading_context(module, target_device):
-                        quant_method.process_weights_after_loading(module)
+            if pipeline is None:
+                process_start = time.perf_counter()
+                for _, module in get_modules_to_process(model):
+                    process_module(module)
+                stats.process_s = time.perf_counter() - process_start
+                stats.process_after_load_s = stats.process_s
+            else:
+                pipeline.process_remaining()
+        stats.total_s = time.perf_counter() - start
+        stats.log()
+        self.load_stats = stats
         return model.eval()
 
 
@@ -689,6 +772,78 @@ class ShardedStateLoader(BaseModelLoader):
             )
 
 
+class EngineImageLoader(BaseModelLoader):
+    """Model loader for vLLM engine images, which store each rank's
+    parameters exactly as they are laid out at runtime. See
+    `vllm.model_executor.model_loader.engine_image` and
+    `vllm convert-checkpoint` for creating an engine image.
+
+    Loading maps each rank's data file into memory and rebuilds the
+    parameters of the model in their runtime layout, without running
+    `process_weights_after_loading`. On CPU the parameters are views of the
+    mapping, other devices copy from it.
+    """
+
+    def __init__(self, load_config: LoadConfig):
+        super().__init__(load_config)
+        if load_config.model_loader_extra_config:
+            raise ValueError(f"Model loader extra config is not supported for "
+                             f"load format {load_config.load_format}")
+
+    def download_model(self, model_config: ModelConfig) -> None:
+        pass  # Engine images are always local
+
+    @staticmethod
+    def _check_manifest(image_dir: str, vllm_config: VllmConfig) -> None:
+        manifest = ImageManifest.load(image_dir)
+        model_config = vllm_config.model_config
+        parallel_config = vllm_config.parallel_config
+        expected = {
+            "format_version": IMAGE_FORMAT_VERSION,
+            "tensor_parallel_size": parallel_config.tensor_parallel_size,
+            "pipeline_parallel_size": parallel_config.pipeline_parallel_size,
+            "dtype": str(model_config.dtype).removeprefix("torch."),
+            "quantization": model_config.quantization,
+        }
+        for key, value in expected.items():
+            if getattr(manifest, key) != value:
+                raise ValueError(
+                    f"Engine image {image_dir} was created with {key}="
+                    f"{getattr(manifest, key)!r}, but the engine uses "
+                    f"{key}={value!r}. Convert the checkpoint again with the "
+                    "engine's configuration.")
+
+    def load_model(self, vllm_config: VllmConfig) -> nn.Module:
+        device_config = vllm_config.device_config
+        model_config = vllm_config.model_config
+        image_dir = model_config.model
+        if not is_engine_image(image_dir):
+            raise ValueError(f"{image_dir} is not a vLLM engine image. Create "
+                             "one with `vllm convert-checkpoint`.")
+        self._check_manifest(image_dir, vllm_config)
+
+        target_device = torch.device(device_config.device)
+        with set_default_torch_dtype(model_config.dtype):
+            with target_device:
+                model = _initialize_model(vllm_config=vllm_config)
+
+        # The image holds the parameters as `process_weights_after_loading`
+        # left them, so instead of running it on uninitialized weights, the
+        # modules' tensors are rebuilt in the layout recorded in the image.
+        manifest, tensors = load_rank_image(image_dir,
+                                            get_tensor_model_parallel_rank(),
+                                            get_pp_group().rank_in_group)
+        set_module_tensors(model, manifest, tensors, target_device)
+        set_module_attributes(model, manifest.attributes)
+        return model.eval()
+
+    @staticmethod
+    def save_model(model: nn.Module, path: str) -> None:
+        """Save the model state of the current rank to an engine image."""
+        save_rank_image(model, path, get_tensor_model_parallel_rank(),
+                        get_pp_group().rank_in_group)
+
+
 class BitsAndBytesModelLoader(BaseModelLoader):
     """Model loader to load model weights with BitAndBytes quantization."""
 
@@ -1255,4 +1410,7 @@ def get_model_loader(load_config: LoadConfig) -> BaseModelLoader:
     if load_config.load_format == LoadFormat.GGUF:
         return GGUFModelLoader(load_config)
 
+    if load_config.load_format == LoadFormat.ENGINE_IMAGE:
+        return EngineImageLoader(load_config)
+
     return DefaultModelLoader(load_config)
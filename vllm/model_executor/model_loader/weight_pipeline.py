@@ -0,0 +1,261 @@
+"""Post-loading processing of weights overlapped with checkpoint reads.
+
+The default loader loads every weight of the checkpoint and then walks the
+modules of the model to run the `process_weights_after_loading` of their
+quantization methods (e.g. Marlin or Machete repacking), which is a second
+sweep over all the weights. With `VLLM_WEIGHT_LOADING_PIPELINED`, a module
+is instead processed on a worker thread as soon as the weights of its layer
+have been loaded, while the next layers are read.
+
+A layer is identified by the first numbered component of the names of its
+weights and modules (e.g. `layers.3` in `model.layers.3.mlp.down_proj`).
+The layer of a module is complete once the weights iterator has yielded
+every checkpoint tensor of the layer and the model has loaded them, i.e.
+asked for the next tensor. Modules without a numbered component or whose
+layer does not occur in the checkpoint are processed after loading, as
+before. Writes through the weight loaders of the parameters tell which
+modules were loaded, and a write into a module that was already processed
+is an error, so checkpoints that are not laid out like the model fail
+loudly rather than load wrong weights.
+"""
+import functools
+import queue
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import (Callable, Dict, Generator, Iterable, List, Optional, Set,
+                    Tuple)
+
+import torch
+from torch import nn
+
+from vllm.logger import init_logger
+from vllm.model_executor.layers.quantization.base_config import (
+    QuantizeMethodBase)
+from vllm.model_executor.model_loader.weight_utils import default_weight_loader
+from vllm.model_executor.parameter import BasevLLMParameter
+
+logger = init_logger(__name__)
+
+# Number of layers loaded but not yet processed after which reading pauses,
+# so that loading does not run ahead of processing.
+_MAX_PENDING_LAYERS = 4
+
+_LAYER_PATTERN = re.compile(r"(?:^|\.)([^.]+\.\d+)(?=\.|$)")
+
+
+def get_weight_layer(name: str) -> Optional[str]:
+    """Return the layer of a weight or module name, e.g. `layers.3` for
+    `model.layers.3.mlp.down_proj.weight`, or None if the name has no
+    numbered component."""
+    match = _LAYER_PATTERN.search(name)
+    return match.group(1) if match else None
+
+
+@dataclass
+class ModelLoadingStats:
+    """Time spent in each phase of loading a model, in seconds."""
+    pipelined: bool = False
+    # Constructing the model.
+    initialize_s: float = 0.0
+    # Reading the checkpoint, i.e. waiting for the weights iterator.
+    read_s: float = 0.0
+    # Loading the weights into the parameters of the model.
+    load_s: float = 0.0
+    # Processing the weights after loading, overlapped or not.
+    process_s: float = 0.0
+    # Processing the weights once loading is done, i.e. not overlapped.
+    process_after_load_s: float = 0.0
+    total_s: float = 0.0
+
+    def log(self) -> None:
+        logger.info(
+            "Model loading took %.2fs: initialization %.2fs, reading "
+            "%.2fs, loading %.2fs, weight processing %.2fs (%.2fs after "
+            "loading%s).", self.total_s, self.initialize_s, self.read_s,
+            self.load_s, self.process_s, self.process_after_load_s,
+            ", pipelined" if self.pipelined else "")
+
+
+def timed_weights_iterator(
+    weights: Iterable[Tuple[str, torch.Tensor]], stats: ModelLoadingStats
+) -> Generator[Tuple[str, torch.Tensor], None, None]:
+    """Add the time spent waiting for `weights` to `stats.read_s`."""
+    iterator = iter(weights)
+    while True:
+        start = time.perf_counter()
+        try:
+            weight = next(iterator)
+        except StopIteration:
+            stats.read_s += time.perf_counter() - start
+            return
+        stats.read_s += time.perf_counter() - start
+        yield weight
+
+
+def get_modules_to_process(model: nn.Module) -> List[Tuple[str, nn.Module]]:
+    """Return the modules of `model` whose weights are processed after
+    loading, in order."""
+    return [(name, module)
+            for name, module in model.named_modules() if isinstance(
+                getattr(module, "quant_method", None), QuantizeMethodBase)]
+
+
+class WeightProcessingPipeline:
+    """Processes the weights of the modules of a model on a worker thread as
+    the layers of the checkpoint are loaded.
+
+    Usage::
+
+        pipeline = WeightProcessingPipeline(model, names, process_module,
+                                            device, stats)
+        try:
+            model.load_weights(pipeline.wrap(weights))
+        finally:
+            pipeline.stop()
+        pipeline.process_remaining()
+
+    Args:
+        model: The model being loaded.
+        checkpoint_weight_names: The names of all the weights yielded by
+            the weights iterator.
+        process_module: Processes the weights of a module after loading.
+        target_device: The device the model is loaded on.
+        stats: The stats to add the processing time to.
+    """
+
+    def __init__(self, model: nn.Module, checkpoint_weight_names: List[str],
+                 process_module: Callable[[nn.Module], None],
+                 target_device: torch.device, stats: ModelLoadingStats):
+        self.process_module = process_module
+        self.target_device = target_device
+        self.stats = stats
+        self.modules = get_modules_to_process(model)
+
+        # Number of checkpoint tensors of each layer not yet loaded.
+        self._remaining = Counter(
+            get_weight_layer(name) for name in checkpoint_weight_names)
+        self._remaining.pop(None, None)
+        self._layer_modules: Dict[str, List[Tuple[str, nn.Module]]]
+        self._layer_modules = defaultdict(list)
+        for name, module in self.modules:
+            layer = get_weight_layer(name)
+            if layer in self._remaining:
+                self._layer_modules[layer].append((name, module))
+
+        self._loaded: Set[str] = set()
+        self._submitted: Set[str] = set()
+        self._restore_loaders: List[Callable[[], None]] = []
+        for layer_modules in self._layer_modules.values():
+            for name, module in layer_modules:
+                for param in module.parameters():
+                    self._track_weight_loader(name, param)
+
+        self._queue: queue.Queue = queue.Queue(maxsize=_MAX_PENDING_LAYERS)
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._process_layers,
+                                        name="vllm-weight-processing",
+                                        daemon=True)
+        self._thread.start()
+
+    def _track_weight_loader(self, module_name: str,
+                             param: torch.Tensor) -> None:
+        if isinstance(param, BasevLLMParameter):
+            attr = "_weight_loader"
+        else:
+            attr = "weight_loader"
+        had_loader = hasattr(param, attr)
+        original = getattr(param, attr, default_weight_loader)
+
+        @functools.wraps(original)
+        def weight_loader(*args, **kwargs):
+            if module_name in self._submitted:
+                raise RuntimeError(
+                    f"Weights of {module_name} were loaded after the module "
+                    "was processed: the checkpoint is not laid out by layer "
+                    "like the model. Unset VLLM_WEIGHT_LOADING_PIPELINED to "
+                    "load it.")
+            self._loaded.add(module_name)
+            return original(*args, **kwargs)
+
+        setattr(param, attr, weight_loader)
+
+        def restore() -> None:
+            if had_loader:
+                setattr(param, attr, original)
+            else:
+                delattr(param, attr)
+
+        self._restore_loaders.append(restore)
+
+    def wrap(
+        self, weights: Iterable[Tuple[str, torch.Tensor]]
+    ) -> Generator[Tuple[str, torch.Tensor], None, None]:
+        """Yield `weights`, submitting the modules of each layer for
+        processing once all the tensors of the layer are loaded."""
+        for name, weight in weights:
+            yield name, weight
+            # The model asks for the next tensor once it loaded this one.
+            layer = get_weight_layer(name)
+            if layer in self._remaining:
+                self._remaining[layer] -= 1
+                if self._remaining[layer] == 0:
+                    self._submit(layer)
+
+    def _submit(self, layer: str) -> None:
+        # Modules none of whose weights were loaded yet, e.g. because the
+        # model buffers weights, are processed after loading.
+        modules = [(name, module)
+                   for name, module in self._layer_modules.pop(layer, [])
+                   if name in self._loaded]
+        if not modules:
+            return
+        self._submitted.update(name for name, _ in modules)
+        # Blocks while _MAX_PENDING_LAYERS layers wait to be processed.
+        self._queue.put(modules)
+
+    def _process_layers(self) -> None:
+        if self.target_device.type == "cuda":
+            # The current device is per thread. Processing runs on the
+            # default stream of the device, after the copies of the weights.
+            torch.cuda.set_device(self.target_device)
+        while True:
+            modules = self._queue.get()
+            if modules is None:
+                return
+            if self._error is not None:
+                continue
+            start = time.perf_counter()
+            try:
+                for _, module in modules:
+                    self.process_module(module)
+            except BaseException as e:
+                self._error = e
+            self.stats.process_s += time.perf_counter() - start
+
+    def stop(self) -> None:
+        """Wait for the submitted modules to be processed and stop tracking
+        the weight loaders."""
+        start = time.perf_counter()
+        self._queue.put(None)
+        self._thread.join()
+        self.stats.process_after_load_s += time.perf_counter() - start
+        for restore in self._restore_loaders:
+            restore()
+        self._restore_loaders.clear()
+        if self._error is not None:
+            raise self._error
+
+    def process_remaining(self) -> None:
+        """Process the modules that were not processed while loading."""
+        start = time.perf_counter()
+        for name, module in self.modules:
+            if name not in self._submitted:
+                self.process_module(module)
+        elapsed = time.perf_counter() - start
+        self.stats.process_s += elapsed
+        self.stats.process_after_load_s += elapsed
+        logger.debug("Processed %d of %d modules while loading weights.",
+                     len(self._submitted), len(self.modules))
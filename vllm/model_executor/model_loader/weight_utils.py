@@ -1,13 +1,17 @@
 """Utilities for downloading and initializing model weights."""
+import copy
 import fnmatch
 import glob
 import hashlib
 import json
 import os
 import tempfile
-from collections import defaultdict
-from typing import (Any, Callable, Dict, Generator, Iterable, List, Optional,
-                    Tuple, Union)
+import time
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import (Any, Callable, Deque, Dict, Generator, Iterable, List,
+                    NamedTuple, Optional, Tuple, Union)
 
 import filelock
 import gguf
@@ -16,6 +20,7 @@ import numpy as np
 import torch
 from huggingface_hub import HfFileSystem, hf_hub_download, snapshot_download
 from safetensors.torch import load_file, safe_open, save_file
+from torch.utils._pytree import tree_map
 from tqdm.auto import tqdm
 
 from vllm.config import LoadConfig, ModelConfig
@@ -410,6 +415,289 @@ def safetensors_weights_iterator(
                 yield name, param
 
 
+# Data types of the safetensors format.
+_SAFETENSORS_DTYPES: Dict[str, torch.dtype] = {
+    "BOOL": torch.bool,
+    "U8": torch.uint8,
+    "I8": torch.int8,
+    "I16": torch.int16,
+    "I32": torch.int32,
+    "I64": torch.int64,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "F32": torch.float32,
+    "F64": torch.float64,
+    "F8_E4M3": torch.float8_e4m3fn,
+    "F8_E5M2": torch.float8_e5m2,
+}
+
+# Large tensors are read in chunks of this size so that their reads are
+# spread over the thread pool.
+_READ_CHUNK_BYTES = 64 * 1024 * 1024
+
+
+class _SafetensorsEntry(NamedTuple):
+    path: str
+    name: str
+    dtype: torch.dtype
+    shape: List[int]
+    # Absolute offset of the tensor data in the file.
+    offset: int
+    nbytes: int
+
+
+def _read_safetensors_entries(st_file: str) -> List[_SafetensorsEntry]:
+    """Parse the header of a safetensors file without reading its data."""
+    with open(st_file, "rb") as f:
+        header_size = int.from_bytes(f.read(8), "little")
+        header = json.loads(f.read(header_size))
+    header.pop("__metadata__", None)
+    entries = []
+    for name, info in header.items():
+        begin, end = info["data_offsets"]
+        entries.append(
+            _SafetensorsEntry(path=st_file,
+                              name=name,
+                              dtype=_SAFETENSORS_DTYPES[info["dtype"]],
+                              shape=info["shape"],
+                              offset=8 + header_size + begin,
+                              nbytes=end - begin))
+    # Same order as `safe_open(...).keys()`.
+    entries.sort(key=lambda entry: entry.name)
+    return entries
+
+
+def safetensors_weight_names(hf_weights_files: List[str]) -> List[str]:
+    """Return the names of the weights in the model safetensor files, in the
+    order of safetensors_weights_iterator, reading only their headers."""
+    return [
+        entry.name for st_file in hf_weights_files
+        for entry in _read_safetensors_entries(st_file)
+    ]
+
+
+def _read_into(path: str, offset: int, buffer: memoryview) -> None:
+    # File objects release the GIL while reading, so reads issued from
+    # several threads proceed concurrently.
+    with open(path, "rb", buffering=0) as f:
+        f.seek(offset)
+        while buffer:
+            num_read = f.readinto(buffer)
+            if not num_read:
+                raise EOFError(f"Unexpected end of file while reading {path}")
+            buffer = buffer[num_read:]
+
+
+def parallel_safetensors_weights_iterator(
+    hf_weights_files: List[str],
+    num_threads: int,
+    max_inflight_bytes: int,
+) -> Generator[Tuple[str, torch.Tensor], None, None]:
+    """Iterate over the weights in the model safetensor files, reading them
+    ahead on a thread pool.
+
+    Tensors are yielded in the same order as `safetensors_weights_iterator`.
+    Reads are issued ahead of the consumer as long as the tensors that have
+    been read or are being read but not yet yielded stay under
+    `max_inflight_bytes`; a single tensor larger than the budget is still
+    read, alone.
+    """
+    enable_tqdm = not torch.distributed.is_initialized(
+    ) or torch.distributed.get_rank() == 0
+    entries = [
+        entry for st_file in hf_weights_files
+        for entry in _read_safetensors_entries(st_file)
+    ]
+    last_entry_of_file = {entry.path: i for i, entry in enumerate(entries)}
+    total_bytes = sum(entry.nbytes for entry in entries)
+
+    def submit(executor: ThreadPoolExecutor,
+               entry: _SafetensorsEntry) -> Tuple[torch.Tensor, List[Future]]:
+        buffer = torch.empty(entry.nbytes, dtype=torch.uint8)
+        view = memoryview(buffer.numpy())
+        futures = [
+            executor.submit(_read_into, entry.path, entry.offset + start,
+                            view[start:start + _READ_CHUNK_BYTES])
+            for start in range(0, entry.nbytes, _READ_CHUNK_BYTES)
+        ]
+        return buffer, futures
+
+    start_time = time.perf_counter()
+    inflight: Deque[Tuple[torch.Tensor, List[Future]]] = deque()
+    inflight_bytes = 0
+    next_to_submit = 0
+    with ThreadPoolExecutor(max_workers=num_threads,
+                            thread_name_prefix="weight_loader") as executor, \
+            tqdm(total=len(hf_weights_files),
+                 desc="Loading safetensors checkpoint shards",
+                 disable=not enable_tqdm,
+                 bar_format=_BAR_FORMAT) as pbar:
+        for i, entry in enumerate(entries):
+            # Read ahead within the in-flight budget.
+            while next_to_submit < len(entries) and (
+                    not inflight or inflight_bytes +
+                    entries[next_to_submit].nbytes <= max_inflight_bytes):
+                inflight.append(submit(executor, entries[next_to_submit]))
+                inflight_bytes += entries[next_to_submit].nbytes
+                next_to_submit += 1
+
+            buffer, futures = inflight.popleft()
+            try:
+                for future in futures:
+                    future.result()
+            except BaseException:
+                for _, pending in inflight:
+                    for future in pending:
+                        future.cancel()
+                raise
+            inflight_bytes -= entry.nbytes
+            yield entry.name, buffer.view(entry.dtype).reshape(entry.shape)
+            del buffer
+            if last_entry_of_file[entry.path] == i:
+                pbar.update(1)
+
+    elapsed = time.perf_counter() - start_time
+    logger.info(
+        "Loaded %.2f GiB of safetensors weights in %.2f s (%.2f GB/s) "
+        "with %d threads.", total_bytes / (1 << 30), elapsed,
+        total_bytes / elapsed / 1e9 if elapsed > 0 else 0.0, num_threads)
+
+
+@dataclass
+class WeightReadStats:
+    """Bytes of checkpoint data read and available while loading."""
+    bytes_read: int = 0
+    bytes_total: int = 0
+
+
+class LazyWeightSlice:
+    """A checkpoint tensor whose data is only read when it is used.
+
+    Weight loaders select the shard of a tensor that the current rank needs
+    with `narrow` (see e.g. `ColumnParallelLinear.weight_loader`). Narrowing
+    a lazy weight only records the selected range; the data is read from the
+    safetensors file when the weight is first used like a tensor, e.g. in
+    `param.data.copy_(loaded_weight)`, and only the selected range is read.
+    Any other tensor method or torch function reads the selected range and
+    forwards to the resulting tensor, so lazy weights can be passed to
+    weight loaders that are not aware of them.
+    """
+
+    def __init__(self,
+                 handle: Any,
+                 name: str,
+                 stats: Optional[WeightReadStats] = None):
+        self._handle = handle
+        self._name = name
+        self._stats = stats
+        self._tensor: Optional[torch.Tensor] = None
+        safe_slice = handle.get_slice(name)
+        self.dtype = _SAFETENSORS_DTYPES[safe_slice.get_dtype()]
+        # Selected [start, stop) range of each dimension.
+        self._ranges = [(0, size) for size in safe_slice.get_shape()]
+
+    @property
+    def shape(self) -> torch.Size:
+        return torch.Size(stop - start for start, stop in self._ranges)
+
+    @property
+    def ndim(self) -> int:
+        return len(self._ranges)
+
+    def dim(self) -> int:
+        return self.ndim
+
+    def size(self, dim: Optional[int] = None):
+        return self.shape if dim is None else self.shape[dim]
+
+    def numel(self) -> int:
+        return self.shape.numel()
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __repr__(self) -> str:
+        return (f"LazyWeightSlice(name={self._name!r}, "
+                f"shape={tuple(self.shape)}, dtype={self.dtype})")
+
+    def narrow(self, dim: int, start: int, length: int) -> "LazyWeightSlice":
+        dim = dim % self.ndim
+        size = self.shape[dim]
+        if start < 0:
+            start += size
+        if start < 0 or length < 0 or start + length > size:
+            raise IndexError(
+                f"narrow({dim}, {start}, {length}) is out of "
+                f"range for a tensor of shape {tuple(self.shape)}")
+        narrowed = copy.copy(self)
+        narrowed._tensor = None
+        narrowed._ranges = list(self._ranges)
+        begin = self._ranges[dim][0] + start
+        narrowed._ranges[dim] = (begin, begin + length)
+        return narrowed
+
+    def materialize(self) -> torch.Tensor:
+        """Read the selected range of the tensor from the checkpoint."""
+        if self._tensor is None:
+            index = tuple(slice(start, stop) for start, stop in self._ranges)
+            tensor = self._handle.get_slice(self._name)[index]
+            # Reading a scalar returns a tensor of the right shape already.
+            self._tensor = tensor.reshape(self.shape)
+            if self._stats is not None:
+                self._stats.bytes_read += (self._tensor.numel() *
+                                           self._tensor.element_size())
+        return self._tensor
+
+    def __getitem__(self, key: Any) -> Any:
+        return self.materialize()[key]
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.materialize(), name)
+
+    @classmethod
+    def __torch_function__(cls, func, types, args=(), kwargs=None):
+
+        def unwrap(x):
+            return x.materialize() if isinstance(x, LazyWeightSlice) else x
+
+        args = tree_map(unwrap, args)
+        kwargs = tree_map(unwrap, kwargs or {})
+        return func(*args, **kwargs)
+
+
+def lazy_safetensors_weights_iterator(
+    hf_weights_files: List[str],
+    stats: Optional[WeightReadStats] = None,
+) -> Generator[Tuple[str, LazyWeightSlice], None, None]:
+    """Iterate over the weights in the model safetensor files without
+    reading them.
+
+    Each weight is yielded as a `LazyWeightSlice`, so that tensor parallel
+    ranks only read the shard of each tensor that they load.
+    """
+    enable_tqdm = not torch.distributed.is_initialized(
+    ) or torch.distributed.get_rank() == 0
+    if stats is None:
+        stats = WeightReadStats()
+    for st_file in tqdm(
+            hf_weights_files,
+            desc="Loading safetensors checkpoint shards",
+            disable=not enable_tqdm,
+            bar_format=_BAR_FORMAT,
+    ):
+        stats.bytes_total += sum(
+            entry.nbytes for entry in _read_safetensors_entries(st_file))
+        # Not closed explicitly: lazy weights keep the file open until
+        # they are dropped.
+        handle = safe_open(st_file, framework="pt")
+        for name in handle.keys():  # noqa: SIM118
+            yield name, LazyWeightSlice(handle, name, stats=stats)
+    logger.info("Read %.2f GiB of the %.2f GiB safetensors checkpoint.",
+                stats.bytes_read / (1 << 30), stats.bytes_total / (1 << 30))
+
+
 def pt_weights_iterator(
     hf_weights_files: List[str]
 ) -> Generator[Tuple[str, torch.Tensor], None, None]:
@@ -1,14 +1,11 @@
-from array import array
 from dataclasses import dataclass
 from typing import Dict, List, Optional, Tuple
 
 import torch
 
 from vllm.sampling_params import SamplingParams, SamplingType
-from vllm.sequence import (VLLM_TOKEN_ID_ARRAY_TYPE, SequenceData,
-                           SequenceGroupMetadata)
-from vllm.utils import (PyObjectCache, async_tensor_h2d,
-                        is_pin_memory_available, make_tensor_with_pad)
+from vllm.sequence import SequenceData, SequenceGroupMetadata
+from vllm.utils import PyObjectCache, async_tensor_h2d, is_pin_memory_available
 
 _SAMPLING_EPS = 1e-5
 
@@ -372,8 +369,6 @@ class SamplingTensors:
     presence_penalties: torch.Tensor
     frequency_penalties: torch.Tensor
     repetition_penalties: torch.Tensor
-    prompt_tokens: torch.Tensor
-    output_tokens: torch.Tensor
 
     @classmethod
     def from_sampling_metadata(
@@ -383,8 +378,6 @@ class SamplingTensors:
         device: torch.device,
         dtype: torch.dtype,
     ) -> Tuple["SamplingTensors", bool, bool, bool]:
-        prompt_tokens: List[array] = []
-        output_tokens: List[array] = []
         top_ks: List[int] = []
         temperatures: List[float] = []
         top_ps: List[float] = []
@@ -451,25 +444,6 @@ class SamplingTensors:
                 frequency_penalties += [f] * sample_lens
                 repetition_penalties += [r] * sample_lens
 
-        if do_penalties:
-            for seq_group in sampling_metadata.seq_groups:
-                seq_ids = seq_group.seq_ids
-                sampling_params = seq_group.sampling_params
-                if (seq_group.is_prompt
-                        and sampling_params.prompt_logprobs is not None):
-                    prefill_len = len(seq_group.prompt_logprob_indices)
-                    prompt_tokens.extend(
-                        array(VLLM_TOKEN_ID_ARRAY_TYPE)
-                        for _ in range(prefill_len))
-                    output_tokens.extend(
-                        array(VLLM_TOKEN_ID_ARRAY_TYPE)
-                        for _ in range(prefill_len))
-                if seq_group.do_sample:
-                    for seq_id in seq_ids:
-                        seq_data = seq_group.seq_data[seq_id]
-                        prompt_tokens.append(seq_data.prompt_token_ids_array)
-                        output_tokens.append(seq_data.output_token_ids_array)
-
         sampling_tensors = SamplingTensors.from_lists(
             temperatures,
             top_ps,
@@ -478,9 +452,6 @@ class SamplingTensors:
             presence_penalties,
             frequency_penalties,
             repetition_penalties,
-            prompt_tokens,
-            output_tokens,
-            vocab_size,
             device,
             dtype,
         )
@@ -496,9 +467,6 @@ class SamplingTensors:
         presence_penalties: List[float],
         frequency_penalties: List[float],
         repetition_penalties: List[float],
-        prompt_tokens: List[array],
-        output_tokens: List[array],
-        vocab_size: int,
         device: torch.device,
         dtype: torch.dtype,
     ) -> "SamplingTensors":
@@ -506,28 +474,6 @@ class SamplingTensors:
         # pinned memory.
         pin_memory = is_pin_memory_available()
 
-        do_penalties = prompt_tokens or output_tokens
-
-        if do_penalties:
-            prompt_t = make_tensor_with_pad(
-                prompt_tokens,
-                vocab_size,
-                device="cpu",
-                dtype=torch.int64,
-                pin_memory=pin_memory,
-            )
-            output_t = make_tensor_with_pad(
-                output_tokens,
-                vocab_size,
-                device="cpu",
-                dtype=torch.int64,
-                pin_memory=pin_memory,
-            )
-        else:
-            empty_tensor = torch.empty(0, device=device, dtype=torch.long)
-            prompt_t = empty_tensor
-            output_t = empty_tensor
-
         temperatures_t = torch.tensor(
             temperatures,
             device="cpu",
@@ -584,6 +530,4 @@ class SamplingTensors:
                                                          non_blocking=True),
             repetition_penalties=repetition_penalties_t.to(device=device,
                                                            non_blocking=True),
-            prompt_tokens=prompt_t.to(device=device, non_blocking=True),
-            output_tokens=output_t.to(device=device, non_blocking=True),
         )
@@ -1,12 +1,14 @@
 import base64
 import os
+import pickle
 from functools import lru_cache
 from io import BytesIO
-from typing import Any, List, Optional, Tuple, TypeVar, Union
+from typing import Any, Dict, List, Optional, Tuple, TypeVar, Union
 
 import numpy as np
 import numpy.typing as npt
 import torch
+from blake3 import blake3
 from PIL import Image
 
 import vllm.envs as envs
@@ -545,3 +547,48 @@ def consecutive_placeholder_ranges(
         PlaceholderRange(offset=initial_offset + i * item_size,
                          length=item_size) for i in range(num_items)
     ]
+
+
+def _update_multi_modal_hash(hasher: blake3, item: object) -> None:
+    if isinstance(item, Image.Image):
+        hasher.update(f"image:{item.mode}:{item.size}:".encode())
+        hasher.update(item.tobytes())
+    elif isinstance(item, torch.Tensor):
+        item = item.detach().cpu().contiguous()
+        hasher.update(f"tensor:{item.dtype}:{tuple(item.shape)}:".encode())
+        hasher.update(item.flatten().view(torch.uint8).numpy().tobytes())
+    elif isinstance(item, np.ndarray):
+        hasher.update(f"ndarray:{item.dtype}:{item.shape}:".encode())
+        hasher.update(np.ascontiguousarray(item).tobytes())
+    elif isinstance(item, (list, tuple)):
+        hasher.update(f"{type(item).__name__}:{len(item)}:".encode())
+        for sub_item in item:
+            _update_multi_modal_hash(hasher, sub_item)
+    elif isinstance(item, dict):
+        hasher.update(f"dict:{len(item)}:".encode())
+        for key in sorted(item, key=str):
+            hasher.update(f"{key}=".encode())
+            _update_multi_modal_hash(hasher, item[key])
+    elif isinstance(item, (str, bytes, int, float, bool, type(None))):
+        hasher.update(f"{type(item).__name__}:{item!r};".encode())
+    else:
+        hasher.update(f"{type(item).__name__}:".encode())
+        hasher.update(pickle.dumps(item))
+
+
+def hash_multi_modal_data(
+        mm_data: MultiModalDataDict,
+        mm_processor_kwargs: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Returns a stable 64-bit hash of the contents of the multi-modal data of a
+    prompt and of the processor arguments applied to it.
+
+    The placeholder tokens of different images, audios or videos are the
+    same, so the contents of the multi-modal data have to be part of the
+    hash of the blocks of a prompt for prefix caching. The hash is the same
+    in every process for the same data.
+    """
+    hasher = blake3()
+    _update_multi_modal_hash(hasher, mm_data)
+    _update_multi_modal_hash(hasher, mm_processor_kwargs or {})
+    return int.from_bytes(hasher.digest()[:8], "little")
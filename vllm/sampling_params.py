@@ -165,6 +165,16 @@ class SamplingParams(
         allowed_token_ids: If provided, the engine will construct a logits
             processor which only retains scores for the given token ids.
             Defaults to None.
+        ttft_slo_ms: The time to first token in milliseconds within which
+            the request must get its first token. With the "deadline"
+            scheduling policy, requests are scheduled by earliest deadline
+            and are aborted once their first token cannot be on time.
+            Defaults to None.
+        tpot_slo_ms: The time per output token in milliseconds after the
+            first token within which the request must get its next tokens.
+            With the "deadline" scheduling policy, running requests are
+            scheduled and preempted by the deadline of their next token.
+            Defaults to None.
     """
 
     n: int = 1
@@ -209,6 +219,10 @@ class SamplingParams(
     logit_bias: Optional[Dict[int, float]] = None
     allowed_token_ids: Optional[List[int]] = None
 
+    # Latency SLOs used by the "deadline" scheduling policy
+    ttft_slo_ms: Optional[float] = None
+    tpot_slo_ms: Optional[float] = None
+
     @staticmethod
     def from_optional(
         n: Optional[int] = 1,
@@ -240,6 +254,8 @@ class SamplingParams(
         guided_decoding: Optional[GuidedDecodingParams] = None,
         logit_bias: Optional[Union[Dict[int, float], Dict[str, float]]] = None,
         allowed_token_ids: Optional[List[int]] = None,
+        ttft_slo_ms: Optional[float] = None,
+        tpot_slo_ms: Optional[float] = None,
     ) -> "SamplingParams":
         if logit_bias is not None:
             logit_bias = {
@@ -279,6 +295,8 @@ class SamplingParams(
             guided_decoding=guided_decoding,
             logit_bias=logit_bias,
             allowed_token_ids=allowed_token_ids,
+            ttft_slo_ms=ttft_slo_ms,
+            tpot_slo_ms=tpot_slo_ms,
         )
 
     def __post_init__(self) -> None:
@@ -405,6 +423,12 @@ class SamplingParams(
         if self.best_of != self._real_n and self.output_kind == (
                 RequestOutputKind.DELTA):
             raise ValueError("best_of must equal n to use output_kind=DELTA")
+        if self.ttft_slo_ms is not None and self.ttft_slo_ms <= 0:
+            raise ValueError(
+                f"ttft_slo_ms must be positive, got {self.ttft_slo_ms}.")
+        if self.tpot_slo_ms is not None and self.tpot_slo_ms <= 0:
+            raise ValueError(
+                f"tpot_slo_ms must be positive, got {self.tpot_slo_ms}.")
 
     def _verify_greedy_sampling(self) -> None:
         if self.n > 1:
@@ -487,7 +511,9 @@ class SamplingParams(
             "spaces_between_special_tokens="
             f"{self.spaces_between_special_tokens}, "
             f"truncate_prompt_tokens={self.truncate_prompt_tokens}, "
-            f"guided_decoding={self.guided_decoding})")
+            f"guided_decoding={self.guided_decoding}, "
+            f"ttft_slo_ms={self.ttft_slo_ms}, "
+            f"tpot_slo_ms={self.tpot_slo_ms})")
 
 
 class BeamSearchParams(
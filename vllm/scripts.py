@@ -63,6 +63,32 @@ def interactive_cli(args: argparse.Namespace) -> None:
         chat(args.system_prompt, model_name, openai_client)
 
 
+def convert_checkpoint(args: argparse.Namespace) -> None:
+    # Imported lazily, as creating an engine is only needed by this command.
+    import dataclasses
+
+    from vllm import LLM
+    from vllm.config import LoadFormat
+    from vllm.engine.snapshot import save_engine_image, save_engine_snapshot
+
+    args.model = args.model_tag
+    engine_args = EngineArgs.from_cli_args(args)
+    if engine_args.enable_lora:
+        raise ValueError("Converting with enable_lora=True is not supported.")
+    if engine_args.load_format == LoadFormat.ENGINE_IMAGE:
+        raise ValueError("The model is already an engine image.")
+
+    llm = LLM(**dataclasses.asdict(engine_args))
+    if args.snapshot:
+        save_engine_snapshot(llm.llm_engine, args.output, args.model_tag)
+    else:
+        save_engine_image(llm.llm_engine, args.output, args.model_tag)
+    print(f"Saved engine {'snapshot' if args.snapshot else 'image'} of "
+          f"{args.model_tag} to {args.output}. Load it with `--load-format "
+          f"{LoadFormat.ENGINE_IMAGE.value}` and the same parallel and "
+          "quantization configuration.")
+
+
 def complete(model_name: str, client: OpenAI) -> None:
     print("Please enter prompt to complete:")
     while True:
@@ -192,6 +218,30 @@ def main():
               "used for models that support system prompts."))
     chat_parser.set_defaults(dispatch_function=interactive_cli, command="chat")
 
+    convert_parser = subparsers.add_parser(
+        "convert-checkpoint",
+        help=("Convert a model into a vLLM engine image: weights that are "
+              "pre-sharded and pre-processed for the given configuration "
+              "and load with `--load-format engine_image`"),
+        usage="vllm convert-checkpoint <model_tag> --output <dir> [options]")
+    convert_parser.add_argument("model_tag",
+                                type=str,
+                                help="The model tag to convert")
+    convert_parser.add_argument("--output",
+                                "-o",
+                                type=str,
+                                required=True,
+                                help="Directory of the engine image")
+    convert_parser.add_argument(
+        "--snapshot",
+        action="store_true",
+        help=("Save a snapshot of the initialized engine: in addition to "
+              "the weights, save the torch.compile cache, the profiled "
+              "number of KV cache blocks and the tokenizer, so that engines "
+              "started from the image skip compilation and profiling"))
+    convert_parser = EngineArgs.add_cli_args(convert_parser)
+    convert_parser.set_defaults(dispatch_function=convert_checkpoint)
+
     args = parser.parse_args()
     if args.subparser == "serve":
         validate_parsed_serve_args(args)
@@ -383,6 +383,53 @@ class SequenceData(msgspec.Struct,
                 f"get_num_computed_tokens={self.get_num_computed_tokens()}")
 
 
+def compute_extra_hash(
+    inputs: SingletonInputs,
+    lora_request: Optional[LoRARequest] = None,
+    prompt_adapter_request: Optional[PromptAdapterRequest] = None,
+    lora_fingerprint: Optional[int] = None,
+) -> Optional[int]:
+    """
+    Computes the extra hash of a sequence for prefix caching: the hash of the
+    factors other than the token ids that its KV cache depends on.
+
+    LoRA adapters are identified by the fingerprint of their weights rather
+    than by their ids, so that sequences of adapters with different ids but
+    the same weights share cached blocks, and the hash does not change when
+    the adapters get new ids, e.g. after a restart. Multi-modal data is
+    identified by its contents. All the factors are stable across processes.
+
+    Hashing the adapter weights and multi-modal data may be slow, so this is
+    called once per request, and only when prefix caching is enabled. The
+    fingerprint of the adapter may be passed by callers that computed it
+    before the request reaches the engine loop.
+    """
+    from vllm.lora.utils import get_adapter_fingerprint
+    from vllm.multimodal.utils import hash_multi_modal_data
+
+    inputs_adapter = SingletonInputsAdapter(inputs)
+    prompt_adapter_id = (prompt_adapter_request.prompt_adapter_id
+                         if prompt_adapter_request else 0)
+    if lora_request is None:
+        lora_fingerprint = 0
+    elif lora_fingerprint is None:
+        lora_fingerprint = get_adapter_fingerprint(lora_request.lora_path)
+    mm_hash = 0
+    if inputs_adapter.multi_modal_data:
+        mm_hash = hash_multi_modal_data(inputs_adapter.multi_modal_data,
+                                        inputs_adapter.mm_processor_kwargs)
+    if prompt_adapter_id == 0 and lora_fingerprint == 0 and mm_hash == 0:
+        return None
+
+    # NOTE: If there are additional factors influencing the block aside from
+    # token_ids, include them as input parameters to the hash.
+    # Only ints are hashed, as the hashes of strings differ across processes.
+    long_lora_max_len = (lora_request.long_lora_max_len
+                         if lora_request else None)
+    return hash((prompt_adapter_id, lora_fingerprint, long_lora_max_len
+                 or 0, mm_hash))
+
+
 class Sequence:
     """Stores the data, status, and block information of a sequence.
 
@@ -398,6 +445,9 @@ class Sequence:
         eos_token_id: The end-of-sequence (EOS) token id recognized by this LLM.
         lora_request: LoRA request.
         prompt_adapter_request: Prompt Adapter request.
+        extra_hash: The hash of the factors other than the token ids that the
+            KV cache of the sequence depends on, from
+            :func:`compute_extra_hash`. Only used for prefix caching.
     """
 
     def __init__(
@@ -408,6 +458,7 @@ class Sequence:
         eos_token_id: Optional[int] = None,
         lora_request: Optional[LoRARequest] = None,
         prompt_adapter_request: Optional[PromptAdapterRequest] = None,
+        extra_hash: Optional[int] = None,
     ) -> None:
         self.seq_id = seq_id
         self.inputs = SingletonInputsAdapter(inputs)
@@ -433,6 +484,8 @@ class Sequence:
         # Input + output tokens
         self.tokens: Optional[List[str]] = None
 
+        self._extra_hash = extra_hash
+
     @property
     def n_blocks(self) -> int:
         return (self.get_len() + self.block_size - 1) // self.block_size
@@ -525,20 +578,19 @@ class Sequence:
         # this in the future.
         num_tokens = self.num_hashed_tokens_of_block(logical_idx)
         hashed_tokens = self.data.get_prefix_token_ids(num_tokens)
-        return hash((hashed_tokens, self.lora_int_id))
+        return hash((hashed_tokens, self.extra_hash()))
 
     def extra_hash(self) -> Optional[int]:
         """
-        This function computes an extra hash for a sequence, specifically
+        This function returns the extra hash of a sequence, specifically
         designed for prefix caching mode. The final sequence hash is determined
         by applying token_ids from the sequence's blocks.
-        """
-        if self.prompt_adapter_id == 0 and self.lora_int_id == 0:
-            return None
 
-        # NOTE: If there are additional factors influencing the block aside from
-        # token_ids, include them as input parameters to the hash.
-        return hash((self.prompt_adapter_id, self.lora_int_id))
+        The extra hash is computed once, when the request is added, by
+        :func:`compute_extra_hash`, as it may hash adapter weights and
+        multi-modal data.
+        """
+        return self._extra_hash
 
     def num_hashed_tokens_of_block(self, logical_idx: int):
         return logical_idx * self.block_size + self.block_size
@@ -1272,6 +1324,10 @@ class ExecuteModelRequest(
     finished_requests_ids: List[str] = msgspec.field(default_factory=list)
     # The last sampled token ids for multi step decoding.
     last_sampled_token_ids: Optional[torch.Tensor] = None
+    # LoRAs of requests expected to be scheduled soon, to load in the
+    # background.
+    prefetch_lora_requests: List[LoRARequest] = msgspec.field(
+        default_factory=list)
     # Async callback
     async_callback: Optional[Callable] = None
 
@@ -1320,6 +1376,7 @@ class ExecuteModelRequest(
             finished_requests_ids=self.finished_requests_ids,
             last_sampled_token_ids=self.last_sampled_token_ids.clone()
             if self.last_sampled_token_ids is not None else None,
+            prefetch_lora_requests=self.prefetch_lora_requests,
             async_callback=self.async_callback)
 
 
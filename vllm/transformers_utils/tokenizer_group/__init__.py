@@ -5,6 +5,7 @@ from vllm.config import (LoRAConfig, ModelConfig, ParallelConfig,
 from vllm.executor.ray_utils import ray
 
 from .base_tokenizer_group import AnyTokenizer, BaseTokenizerGroup
+from .process_tokenizer_group import ProcessPoolTokenizerGroup
 from .tokenizer_group import TokenizerGroup
 
 if ray:
@@ -49,6 +50,8 @@ def get_tokenizer_group(tokenizer_pool_config: Optional[TokenizerPoolConfig],
                 "RayTokenizerGroupPool is not available. Please install "
                 "the ray package to use the Ray tokenizer group pool.")
         tokenizer_cls = RayTokenizerGroupPool
+    elif tokenizer_pool_config.pool_type == "process":
+        tokenizer_cls = ProcessPoolTokenizerGroup
     else:
         raise ValueError(
             f"Unknown pool type: {tokenizer_pool_config.pool_type}")
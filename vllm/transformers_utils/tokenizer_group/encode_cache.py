@@ -0,0 +1,257 @@
+"""Cache of the token ids of the prompts encoded by a tokenizer group.
+
+The token ids of each prompt are cached, so that prompts sent again are not
+tokenized again. Prompts often also start with the same text, such as a
+system prompt followed by few-shot examples. The heads of the prompts are
+counted at lengths that are powers of two, and once a head has been seen in
+`min_prefix_count` prompts, the longest common prefix of these prompts is
+registered and tokenized. The prompts that start with a registered prefix
+then only have the text after it tokenized.
+
+The tokens at the end of a prefix can depend on the text after it, e.g.
+"token" followed by "s" is tokenized differently than "token" followed by
+" s". The prefix is therefore cut after its last token whose tokenization
+does not change when the prefix is followed by various probe texts, and the
+text after the cut is tokenized with the rest of the prompt. Prefixes are
+only reused for fast tokenizers, which return the character offsets of the
+tokens, and whose special tokens are added around the token ids of the
+text.
+"""
+import threading
+import weakref
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, MutableMapping, Optional, Tuple
+
+from transformers import PreTrainedTokenizerFast
+
+from vllm.logger import init_logger
+from vllm.transformers_utils.tokenizer import AnyTokenizer
+
+logger = init_logger(__name__)
+
+# The prompt heads are counted at these lengths (in characters) and above,
+# doubling each time.
+_MIN_HEAD_LEN = 64
+_MAX_TRACKED_HEADS = 4096
+_MAX_PREFIXES = 64
+# The texts that follow a prefix to find a safe cut. They start with the
+# kinds of characters that pre-tokenizers split on differently.
+_PROBE_SUFFIXES = ("s", "S", " the", "  x", "\n\nQ", "\t", "1", ".", "'s", "é",
+                   "中")
+# Number of tokens at the end of a prefix among which a cut is searched.
+_MAX_CUT_BACKOFF = 16
+
+
+@dataclass
+class _Prefix:
+    text: str
+    # The token ids of the text before the cut, without special tokens.
+    token_ids: List[int]
+    # The offset of the cut in the text.
+    cut: int
+
+
+class _TokenizerEncodeCache:
+    """The cached prompts and prefixes of a tokenizer."""
+
+    def __init__(self, tokenizer: AnyTokenizer):
+        self.prompts: OrderedDict[str, array] = OrderedDict()
+        # The number of prompts with each head, and the last of them.
+        self.heads: OrderedDict[int, Tuple[int, str]] = OrderedDict()
+        # The registered prefixes by the hash of their longest counted head.
+        # None for the prefixes which cannot be cut safely.
+        self.prefixes: OrderedDict[int,
+                                   Dict[str,
+                                        Optional[_Prefix]]] = OrderedDict()
+        self.special_tokens = (self._get_special_tokens(tokenizer) if
+                               isinstance(tokenizer,
+                                          PreTrainedTokenizerFast) else None)
+
+    @staticmethod
+    def _get_special_tokens(
+        tokenizer: PreTrainedTokenizerFast
+    ) -> Optional[Tuple[List[int], List[int]]]:
+        """The token ids added before and after the token ids of a text, if
+        they do not depend on the text."""
+        special_tokens = None
+        for text in ("Hello world", "x"):
+            token_ids = tokenizer.encode(text)
+            text_token_ids = tokenizer.encode(text, add_special_tokens=False)
+            for start in range(len(token_ids) - len(text_token_ids) + 1):
+                if token_ids[start:start +
+                             len(text_token_ids)] == text_token_ids:
+                    break
+            else:
+                return None
+            found = (token_ids[:start],
+                     token_ids[start + len(text_token_ids):])
+            if special_tokens is not None and found != special_tokens:
+                return None
+            special_tokens = found
+        return special_tokens
+
+
+def _common_prefix_len(a: str, b: str) -> int:
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a.startswith(b[:mid]):
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+class EncodeCache:
+    """LRU cache of the token ids of the prompts encoded with each tokenizer,
+    which also tokenizes only the text after the common prefixes of the
+    prompts.
+
+    Args:
+        max_prompts: The maximum number of prompts cached for each tokenizer.
+        min_prefix_count: The number of prompts that must start with the
+            same text for it to be registered as a prefix.
+    """
+
+    def __init__(self, max_prompts: int, min_prefix_count: int = 2):
+        self.max_prompts = max_prompts
+        self.min_prefix_count = min_prefix_count
+        # Each LoRA tokenizer has its own cache, which is dropped with it.
+        self._caches: MutableMapping[
+            AnyTokenizer, _TokenizerEncodeCache] = weakref.WeakKeyDictionary()
+        # encode is called from the engine and from the tokenizer threads of
+        # the API server.
+        self._lock = threading.Lock()
+
+        self.num_queries = 0
+        self.num_hits = 0
+        self.num_prefix_hits = 0
+        self.num_prefix_tokens = 0
+
+    @property
+    def hit_rate(self) -> float:
+        return self.num_hits / self.num_queries if self.num_queries else 0.0
+
+    @property
+    def prefix_hit_rate(self) -> float:
+        return (self.num_prefix_hits /
+                self.num_queries if self.num_queries else 0.0)
+
+    def _get_cache(self, tokenizer: AnyTokenizer) -> _TokenizerEncodeCache:
+        cache = self._caches.get(tokenizer)
+        if cache is None:
+            cache = self._caches[tokenizer] = _TokenizerEncodeCache(tokenizer)
+        return cache
+
+    def encode(self, tokenizer: AnyTokenizer, prompt: str) -> List[int]:
+        """Return `tokenizer.encode(prompt)`."""
+        head_lens = []
+        head_len = _MIN_HEAD_LEN
+        while head_len < len(prompt):
+            head_lens.append(head_len)
+            head_len *= 2
+        head_hashes = [hash(prompt[:head_len]) for head_len in head_lens]
+
+        with self._lock:
+            self.num_queries += 1
+            cache = self._get_cache(tokenizer)
+            cached = cache.prompts.get(prompt)
+            if cached is not None:
+                cache.prompts.move_to_end(prompt)
+                self.num_hits += 1
+                return cached.tolist()
+            prefix = self._find_prefix(cache, prompt, head_hashes)
+
+        if prefix is not None and cache.special_tokens is not None:
+            before, after = cache.special_tokens
+            token_ids = before + prefix.token_ids
+            token_ids.extend(
+                tokenizer.encode(prompt[prefix.cut:],
+                                 add_special_tokens=False))
+            token_ids.extend(after)
+        else:
+            token_ids = tokenizer.encode(prompt)
+
+        with self._lock:
+            if prefix is not None:
+                self.num_prefix_hits += 1
+                self.num_prefix_tokens += len(prefix.token_ids)
+            cache.prompts[prompt] = array("q", token_ids)
+            while len(cache.prompts) > self.max_prompts:
+                cache.prompts.popitem(last=False)
+            new_prefix = (
+                None if prefix is not None or cache.special_tokens is None else
+                self._count_heads(cache, prompt, head_lens, head_hashes))
+
+        if new_prefix is not None:
+            self._register_prefix(tokenizer, cache, *new_prefix)
+        return token_ids
+
+    def _find_prefix(self, cache: _TokenizerEncodeCache, prompt: str,
+                     head_hashes: List[int]) -> Optional[_Prefix]:
+        for head_hash in reversed(head_hashes):
+            prefixes = cache.prefixes.get(head_hash)
+            if prefixes is None:
+                continue
+            for text, prefix in prefixes.items():
+                if (prefix is not None and len(text) < len(prompt)
+                        and prompt.startswith(text)):
+                    cache.prefixes.move_to_end(head_hash)
+                    return prefix
+        return None
+
+    def _count_heads(self, cache: _TokenizerEncodeCache, prompt: str,
+                     head_lens: List[int],
+                     head_hashes: List[int]) -> Optional[Tuple[int, str]]:
+        """Count the heads of a prompt, and return the hash of the longest
+        counted head and the common prefix to register, if any."""
+        new_prefix = None
+        for head_len, head_hash in reversed(list(zip(head_lens, head_hashes))):
+            count, last_prompt = cache.heads.pop(head_hash, (0, ""))
+            cache.heads[head_hash] = (count + 1, prompt)
+            if (new_prefix is None and count + 1 >= self.min_prefix_count
+                    and last_prompt.startswith(prompt[:head_len])):
+                prefix_len = _common_prefix_len(prompt, last_prompt)
+                prefix_text = prompt[:prefix_len]
+                if prefix_text not in cache.prefixes.get(head_hash, {}):
+                    new_prefix = (head_hash, prefix_text)
+        while len(cache.heads) > _MAX_TRACKED_HEADS:
+            cache.heads.popitem(last=False)
+        return new_prefix
+
+    def _register_prefix(self, tokenizer: AnyTokenizer,
+                         cache: _TokenizerEncodeCache, head_hash: int,
+                         text: str) -> None:
+        encoded = tokenizer(text,
+                            add_special_tokens=False,
+                            return_offsets_mapping=True)
+        token_ids: List[int] = encoded.input_ids
+        offsets: List[Tuple[int, int]] = encoded.offset_mapping
+        probes = [
+            tokenizer.encode(text + suffix, add_special_tokens=False)
+            for suffix in _PROBE_SUFFIXES
+        ]
+
+        prefix = None
+        for num_tokens in range(
+                len(token_ids) - 1, max(len(token_ids) - _MAX_CUT_BACKOFF, 0),
+                -1):
+            cut = offsets[num_tokens - 1][1]
+            if all(probe[:num_tokens] == token_ids[:num_tokens]
+                   and probe[num_tokens:] == tokenizer.encode(
+                       text[cut:] + suffix, add_special_tokens=False)
+                   for probe, suffix in zip(probes, _PROBE_SUFFIXES)):
+                prefix = _Prefix(text, token_ids[:num_tokens], cut)
+                break
+        if prefix is None:
+            logger.debug(
+                "No safe cut found in a common prompt prefix of %d "
+                "characters.", len(text))
+
+        with self._lock:
+            cache.prefixes.setdefault(head_hash, {})[text] = prefix
+            cache.prefixes.move_to_end(head_hash)
+            while len(cache.prefixes) > _MAX_PREFIXES:
+                cache.prefixes.popitem(last=False)
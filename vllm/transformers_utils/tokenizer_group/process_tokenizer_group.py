@@ -0,0 +1,465 @@
+import asyncio
+import contextlib
+import os
+import pickle
+import weakref
+from array import array
+from multiprocessing import shared_memory
+from multiprocessing.connection import Connection
+from typing import Any, Dict, List, NoReturn, Optional, Set, Type
+from unittest.mock import patch
+
+from vllm.config import TokenizerPoolConfig
+from vllm.executor.multiproc_worker_utils import get_mp_context
+from vllm.logger import init_logger
+from vllm.lora.request import LoRARequest
+from vllm.transformers_utils.tokenizer import AnyTokenizer
+
+from .base_tokenizer_group import BaseTokenizerGroup
+from .tokenizer_group import TokenizerGroup
+
+logger = init_logger(__name__)
+
+# Size of the shared memory of each worker, through which the token ids of
+# long prompts are returned. The token ids that do not fit are pickled.
+_DEFAULT_SHM_BYTES = 8 << 20
+# The token ids of shorter prompts are pickled, which is as fast.
+_MIN_SHM_TOKENS = 1024
+_TOKEN_ID_TYPECODE = "q"
+_TOKEN_ID_BYTES = array(_TOKEN_ID_TYPECODE).itemsize
+_WORKER_INIT_TIMEOUT_S = 300
+_PARENT_CHECK_INTERVAL_S = 1
+
+
+class WorkerDiedError(RuntimeError):
+    pass
+
+
+def _run_worker(worker_cls: Type[TokenizerGroup], tokenizer_config: Dict[str,
+                                                                         Any],
+                conn: Connection, shm_name: str) -> None:
+    # fix to https://stackoverflow.com/q/62748654/9191338
+    # The shared memory is created and unlinked by the pool, and must not be
+    # tracked by the worker.
+    with patch("multiprocessing.resource_tracker.register",
+               lambda *args, **kwargs: None):
+        shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        tokenizer_group = worker_cls(**tokenizer_config)
+    except Exception as e:
+        conn.send(("error", e))
+        return
+    conn.send(("ready", None))
+
+    max_shm_tokens = shm.size // _TOKEN_ID_BYTES
+    parent_pid = os.getppid()
+    while True:
+        try:
+            # The pipe is not closed when the pool dies if other workers
+            # forked from it hold its end.
+            while not conn.poll(_PARENT_CHECK_INTERVAL_S):
+                if os.getppid() != parent_pid:
+                    return
+            kwargs = conn.recv()
+        except EOFError:
+            # The pool is gone.
+            break
+        if kwargs is None:
+            break
+        try:
+            token_ids = tokenizer_group.encode(**kwargs)
+        except Exception as e:
+            try:
+                conn.send(("error", e))
+            except (pickle.PicklingError, TypeError, AttributeError):
+                conn.send(("error", RuntimeError(repr(e))))
+            continue
+        if _MIN_SHM_TOKENS <= len(token_ids) <= max_shm_tokens:
+            num_bytes = len(token_ids) * _TOKEN_ID_BYTES
+            shm.buf[:num_bytes] = memoryview(
+                array(_TOKEN_ID_TYPECODE, token_ids)).cast("B")
+            conn.send(("shm", len(token_ids)))
+        else:
+            conn.send(("token_ids", token_ids))
+    shm.close()
+
+
+class _TokenizerWorker:
+    """A tokenizer process, which encodes one prompt at a time."""
+
+    def __init__(self, worker_cls: Type[TokenizerGroup],
+                 tokenizer_config: Dict[str, Any], shm_bytes: int):
+        context = get_mp_context()
+        self.shm = shared_memory.SharedMemory(create=True, size=shm_bytes)
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_run_worker,
+                                       args=(worker_cls, tokenizer_config,
+                                             child_conn, self.shm.name),
+                                       daemon=True)
+        self.process.start()
+        # The pipe is closed when the worker dies, so that reading from it
+        # fails instead of blocking.
+        child_conn.close()
+        if not self.conn.poll(_WORKER_INIT_TIMEOUT_S):
+            self.shutdown()
+            raise WorkerDiedError("Tokenizer worker did not start within "
+                                  f"{_WORKER_INIT_TIMEOUT_S} seconds.")
+        self.recv()
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    def send(self, **kwargs) -> None:
+        try:
+            self.conn.send(kwargs)
+        except (BrokenPipeError, ConnectionResetError) as e:
+            raise WorkerDiedError("Tokenizer worker died.") from e
+
+    def recv(self) -> Any:
+        try:
+            kind, value = self.conn.recv()
+        except (EOFError, ConnectionResetError) as e:
+            self.process.join(timeout=1)
+            raise WorkerDiedError("Tokenizer worker died with exit code "
+                                  f"{self.process.exitcode}.") from e
+        if kind == "error":
+            raise value
+        if kind == "shm":
+            token_ids = array(_TOKEN_ID_TYPECODE)
+            token_ids.frombytes(self.shm.buf[:value * _TOKEN_ID_BYTES])
+            return token_ids.tolist()
+        return value
+
+    async def recv_async(self) -> Any:
+        if not self.conn.poll():
+            loop = asyncio.get_running_loop()
+            readable = loop.create_future()
+
+            def set_readable():
+                if not readable.done():
+                    readable.set_result(None)
+
+            loop.add_reader(self.conn.fileno(), set_readable)
+            try:
+                await readable
+            finally:
+                loop.remove_reader(self.conn.fileno())
+        return self.recv()
+
+    def shutdown(self) -> None:
+        _shutdown_worker(self.process, self.conn, self.shm)
+
+
+def _shutdown_worker(process, conn: Connection,
+                     shm: shared_memory.SharedMemory) -> None:
+    if process.is_alive():
+        with contextlib.suppress(OSError):
+            conn.send(None)
+        process.join(timeout=5)
+        if process.is_alive():
+            process.kill()
+    conn.close()
+    shm.close()
+    with contextlib.suppress(FileNotFoundError):
+        shm.unlink()
+
+
+def _shutdown_workers(workers: List[_TokenizerWorker]) -> None:
+    for worker in workers:
+        worker.shutdown()
+
+
+class ProcessPoolTokenizerGroup(BaseTokenizerGroup):
+    """A pool of tokenizer processes for async tokenization without Ray.
+
+    Each worker process holds a TokenizerGroup, with the LoRA tokenizers it
+    is asked for, and encodes one prompt at a time. The token ids of long
+    prompts are returned through shared memory. A worker that dies is
+    restarted once, and the pool is marked as unhealthy if it dies again.
+    Starting a worker may take up to _WORKER_INIT_TIMEOUT_S seconds, so
+    workers are restarted in a thread when the pool is used from an event
+    loop.
+    """
+
+    # Class to use for workers making up the pool.
+    _worker_cls = TokenizerGroup
+
+    @classmethod
+    def from_config(cls, tokenizer_pool_config: Optional[TokenizerPoolConfig],
+                    **init_kwargs) -> "ProcessPoolTokenizerGroup":
+        if not tokenizer_pool_config:
+            raise ValueError("tokenizer_pool_config must not be None.")
+        extra_config = dict(tokenizer_pool_config.extra_config)
+        shm_bytes = extra_config.pop("shm_bytes", _DEFAULT_SHM_BYTES)
+        if extra_config:
+            raise ValueError("Unknown extra config of the process tokenizer "
+                             f"pool: {list(extra_config)}.")
+        init_kwargs["num_workers"] = tokenizer_pool_config.pool_size
+        init_kwargs["shm_bytes"] = shm_bytes
+        return cls(**init_kwargs)
+
+    def __init__(self,
+                 tokenizer_id: str,
+                 enable_lora: bool,
+                 max_num_seqs: int,
+                 max_input_length: Optional[int],
+                 num_workers: int,
+                 shm_bytes: int = _DEFAULT_SHM_BYTES,
+                 **tokenizer_config):
+        # Store a local copy of the TokenizerGroup for quick access
+        # to underlying HF tokenizers.
+        self._tokenizer_config = {
+            "tokenizer_id": tokenizer_id,
+            "enable_lora": enable_lora,
+            "max_num_seqs": max_num_seqs,
+            "max_input_length": max_input_length,
+            **tokenizer_config
+        }
+        self._local_tokenizer_group = self._worker_cls(
+            **self._tokenizer_config)
+        # The shared memory holds whole token ids.
+        self._shm_bytes = max(shm_bytes // _TOKEN_ID_BYTES,
+                              1) * _TOKEN_ID_BYTES
+
+        self.workers: List[_TokenizerWorker] = []
+        self._finalizer = weakref.finalize(self, _shutdown_workers,
+                                           self.workers)
+        self.workers.extend(self._init_worker() for _ in range(num_workers))
+        self._idle_workers: Optional[asyncio.Queue] = None
+        # Tasks that wait for the results of cancelled requests before the
+        # workers are put back in the queue.
+        self._drain_tasks: Set[asyncio.Task] = set()
+        # Tasks that restart dead workers before they are put back in the
+        # queue.
+        self._restart_tasks: Set[asyncio.Task] = set()
+
+        # If set, the pool is unhealthy. Will reraise on the next
+        # check_health call.
+        self._exception: Optional[BaseException] = None
+
+    def _init_worker(self) -> _TokenizerWorker:
+        return _TokenizerWorker(self._worker_cls, self._tokenizer_config,
+                                self._shm_bytes)
+
+    @property
+    def pool_size(self) -> int:
+        return len(self.workers)
+
+    def ping(self) -> bool:
+        return all(worker.is_alive() for worker in self.workers)
+
+    def shutdown(self) -> None:
+        self._finalizer()
+
+    def _ensure_queue_initialized(self):
+        if self._idle_workers is None:
+            self._idle_workers = asyncio.Queue()
+            for worker in self.workers:
+                self._idle_workers.put_nowait(worker)
+
+    def _restart_worker(self, worker: _TokenizerWorker,
+                        error: WorkerDiedError) -> _TokenizerWorker:
+        """Shut down a dead worker and start a new one. This is blocking and
+        does not change the pool, so it can run in a thread."""
+        logger.warning("Tokenizer worker %d died, restarting it: %s",
+                       worker.process.pid, error)
+        worker.shutdown()
+        return self._init_worker()
+
+    def _replace_worker(self, worker: _TokenizerWorker,
+                        error: WorkerDiedError) -> _TokenizerWorker:
+        self.workers.remove(worker)
+        try:
+            new_worker = self._restart_worker(worker, error)
+        except Exception as e:
+            self._mark_unhealthy("Tokenizer worker failed to restart", e)
+            self.check_health()
+            raise
+        self.workers.append(new_worker)
+        return new_worker
+
+    def _replace_worker_in_background(
+            self, worker: _TokenizerWorker,
+            error: WorkerDiedError) -> "asyncio.Task[None]":
+        """Restart a dead worker in a thread, so that the event loop is not
+        blocked, and put the new worker in the queue once it is ready."""
+        self.workers.remove(worker)
+        task = asyncio.create_task(self._replace_worker_async(worker, error))
+        self._restart_tasks.add(task)
+        task.add_done_callback(self._restart_tasks.discard)
+        return task
+
+    async def _replace_worker_async(self, worker: _TokenizerWorker,
+                                    error: WorkerDiedError) -> None:
+        assert self._idle_workers is not None
+        loop = asyncio.get_running_loop()
+        try:
+            new_worker = await loop.run_in_executor(None, self._restart_worker,
+                                                    worker, error)
+        except Exception as e:
+            self._mark_unhealthy("Tokenizer worker failed to restart", e)
+            return
+        self.workers.append(new_worker)
+        self._idle_workers.put_nowait(new_worker)
+
+    def _mark_unhealthy(self, reason: str, error: BaseException) -> None:
+        logger.error("%s, marking ProcessPoolTokenizerGroup as unhealthy.",
+                     reason)
+        if not self._exception:
+            self._exception = error
+
+    def encode(self,
+               prompt: str,
+               request_id: Optional[str] = None,
+               lora_request: Optional[LoRARequest] = None) -> List[int]:
+        """Encode a prompt using the tokenizer group.
+
+        We pick an idle worker and use it to encode the prompt.
+        The worker is then put back in the queue for future use.
+        This is blocking.
+        """
+        self._check_health(restart_in_background=False)
+        self._ensure_queue_initialized()
+        assert self._idle_workers is not None
+
+        if self._idle_workers.empty():
+            raise RuntimeError("No idle workers available.")
+        worker: Optional[_TokenizerWorker] = self._idle_workers.get_nowait()
+        try:
+            for attempt in range(2):
+                assert worker is not None
+                try:
+                    worker.send(prompt=prompt,
+                                request_id=request_id,
+                                lora_request=lora_request)
+                    return worker.recv()
+                except WorkerDiedError as e:
+                    dead_worker, worker = worker, None
+                    if attempt > 0:
+                        self._fail_worker(dead_worker, e)
+                    worker = self._replace_worker(dead_worker, e)
+            raise AssertionError("unreachable")
+        finally:
+            if worker is not None:
+                self._idle_workers.put_nowait(worker)
+
+    async def encode_async(
+            self,
+            prompt: str,
+            request_id: Optional[str] = None,
+            lora_request: Optional[LoRARequest] = None) -> List[int]:
+        """Encode a prompt using the tokenizer group.
+
+        We pick an idle worker and use it to encode the prompt.
+        If there are no idle workers, we wait until one becomes
+        available.
+        The worker is then put back in the queue for future use.
+        This is non-blocking.
+        """
+        self._check_health(restart_in_background=True)
+        self._ensure_queue_initialized()
+        assert self._idle_workers is not None
+
+        for attempt in range(2):
+            worker: _TokenizerWorker = await self._idle_workers.get()
+            try:
+                worker.send(prompt=prompt,
+                            request_id=request_id,
+                            lora_request=lora_request)
+                token_ids = await worker.recv_async()
+            except asyncio.CancelledError:
+                # The worker is still encoding the prompt.
+                task = asyncio.create_task(self._drain(worker))
+                self._drain_tasks.add(task)
+                task.add_done_callback(self._drain_tasks.discard)
+                raise
+            except WorkerDiedError as e:
+                if attempt > 0:
+                    self._fail_worker(worker, e)
+                restart = self._replace_worker_in_background(worker, e)
+            except BaseException:
+                self._idle_workers.put_nowait(worker)
+                raise
+            else:
+                self._idle_workers.put_nowait(worker)
+                return token_ids
+            # The prompt is encoded again once the worker is restarted. The
+            # restart goes on if the request is cancelled.
+            await asyncio.shield(restart)
+            self.check_health()
+        raise AssertionError("unreachable")
+
+    def _fail_worker(self, worker: _TokenizerWorker,
+                     error: WorkerDiedError) -> NoReturn:
+        """Mark the pool as unhealthy when a worker dies while encoding a
+        prompt that a restarted worker was encoding too."""
+        worker.shutdown()
+        self.workers.remove(worker)
+        self._mark_unhealthy("Tokenizer worker died for second time in a row",
+                             error)
+        self.check_health()
+        raise error
+
+    async def _drain(self, worker: _TokenizerWorker) -> None:
+        assert self._idle_workers is not None
+        try:
+            await worker.recv_async()
+        except WorkerDiedError as e:
+            self._replace_worker_in_background(worker, e)
+            return
+        except Exception:
+            pass
+        self._idle_workers.put_nowait(worker)
+
+    def get_max_input_len(self,
+                          lora_request: Optional[LoRARequest] = None
+                          ) -> Optional[int]:
+        """Get the maximum input length for the LoRA request."""
+        return self._local_tokenizer_group.get_max_input_len(lora_request)
+
+    def get_lora_tokenizer(
+        self,
+        lora_request: Optional[LoRARequest] = None,
+    ) -> AnyTokenizer:
+        return self._local_tokenizer_group.get_lora_tokenizer(lora_request)
+
+    async def get_lora_tokenizer_async(
+        self,
+        lora_request: Optional[LoRARequest] = None,
+    ) -> AnyTokenizer:
+        return await self._local_tokenizer_group.get_lora_tokenizer_async(
+            lora_request)
+
+    def check_health(self):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            in_event_loop = False
+        else:
+            in_event_loop = True
+        self._check_health(restart_in_background=in_event_loop)
+
+    def _check_health(self, restart_in_background: bool) -> None:
+        if self._exception:
+            raise RuntimeError(
+                "TokenizerGroupPool is unhealthy.") from self._exception
+        # Restart the idle workers that died since they were last used.
+        if self._idle_workers is not None:
+            idle_workers: List[_TokenizerWorker] = []
+            while not self._idle_workers.empty():
+                idle_workers.append(self._idle_workers.get_nowait())
+            try:
+                for i, worker in enumerate(idle_workers):
+                    if worker.is_alive():
+                        continue
+                    error = WorkerDiedError(
+                        "Tokenizer worker died with exit code "
+                        f"{worker.process.exitcode}.")
+                    if restart_in_background:
+                        self._replace_worker_in_background(worker, error)
+                    else:
+                        idle_workers[i] = self._replace_worker(worker, error)
+            finally:
+                for worker in idle_workers:
+                    if worker in self.workers:
+                        self._idle_workers.put_nowait(worker)
@@ -1,5 +1,6 @@
 from typing import List, Optional
 
+import vllm.envs as envs
 from vllm.config import TokenizerPoolConfig
 from vllm.lora.request import LoRARequest
 from vllm.transformers_utils.tokenizer import (AnyTokenizer,
@@ -9,13 +10,19 @@ from vllm.transformers_utils.tokenizer import (AnyTokenizer,
 from vllm.utils import LRUCache
 
 from .base_tokenizer_group import BaseTokenizerGroup
+from .encode_cache import EncodeCache
 
 
 class TokenizerGroup(BaseTokenizerGroup):
     """A group of tokenizers that can be used for LoRA adapters."""
 
-    def __init__(self, tokenizer_id: str, enable_lora: bool, max_num_seqs: int,
-                 max_input_length: Optional[int], **tokenizer_config):
+    def __init__(self,
+                 tokenizer_id: str,
+                 enable_lora: bool,
+                 max_num_seqs: int,
+                 max_input_length: Optional[int],
+                 encode_cache_size: Optional[int] = None,
+                 **tokenizer_config):
         self.tokenizer_id = tokenizer_id
         self.tokenizer_config = tokenizer_config
         self.enable_lora = enable_lora
@@ -24,6 +31,10 @@ class TokenizerGroup(BaseTokenizerGroup):
         max_loras = tokenizer_config.get("max_loras", 0)
         self.lora_tokenizers = LRUCache[AnyTokenizer](
             capacity=max(max_loras, max_num_seqs) if enable_lora else 0)
+        if encode_cache_size is None:
+            encode_cache_size = envs.VLLM_TOKENIZER_CACHE_SIZE
+        self.encode_cache = (EncodeCache(encode_cache_size)
+                             if encode_cache_size > 0 else None)
 
     @classmethod
     def from_config(cls, tokenizer_pool_config: Optional[TokenizerPoolConfig],
@@ -52,12 +63,17 @@ class TokenizerGroup(BaseTokenizerGroup):
         if max_input_length is not None and input_length > max_input_length:
             raise ValueError("Input too long.", input_length, max_input_length)
 
+    def _encode(self, tokenizer: AnyTokenizer, prompt: str) -> List[int]:
+        if self.encode_cache is None:
+            return tokenizer.encode(prompt)
+        return self.encode_cache.encode(tokenizer, prompt)
+
     def encode(self,
                prompt: str,
                request_id: Optional[str] = None,
                lora_request: Optional[LoRARequest] = None) -> List[int]:
         tokenizer = self.get_lora_tokenizer(lora_request)
-        ret = tokenizer.encode(prompt)
+        ret = self._encode(tokenizer, prompt)
         self._raise_if_input_too_long(ret, lora_request)
         return ret
 
@@ -67,7 +83,7 @@ class TokenizerGroup(BaseTokenizerGroup):
             request_id: Optional[str] = None,
             lora_request: Optional[LoRARequest] = None) -> List[int]:
         tokenizer = await self.get_lora_tokenizer_async(lora_request)
-        ret = tokenizer.encode(prompt)
+        ret = self._encode(tokenizer, prompt)
         self._raise_if_input_too_long(ret, lora_request)
         return ret
 
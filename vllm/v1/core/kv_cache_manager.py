@@ -1,10 +1,12 @@
 from collections import defaultdict
-from typing import Dict, Iterable, List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 from vllm.logger import init_logger
 from vllm.utils import cdiv
 from vllm.v1.core.kv_cache_utils import (BlockHashType, FreeKVCacheBlockQueue,
-                                         KVCacheBlock, hash_block_tokens,
+                                         KVCacheBlock,
+                                         generate_block_hash_extra_keys,
+                                         hash_block_tokens,
                                          hash_request_tokens)
 from vllm.v1.request import Request
 
@@ -67,6 +69,10 @@ class KVCacheManager:
         # is finished.
         self.req_to_blocks: Dict[str, List[KVCacheBlock]] = {}
 
+        # Mapping from request ID to the extra keys of the block hashes of
+        # the request, which are computed once per request.
+        self.req_to_extra_keys: Dict[str, Optional[Tuple[Any, ...]]] = {}
+
     def get_computed_blocks(self, request: Request) -> List[KVCacheBlock]:
         """Get the computed (cached) blocks for the request.
         Note that the computed blocks must be full.
@@ -86,7 +92,8 @@ class KVCacheManager:
         # TODO(rickyx): potentially we could cache this so we don't have to
         # recompute it every time.
         block_hashes = hash_request_tokens(self.block_size,
-                                           request.all_token_ids)
+                                           request.all_token_ids,
+                                           self._get_extra_keys(request))
 
         for block_hash in block_hashes:
             # block_hashes is a chain of block hashes. If a block hash is not
@@ -253,6 +260,12 @@ class KVCacheManager:
 
         return new_blocks
 
+    def _get_extra_keys(self, request: Request) -> Optional[Tuple[Any, ...]]:
+        if request.request_id not in self.req_to_extra_keys:
+            self.req_to_extra_keys[request.request_id] = (
+                generate_block_hash_extra_keys(request))
+        return self.req_to_extra_keys[request.request_id]
+
     def free(self, request: Request) -> None:
         """Free the blocks allocated for the request.
         When caching is enabled, we free the blocks in reverse order so that
@@ -263,6 +276,7 @@ class KVCacheManager:
         """
         # Default to [] in case a request is freed (aborted) before alloc.
         blocks = self.req_to_blocks.pop(request.request_id, [])
+        self.req_to_extra_keys.pop(request.request_id, None)
         ordered_blocks: Iterable[KVCacheBlock] = blocks
         if self.enable_caching:
             # Free blocks in reverse order so that the tail blocks are
@@ -384,6 +398,7 @@ class KVCacheManager:
             assert prev_block.block_hash is not None
             prev_block_hash_value = prev_block.block_hash.hash_value
 
+        extra_keys = self._get_extra_keys(request)
         for i, blk in enumerate(full_blocks):
             blk_idx = blk_start_idx + i
 
@@ -397,7 +412,8 @@ class KVCacheManager:
                 f"{request.request_id}({request})")
 
             # Compute the hash of the current block.
-            block_hash = hash_block_tokens(prev_block_hash_value, block_tokens)
+            block_hash = hash_block_tokens(prev_block_hash_value, block_tokens,
+                                           extra_keys)
 
             # Update and added the full block to the cache.
             blk.block_hash = block_hash
@@ -1,20 +1,23 @@
 """KV-Cache Utilities."""
 from collections.abc import Sequence
 from dataclasses import dataclass
-from typing import List, NamedTuple, Optional, Tuple
+from typing import Any, List, NamedTuple, Optional, Tuple
 
 from vllm.logger import init_logger
+from vllm.v1.request import Request
 
 logger = init_logger(__name__)
 
 
 class BlockHashType(NamedTuple):
-    """Hash value of a block and the token IDs in the block.
-    The reason we keep a tuple of token IDs is to make sure no hash
-    collision happens when the hash value is the same.
+    """Hash value of a block, the token IDs in the block and the extra keys
+    of the block (e.g. the LoRA adapter of the request).
+    The reason we keep a tuple of token IDs and the extra keys is to make
+    sure no hash collision happens when the hash value is the same.
     """
     hash_value: int
     token_ids: Tuple[int, ...]
+    extra_keys: Optional[Tuple[Any, ...]] = None
 
 
 @dataclass
@@ -159,38 +162,67 @@ class FreeKVCacheBlockQueue:
         return ret
 
 
-def hash_block_tokens(parent_block_hash: Optional[int],
-                      curr_block_token_ids: Sequence[int]) -> BlockHashType:
+def generate_block_hash_extra_keys(
+        request: Request) -> Optional[Tuple[Any, ...]]:
+    """Returns the keys other than the token IDs that the KV cache of the
+    blocks of a request depends on, or None if there are none.
+
+    The KV cache computed with a LoRA adapter differs from the one computed
+    with the base model (or another adapter) for the same tokens, so the
+    adapter is part of the hash of every block of the request. Adapters are
+    identified by the fingerprint of their weights, so that adapters with
+    different ids but the same weights share cached blocks. The fingerprint
+    is computed by the frontend, as it reads the files of the adapter.
+
+    Args:
+        request: The request to generate the extra keys for.
+
+    Returns:
+        The extra keys of the blocks of the request.
+    """
+    if request.lora_request is None:
+        return None
+    return (request.lora_fingerprint, )
+
+
+def hash_block_tokens(
+        parent_block_hash: Optional[int],
+        curr_block_token_ids: Sequence[int],
+        extra_keys: Optional[Tuple[Any, ...]] = None) -> BlockHashType:
     """Computes a hash value corresponding to the contents of a block and
     the contents of the preceding block(s). The hash value is used for
     prefix caching. We use LRU cache for this function to avoid recomputing
     hash values for the same block contents.
 
-    TODO: Support arbitrary metadata so that we could support more
-    features such as LoRA adapter.
-
     Args:
         parent_block_hash: The hash of the parent block. None
             if this is the first block.
         curr_block_token_ids: A list of token ids in the current
             block. The current block is assumed to be full.
+        extra_keys: Extra keys of the block, such as the LoRA adapter, see
+            `generate_block_hash_extra_keys`.
 
     Returns:
-        The hash value of the block and the token ids in the block.
-        The entire tuple is used as the hash key of the block.
+        The hash value of the block, the token ids and the extra keys of
+        the block. The entire tuple is used as the hash key of the block.
     """
-    return BlockHashType(hash((parent_block_hash, *curr_block_token_ids)),
-                         tuple(curr_block_token_ids))
+    return BlockHashType(
+        hash((parent_block_hash, *curr_block_token_ids, extra_keys)),
+        tuple(curr_block_token_ids), extra_keys)
 
 
-def hash_request_tokens(block_size: int,
-                        token_ids: Sequence[int]) -> List[BlockHashType]:
+def hash_request_tokens(
+        block_size: int,
+        token_ids: Sequence[int],
+        extra_keys: Optional[Tuple[Any, ...]] = None) -> List[BlockHashType]:
     """Computes hash values of a chain of blocks given a sequence of
     token IDs. The hash value is used for prefix caching.
 
     Args:
         block_size: The size of each block.
         token_ids: A sequence of token ids in the request.
+        extra_keys: Extra keys of the blocks of the request, see
+            `generate_block_hash_extra_keys`.
 
     Returns:
         The list of computed hash values.
@@ -204,7 +236,7 @@ def hash_request_tokens(block_size: int,
         if len(block_token_ids) < block_size:
             break
         block_hash = hash_block_tokens(parent_block_hash_value,
-                                       block_token_ids)
+                                       block_token_ids, extra_keys)
         ret.append(block_hash)
         parent_block_hash_value = block_hash.hash_value
     return ret
@@ -1,10 +1,14 @@
+import itertools
+import time
 from collections import deque
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import (TYPE_CHECKING, Deque, Dict, Iterable, List, Optional, Set,
                     Tuple, Union)
 
 from vllm.config import CacheConfig, LoRAConfig, SchedulerConfig
+from vllm.core.scheduler import LORA_MAX_BYPASSED_STEPS, get_slo_deadline
 from vllm.logger import init_logger
+from vllm.lora.request import LoRARequest
 from vllm.multimodal import MultiModalKwargs
 from vllm.multimodal.base import PlaceholderRange
 from vllm.sampling_params import SamplingParams
@@ -32,8 +36,6 @@ class Scheduler:
         self.scheduler_config = scheduler_config
         self.cache_config = cache_config
         self.lora_config = lora_config
-        # TODO: Support LoRA.
-        assert lora_config is None, "V1 does not support LoRA yet."
 
         # Scheduling constraints.
         self.max_num_running_reqs = self.scheduler_config.max_num_seqs
@@ -81,6 +83,16 @@ class Scheduler:
         self.encoder_cache_manager = EncoderCacheManager(
             cache_size=self.scheduler_config.encoder_cache_size)
 
+        # LoRA-related.
+        # NOTE: Each step runs with at most max_loras distinct LoRAs, one
+        # per GPU slot of the workers. The LoRAs of the previous step are
+        # in the slots of the workers, so only the LoRAs that are not count
+        # as loads for max_lora_loads_per_step.
+        self.prev_scheduled_lora_ids: Set[int] = set()
+        # req_id -> number of steps in which the request was skipped for
+        # its LoRA while later requests were scheduled.
+        self.lora_bypassed_steps: Dict[str, int] = {}
+
     def schedule(self) -> "SchedulerOutput":
         # NOTE(woosuk) on the scheduling algorithm:
         # There's no "decoding phase" nor "prefill phase" in the scheduler.
@@ -102,6 +114,12 @@ class Scheduler:
         # Encoder-related.
         scheduled_encoder_inputs: Dict[str, List[int]] = {}
         encoder_budget = self.max_num_encoder_input_tokens
+        # LoRA-related.
+        scheduled_lora_ids: Set[int] = set()
+        num_lora_loads = 0
+
+        if self.scheduler_config.policy == "deadline":
+            self._order_by_deadline()
 
         # First, schedule the RUNNING requests.
         # NOTE(woosuk): At most 1 request in the RUNNING queue is allowed to be
@@ -155,6 +173,8 @@ class Scheduler:
 
             # Schedule the request.
             scheduled_running_reqs.append(request)
+            if request.lora_request is not None:
+                scheduled_lora_ids.add(request.lora_request.lora_int_id)
             req_to_new_block_ids[request.request_id] = [
                 b.block_id for b in new_blocks
             ]
@@ -174,6 +194,8 @@ class Scheduler:
                 encoder_budget = new_encoder_budget
 
         # Next, schedule the WAITING requests.
+        # The requests skipped because of their LoRA, in the waiting order.
+        skipped_waiting_reqs: Deque[Request] = deque()
         if not preempted_reqs:
             while self.waiting:
                 if has_partial_request:
@@ -184,6 +206,16 @@ class Scheduler:
                     break
 
                 request = self.waiting[0]
+                if not self._can_schedule_lora(request, scheduled_lora_ids,
+                                               num_lora_loads):
+                    if (self.lora_bypassed_steps.get(request.request_id, 0) >=
+                            LORA_MAX_BYPASSED_STEPS):
+                        # The request is starving: do not schedule any later
+                        # request until the LoRAs in use drain.
+                        break
+                    self.waiting.popleft()
+                    skipped_waiting_reqs.append(request)
+                    continue
                 # Get already-cached tokens.
                 computed_blocks = self.kv_cache_manager.get_computed_blocks(
                     request)
@@ -244,6 +276,13 @@ class Scheduler:
                 request.num_computed_tokens = num_computed_tokens
                 has_partial_request = (num_computed_tokens + num_new_tokens <
                                        request.num_tokens)
+                if request.lora_request is not None:
+                    lora_id = request.lora_request.lora_int_id
+                    if lora_id not in scheduled_lora_ids:
+                        scheduled_lora_ids.add(lora_id)
+                        num_lora_loads += (lora_id
+                                           not in self.prev_scheduled_lora_ids)
+                    self.lora_bypassed_steps.pop(request.request_id, None)
 
                 # Encoder-related.
                 if encoder_inputs_to_schedule:
@@ -254,6 +293,18 @@ class Scheduler:
                         self.encoder_cache_manager.allocate(request, i)
                     encoder_budget = new_encoder_budget
 
+        if skipped_waiting_reqs:
+            # The skipped requests are bypassed if waiting requests were
+            # scheduled in their place.
+            if scheduled_new_reqs or scheduled_resumed_reqs:
+                for request in skipped_waiting_reqs:
+                    self.lora_bypassed_steps[request.request_id] = (
+                        self.lora_bypassed_steps.get(request.request_id, 0) +
+                        1)
+            self.waiting.extendleft(reversed(skipped_waiting_reqs))
+        if self.lora_config is not None:
+            self.prev_scheduled_lora_ids = scheduled_lora_ids
+
         # Check if the scheduling constraints are satisfied.
         total_num_scheduled_tokens = sum(num_scheduled_tokens.values())
         assert total_num_scheduled_tokens <= self.max_num_scheduled_tokens
@@ -294,11 +345,92 @@ class Scheduler:
             # the previous and the current steps.
             finished_req_ids=self.finished_req_ids,
             free_encoder_input_ids=self.encoder_cache_manager.get_freed_ids(),
+            prefetch_lora_requests=self._get_prefetch_lora_requests(
+                scheduled_lora_ids),
         )
 
         self.finished_req_ids = set()
         return scheduler_output
 
+    def _get_deadline(self, request: Request) -> float:
+        return get_slo_deadline(request.sampling_params,
+                                request.metrics.arrival_time,
+                                request.metrics.first_token_time,
+                                request.num_output_tokens)
+
+    def _order_by_deadline(self) -> None:
+        """Order the queues by earliest deadline first, so that the waiting
+        requests with the earliest deadlines are scheduled first and the
+        running requests with the latest deadlines are preempted first.
+        Requests without SLOs keep their order after the others."""
+        self.waiting = deque(sorted(self.waiting, key=self._get_deadline))
+        # Only the last running request can be partially computed.
+        self.running.sort(key=lambda request:
+                          (request.num_tokens - request.num_computed_tokens >
+                           1, self._get_deadline(request)))
+
+    def finish_expired_requests(self) -> List[EngineCoreOutput]:
+        """Abort the waiting requests whose first token is past its deadline
+        with the deadline policy, rather than spend compute on responses
+        that are too late."""
+        if self.scheduler_config.policy != "deadline" or not self.waiting:
+            return []
+        now = time.time()
+        engine_core_outputs: List[EngineCoreOutput] = []
+        waiting: Deque[Request] = deque()
+        for request in self.waiting:
+            if (request.num_output_tokens > 0
+                    or self._get_deadline(request) >= now):
+                waiting.append(request)
+                continue
+            request.status = RequestStatus.FINISHED_ABORTED
+            self._free_request(request)
+            engine_core_outputs.append(
+                EngineCoreOutput(request_id=request.request_id,
+                                 new_token_ids=[],
+                                 finished=True,
+                                 finish_reason=request.get_finished_reason()))
+        self.waiting = waiting
+        return engine_core_outputs
+
+    def _can_schedule_lora(self, request: Request,
+                           scheduled_lora_ids: Set[int],
+                           num_lora_loads: int) -> bool:
+        """Whether the LoRA of a waiting request fits in the current step,
+        i.e. it is already used by the step or there is a free LoRA slot and
+        the step has not reached max_lora_loads_per_step."""
+        if self.lora_config is None or request.lora_request is None:
+            return True
+        lora_id = request.lora_request.lora_int_id
+        if lora_id in scheduled_lora_ids:
+            return True
+        if len(scheduled_lora_ids) >= self.lora_config.max_loras:
+            return False
+        max_lora_loads = self.lora_config.max_lora_loads_per_step
+        return (max_lora_loads is None
+                or lora_id in self.prev_scheduled_lora_ids
+                or num_lora_loads < max_lora_loads)
+
+    def _get_prefetch_lora_requests(
+            self, scheduled_lora_ids: Set[int]) -> List[LoRARequest]:
+        """The LoRAs of the requests at the head of the waiting queue that
+        are not used by the current step, which the workers load in the
+        background so that they are ready when the requests are
+        scheduled."""
+        if self.lora_config is None:
+            return []
+        prefetch_lora_requests: Dict[int, LoRARequest] = {}
+        for request in itertools.islice(self.waiting,
+                                        self.max_num_running_reqs):
+            if len(prefetch_lora_requests) >= self.lora_config.max_loras:
+                break
+            lora_request = request.lora_request
+            if (lora_request is not None
+                    and lora_request.lora_int_id not in scheduled_lora_ids):
+                prefetch_lora_requests.setdefault(lora_request.lora_int_id,
+                                                  lora_request)
+        return list(prefetch_lora_requests.values())
+
     def _make_running_request_data(
         self,
         request: Request,
@@ -418,6 +550,8 @@ class Scheduler:
                 token_id = sampled_token_ids[req_index]
                 request.append_output_token_ids(token_id)
                 num_new_tokens = 1
+                if request.num_output_tokens == 1:
+                    request.metrics.first_token_time = time.time()
                 # TODO: Update the KV cache manager for prefix caching.
 
                 # Check for stop and update request state.
@@ -499,6 +633,7 @@ class Scheduler:
         assert request.is_finished()
         self.kv_cache_manager.free(request)
         self.running_reqs_data.pop(request.request_id, None)
+        self.lora_bypassed_steps.pop(request.request_id, None)
         del self.requests[request.request_id]
         self.finished_req_ids.add(request.request_id)
 
@@ -520,6 +655,7 @@ class NewRequestData:
     sampling_params: SamplingParams
     block_ids: List[int]
     num_computed_tokens: int
+    lora_request: Optional[LoRARequest]
 
     @classmethod
     def from_request(
@@ -537,6 +673,7 @@ class NewRequestData:
             sampling_params=request.sampling_params,
             block_ids=block_ids,
             num_computed_tokens=num_computed_tokens,
+            lora_request=request.lora_request,
         )
 
 
@@ -596,3 +733,6 @@ class SchedulerOutput:
     preempted_req_ids: Set[str]
     finished_req_ids: Set[str]
     free_encoder_input_ids: List[Tuple[str, int]]
+
+    # LoRAs of waiting requests for the workers to load in the background.
+    prefetch_lora_requests: List[LoRARequest] = field(default_factory=list)
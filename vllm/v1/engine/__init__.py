@@ -42,6 +42,9 @@ class EngineCoreRequest:
     eos_token_id: Optional[int]
     arrival_time: float
     lora_request: Optional[LoRARequest]
+    # The fingerprint of the weights of the LoRA adapter, which the frontend
+    # computes as it reads the files of the adapter.
+    lora_fingerprint: Optional[int]
 
 
 class EngineCoreOutput(
@@ -9,6 +9,7 @@ from vllm.inputs import INPUT_REGISTRY, InputRegistry, PromptType
 from vllm.inputs.preprocess import InputPreprocessor
 from vllm.logger import init_logger
 from vllm.lora.request import LoRARequest
+from vllm.lora.utils import get_adapter_fingerprint
 from vllm.outputs import PoolingRequestOutput, RequestOutput
 from vllm.pooling_params import PoolingParams
 from vllm.prompt_adapter.request import PromptAdapterRequest
@@ -16,6 +17,7 @@ from vllm.sampling_params import SamplingParams
 from vllm.transformers_utils.tokenizer import AnyTokenizer
 from vllm.transformers_utils.tokenizer_group import init_tokenizer_from_configs
 from vllm.usage.usage_lib import UsageContext
+from vllm.utils import make_async
 from vllm.v1.engine.async_stream import AsyncStream
 from vllm.v1.engine.core_client import EngineCoreClient
 from vllm.v1.engine.detokenizer import Detokenizer
@@ -159,9 +161,15 @@ class AsyncLLM(EngineClient):
         stream = self._add_request_to_streams(request_id)
 
         # 2) Convert input --> DetokenizerRequest / EngineCoreRequest.
+        # Fingerprinting the LoRA adapter hashes (and may download) its
+        # files, so it runs off the event loop.
+        lora_fingerprint = None
+        if lora_request is not None:
+            lora_fingerprint = await make_async(get_adapter_fingerprint)(
+                lora_request.lora_path)
         detokenizer_req, engine_core_req = self.processor.process_inputs(
             request_id, prompt, params, arrival_time, lora_request,
-            trace_headers, prompt_adapter_request, priority)
+            trace_headers, prompt_adapter_request, priority, lora_fingerprint)
 
         # 3) Add the request to Detokenizer (this process).
         self.detokenizer.add_request(detokenizer_req)
@@ -345,8 +353,9 @@ class AsyncLLM(EngineClient):
         self,
         lora_request: Optional[LoRARequest] = None,
     ) -> AnyTokenizer:
-        assert lora_request is None
-        return self.detokenizer.tokenizer
+        if lora_request is None:
+            return self.detokenizer.tokenizer
+        return await self.tokenizer.get_lora_tokenizer_async(lora_request)
 
     async def is_tracing_enabled(self) -> bool:
         return False
@@ -121,10 +121,17 @@ class EngineCore:
         if not self.scheduler.has_unfinished_requests():
             return []
 
+        # Requests past their deadline are aborted before scheduling.
+        expired_outputs = self.scheduler.finish_expired_requests()
+        if not self.scheduler.has_unfinished_requests():
+            return expired_outputs
+
         scheduler_output = self.scheduler.schedule()
         output = self.model_executor.execute_model(scheduler_output)
         engine_core_outputs = self.scheduler.update_from_output(
             scheduler_output, output)
+        if expired_outputs:
+            engine_core_outputs = expired_outputs + engine_core_outputs
         return engine_core_outputs
 
     def shutdown(self):
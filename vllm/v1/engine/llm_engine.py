@@ -45,6 +45,7 @@ class LLMEngine:
 
         # TODO: Can we avoid this?
         self.model_config = vllm_config.model_config
+        self.cache_config = vllm_config.cache_config
 
         # Tokenizer (+ ensure liveness if running in another process).
         self.tokenizer = init_tokenizer_from_configs(
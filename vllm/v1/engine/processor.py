@@ -7,6 +7,7 @@ from vllm.inputs import (INPUT_REGISTRY, InputRegistry, ProcessorInputs,
 from vllm.inputs.parse import is_encoder_decoder_inputs
 from vllm.inputs.preprocess import InputPreprocessor
 from vllm.lora.request import LoRARequest
+from vllm.lora.utils import get_adapter_fingerprint
 from vllm.multimodal import (MULTIMODAL_REGISTRY, MultiModalKwargs,
                              MultiModalRegistry)
 from vllm.pooling_params import PoolingParams
@@ -61,6 +62,7 @@ class Processor:
         trace_headers: Optional[Mapping[str, str]] = None,
         prompt_adapter_request: Optional[PromptAdapterRequest] = None,
         priority: int = 0,
+        lora_fingerprint: Optional[int] = None,
     ) -> Tuple[DetokenizerRequest, EngineCoreRequest]:
 
         # TODO(woosuk): Support pooling models.
@@ -75,6 +77,11 @@ class Processor:
         assert priority == 0, "vLLM V1 does not support priority at the moment."
         assert trace_headers is None, "vLLM V1 does not support tracing yet."
 
+        # Fingerprint the LoRA adapter (if not done by the caller), so that
+        # the EngineCore does not read the files of the adapter.
+        if lora_request is not None and lora_fingerprint is None:
+            lora_fingerprint = get_adapter_fingerprint(lora_request.lora_path)
+
         # Compute MM hashes (if enabled)
         mm_hashes = None
         if self.mm_hasher is not None:
@@ -146,6 +153,7 @@ class Processor:
             eos_token_id,
             arrival_time,
             lora_request,
+            lora_fingerprint,
         )
 
         return detokenizer_request, engine_core_request
@@ -20,6 +20,7 @@ class Request:
         eos_token_id: Optional[int],
         arrival_time: float,
         lora_request: Optional[LoRARequest] = None,
+        lora_fingerprint: Optional[int] = None,
     ) -> None:
         self.request_id = request_id
         self.inputs = SingletonInputsAdapter(inputs)
@@ -32,6 +33,7 @@ class Request:
                                       first_token_time=None,
                                       time_in_queue=None)
         self.lora_request = lora_request
+        self.lora_fingerprint = lora_fingerprint
 
         self.status = RequestStatus.WAITING
         self.stop_reason: Union[int, str, None] = None
@@ -72,6 +74,7 @@ class Request:
             eos_token_id=request.eos_token_id,
             arrival_time=request.arrival_time,
             lora_request=request.lora_request,
+            lora_fingerprint=request.lora_fingerprint,
         )
 
     @property
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Dict
+from typing import Dict, Optional
 
 import torch
 
@@ -19,3 +19,13 @@ class SamplingMetadata:
     generators: Dict[int, torch.Generator]
 
     max_num_logprobs: int
+
+    no_penalties: bool
+    presence_penalties: torch.Tensor
+    frequency_penalties: torch.Tensor
+    repetition_penalties: torch.Tensor
+    # The batch indices of the requests with penalties, and their token
+    # state. None if no request has penalties.
+    penalty_req_indices: Optional[torch.Tensor]
+    prompt_token_mask: Optional[torch.Tensor]
+    output_token_counts: Optional[torch.Tensor]
@@ -4,6 +4,7 @@ from typing import Dict
 import torch
 import torch.nn as nn
 
+from vllm.model_executor.layers.utils import apply_penalties
 from vllm.v1.outputs import SamplerOutput
 from vllm.v1.sample.metadata import SamplingMetadata
 
@@ -17,6 +18,7 @@ class Sampler(nn.Module):
         logits: torch.Tensor,
         sampling_metadata: SamplingMetadata,
     ) -> SamplerOutput:
+        logits = self.apply_penalties(logits, sampling_metadata)
         logits = self.apply_temperature(logits, sampling_metadata.temperature)
         logits = self.apply_top_k_top_p(logits, sampling_metadata)
 
@@ -47,6 +49,25 @@ class Sampler(nn.Module):
         )
         return sampler_output
 
+    def apply_penalties(
+        self,
+        logits: torch.Tensor,
+        sampling_metadata: SamplingMetadata,
+    ) -> torch.Tensor:
+        if sampling_metadata.no_penalties:
+            return logits
+        req_indices = sampling_metadata.penalty_req_indices
+        assert req_indices is not None
+        assert sampling_metadata.prompt_token_mask is not None
+        assert sampling_metadata.output_token_counts is not None
+        logits[req_indices] = apply_penalties(
+            logits[req_indices], sampling_metadata.prompt_token_mask,
+            sampling_metadata.output_token_counts,
+            sampling_metadata.presence_penalties[req_indices],
+            sampling_metadata.frequency_penalties[req_indices],
+            sampling_metadata.repetition_penalties[req_indices])
+        return logits
+
     def apply_temperature(
         self,
         logits: torch.Tensor,
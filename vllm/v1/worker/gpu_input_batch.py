@@ -1,11 +1,12 @@
 # Datastructures defining an input batch
 
 from dataclasses import dataclass
-from typing import TYPE_CHECKING, Dict, List, Optional, Set
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
 
 import numpy as np
 import torch
 
+from vllm.lora.request import LoRARequest
 from vllm.multimodal import MultiModalKwargs
 from vllm.sampling_params import SamplingParams, SamplingType
 from vllm.v1.sample.metadata import SamplingMetadata
@@ -29,6 +30,8 @@ class CachedRequestState:
     num_computed_tokens: int
     output_token_ids: List[int]
 
+    lora_request: Optional[LoRARequest] = None
+
     @property
     def num_tokens(self) -> int:
         return len(self.prompt_token_ids) + len(self.output_token_ids)
@@ -43,10 +46,13 @@ class InputBatch:
         max_num_blocks_per_req: int,
         device: torch.device,
         pin_memory: bool,
+        vocab_size: int,
+        max_num_penalty_reqs: int,
     ):
         self.max_num_reqs = max_num_reqs
         self.max_model_len = max_model_len
         self.max_num_blocks_per_req = max_num_blocks_per_req
+        self.vocab_size = vocab_size
         self.device = device
         self.pin_memory = pin_memory
 
@@ -62,6 +68,8 @@ class InputBatch:
             pin_memory=pin_memory,
         )
         self.token_ids_cpu = self.token_ids_cpu_tensor.numpy()
+        self.num_prompt_tokens = np.zeros(max_num_reqs, dtype=np.int32)
+        self.num_tokens = np.zeros(max_num_reqs, dtype=np.int32)
         self.num_computed_tokens_cpu = np.empty(max_num_reqs, dtype=np.int32)
 
         # Attention-related.
@@ -110,6 +118,52 @@ class InputBatch:
         self.top_k_cpu = self.top_k_cpu_tensor.numpy()
         self.top_k_reqs: Set[str] = set()
 
+        self.presence_penalties = torch.empty((max_num_reqs, ),
+                                              dtype=torch.float32,
+                                              device=device)
+        self.presence_penalties_cpu_tensor = torch.empty((max_num_reqs, ),
+                                                         dtype=torch.float32,
+                                                         device="cpu",
+                                                         pin_memory=pin_memory)
+        self.presence_penalties_cpu = \
+            self.presence_penalties_cpu_tensor.numpy()
+
+        self.frequency_penalties = torch.empty((max_num_reqs, ),
+                                               dtype=torch.float32,
+                                               device=device)
+        self.frequency_penalties_cpu_tensor = torch.empty(
+            (max_num_reqs, ),
+            dtype=torch.float32,
+            device="cpu",
+            pin_memory=pin_memory)
+        self.frequency_penalties_cpu = \
+            self.frequency_penalties_cpu_tensor.numpy()
+
+        self.repetition_penalties = torch.empty((max_num_reqs, ),
+                                                dtype=torch.float32,
+                                                device=device)
+        self.repetition_penalties_cpu_tensor = torch.empty(
+            (max_num_reqs, ),
+            dtype=torch.float32,
+            device="cpu",
+            pin_memory=pin_memory)
+        self.repetition_penalties_cpu = \
+            self.repetition_penalties_cpu_tensor.numpy()
+        self.penalty_reqs: Set[str] = set()
+
+        # Token state of the requests with penalties, persisted across steps
+        # and updated incrementally with the sampled tokens, in at most
+        # max_num_penalty_reqs slots. Allocated by the memory profiling, or
+        # when the first request with penalties is added. The token state of
+        # the requests with penalties that do not get a slot is built from
+        # their token ids every step.
+        self.max_num_penalty_reqs = max_num_penalty_reqs
+        self.prompt_token_mask: Optional[torch.Tensor] = None
+        self.output_token_counts: Optional[torch.Tensor] = None
+        # req_id -> slot
+        self.penalty_req_slots: Dict[str, int] = {}
+        self.free_penalty_slots = list(range(max_num_penalty_reqs - 1, -1, -1))
+
         # req_index -> generator
         # NOTE(woosuk): The indices of the requests that do not have their own
         # generator should not be included in the dictionary.
@@ -118,6 +172,15 @@ class InputBatch:
         self.num_logprobs: Dict[str, int] = {}
         self.prompt_logprob_reqs: Set[str] = set()
 
+        # LoRA-related.
+        # The LoRA ID of each request (0 for no LoRA), persisted across steps
+        # like the sampling parameters so that the LoRA mapping of a step is
+        # not rebuilt from the requests.
+        self.request_lora_mapping = np.zeros((self.max_num_reqs, ),
+                                             dtype=np.int32)
+        self.lora_id_to_request_ids: Dict[int, Set[str]] = {}
+        self.lora_id_to_lora_request: Dict[int, LoRARequest] = {}
+
     def add_request(
         self,
         request: "CachedRequestState",
@@ -139,6 +202,8 @@ class InputBatch:
         end_idx = start_idx + len(request.output_token_ids)
         self.token_ids_cpu[req_index,
                            start_idx:end_idx] = request.output_token_ids
+        self.num_prompt_tokens[req_index] = num_prompt_tokens
+        self.num_tokens[req_index] = end_idx
 
         self.num_computed_tokens_cpu[req_index] = request.num_computed_tokens
         num_blocks = len(request.block_ids)
@@ -158,6 +223,17 @@ class InputBatch:
         if sampling_params.top_k > 0:
             self.top_k_reqs.add(req_id)
 
+        self.presence_penalties_cpu[
+            req_index] = sampling_params.presence_penalty
+        self.frequency_penalties_cpu[
+            req_index] = sampling_params.frequency_penalty
+        self.repetition_penalties_cpu[
+            req_index] = sampling_params.repetition_penalty
+        if (sampling_params.presence_penalty != 0.0
+                or sampling_params.frequency_penalty != 0.0
+                or sampling_params.repetition_penalty != 1.0):
+            self.penalty_reqs.add(req_id)
+
         # NOTE(woosuk): self.generators should not include the requests that
         # do not have their own generator.
         if request.generator is not None:
@@ -169,16 +245,38 @@ class InputBatch:
         if sampling_params.prompt_logprobs:
             self.prompt_logprob_reqs.add(req_id)
 
+        lora_request = request.lora_request
+        if lora_request is not None:
+            lora_id = lora_request.lora_int_id
+            self.lora_id_to_request_ids.setdefault(lora_id, set()).add(req_id)
+            self.lora_id_to_lora_request[lora_id] = lora_request
+            self.request_lora_mapping[req_index] = lora_id
+        else:
+            self.request_lora_mapping[req_index] = 0
+
     def remove_request(self, req_id: str) -> Optional[int]:
         req_index = self.req_id_to_index.pop(req_id, None)
         if req_index is None:
             return None
         self.req_ids[req_index] = None
 
+        lora_id = int(self.request_lora_mapping[req_index])
+        if lora_id != 0:
+            lora_req_ids = self.lora_id_to_request_ids[lora_id]
+            lora_req_ids.discard(req_id)
+            if not lora_req_ids:
+                del self.lora_id_to_request_ids[lora_id]
+                del self.lora_id_to_lora_request[lora_id]
+            self.request_lora_mapping[req_index] = 0
+
         self.greedy_reqs.discard(req_id)
         self.random_reqs.discard(req_id)
         self.top_p_reqs.discard(req_id)
         self.top_k_reqs.discard(req_id)
+        self.penalty_reqs.discard(req_id)
+        slot = self.penalty_req_slots.pop(req_id, None)
+        if slot is not None:
+            self.free_penalty_slots.append(slot)
         self.generators.pop(req_index, None)
         self.num_logprobs.pop(req_id, None)
         self.prompt_logprob_reqs.discard(req_id)
@@ -191,9 +289,16 @@ class InputBatch:
         self.random_reqs.clear()
         self.top_p_reqs.clear()
         self.top_k_reqs.clear()
+        self.penalty_reqs.clear()
+        self.penalty_req_slots.clear()
+        self.free_penalty_slots = list(
+            range(self.max_num_penalty_reqs - 1, -1, -1))
         self.generators.clear()
         self.num_logprobs.clear()
         self.prompt_logprob_reqs.clear()
+        self.request_lora_mapping.fill(0)
+        self.lora_id_to_request_ids.clear()
+        self.lora_id_to_lora_request.clear()
 
     def condense(self, empty_req_indices: List[int]) -> None:
         if self.num_reqs == 0:
@@ -224,6 +329,9 @@ class InputBatch:
             # block_table_cpu.
             self.token_ids_cpu[empty_index] = self.token_ids_cpu[
                 last_req_index]
+            self.num_prompt_tokens[empty_index] = self.num_prompt_tokens[
+                last_req_index]
+            self.num_tokens[empty_index] = self.num_tokens[last_req_index]
             self.num_computed_tokens_cpu[
                 empty_index] = self.num_computed_tokens_cpu[last_req_index]
             self.block_table_cpu[empty_index] = self.block_table_cpu[
@@ -232,9 +340,18 @@ class InputBatch:
                 last_req_index]
             self.top_p_cpu[empty_index] = self.top_p_cpu[last_req_index]
             self.top_k_cpu[empty_index] = self.top_k_cpu[last_req_index]
+            self.presence_penalties_cpu[
+                empty_index] = self.presence_penalties_cpu[last_req_index]
+            self.frequency_penalties_cpu[
+                empty_index] = self.frequency_penalties_cpu[last_req_index]
+            self.repetition_penalties_cpu[
+                empty_index] = self.repetition_penalties_cpu[last_req_index]
             generator = self.generators.pop(last_req_index, None)
             if generator is not None:
                 self.generators[empty_index] = generator
+            self.request_lora_mapping[empty_index] = self.request_lora_mapping[
+                last_req_index]
+            self.request_lora_mapping[last_req_index] = 0
 
             # Decrement last_req_index since it is now empty.
             last_req_index -= 1
@@ -250,6 +367,23 @@ class InputBatch:
                 self.top_p_cpu_tensor[:self.num_reqs], non_blocking=True)
             self.top_k[:self.num_reqs].copy_(
                 self.top_k_cpu_tensor[:self.num_reqs], non_blocking=True)
+            if not self.no_penalties:
+                self.presence_penalties[:self.num_reqs].copy_(
+                    self.presence_penalties_cpu_tensor[:self.num_reqs],
+                    non_blocking=True)
+                self.frequency_penalties[:self.num_reqs].copy_(
+                    self.frequency_penalties_cpu_tensor[:self.num_reqs],
+                    non_blocking=True)
+                self.repetition_penalties[:self.num_reqs].copy_(
+                    self.repetition_penalties_cpu_tensor[:self.num_reqs],
+                    non_blocking=True)
+        if self.no_penalties:
+            penalty_req_indices = None
+            prompt_token_mask = None
+            output_token_counts = None
+        else:
+            (penalty_req_indices, prompt_token_mask,
+             output_token_counts) = self._make_token_state()
         return SamplingMetadata(
             temperature=self.temperature[:self.num_reqs],
             all_greedy=self.all_greedy,
@@ -260,8 +394,151 @@ class InputBatch:
             no_top_k=self.no_top_k,
             generators=self.generators,
             max_num_logprobs=self.max_num_logprobs,
+            no_penalties=self.no_penalties,
+            presence_penalties=self.presence_penalties[:self.num_reqs],
+            frequency_penalties=self.frequency_penalties[:self.num_reqs],
+            repetition_penalties=self.repetition_penalties[:self.num_reqs],
+            penalty_req_indices=penalty_req_indices,
+            prompt_token_mask=prompt_token_mask,
+            output_token_counts=output_token_counts,
         )
 
+    def make_lora_inputs(
+        self, num_scheduled_tokens: np.ndarray
+    ) -> Tuple[Tuple[int, ...], Tuple[int, ...], Set[LoRARequest]]:
+        """Returns the LoRA ID of each request and of each scheduled token
+        of the batch, and the LoRAs used by the batch.
+
+        Args:
+            num_scheduled_tokens: The number of scheduled tokens of each
+                request of the batch, in batch order.
+        """
+        req_lora_mapping = self.request_lora_mapping[:self.num_reqs]
+        prompt_lora_mapping = tuple(req_lora_mapping.tolist())
+        token_lora_mapping = tuple(
+            np.repeat(req_lora_mapping, num_scheduled_tokens).tolist())
+        lora_requests = set(self.lora_id_to_lora_request.values())
+        return prompt_lora_mapping, token_lora_mapping, lora_requests
+
+    def allocate_token_state(self) -> None:
+        """Allocate the slots of the token state of the requests with
+        penalties, which the memory profiling must account for."""
+        if self.prompt_token_mask is None:
+            self.prompt_token_mask = torch.zeros(
+                (self.max_num_penalty_reqs, self.vocab_size),
+                dtype=torch.bool,
+                device=self.device)
+            self.output_token_counts = torch.zeros(
+                (self.max_num_penalty_reqs, self.vocab_size),
+                dtype=torch.int32,
+                device=self.device)
+
+    def _make_token_state(
+            self) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        """Returns the batch indices of the requests with penalties, and
+        their prompt token masks and output token counts."""
+        self.allocate_token_state()
+        assert self.prompt_token_mask is not None
+        assert self.output_token_counts is not None
+
+        req_indices = sorted(self.req_id_to_index[req_id]
+                             for req_id in self.penalty_reqs)
+        prompt_token_mask = torch.zeros((len(req_indices), self.vocab_size),
+                                        dtype=torch.bool,
+                                        device=self.device)
+        output_token_counts = torch.zeros((len(req_indices), self.vocab_size),
+                                          dtype=torch.int32,
+                                          device=self.device)
+        rows: List[int] = []
+        slots: List[int] = []
+        for row, req_index in enumerate(req_indices):
+            req_id = self.req_ids[req_index]
+            assert req_id is not None
+            slot = self.penalty_req_slots.get(req_id)
+            if slot is None and self.free_penalty_slots:
+                slot = self.free_penalty_slots.pop()
+                self.penalty_req_slots[req_id] = slot
+                self._init_token_state(req_index, self.prompt_token_mask[slot],
+                                       self.output_token_counts[slot])
+            if slot is None:
+                # No slot left, build the token state for this step only.
+                self._init_token_state(req_index, prompt_token_mask[row],
+                                       output_token_counts[row])
+            else:
+                rows.append(row)
+                slots.append(slot)
+        if rows:
+            indices = torch.tensor([rows, slots],
+                                   dtype=torch.long,
+                                   device="cpu",
+                                   pin_memory=self.pin_memory)
+            indices = indices.to(self.device, non_blocking=True)
+            prompt_token_mask[indices[0]] = self.prompt_token_mask[indices[1]]
+            output_token_counts[indices[0]] = self.output_token_counts[
+                indices[1]]
+        req_indices_t = torch.tensor(req_indices,
+                                     dtype=torch.long,
+                                     device="cpu",
+                                     pin_memory=self.pin_memory)
+        return (req_indices_t.to(self.device, non_blocking=True),
+                prompt_token_mask, output_token_counts)
+
+    def _init_token_state(
+        self,
+        req_index: int,
+        prompt_token_mask: torch.Tensor,
+        output_token_counts: torch.Tensor,
+    ) -> None:
+        """Build the prompt token mask and output token counts of a request
+        from its token ids."""
+        num_prompt_tokens = self.num_prompt_tokens[req_index]
+        token_ids = self.token_ids_cpu_tensor[
+            req_index, :self.num_tokens[req_index]].to(self.device,
+                                                       non_blocking=True)
+        token_ids = token_ids.long()
+
+        prompt_token_mask.zero_()
+        prompt_token_mask[token_ids[:num_prompt_tokens]] = True
+
+        output_token_counts.zero_()
+        output_token_ids = token_ids[num_prompt_tokens:]
+        output_token_counts.index_add_(
+            0, output_token_ids,
+            torch.ones_like(output_token_ids, dtype=torch.int32))
+
+    def record_sampled_token_ids(
+        self,
+        req_indices: List[int],
+        token_ids: List[int],
+    ) -> None:
+        """Append the tokens sampled in this step to the token ids of the
+        requests, and update the output token counts of the requests with
+        penalties that have a slot."""
+        rows: List[int] = []
+        cols: List[int] = []
+        for req_index, token_id in zip(req_indices, token_ids):
+            self.token_ids_cpu[req_index,
+                               self.num_tokens[req_index]] = token_id
+            self.num_tokens[req_index] += 1
+            req_id = self.req_ids[req_index]
+            assert req_id is not None
+            slot = self.penalty_req_slots.get(req_id)
+            if slot is not None:
+                rows.append(slot)
+                cols.append(token_id)
+        if not rows:
+            return
+        assert self.output_token_counts is not None
+        indices = torch.tensor([rows, cols],
+                               dtype=torch.long,
+                               device="cpu",
+                               pin_memory=self.pin_memory)
+        indices = indices.to(self.device, non_blocking=True)
+        self.output_token_counts.index_put_((indices[0], indices[1]),
+                                            torch.ones_like(indices[0],
+                                                            dtype=torch.int32),
+                                            accumulate=True)
+
     @property
     def num_reqs(self) -> int:
         return len(self.req_id_to_index)
@@ -282,6 +559,10 @@ class InputBatch:
     def no_top_k(self) -> bool:
         return len(self.top_k_reqs) == 0
 
+    @property
+    def no_penalties(self) -> bool:
+        return len(self.penalty_reqs) == 0
+
     @property
     def max_num_logprobs(self) -> int:
         return max(self.num_logprobs.values()) if self.num_logprobs else 0
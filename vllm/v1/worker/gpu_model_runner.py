@@ -1,6 +1,7 @@
 import gc
 import time
-from typing import TYPE_CHECKING, Dict, List, Tuple, cast
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple, cast
 
 import numpy as np
 import torch
@@ -12,7 +13,11 @@ from vllm.distributed.parallel_state import graph_capture
 from vllm.forward_context import set_forward_context
 from vllm.inputs import INPUT_REGISTRY
 from vllm.logger import init_logger
+from vllm.lora.layers import LoRAMapping
+from vllm.lora.request import LoRARequest
+from vllm.lora.worker_manager import LRUCacheWorkerLoRAManager
 from vllm.model_executor.model_loader import get_model
+from vllm.model_executor.models import supports_lora, supports_multimodal
 from vllm.multimodal import MULTIMODAL_REGISTRY, MultiModalKwargs
 from vllm.sampling_params import SamplingType
 from vllm.utils import (STR_DTYPE_TO_TORCH_DTYPE, DeviceMemoryProfiler,
@@ -29,6 +34,8 @@ if TYPE_CHECKING:
 
 logger = init_logger(__name__)
 
+LORA_WARMUP_RANK = 8
+
 
 class GPUModelRunner:
 
@@ -99,11 +106,19 @@ class GPUModelRunner:
             max_num_blocks_per_req=self.max_num_blocks_per_req,
             device=self.device,
             pin_memory=self.pin_memory,
+            vocab_size=self.model_config.get_vocab_size(),
+            max_num_penalty_reqs=min(scheduler_config.max_num_penalty_seqs,
+                                     self.max_num_reqs),
         )
 
+        self.lora_manager: Optional[LRUCacheWorkerLoRAManager] = None
+
+        # NOTE: The LoRA kernels choose their launch configuration from the
+        # LoRA mapping of each step, which CUDA graphs would freeze.
         self.use_cuda_graph = (self.vllm_config.compilation_config.level
                                == CompilationLevel.PIECEWISE
-                               and not self.model_config.enforce_eager)
+                               and not self.model_config.enforce_eager
+                               and self.lora_config is None)
         # TODO(woosuk): Provide an option to tune the max cudagraph batch size.
         # The convention is different.
         # self.cudagraph_batch_sizes sorts in ascending order.
@@ -224,6 +239,7 @@ class GPUModelRunner:
                 block_ids=new_req_data.block_ids,
                 num_computed_tokens=new_req_data.num_computed_tokens,
                 output_token_ids=[],
+                lora_request=new_req_data.lora_request,
             )
             req_ids_to_add.append(req_id)
 
@@ -278,6 +294,9 @@ class GPUModelRunner:
         num_scheduled_tokens = np.array(num_scheduled_tokens, dtype=np.int32)
         assert max_num_scheduled_tokens > 0
 
+        if self.lora_config:
+            self._set_active_loras_for_batch(num_scheduled_tokens)
+
         # Get request indices.
         # E.g., [2, 5, 3] -> [0, 0, 1, 1, 1, 1, 1, 2, 2, 2]
         req_indices = np.repeat(self.arange_np[:num_reqs],
@@ -453,12 +472,25 @@ class GPUModelRunner:
                 encoder_outputs.append(encoder_output[start_idx:end_idx])
         return encoder_outputs
 
+    def _set_active_loras_for_batch(self,
+                                    num_scheduled_tokens: np.ndarray) -> None:
+        prompt_lora_mapping, token_lora_mapping, lora_requests = (
+            self.input_batch.make_lora_inputs(num_scheduled_tokens))
+        # NOTE: A step mixes prefills and decodes, so the LoRA kernels for
+        # prefills, which handle requests with several tokens, are used.
+        lora_mapping = LoRAMapping(token_lora_mapping,
+                                   prompt_lora_mapping,
+                                   is_prefill=True)
+        self.set_active_loras(lora_requests, lora_mapping)
+
     @torch.inference_mode()
     def execute_model(
         self,
         scheduler_output: "SchedulerOutput",
     ) -> ModelRunnerOutput:
         self._update_states(scheduler_output)
+        if scheduler_output.prefetch_lora_requests:
+            self.prefetch_loras(scheduler_output.prefetch_lora_requests)
 
         if self.is_multimodal_model:
             # Run the multimodal encoder if any.
@@ -528,6 +560,8 @@ class GPUModelRunner:
         # TODO(woosuk): The following loop can be slow since it iterates over
         # the requests one by one. Optimize.
         num_reqs = self.input_batch.num_reqs
+        appended_req_indices: List[int] = []
+        appended_token_ids: List[int] = []
         for i, req_id in enumerate(self.input_batch.req_ids[:num_reqs]):
             assert req_id is not None
             req_state = self.requests[req_id]
@@ -537,8 +571,9 @@ class GPUModelRunner:
             if seq_len == req_state.num_tokens:
                 # Append the sampled token to the output token ids.
                 token_id = sampled_token_ids[i]
-                self.input_batch.token_ids_cpu[i, seq_len] = token_id
                 req_state.output_token_ids.append(token_id)
+                appended_req_indices.append(i)
+                appended_token_ids.append(token_id)
             else:
                 # Ignore the sampled token from the partial request.
                 # Rewind the generator state as if the token was not sampled.
@@ -546,6 +581,10 @@ class GPUModelRunner:
                 if generator is not None:
                     # This relies on cuda-specific torch-internal impl details
                     generator.set_offset(generator.get_offset() - 4)
+        # Append the sampled tokens to the token ids of the persistent batch,
+        # and keep the penalty token counts in sync with them.
+        self.input_batch.record_sampled_token_ids(appended_req_indices,
+                                                  appended_token_ids)
 
         if sampler_output.logprob_token_ids is None:
             logprob_token_ids = None
@@ -580,6 +619,34 @@ class GPUModelRunner:
         logger.info("Loading model weights took %.4f GB",
                     self.model_memory_usage / float(2**30))
 
+        if self.lora_config:
+            assert supports_lora(
+                self.model
+            ), f"{self.model.__class__.__name__} does not support LoRA yet."
+
+            if supports_multimodal(self.model):
+                logger.warning("Regarding multimodal models, vLLM currently "
+                               "only supports adding LoRA to language model.")
+            # It's necessary to distinguish between the max_position_embeddings
+            # of VLMs and LLMs.
+            if hasattr(self.model.config, "max_position_embeddings"):
+                max_pos_embeddings = self.model.config.max_position_embeddings
+            else:
+                max_pos_embeddings = (
+                    self.model.config.text_config.max_position_embeddings)
+
+            self.lora_manager = LRUCacheWorkerLoRAManager(
+                self.max_num_reqs,
+                self.max_num_tokens,
+                self.model_config.get_vocab_size(),
+                self.lora_config,
+                self.device,
+                self.model.embedding_modules,
+                self.model.embedding_padding_modules,
+                max_position_embeddings=max_pos_embeddings,
+            )
+            self.model = self.lora_manager.create_lora_manager(self.model)
+
     @torch.inference_mode()
     def _dummy_run(
         self,
@@ -667,17 +734,94 @@ class GPUModelRunner:
             self.encoder_cache["tmp"] = dict(enumerate(dummy_encoder_outputs))
 
         # Trigger compilation for general shape.
-        hidden_states = self._dummy_run(self.model, self.max_num_tokens,
-                                        dummy_kv_caches)
-        logits = self.model.compute_logits(hidden_states, None)
+        with self._maybe_dummy_loras(self.max_num_tokens):
+            hidden_states = self._dummy_run(self.model, self.max_num_tokens,
+                                            dummy_kv_caches)
+            logits = self.model.compute_logits(hidden_states, None)
         logits = logits[:self.max_num_tokens]
         # TODO(woosuk): Consider the memory usage of the sampler.
+        # The token state of the penalties is persistent for a capped number
+        # of requests, so allocate it now for the profiling to account for
+        # it.
+        self.input_batch.allocate_token_state()
         torch.cuda.synchronize()
         del hidden_states, logits
         self.encoder_cache.clear()
         gc.collect()
 
+    @contextmanager
+    def _maybe_dummy_loras(self, num_tokens: int):
+        """Activate max_loras dummy LoRAs over `num_tokens` tokens, so that
+        the profiling run accounts for the memory used by the LoRA
+        kernels."""
+        if not self.lora_config:
+            yield
+            return
+        assert self.lora_manager is not None
+        num_reqs = min(self.max_num_reqs, num_tokens)
+        with self.lora_manager.dummy_lora_cache():
+            dummy_lora_requests: List[LoRARequest] = []
+            for idx in range(self.lora_config.max_loras):
+                lora_id = idx + 1
+                dummy_lora_request = LoRARequest(
+                    lora_name=f"warmup_{lora_id}",
+                    lora_int_id=lora_id,
+                    lora_path="/not/a/real/path",
+                )
+                self.lora_manager.add_dummy_lora(dummy_lora_request,
+                                                 rank=LORA_WARMUP_RANK)
+                dummy_lora_requests.append(dummy_lora_request)
+            req_lora_mapping = (np.arange(num_reqs, dtype=np.int32) %
+                                len(dummy_lora_requests) + 1)
+            num_scheduled_tokens = np.full(num_reqs,
+                                           num_tokens // num_reqs,
+                                           dtype=np.int32)
+            num_scheduled_tokens[:num_tokens % num_reqs] += 1
+            token_lora_mapping = np.repeat(req_lora_mapping,
+                                           num_scheduled_tokens)
+            # The logits are computed for every token of the profiling run.
+            lora_mapping = LoRAMapping(token_lora_mapping.tolist(),
+                                       token_lora_mapping.tolist(),
+                                       is_prefill=True)
+            self.set_active_loras(set(dummy_lora_requests), lora_mapping)
+            yield
+        self.remove_all_loras()
+
+    def remove_all_loras(self) -> None:
+        if not self.lora_manager:
+            raise RuntimeError("LoRA is not enabled.")
+        self.lora_manager.remove_all_adapters()
+
+    def set_active_loras(self, lora_requests: Set[LoRARequest],
+                         lora_mapping: LoRAMapping) -> None:
+        if not self.lora_manager:
+            raise RuntimeError("LoRA is not enabled.")
+        self.lora_manager.set_active_adapters(lora_requests, lora_mapping)
+
+    def add_lora(self, lora_request: LoRARequest) -> bool:
+        if not self.lora_manager:
+            raise RuntimeError("LoRA is not enabled.")
+        return self.lora_manager.add_adapter(lora_request)
+
+    def remove_lora(self, lora_id: int) -> bool:
+        if not self.lora_manager:
+            raise RuntimeError("LoRA is not enabled.")
+        return self.lora_manager.remove_adapter(lora_id)
+
+    def list_loras(self) -> Set[int]:
+        if not self.lora_manager:
+            raise RuntimeError("LoRA is not enabled.")
+        return self.lora_manager.list_adapters()
+
+    def prefetch_loras(self, lora_requests: List[LoRARequest]) -> None:
+        if not self.lora_manager:
+            raise RuntimeError("LoRA is not enabled.")
+        self.lora_manager.prefetch_adapters(lora_requests)
+
     def capture_model(self) -> None:
+        if not self.use_cuda_graph and self.lora_config:
+            logger.info("Skipping CUDA graph capture as LoRA is enabled.")
+            return
         if not self.use_cuda_graph:
             logger.warning(
                 "Skipping CUDA graph capture. Please add "
@@ -437,6 +437,13 @@ class CPUModelRunnerBase(ModelRunnerBase[TModelInputForCPU]):
     def load_model(self) -> None:
         self.model = get_model(vllm_config=self.vllm_config)
 
+    def save_engine_image(self, path: str) -> None:
+        from vllm.model_executor.model_loader.engine_image import (
+            save_compile_cache)
+        from vllm.model_executor.model_loader.loader import EngineImageLoader
+        EngineImageLoader.save_model(self.model, path)
+        save_compile_cache(self.vllm_config, path)
+
     def _prepare_model_input_tensors(
         self,
         seq_group_metadata_list: List[SequenceGroupMetadata],
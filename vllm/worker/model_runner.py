@@ -27,10 +27,11 @@ from vllm.inputs import INPUT_REGISTRY, InputRegistry
 from vllm.logger import init_logger
 from vllm.lora.layers import LoRAMapping
 from vllm.lora.request import LoRARequest
-from vllm.lora.worker_manager import LRUCacheWorkerLoRAManager
+from vllm.lora.worker_manager import (LoRAPrefetchStats,
+                                      LRUCacheWorkerLoRAManager)
 from vllm.model_executor import SamplingMetadata, SamplingMetadataCache
 from vllm.model_executor.layers.rotary_embedding import MRotaryEmbedding
-from vllm.model_executor.layers.sampler import SamplerOutput
+from vllm.model_executor.layers.sampler import Sampler, SamplerOutput
 from vllm.model_executor.model_loader import get_model
 from vllm.model_executor.model_loader.tensorizer import TensorizerConfig
 from vllm.model_executor.models import supports_lora, supports_multimodal
@@ -1184,6 +1185,13 @@ class GPUModelRunnerBase(ModelRunnerBase[TModelInputForGPU]):
             max_size=max_size,
         )
 
+    def save_engine_image(self, path: str) -> None:
+        from vllm.model_executor.model_loader.engine_image import (
+            save_compile_cache)
+        from vllm.model_executor.model_loader.loader import EngineImageLoader
+        EngineImageLoader.save_model(self.model, path)
+        save_compile_cache(self.vllm_config, path)
+
     def save_tensorized_model(
         self,
         tensorizer_config: TensorizerConfig,
@@ -1231,6 +1239,14 @@ class GPUModelRunnerBase(ModelRunnerBase[TModelInputForGPU]):
         sampling_params = SamplingParams(top_p=0.99, top_k=self.vocab_size - 1)
         max_num_batched_tokens = self.scheduler_config.max_num_batched_tokens
         max_num_seqs = self.scheduler_config.max_num_seqs
+        # The sampler keeps the token counts of the penalties on device
+        # across steps for a capped number of sequences; allocate them so
+        # that they are profiled.
+        sampler = getattr(self.model, "sampler", None)
+        if isinstance(sampler, Sampler):
+            sampler.reserve_token_counts(
+                self.scheduler_config.max_num_penalty_seqs, self.vocab_size,
+                self.device)
         # This represents the maximum number of different requests
         # that will have unique loras, an therefore the max amount of memory
         # consumption create dummy lora request copies from the lora request
@@ -1361,6 +1377,16 @@ class GPUModelRunnerBase(ModelRunnerBase[TModelInputForGPU]):
             raise RuntimeError("LoRA is not enabled.")
         return self.lora_manager.list_adapters()
 
+    def prefetch_loras(self, lora_requests: List[LoRARequest]) -> None:
+        if not self.lora_manager:
+            raise RuntimeError("LoRA is not enabled.")
+        self.lora_manager.prefetch_adapters(lora_requests)
+
+    def get_lora_prefetch_stats(self) -> LoRAPrefetchStats:
+        if not self.lora_manager:
+            raise RuntimeError("LoRA is not enabled.")
+        return self.lora_manager.get_prefetch_stats()
+
     def remove_all_prompt_adapters(self):
         if not self.prompt_adapter_manager:
             raise RuntimeError("PromptAdapter is not enabled.")
@@ -657,6 +657,9 @@ class MultiStepModelRunner(GPUModelRunnerBase[StatefulModelInput]):
         return self._base_model_runner.save_sharded_state(
             path, pattern, max_size)
 
+    def save_engine_image(self, path: str) -> None:
+        return self._base_model_runner.save_engine_image(path)
+
     def save_tensorized_model(self,
                               tensorizer_config: TensorizerConfig) -> None:
         return self._base_model_runner.save_tensorized_model(tensorizer_config)
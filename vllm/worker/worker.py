@@ -14,6 +14,7 @@ from vllm.distributed import (ensure_kv_transfer_initialized,
                               set_custom_all_reduce)
 from vllm.logger import init_logger
 from vllm.lora.request import LoRARequest
+from vllm.lora.worker_manager import LoRAPrefetchStats
 from vllm.model_executor import set_random_seed
 from vllm.model_executor.layers.sampler import SamplerOutput
 from vllm.model_executor.model_loader.tensorizer import TensorizerConfig
@@ -166,6 +167,9 @@ class Worker(LocalOrDistributedWorkerBase):
             max_size=max_size,
         )
 
+    def save_engine_image(self, path: str) -> None:
+        self.model_runner.save_engine_image(path)
+
     def save_tensorized_model(
         self,
         tensorizer_config: TensorizerConfig,
@@ -329,6 +333,7 @@ class Worker(LocalOrDistributedWorkerBase):
             blocks_to_copy=blocks_to_copy,
             virtual_engine=virtual_engine,
             num_steps=num_steps,
+            prefetch_lora_requests=execute_model_req.prefetch_lora_requests,
         )
 
     @torch.inference_mode()
@@ -346,6 +351,9 @@ class Worker(LocalOrDistributedWorkerBase):
         if (worker_input.blocks_to_copy is not None
                 and worker_input.blocks_to_copy.numel() > 0):
             self.cache_engine[virtual_engine].copy(worker_input.blocks_to_copy)
+        if worker_input.prefetch_lora_requests:
+            self.model_runner.prefetch_loras(
+                worker_input.prefetch_lora_requests)
 
     def _get_cached_seq_group_metadata(
             self,
@@ -416,6 +424,9 @@ class Worker(LocalOrDistributedWorkerBase):
     def list_loras(self) -> Set[int]:
         return self.model_runner.list_loras()
 
+    def get_lora_prefetch_stats(self) -> LoRAPrefetchStats:
+        return self.model_runner.get_lora_prefetch_stats()
+
     def add_prompt_adapter(
             self, prompt_adapter_request: PromptAdapterRequest) -> bool:
         return self.model_runner.add_prompt_adapter(prompt_adapter_request)
@@ -148,6 +148,7 @@ class WorkerInput:
     blocks_to_copy: Optional[torch.Tensor] = None
     virtual_engine: int = 0
     num_steps: int = 1
+    prefetch_lora_requests: Optional[List[LoRARequest]] = None
 
     @classmethod
     def from_broadcasted_tensor_dict(
@@ -165,6 +166,7 @@ class WorkerInput:
             blocks_to_copy=tensor_dict.pop("blocks_to_copy"),
             virtual_engine=tensor_dict["virtual_engine"],
             num_steps=tensor_dict.pop("num_steps"),
+            prefetch_lora_requests=tensor_dict.pop("prefetch_lora_requests"),
         )
 
     def as_broadcastable_tensor_dict(
@@ -179,6 +181,7 @@ class WorkerInput:
             "blocks_to_copy": self.blocks_to_copy,
             "virtual_engine": self.virtual_engine,
             "num_steps": self.num_steps,
+            "prefetch_lora_requests": self.prefetch_lora_requests,
         }
 
         return tensor_dict